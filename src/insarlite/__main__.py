@@ -9,6 +9,11 @@ Author: Muhammad Badar Munir
 
 def main():
     """Main entry point for InSARLite application."""
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "run":
+        # Headless batch processing: python -m insarlite run <project> ...
+        from .cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
     import tkinter as tk
     from .main import InSARLiteApp
     
@@ -0,0 +1,368 @@
+"""
+Headless command line interface for InSARLite.
+
+Runs processing stages of an existing project without a GUI, e.g. on
+compute nodes:
+
+    insarlite run /path/to/project --stages ifgs,merge,unwrap,sbas --cores 16 --memory-gb 64
+
+The project must have been set up (structure, baselines, master and pairs)
+so that its .config.json exists. Questions the GUI would ask are answered by
+policy flags and progress is emitted as JSON lines on stdout.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+STAGES = ["align", "ifgs", "merge", "mean_corr", "unwrap", "normalize", "closure", "gacos", "qc", "sbas", "trend"]
+
+
+class ProgressReporter:
+    """Writes progress events as JSON lines (or plain text) to a stream."""
+
+    def __init__(self, mode: str = "json", stream=None):
+        self.mode = mode
+        self.stream = stream or sys.stdout
+
+    def emit(self, event: str, **fields: Any) -> None:
+        record = {"event": event, "time": datetime.now().strftime("%Y-%m-%dT%H:%M:%S")}
+        record.update(fields)
+        if self.mode == "json":
+            line = json.dumps(record)
+        else:
+            line = " ".join(f"{k}={v}" for k, v in record.items())
+        self.stream.write(line + "\n")
+        self.stream.flush()
+
+
+def load_project_config(project: str) -> Dict[str, Any]:
+    """
+    Load the .config.json of a project.
+
+    Args:
+        project: Project folder or path to its .config.json
+
+    Returns:
+        Configuration dictionary
+    """
+    config_path = project if os.path.isfile(project) else os.path.join(project, ".config.json")
+    if not os.path.exists(config_path):
+        raise FileNotFoundError(f"Project configuration not found: {config_path}")
+    with open(config_path, "r") as f:
+        return json.load(f)
+
+
+def get_project_paths(config: Dict[str, Any], log_file: Optional[str] = None) -> Dict[str, str]:
+    """Rebuild the processing paths of a project from its configuration."""
+    from .gmtsar_gui.structuring import generate_paths
+
+    paths = generate_paths(config["output_folder"], config["project_name"],
+                           config.get("flight_direction", "DESCENDING"), config.get("subswaths", []))
+    paths["log_file_path"] = log_file
+    return paths
+
+
+def get_ifgs_root(paths: Dict[str, str]) -> Optional[str]:
+    """Get the folder holding the interferograms that are unwrapped and inverted."""
+    pmerge = paths.get("pmerge")
+    if pmerge and os.path.exists(pmerge):
+        return pmerge
+    for key in ["pF1", "pF2", "pF3"]:
+        dir_path = paths.get(key)
+        if dir_path and os.path.exists(dir_path):
+            return os.path.join(dir_path, "intf_all")
+    return None
+
+
+class HeadlessRunner:
+    """Runs processing stages of a project without Tk windows."""
+
+    def __init__(self, config: Dict[str, Any], args: argparse.Namespace, reporter: ProgressReporter):
+        self.config = config
+        self.args = args
+        self.reporter = reporter
+        project_dir = os.path.join(config["output_folder"], config["project_name"])
+        now = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.log_file = os.path.join(project_dir, f"{config['project_name']}_{now}.log")
+        self.paths = get_project_paths(config, self.log_file)
+        self.mst = config.get("mst")
+        self.dem = config.get("dem_file")
+        self.gacos_dir = config.get("gacos_folder") or None
+
+    def workers(self, stage: str) -> int:
+        # --memory-gb is applied inside the stages, which size their jobs from the grids
+        return max(1, self.args.cores)
+
+    def run(self, stages: List[str]) -> bool:
+        """Run stages in pipeline order; stops at the first failing stage."""
+        for stage in [s for s in STAGES if s in stages]:
+            self.reporter.emit("stage_start", stage=stage)
+            start = time.time()
+            try:
+                status = getattr(self, f"run_{stage}")() or "completed"
+            except Exception as e:
+                self.reporter.emit("stage_end", stage=stage, status="failed", error=str(e),
+                                   duration=round(time.time() - start, 1))
+                return False
+            self.reporter.emit("stage_end", stage=stage, status=status, duration=round(time.time() - start, 1))
+        return True
+
+    def _require_master(self) -> None:
+        if not self.mst:
+            raise RuntimeError("No master image in the project configuration; select it in the GUI first")
+
+    def run_align(self):
+        from .gmtsar_gui.alignment import align_sec_imgs
+
+        self._require_master()
+        align_mode = self.config.get("align_mode") or "esd"
+        esd_mode = self.config.get("esd_mode") or ""
+        align_sec_imgs(self.paths, self.mst, self.dem, align_mode, esd_mode)
+
+    def run_ifgs(self):
+        from .gmtsar_gui.ifgs_generation import gen_ifgs
+
+        self._require_master()
+
+        def on_progress(key, completed, total, eta):
+            self.reporter.emit("progress", stage="ifgs", subswath=key, completed=completed, total=total,
+                               eta_seconds=round(eta) if eta is not None else None)
+
+        gen_ifgs(self.paths, self.mst, self.args.filter_wavelength, self.args.range_dec, self.args.azimuth_dec,
+                 self.workers("ifgs"), progress_callback=on_progress)
+
+    def run_merge(self):
+        from .gmtsar_gui.mergeIFGs import merge_thread
+
+        pmerge = self.paths.get("pmerge")
+        if not pmerge or not os.path.exists(pmerge):
+            return "skipped"
+        merge_thread(pmerge, self.log_file, self.mst)
+
+    def run_mean_corr(self):
+        from .gmtsar_gui.mean_corr import create_mean_grd
+
+        ifgsroot = get_ifgs_root(self.paths)
+        if not ifgsroot:
+            raise RuntimeError("No interferogram folder found")
+        create_mean_grd(ifgsroot, log_file_path=self.log_file)
+
+    def _unwrap_processing(self, stage: str):
+        from .gmtsar_gui.unwrap_processing import UnwrapProcessing
+
+        ifgsroot = get_ifgs_root(self.paths)
+        if not ifgsroot:
+            raise RuntimeError("No interferogram folder found")
+        processing = UnwrapProcessing()
+        processing.ifgsroot = ifgsroot
+        processing.ifgs = []
+        processing.topodir = self._topodir(ifgsroot)
+        processing.ncores = self.workers(stage)
+        processing.log_file = self.log_file
+        return processing
+
+    def _apply_roi(self, processing) -> None:
+        """Set (or clear) the unwrapping ROI from --roi or the unwrap_roi configuration key."""
+        from .utils.roi import clear_roi, resolve_roi, write_roi
+
+        spec = self.args.roi or self.config.get("unwrap_roi")
+        if not spec:
+            return
+        if spec == "none":
+            clear_roi(processing.ifgsroot)
+            return
+        roi, source = resolve_roi(spec, processing.ifgsroot, processing.topodir)
+        if roi is None:
+            raise RuntimeError(f"Could not determine the ROI from {spec}")
+        write_roi(processing.ifgsroot, roi, source)
+
+    def run_unwrap(self):
+        processing = self._unwrap_processing("unwrap")
+        self._apply_roi(processing)
+        processing.parall_unwrap(self.args.unwrap_threshold, processing.ncores,
+                                 tiling=self.args.unwrap_tiling == "auto")
+
+    def run_normalize(self):
+        processing = self._unwrap_processing("normalize")
+        if not os.path.exists(os.path.join(processing.topodir, "ref_point.ra")):
+            print("No reference point (ref_point.ra) defined; select it in the GUI first")
+            return "skipped"
+        processing.post_unwrap()
+
+    def _topodir(self, ifgsroot: str) -> str:
+        return ifgsroot if os.path.basename(ifgsroot) == "merge" else os.path.join(os.path.dirname(ifgsroot), "topo")
+
+    def run_closure(self):
+        from .gmtsar_gui.sbas04 import sb_unwrap_name
+        from .utils.phase_closure import check_closure, enumerate_triplets, network_pairs
+
+        ifgsroot = get_ifgs_root(self.paths)
+        if not ifgsroot:
+            raise RuntimeError("No interferogram folder found")
+        uwp = sb_unwrap_name(ifgsroot)
+        if not len(enumerate_triplets(network_pairs(ifgsroot, uwp))):
+            print("No closed triplets in the unwrapped interferogram network")
+            return "skipped"
+
+        def on_progress(completed, total):
+            self.reporter.emit("progress", stage="closure", completed=completed, total=total)
+
+        check_closure(ifgsroot, uwp, topodir=self._topodir(ifgsroot),
+                      threshold=self.args.closure_threshold, ncores=self.workers("closure"),
+                      progress_callback=on_progress)
+
+    def run_gacos(self):
+        from .gmtsar_gui.gacos_atm_corr import gacos
+
+        if not self.gacos_dir or not os.path.exists(self.gacos_dir):
+            return "skipped"
+        processing = self._unwrap_processing("gacos")
+        gacos(self.gacos_dir, processing.topodir, self.args.incidence, processing.ifgsroot,
+              processing.ncores, log_file=self.log_file)
+
+    def run_qc(self):
+        from .gmtsar_gui.sbas04 import sb_unwrap_name
+        from .utils.ifg_qc import run_ifg_qc
+
+        ifgsroot = get_ifgs_root(self.paths)
+        if not ifgsroot:
+            raise RuntimeError("No interferogram folder found")
+        thresholds = {"min_coherence": self.args.qc_min_coherence,
+                      "min_valid_fraction": self.args.qc_min_valid_fraction,
+                      "max_gradient_outliers": self.args.qc_max_gradient_outliers}
+
+        def on_progress(completed, total):
+            self.reporter.emit("progress", stage="qc", completed=completed, total=total)
+
+        run_ifg_qc(ifgsroot, sb_unwrap_name(ifgsroot), closure=self.args.qc_closure, thresholds=thresholds,
+                   ncores=self.workers("qc"), topodir=self._topodir(ifgsroot), progress_callback=on_progress)
+
+    def run_sbas(self):
+        from .gmtsar_gui.sbas04 import sb_inversion
+
+        sdir = self.paths.get("psbas")
+        if not sdir or not os.path.exists(sdir):
+            raise RuntimeError("SBAS folder not found")
+        sbas = self.args.sbas_mode
+        if sbas == "sbas_parallel":
+            os.environ["OMP_NUM_THREADS"] = str(self.args.cores)
+        sb_inversion(sdir, self.paths, str(self.args.incidence),
+                     atm=f"-atm {self.args.atm}",
+                     rms="" if self.args.no_rms else "-rms",
+                     dem="" if self.args.no_dem else "-dem",
+                     sbas=sbas,
+                     smooth=f"-smooth {self.args.smooth}",
+                     log_file=self.log_file,
+                     ncores=self.workers("sbas"))
+
+    def run_trend(self):
+        from .utils.trend_model import fit_trend_grids
+
+        sdir = self.paths.get("psbas")
+        if not sdir or not os.path.exists(sdir):
+            raise RuntimeError("SBAS folder not found")
+        fit_trend_grids(sdir)
+
+
+def _yes_no(value: str) -> Optional[bool]:
+    return {"yes": True, "no": False, "ask": None}[value]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    from .utils.phase_closure import ERROR_THRESHOLD
+
+    parser = argparse.ArgumentParser(prog="insarlite", description="InSARLite headless processing")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Run processing stages of a project non-interactively")
+    run.add_argument("project", help="Project folder (holding .config.json) or the .config.json itself")
+    run.add_argument("--stages", default=",".join(STAGES),
+                     help=f"Comma separated stages to run (default: all of {','.join(STAGES)})")
+    run.add_argument("--cores", type=int, default=os.cpu_count() or 1, help="Core budget")
+    run.add_argument("--memory-gb", type=float, default=None, help="Memory budget in GB, limits parallel jobs (default: available memory)")
+    run.add_argument("--filter-wavelength", type=int, default=200)
+    run.add_argument("--range-dec", type=int, default=8)
+    run.add_argument("--azimuth-dec", type=int, default=2)
+    run.add_argument("--unwrap-threshold", type=float, default=0.01, help="Correlation threshold for unwrapping")
+    run.add_argument("--unwrap-tiling", choices=["auto", "off"], default="auto",
+                     help="Unwrap large grids in SNAPHU tiles when fewer interferograms than cores remain")
+    run.add_argument("--roi", default=None,
+                     help="Crop interferograms before unwrapping: x0/x1/y0/y1 in radar coordinates, "
+                          "'mask' for the extent of mask_def.grd or 'none' for the full frame "
+                          "(default: keep the project ROI)")
+    run.add_argument("--incidence", type=float, default=37.0, help="Incidence angle in degrees")
+    run.add_argument("--closure-threshold", type=float, default=ERROR_THRESHOLD,
+                     help="Triplet closure (radians) counted as an unwrapping error (default: pi)")
+    run.add_argument("--qc-min-coherence", type=float, default=0.15,
+                     help="Interferograms with a lower mean coherence are left out of SBAS")
+    run.add_argument("--qc-min-valid-fraction", type=float, default=0.3,
+                     help="Interferograms with a smaller unwrapped share are left out of SBAS")
+    run.add_argument("--qc-max-gradient-outliers", type=float, default=0.02,
+                     help="Interferograms with more neighbour phase jumps over pi are left out of SBAS")
+    run.add_argument("--qc-closure", action="store_true", help="Also screen phase closure over triplets (as the closure stage)")
+    run.add_argument("--sbas-mode", choices=["sbas", "sbas_parallel", "python"], default="sbas",
+                     help="GMTSAR sbas or sbas_parallel, or the resumable in-process blocked inversion")
+    run.add_argument("--smooth", type=float, default=5.0)
+    run.add_argument("--atm", type=int, default=0)
+    run.add_argument("--no-rms", action="store_true")
+    run.add_argument("--no-dem", action="store_true")
+    run.add_argument("--backup-alignment", choices=["yes", "no"], default="yes",
+                     help="Back up aligned SLC files before re-alignment")
+    run.add_argument("--redo-sbas", choices=["yes", "no"], default="no",
+                     help="Redo SBAS when displacement grids already exist")
+    run.add_argument("--progress", choices=["json", "text"], default="json", help="Progress output format")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point of the headless CLI; returns the process exit code."""
+    from .utils.run_policy import set_headless, set_policy
+    from .utils.memory_planner import set_memory_budget
+
+    args = build_parser().parse_args(argv)
+    stream = None
+    if args.progress == "json":
+        # Keep stdout machine-readable: processing output (including that of
+        # GMTSAR subprocesses) goes to stderr
+        sys.stdout.flush()
+        stream = os.fdopen(os.dup(1), "w")
+        os.dup2(2, 1)
+        sys.stdout = sys.stderr
+    reporter = ProgressReporter(args.progress, stream)
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        reporter.emit("error", message=f"Unknown stages: {', '.join(unknown)}")
+        return 2
+
+    try:
+        config = load_project_config(args.project)
+    except Exception as e:
+        reporter.emit("error", message=str(e))
+        return 2
+
+    set_headless(True)
+    set_policy("alignment_backup", _yes_no(args.backup_alignment))
+    set_policy("sbas_redo", _yes_no(args.redo_sbas))
+    set_memory_budget(args.memory_gb)
+
+    try:
+        runner = HeadlessRunner(config, args, reporter)
+    except Exception as e:
+        reporter.emit("error", message=f"Could not set up project: {e}")
+        return 2
+    reporter.emit("run_start", project=config.get("project_name"), stages=stages,
+                  cores=args.cores, memory_gb=args.memory_gb)
+    ok = runner.run(stages)
+    reporter.emit("run_end", status="completed" if ok else "failed")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
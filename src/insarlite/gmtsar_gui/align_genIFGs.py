@@ -1,9 +1,10 @@
 import tkinter as tk
 from ..gmtsar_gui.alignment import align_sec_imgs
-from ..gmtsar_gui.ifgs_generation import gen_ifgs
+from ..gmtsar_gui.ifgs_generation import gen_ifgs, get_ifg_params, read_ifg_params_from_config, reconcile_ifg_cache
 from ..gmtsar_gui.mergeIFGs import merge_thread
 from ..gmtsar_gui.mean_corr import create_mean_grd
-from ..utils.utils import check_alignment_completion_status, check_ifgs_completion, check_merge_completion, check_first_ifg_completion, process_logger
+from ..utils.utils import check_alignment_completion_status, check_ifgs_completion, check_merge_completion, check_first_ifg_completion, process_logger, format_time
+from ..utils.product_catalog import get_catalog
 import threading
 from tkinter import messagebox
 import os
@@ -393,6 +394,15 @@ class GenIfg:
         # Initial stage progress update
         self._update_stage_progress("interferograms", "In Progress", "2.2")
         
+        # Set aside interferograms made with other parameters so they are regenerated
+        try:
+            for subswath_name, key, path in self.active_subswaths:
+                ifg_params = get_ifg_params(self.mst, key, int(self.filter_wl_var.get()),
+                                            int(self.range_dec_var.get()), int(self.az_dec_var.get()))
+                reconcile_ifg_cache(path, ifg_params, read_ifg_params_from_config(path))
+        except Exception as e:
+            print(f"Warning: Could not check interferogram parameters: {e}")
+        
         # Check if all subswaths already have interferograms
         all_ifgs_done = True
         for subswath_name, key, path in self.active_subswaths:
@@ -448,7 +458,8 @@ class GenIfg:
                             initial_total = self._count_total_interferograms(path)
                             
                             # gen_ifgs is synchronous - it completes when returned
-                            gen_ifgs(single_paths, self.mst, filter_wavelength, rng, az, ncores)
+                            gen_ifgs(single_paths, self.mst, filter_wavelength, rng, az, ncores,
+                                     progress_callback=self._on_ifg_progress)
                             
                             # Check final status after gen_ifgs completes
                             final_completed = self._count_completed_interferograms(path)
@@ -633,6 +644,7 @@ class GenIfg:
         self._last_first_ifg_status = {}
         self._last_ifg_progress = {}
         self._last_alignment_progress = {}
+        self._ifg_eta = {}
         
         def monitor_all_progress():
             while self._monitoring_active and not getattr(self, '_cancel_requested', False):
@@ -721,6 +733,9 @@ class GenIfg:
                                         # All interferograms generation stage (process x.x.2)
                                         subprocess_stage = f"2.{subswath_num}.2"
                                         detail = f"All IFGs: {completed_ifgs}/{total_ifgs} ({progress:.1f}%)"
+                                        eta = self._ifg_eta.get(key)
+                                        if eta is not None:
+                                            detail += f" | ETA {format_time(round(eta))}"
                                         # Only print progress message once when status first changes
                                         # (The print is already controlled by the status change check above)
                                     else:
@@ -760,6 +775,15 @@ class GenIfg:
         self.monitor_thread = threading.Thread(target=monitor_all_progress, daemon=True)
         self.monitor_thread.start()
 
+    def _on_ifg_progress(self, key, completed, total, eta):
+        """Update the subswath detail with the cost-model ETA reported by gen_ifgs."""
+        self._ifg_eta[key] = eta
+        if total > 0 and completed < total:
+            detail = f"All IFGs: {completed}/{total} ({completed / total * 100:.1f}%)"
+            if eta is not None:
+                detail += f" | ETA {format_time(round(eta))}"
+            self._update_subswath_status(key, "In Progress", detail)
+
     def _stop_comprehensive_monitoring(self):
         """Stop comprehensive monitoring."""
         self._monitoring_active = False
@@ -818,47 +842,20 @@ class GenIfg:
 
     def _count_completed_interferograms(self, path):
         """Count completed interferograms from both intf and intf_all directories using only corr.grd as indicator."""
-        completed_pairs = set()
-        
-        # Check intf directory (temporary working directory)
-        intf_dir = os.path.join(path, 'intf')
-        if os.path.exists(intf_dir):
-            for item in os.listdir(intf_dir):
-                item_path = os.path.join(intf_dir, item)
-                if os.path.isdir(item_path) and '_' in item:
-                    # Check for corr.grd as the only completion indicator
-                    corr_file = os.path.join(item_path, 'corr.grd')
-                    if os.path.exists(corr_file):
-                        completed_pairs.add(item)
-        
-        # Check intf_all directory (final destination)
-        intf_all_dir = os.path.join(path, 'intf_all')
-        if os.path.exists(intf_all_dir):
-            for item in os.listdir(intf_all_dir):
-                item_path = os.path.join(intf_all_dir, item)
-                if os.path.isdir(item_path) and '_' in item:
-                    # Check for corr.grd as the only completion indicator
-                    corr_file = os.path.join(item_path, 'corr.grd')
-                    if os.path.exists(corr_file):
-                        completed_pairs.add(item)
-        
-        return len(completed_pairs)
+        # intf is the temporary working directory, intf_all the final destination
+        return len(self._get_existing_interferogram_pairs(path))
 
     def _get_existing_interferogram_pairs(self, path):
         """Get set of existing interferogram pairs to skip during generation using only corr.grd as indicator."""
         existing_pairs = set()
+        catalog = get_catalog(path)
         
         # Check both intf and intf_all directories for existing completed interferograms
         for intf_subdir in ['intf', 'intf_all']:
             intf_dir = os.path.join(path, intf_subdir)
             if os.path.exists(intf_dir):
-                for item in os.listdir(intf_dir):
-                    item_path = os.path.join(intf_dir, item)
-                    if os.path.isdir(item_path) and '_' in item:
-                        # Check for corr.grd as the only completion indicator
-                        corr_file = os.path.join(item_path, 'corr.grd')
-                        if os.path.exists(corr_file):
-                            existing_pairs.add(item)
+                # Check for corr.grd as the only completion indicator
+                existing_pairs |= {item for item in catalog.pairs_with(intf_dir, 'corr.grd') if '_' in item}
         
         return existing_pairs
 
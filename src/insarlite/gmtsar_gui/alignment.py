@@ -6,13 +6,33 @@ import threading
 import json
 import tkinter as tk
 import re
-from tkinter import messagebox
 from ..utils.utils import process_logger, parse_data_in_line, generate_expected_filenames, check_alignment_completion_status, create_temp_data_in
 from ..gmtsar_gui.pair_generation import remove_unconnected_images
+from ..utils.pair_network import component_labels
+from ..utils.run_policy import confirm, get_policy, is_headless
 from concurrent.futures import ThreadPoolExecutor
 
 # REMOVED: backup_slc_files_for_realignment function was deleted as it caused data loss by moving/deleting original SLC files
 
+def images_connected_to_master(praw, master_date):
+    """Get the dates (YYYYMMDD) of the images linked to the master through the intf.in network.
+
+    Returns None if there is no intf.in to take the network from.
+    """
+    ind = os.path.join(os.path.dirname(praw), "intf.in")
+    if not os.path.exists(ind):
+        return None
+    pairs = []
+    with open(ind, 'r') as f:
+        for intf_line in f:
+            dates = [m.group() for m in (re.search(r'\d{8}', part) for part in intf_line.strip().split(':')[:2]) if m]
+            if len(dates) == 2:
+                pairs.append(dates)
+    ids = {date: n for n, date in enumerate(sorted({date for pair in pairs for date in pair} | {master_date}))}
+    labels = component_labels(len(ids), [(ids[a], ids[b]) for a, b in pairs])
+    return {date for date, n in ids.items() if labels[n] == labels[ids[master_date]]}
+
+
 def check_alignment_method_change(praw, current_alignmode, current_esd_mode):
     """Check if the current alignment method differs from what was used for existing SLC files."""
     if not os.path.exists(praw):
@@ -119,16 +139,26 @@ def align_sec_imgs(paths, mst, dem, alignmode, esd_mode):
                     process_logger(process_num=process_num, log_file=paths.get("log_file_path"), message=f"Alignment already complete for {key} (all connected images)", mode="end")
                     return
             elif alignment_status['status'] == 'partial':
-                connected_missing_count = len(alignment_status['missing_images'])
+                master_date = mst.replace('-', '')[:8]
+                # Only images linked to the master through the network can be aligned to it
+                network = images_connected_to_master(praw, master_date)
+                connected_missing = [d for d in alignment_status['missing_images'] if network is None or d in network]
+                connected_missing_count = len(connected_missing)
                 print(f"🔄 Partial alignment detected for {key} - {alignment_status['aligned_images']}/{alignment_status['total_images']} connected images aligned")
                 if connected_missing_count > 0:
-                    print(f"   Missing connected images: {alignment_status['missing_images'][:5]}{'...' if len(alignment_status['missing_images']) > 5 else ''}")
+                    print(f"   Missing connected images: {connected_missing[:5]}{'...' if connected_missing_count > 5 else ''}")
                     
-                    # BYPASS PARTIAL ALIGNMENT: Always offer backup and do full alignment
-                    print(f"🔄 Offering to backup existing aligned images before full re-alignment")
-                    _backup_alignment_files_with_permission(praw, key, reason="partial_alignment")
-                    print(f"🔄 Proceeding with full alignment (bypassing partial alignment)")
-                    _perform_full_alignment(praw, mst, dem, aligncommand, esd_mode, key, lock)
+                    # Incremental update: align only the new secondaries against the existing master
+                    # as long as the master is aligned and the alignment method is unchanged
+                    master_aligned = master_date not in alignment_status['missing_images']
+                    if master_aligned and not check_alignment_method_change(praw, alignmode, esd_mode):
+                        print(f"🔄 Incremental alignment of {connected_missing_count} new image(s) for {key}")
+                        _perform_incremental_alignment(praw, master_date, connected_missing, dem, aligncommand, esd_mode, key, lock)
+                    else:
+                        print(f"🔄 Offering to backup existing aligned images before full re-alignment")
+                        _backup_alignment_files_with_permission(praw, key, reason="partial_alignment")
+                        print(f"🔄 Proceeding with full alignment (master not aligned or alignment method changed)")
+                        _perform_full_alignment(praw, mst, dem, aligncommand, esd_mode, key, lock)
                 else:
                     print(f"✅ All missing images are unconnected in network - marking as complete")
                     process_logger(process_num=process_num, log_file=paths.get("log_file_path"), message=f"Alignment complete for {key} (all connected images aligned, unconnected skipped)", mode="end")
@@ -188,11 +218,13 @@ def align_sec_imgs(paths, mst, dem, alignmode, esd_mode):
             print(f"ℹ️  No existing alignment files found for {key}")
             return False
             
-        # Ask user for explicit permission to backup files
+        # Ask user for explicit permission to backup files (or follow the run policy)
         try:
             # Create a temporary root window for the dialog
-            temp_root = tk.Tk()
-            temp_root.withdraw()  # Hide the main window
+            temp_root = None
+            if get_policy("alignment_backup") is None and not is_headless():
+                temp_root = tk.Tk()
+                temp_root.withdraw()  # Hide the main window
             
             if reason == "method_change":
                 message = (f"Alignment method has changed for {key}.\n\n"
@@ -213,13 +245,10 @@ def align_sec_imgs(paths, mst, dem, alignmode, esd_mode):
                           f"Full re-alignment will overwrite them with new data.")
                 title = "Partial Alignment Detected - Backup Files?"
             
-            user_response = messagebox.askyesno(
-                title,
-                message,
-                parent=temp_root
-            )
+            user_response = confirm("alignment_backup", title, message, parent=temp_root, default=True)
             
-            temp_root.destroy()
+            if temp_root is not None:
+                temp_root.destroy()
             
             if not user_response:
                 print(f"ℹ️  User chose not to backup existing alignment files for {key}")
@@ -345,82 +374,39 @@ def align_sec_imgs(paths, mst, dem, alignmode, esd_mode):
             else:
                 print(f"⚠️  No connected slave images found for {key}, skipping alignment")
 
-    # COMMENTED OUT: Partial alignment function (no longer used)
-    # def _perform_partial_alignment(praw, mst, missing_images, dem, aligncommand, esd_mode, key, lock):
-    #     """🔒 CRITICAL FIX: Check network connectivity before partial alignment."""
-    #     print(f"🔧 [TEST] Starting partial alignment for {key}")
-    #     
-    #     # First, check which images are actually connected in the network
-    #     ind = os.path.join(os.path.dirname(praw), "intf.in")
-    #     connected_missing_images = []
-    #     
-    #     if os.path.exists(ind):
-    #         # Read intf.in to see which images are connected
-    #         with open(ind, 'r') as f:
-    #             intf_lines = f.readlines()
-    #         
-    #         # Extract connected image dates from intf.in
-    #         connected_images = set()
-    #         for intf_line in intf_lines:
-    #             if ':' in intf_line:
-    #                 parts = intf_line.strip().split(':')
-    #                 if len(parts) >= 2:
-    #                     for part in parts:
-    #                         date_match = re.search(r'\d{8}', part)
-    #                         if date_match:
-    #                             connected_images.add(date_match.group())
-    #         
-    #         # Filter missing images to only include connected ones
-    #         for missing_date in missing_images:
-    #             if missing_date in connected_images:
-    #                 connected_missing_images.append(missing_date)
-    #             else:
-    #                 print(f"⚠️  Skipping unconnected missing image: {missing_date}")
-    #     else:
-    #         print(f"⚠️  No intf.in file found, assuming all missing images are connected")
-    #         connected_missing_images = missing_images
-    #     
-    #     if not connected_missing_images:
-    #         print(f"✅ All missing images for {key} are unconnected in network - no partial alignment needed")
-    #         return
-    #     
-    #     print(f"🔄 Performing partial alignment for {len(connected_missing_images)} connected missing images: {connected_missing_images}")
-    #     
-    #     # Extract master date from master string (assuming format contains date)
-    #     master_date = None
-    #     mst_f = mst.replace('-', '')
-    #     if mst_f and len(mst_f) >= 8:
-    #         # Try to extract date from master string
-    #         for i in range(len(mst_f) - 7):
-    #             potential_date = mst_f[i:i+8]
-    #             if potential_date.isdigit():
-    #                 master_date = potential_date
-    #                 break
-    #     
-    #     if not master_date:
-    #         print(f"❌ Could not determine master date for partial alignment of {key}")
-    #         return
-    #         
-    #     # Create temporary data.in with master + connected unaligned images only
-    #     temp_data_in = create_temp_data_in(praw, master_date, connected_missing_images)
-    #     
-    #     if temp_data_in:
-    #         try:
-    #             with lock:
-    #                 print(f"🔄 Starting partial alignment for {key} - master + {len(connected_missing_images)} connected missing images...")
-    #                 print(f'{aligncommand} {os.path.basename(temp_data_in)} {dem} 2 {esd_mode}'.strip())
-    #                 
-    #                 # Run alignment with temporary data.in file
-    #                 subprocess.call(f'{aligncommand} {os.path.basename(temp_data_in)} {dem} 2 {esd_mode}'.strip(), shell=True, cwd=praw)
-    #                 
-    #                 print(f"✅ Partial alignment completed for {key}")
-    #                 
-    #         finally:
-    #             # Clean up temporary file
-    #             if os.path.exists(temp_data_in):
-    #                 os.remove(temp_data_in)
-    #     else:
-    #         print(f"❌ Failed to create temporary data.in for partial alignment of {key}")
+    def _perform_incremental_alignment(praw, master_date, missing_images, dem, aligncommand, esd_mode, key, lock):
+        """Align only the missing (newly added) images against the already aligned master.
+
+        The master's SLC/PRM/LED files are kept untouched, so interferograms and
+        stage cache stamps made from the existing stack stay valid.
+        """
+        temp_data_in = create_temp_data_in(praw, master_date, missing_images)
+        if not temp_data_in:
+            print(f"❌ Failed to create temporary data.in for incremental alignment of {key}")
+            return
+
+        # The alignment script regenerates the master products; keep the existing ones
+        master_prefix = f"S1_{master_date}_ALL_F"
+        keep_dir = os.path.join(praw, ".master_keep")
+        os.makedirs(keep_dir, exist_ok=True)
+        kept = []
+        for filename in os.listdir(praw):
+            if filename.startswith(master_prefix) and filename.endswith(('.SLC', '.PRM', '.LED')):
+                os.replace(os.path.join(praw, filename), os.path.join(keep_dir, filename))
+                kept.append(filename)
+
+        try:
+            with lock:
+                print(f"🔄 Starting incremental alignment for {key} - master + {len(missing_images)} new images...")
+                print(f'{aligncommand} {os.path.basename(temp_data_in)} {dem} 2 {esd_mode}'.strip())
+                subprocess.call(f'{aligncommand} {os.path.basename(temp_data_in)} {dem} 2 {esd_mode}'.strip(), shell=True, cwd=praw)
+            print(f"✅ Incremental alignment completed for {key}")
+        finally:
+            for filename in kept:
+                os.replace(os.path.join(keep_dir, filename), os.path.join(praw, filename))
+            shutil.rmtree(keep_dir, ignore_errors=True)
+            if os.path.exists(temp_data_in):
+                os.remove(temp_data_in)
 
     # Only process valid existing subswaths
     with ThreadPoolExecutor() as executor:
@@ -12,6 +12,7 @@ from ..utils.utils import (
     process_logger,
 )
 from ..utils.matplotlib_baseline_plotter import create_interactive_baseline_plot
+from ..utils.pair_network import write_intf_in
 from ..gmtsar_gui.baselines_gen import preprocess
 from ..gmtsar_gui.masterselection import select_mst
 import shutil
@@ -45,6 +46,9 @@ class BaselineGUI:
         # Constraints UI
         self.perp_var = tk.StringVar()
         self.temp_var = tk.StringVar()
+        self.max_neighbors_var = tk.StringVar()
+        self.min_redundancy_var = tk.StringVar()
+        self.ensure_connected_var = tk.BooleanVar(value=False)
         self.edit_mode_var = tk.BooleanVar(value=False)
         self.edit_graph_check = None
 
@@ -89,7 +93,8 @@ class BaselineGUI:
             "align_mode": self.align_mode_var.get(),
             "esd_mode": self.esd_mode_var.get(),
             "perpendicular_baseline_constraint": self.perp_var.get() if hasattr(self, 'perp_var') else None,
-            "temporal_baseline_constraint": self.temp_var.get() if hasattr(self, 'temp_var') else None
+            "temporal_baseline_constraint": self.temp_var.get() if hasattr(self, 'temp_var') else None,
+            "pair_network_options": self._get_network_options()
         }
         
         # Check if any value has changed
@@ -254,6 +259,8 @@ class BaselineGUI:
         except:
             pass
             
+        ui_params['pair_network_options'] = self._get_network_options()
+
         # Add master selection if available
         if hasattr(self, 'mst') and self.mst:
             ui_params['master_image'] = self.mst
@@ -1244,6 +1251,12 @@ class BaselineGUI:
         
         self._add_constraint_entry(frame, "Perpendicular Baseline (m):", self.perp_var)
         self._add_constraint_entry(frame, "Temporal Baseline (days):", self.temp_var)
+        self._add_constraint_entry(frame, "Max pairs per image (optional):", self.max_neighbors_var)
+        self._add_constraint_entry(frame, "Min pairs per image (optional):", self.min_redundancy_var)
+
+        connect_check = tk.Checkbutton(frame, text="Ensure connected network", variable=self.ensure_connected_var)
+        connect_check.pack(anchor="w", padx=10)
+        add_tooltip(connect_check, "Add the shortest-baseline pairs needed to join\ndisconnected parts of the network into one")
         
         plot_pairs_btn = tk.Button(frame, text="Plot Pairs", command=self._on_plot_pairs)
         plot_pairs_btn.pack(pady=10)
@@ -1260,6 +1273,10 @@ class BaselineGUI:
             add_tooltip(label, "Maximum perpendicular baseline in meters\nTypical range: 100-400m\nSmaller values = better coherence, fewer pairs")
         elif "Temporal" in label_text:
             add_tooltip(label, "Maximum temporal baseline in days\nTypical range: 50-365 days\nSmaller values = better coherence, fewer pairs")
+        elif "Max pairs" in label_text:
+            add_tooltip(label, "Each image keeps only its temporally nearest pairs\nLeave empty for no limit")
+        elif "Min pairs" in label_text:
+            add_tooltip(label, "Images with fewer pairs get their shortest-baseline extra pairs\nLeave empty for no minimum")
         
         entry = tk.Entry(frame, textvariable=var, validate="key",
                  validatecommand=(self.root.register(lambda v: v.isdigit() or v == ""), "%P")
@@ -1271,6 +1288,18 @@ class BaselineGUI:
         elif "Temporal" in label_text:
             add_tooltip(entry, "Enter maximum temporal separation in days\nRecommended: 100-200 days for SBAS analysis")
 
+    def _get_network_options(self):
+        """Get the optional pair network options (neighbour limit, redundancy, connectivity)."""
+        def to_int(var):
+            value = var.get().strip()
+            return int(value) if value.isdigit() and int(value) > 0 else None
+
+        return {
+            'max_neighbors': to_int(self.max_neighbors_var),
+            'min_redundancy': to_int(self.min_redundancy_var),
+            'ensure_connected': bool(self.ensure_connected_var.get()),
+        }
+
     def _on_plot_pairs(self):
         """Plot interferometric pairs based on constraints using matplotlib plotter."""
         try:
@@ -1285,8 +1314,9 @@ class BaselineGUI:
             return
         
         # Clear existing edges and create new connections
+        options = self._get_network_options()
         self.plotter.clear_edges()
-        self.plotter.connect_baseline_nodes(perp, temp)
+        self.plotter.connect_baseline_nodes(perp, temp, **options)
         
         # Show constraint visualization
         self.plotter.show_constraints(perp, temp)
@@ -1391,10 +1421,11 @@ class BaselineGUI:
             # Restore original edges in matplotlib plotter
             self.plotter.clear_edges()
             
-            # Recreate original edges
-            for idx1, idx2 in original_edges:
-                if idx1 < len(self.points) and idx2 < len(self.points):
-                    self.plotter._create_edge(idx1, idx2)
+            # Recreate original edges in one bulk update
+            self.plotter.add_edges(
+                (idx1, idx2) for idx1, idx2 in original_edges
+                if idx1 < len(self.points) and idx2 < len(self.points)
+            )
                     
             # Update internal edges
             self.edges = self.plotter.edges
@@ -1464,6 +1495,7 @@ class BaselineGUI:
         prev_esd = conf.get("esd_mode")
         prev_perp = conf.get("perpendicular_baseline_constraint")
         prev_temp = conf.get("temporal_baseline_constraint")
+        prev_options = conf.get("pair_network_options", self._get_network_options())
         
         current_perp = self.perp_var.get() if hasattr(self, 'perp_var') else None
         current_temp = self.temp_var.get() if hasattr(self, 'temp_var') else None
@@ -1473,7 +1505,8 @@ class BaselineGUI:
             and self.align_mode_var.get() == prev_align
             and self.esd_mode_var.get() == prev_esd
             and current_perp == prev_perp
-            and current_temp == prev_temp            
+            and current_temp == prev_temp
+            and self._get_network_options() == prev_options
         ):
             # Config and constraints unchanged - still need to check for unconnected images
             print(f"✅ Network config unchanged (master, alignment, and baseline constraints)")
@@ -1503,14 +1536,11 @@ class BaselineGUI:
             
         # Get edge list from matplotlib plotter
         edge_data = self.plotter.get_edge_list()
-        edge_list = [f"{pair[0]}:{pair[1]}" for pair in edge_data]
 
-        # Always save interferometric pairs to intf.in (even if config unchanged)
+        # Write intf.in for all subswaths from the same pair list
+        written = write_intf_in(self.paths, edge_data)
         intf_path = os.path.join(primary_dir, "intf.in")
-        with open(intf_path, "w") as f:
-            for pair in edge_list:
-                f.write(pair + "\n")
-        print(f"Edge list saved to {intf_path}")
+        print(f"Edge list saved to {', '.join(written.values())}")
         
         # Remove unconnected images from data.in and clean up symlinks
         from ..gmtsar_gui.pair_generation import remove_unconnected_images
@@ -1537,41 +1567,16 @@ class BaselineGUI:
         )
         messagebox.showinfo("Export Complete", stats_message)
 
-        # Copy to other subswaths and clean up unconnected images
-        from ..gmtsar_gui.pair_generation import remove_unconnected_images
-        
-        # Extract primary subswath number from primary_dir (e.g., /path/to/F1 -> "1")
-        primary_subswath = os.path.basename(primary_dir)[-1] if primary_dir else "1"
-        
+        # Clean up unconnected images of the other subswaths
         for key in ["pF1", "pF2", "pF3"]:
             dir_path = self.paths.get(key)
-            if dir_path and os.path.exists(dir_path) and dir_path != primary_dir:
-                try:
-                    # Get target subswath number
-                    target_subswath = os.path.basename(dir_path)[-1]
-                    
-                    # Copy and modify intf.in with correct subswath references
-                    subswath_intf = os.path.join(dir_path, "intf.in")
-                    shutil.copy2(intf_path, subswath_intf)
-                    
-                    # Modify subswath references in the copied file
-                    with open(subswath_intf, 'r') as f:
-                        lines = f.readlines()
-                    with open(subswath_intf, 'w') as f:
-                        for line in lines:
-                            # Replace _ALL_F1 with _ALL_F2, etc.
-                            modified_line = line.replace(f'_ALL_F{primary_subswath}', f'_ALL_F{target_subswath}')
-                            f.write(modified_line)
-                    
-                    print(f"Copied and modified intf.in to {dir_path} (F{primary_subswath} -> F{target_subswath})")
-                    
-                    # Also remove unconnected images for this subswath
-                    subswath_raw = os.path.join(dir_path, "raw")
-                    subswath_data_in = os.path.join(subswath_raw, "data.in")
-                    if os.path.exists(subswath_data_in):
-                        remove_unconnected_images(subswath_intf, subswath_data_in)
-                except Exception as e:
-                    print(f"Warning: Could not copy to {dir_path}: {e}")
+            if key in written and dir_path != primary_dir:
+                subswath_data_in = os.path.join(dir_path, "raw", "data.in")
+                if os.path.exists(subswath_data_in):
+                    try:
+                        remove_unconnected_images(written[key], subswath_data_in)
+                    except Exception as e:
+                        print(f"Warning: Could not clean up {dir_path}: {e}")
 
         # Call callback and close
         if self.on_edges_exported:
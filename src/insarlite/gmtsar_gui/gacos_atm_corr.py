@@ -2,7 +2,10 @@ import subprocess
 import os
 from datetime import datetime, timedelta
 from multiprocessing import Pool
-from ..utils.utils import create_symlink, process_logger, process_logger_consolidated
+from ..utils.utils import create_symlink, process_logger, process_logger_consolidated, format_time
+from ..utils.cost_model import JobCostModel, get_grid_pixels, get_temporal_baseline
+from ..utils.memory_planner import plan_workers
+from ..utils.product_catalog import get_catalog
 
 
 def convert_date(code):
@@ -104,10 +107,12 @@ def operation(args):
         print(f"Error in operation for {master_ztd} and {slave_ztd}: {e}")
 
 def gacos_worker(args):
-    GACOS_dir, topo_dir, incidence, intf_dir, dir, ifg_index, log_file = args
+    """Correct one interferogram; returns (dir, duration) when a correction was computed."""
+    GACOS_dir, topo_dir, incidence, intf_dir, dir, ifg_index, log_file, uwp_phase = args
     process_num = f"5.3.{ifg_index}"  # 5.3.1, 5.3.2, etc.
     
     start_time = datetime.now()
+    duration = None
     
     try:
         os.chdir(os.path.join(intf_dir, dir))
@@ -127,13 +132,8 @@ def gacos_worker(args):
             # else:
             create_symlink(os.path.join(topo_dir), os.path.join('.',"trans.dat"))
             if not os.path.exists('unwrap_GACOS_corrected_detrended.grd'):
-                uwps = [os.path.join(root, f) for root, _, files in os.walk(intf_dir) for f in files if f == 'unwrap.grd']
-                uwpn = [os.path.join(root, f) for root, _, files in os.walk(intf_dir) for f in files if f == 'unwrap_pin.grd']
-                if len(uwps) == len(uwpn):
-                    uwp_phase = "unwrap_pin.grd"
-                else:
-                    uwp_phase = "unwrap.grd"
                 operation((first_ztd, first_rsc, second_ztd, second_rsc, reference_point_ra, incidence, uwp_phase))
+                duration = (datetime.now() - start_time).total_seconds()
             else:
                 print('GACOS Correction already done for the current dir')
             os.remove("trans.dat")
@@ -162,19 +162,45 @@ def gacos_worker(args):
                 log_file=log_file,
                 start_time=start_time
             )
+    return dir, duration
 
 def gacos(GACOS_dir, topo_dir, incidence, intf_dir, num_cores, log_file=None):
     
-    ifg_dirs = [dir for dir in os.listdir(intf_dir) if os.path.isdir(os.path.join(intf_dir, dir))]
+    catalog = get_catalog(intf_dir)
+    ifg_dirs = catalog.subdirs(intf_dir)
+
+    # Use the normalized phase only if every interferogram has been normalized
+    uwps = catalog.count_pairs_with(intf_dir, 'unwrap.grd', reconcile=False)
+    uwpn = catalog.count_pairs_with(intf_dir, 'unwrap_pin.grd', reconcile=False)
+    uwp_phase = "unwrap_pin.grd" if uwps == uwpn else "unwrap.grd"
+
+    # Start the most expensive corrections first and report an ETA from the job history
+    cost_model = JobCostModel.for_path(intf_dir)
+    ifg_features = {
+        dir: (get_grid_pixels(os.path.join(intf_dir, dir, "unwrap.grd")), get_temporal_baseline(dir))
+        for dir in ifg_dirs
+    }
+    ifg_dirs = cost_model.order_longest_first("gacos", ifg_dirs, ifg_features.get)
     args_list = [
-        (GACOS_dir, topo_dir, incidence, intf_dir, dir, i+1, log_file)
+        (GACOS_dir, topo_dir, incidence, intf_dir, dir, i+1, log_file, uwp_phase)
         for i, dir in enumerate(ifg_dirs)
     ]
 
-    print(f"Starting GACOS correction with {num_cores} cores")
+    pixels = max((p for p, _ in ifg_features.values() if p), default=None)
+    workers = plan_workers("gacos", num_cores, pixels, cost_model)
+
+    eta = cost_model.estimate_remaining("gacos", ifg_features.values(), workers)
+    if eta is not None:
+        print(f"Estimated GACOS correction time: {format_time(round(eta))}")
+
+    print(f"Starting GACOS correction with {workers} cores")
     try:
-        with Pool(processes=num_cores) as pool:
-            pool.map(gacos_worker, args_list)
+        with Pool(processes=workers) as pool:
+            # chunksize=1 keeps the longest-first order when handing out jobs
+            for dir, duration in pool.imap_unordered(gacos_worker, args_list, chunksize=1):
+                if duration is not None:
+                    cost_model.record("gacos", duration, *ifg_features[dir])
+                    catalog.record(os.path.join(intf_dir, dir, 'unwrap_GACOS_corrected_detrended.grd'))
     except Exception as e:
         print(f"Error in parallel processing: {e}")
     print("GACOS correction done")
@@ -1,14 +1,139 @@
 import os
 import subprocess
+import threading
 from multiprocessing.pool import ThreadPool
 from datetime import datetime
 import shutil
-from ..utils.utils import execute_command, process_logger, log_message
+from ..utils.utils import process_logger, log_message
+from ..utils.cost_model import JobCostModel, get_grid_pixels, get_temporal_baseline
+from ..utils.memory_planner import MemoryGovernor
+from ..utils.product_catalog import get_catalog
+from ..utils.stage_cache import params_hash, inputs_hash, is_stamp_valid, write_stamp, stash_variant, restore_variant
 
+IFG_PARAM_KEYS = ['master_image', 'filter_wavelength', 'range_dec', 'azimuth_dec']
 
-def gen_ifgs(paths, mst, filter_wavelength, rng, az, ncores, console_text=None, log_file_path=None):
+
+def convert_yyyymmdd_to_yyyyddd(date_str):
+    """Convert YYYYMMDD to YYYYDDD format with GMTSAR's 1-day offset.
+    GMTSAR uses 1-day offset: 20180112 -> 2018011 (not 2018012)"""
+    try:
+        date_obj = datetime.strptime(date_str, '%Y%m%d')
+        day_of_year = date_obj.timetuple().tm_yday
+        # Apply GMTSAR's 1-day offset
+        gmtsar_day = day_of_year - 1
+        return f"{date_obj.year}{gmtsar_day:03d}"
+    except:
+        return date_str
+
+
+def intf_pair_name(intf_line):
+    """Get the pair folder name (YYYYDDD_YYYYDDD) of an intf.in line."""
+    scenes = intf_line.strip().split(":")
+    return f"{convert_yyyymmdd_to_yyyyddd(scenes[0][3:11])}_{convert_yyyymmdd_to_yyyyddd(scenes[1][3:11])}"
+
+
+def read_intf_pairs(ind):
+    """Get the pair folder names listed in an intf.in (empty if it does not exist)."""
+    if not os.path.exists(ind):
+        return set()
+    with open(ind, "r") as f:
+        return {intf_pair_name(line) for line in f if ':' in line}
+
+
+def get_ifg_params(mst, key, filter_wavelength, rng, az):
+    """Get the stage parameters an interferogram of subswath key is generated with."""
+    return {
+        'master_image': 'S1_' + mst.replace("-", "") + f'_ALL_F{key[-1]}',
+        'filter_wavelength': filter_wavelength,
+        'range_dec': rng,
+        'azimuth_dec': az
+    }
+
+
+def read_ifg_params_from_config(dir_path):
+    """Read the IFG parameters of the last run from a subswath's batch_tops.config."""
+    con = os.path.join(dir_path, "batch_tops.config")
+    if not os.path.exists(con):
+        return None
+    params = {}
+    with open(con, 'r') as f:
+        for line in f:
+            if '=' in line and not line.lstrip().startswith('#'):
+                name, value = [x.strip() for x in line.split('=', 1)]
+                if name in IFG_PARAM_KEYS:
+                    params[name] = value
+    return params if len(params) == len(IFG_PARAM_KEYS) else None
+
+
+def reconcile_ifg_cache(dir_path, ifg_params, legacy_params=None, detailed_log_path=None):
+    """
+    Match the interferograms of a subswath against the current IFG parameters.
+
+    Interferograms stamped with the current parameters and inputs are kept,
+    stale ones are moved to intf_variants/<params hash>/ and matching
+    variants from earlier runs are moved back into intf_all. Interferograms
+    made before stamping existed are adopted with legacy_params (the
+    parameters of the previous run) or, if unknown, the current parameters.
+
+    Returns:
+        dict with counts of 'valid', 'stale' and 'restored' interferograms
+    """
+    ind = os.path.join(dir_path, "intf.in")
+    stats = {'valid': 0, 'stale': 0, 'restored': 0}
+    if not os.path.exists(ind):
+        return stats
+
+    phash = params_hash(ifg_params)
+    variants_root = os.path.join(dir_path, 'intf_variants')
+    raw_dir = os.path.join(dir_path, 'raw')
+
+    with open(ind, "r") as f:
+        intf_lines = [line.strip() for line in f if line.strip()]
+
+    for intf in intf_lines:
+        scenes = intf.split(":")
+        name = intf_pair_name(intf)
+        input_paths = [os.path.join(raw_dir, f"{scene}.SLC") for scene in scenes[:2]]
+        input_hash = inputs_hash(input_paths)
+
+        present = False
+        for intf_subdir in ['intf', 'intf_all']:
+            product_dir = os.path.join(dir_path, intf_subdir, name)
+            if not os.path.exists(os.path.join(product_dir, 'corr.grd')):
+                continue
+            valid = is_stamp_valid(product_dir, 'ifg', phash, input_hash, input_paths)
+            if valid is None:
+                # Made before stamping: adopt with the parameters it was generated with
+                made_with = legacy_params or ifg_params
+                write_stamp(product_dir, 'ifg', made_with, input_hash, 'corr.grd', input_paths)
+                valid = params_hash(made_with) == phash
+            if valid:
+                present = True
+                stats['valid'] += 1
+                continue
+            stash_variant(product_dir, 'ifg', variants_root)
+            stats['stale'] += 1
+            msg = f"Moved stale interferogram {name} (different parameters/inputs) to {variants_root}"
+            print(msg)
+            if detailed_log_path:
+                log_message(detailed_log_path, msg)
+
+        if not present and restore_variant(variants_root, phash, name, os.path.join(dir_path, 'intf_all'), 'ifg', input_hash, input_paths):
+            stats['restored'] += 1
+            msg = f"Reused cached interferogram {name} made with the same parameters"
+            print(msg)
+            if detailed_log_path:
+                log_message(detailed_log_path, msg)
+
+    return stats
+
+
+def gen_ifgs(paths, mst, filter_wavelength, rng, az, ncores, console_text=None, log_file_path=None, progress_callback=None):
     """
     Generate interferograms with option to skip existing pairs.
+
+    progress_callback, if given, is called as progress_callback(key, completed, total, eta_seconds)
+    after each interferogram finishes; eta_seconds is None when there is no job history yet.
     """
     # Create detailed log file for command outputs and troubleshooting
     detailed_log_path = None
@@ -45,6 +170,9 @@ def gen_ifgs(paths, mst, filter_wavelength, rng, az, ncores, console_text=None,
             fmst = 'S1_' + mst.replace("-", "") + f'_ALL_F{key[-1]}'
             con = os.path.join(dir_path, "batch_tops.config")            
             os.chdir(dir_path)
+            # Parameters of the previous run, used to adopt interferograms made before stamping
+            ifg_params = get_ifg_params(mst, key, filter_wavelength, rng, az)
+            legacy_params = read_ifg_params_from_config(dir_path)
             with open(con, 'r') as f:
                 lines = f.readlines()
             with open(con, 'w') as f:
@@ -94,26 +222,13 @@ def gen_ifgs(paths, mst, filter_wavelength, rng, az, ncores, console_text=None,
             def get_completed_interferograms():
                 """Get set of completed interferogram pairs by checking for corr.grd files."""
                 completed_pairs = set()
+                catalog = get_catalog(dir_path)
                 
-                # Check intf directory
-                intf_dir = os.path.join(dir_path, 'intf')
-                if os.path.exists(intf_dir):
-                    for item in os.listdir(intf_dir):
-                        item_path = os.path.join(intf_dir, item)
-                        if os.path.isdir(item_path):
-                            corr_file = os.path.join(item_path, 'corr.grd')
-                            if os.path.exists(corr_file):
-                                completed_pairs.add(item)
-                
-                # Check intf_all directory
-                intf_all_dir = os.path.join(dir_path, 'intf_all')
-                if os.path.exists(intf_all_dir):
-                    for item in os.listdir(intf_all_dir):
-                        item_path = os.path.join(intf_all_dir, item)
-                        if os.path.isdir(item_path):
-                            corr_file = os.path.join(item_path, 'corr.grd')
-                            if os.path.exists(corr_file):
-                                completed_pairs.add(item)
+                # Check intf and intf_all directories
+                for intf_subdir in ['intf', 'intf_all']:
+                    intf_dir = os.path.join(dir_path, intf_subdir)
+                    if os.path.exists(intf_dir):
+                        completed_pairs |= catalog.pairs_with(intf_dir, 'corr.grd')
                 
                 return completed_pairs
             
@@ -235,6 +350,11 @@ def gen_ifgs(paths, mst, filter_wavelength, rng, az, ncores, console_text=None,
             # Cleanup incomplete directories first
             cleanup_invalid_directories()
             
+            # Keep interferograms made with the current parameters, set aside stale ones
+            # and reuse cached variants made with the same parameters earlier
+            cache_stats = reconcile_ifg_cache(dir_path, ifg_params, legacy_params, detailed_log_path)
+            print(f"IFG cache for {key}: {cache_stats['valid']} valid, {cache_stats['stale']} stale, {cache_stats['restored']} reused from variants")
+            
             # Get completed interferograms after cleanup
             completed_ifgs = get_completed_interferograms()
             
@@ -272,19 +392,6 @@ def gen_ifgs(paths, mst, filter_wavelength, rng, az, ncores, console_text=None,
                 skipped_pairs = []
                 total_pairs_checked = 0
 
-                def convert_yyyymmdd_to_yyyyddd(date_str):
-                    """Convert YYYYMMDD to YYYYDDD format with GMTSAR's 1-day offset.
-                    GMTSAR uses 1-day offset: 20180112 -> 2018011 (not 2018012)"""
-                    import datetime
-                    try:
-                        date_obj = datetime.datetime.strptime(date_str, '%Y%m%d')
-                        day_of_year = date_obj.timetuple().tm_yday
-                        # Apply GMTSAR's 1-day offset
-                        gmtsar_day = day_of_year - 1
-                        return f"{date_obj.year}{gmtsar_day:03d}"
-                    except:
-                        return date_str
-
                 with open(ind, "r") as intf_file:
                     for intf in intf_file:
                         intf = intf.strip()
@@ -349,10 +456,24 @@ def gen_ifgs(paths, mst, filter_wavelength, rng, az, ncores, console_text=None,
                                 detailed_message = f"[{timestamp}] Process-{process_num}: {message.strip()}"
                                 log_message(detailed_log_path, detailed_message)
                     
+                    # Order pairs longest-first using the job history of this project
+                    cost_model = JobCostModel.for_path(dir_path)
+                    ifg_pixels = get_grid_pixels(topo_ra_file)
+                    pair_features = {
+                        infile: (ifg_pixels, get_temporal_baseline(infile[len("intf_"):-len(".in")]))
+                        for infile in ain1
+                    }
+                    ain1 = cost_model.order_longest_first("ifg", ain1, pair_features.get)
+                    pending = dict(pair_features)
+                    pending_lock = threading.Lock()
+                    # Pairs start only while their estimated peak memory fits
+                    governor = MemoryGovernor("ifg", cost_model)
+
                     # Prepare commands for IFGs generation (only for non-existing pairs)
                     bash_commands1 = [
                         "intf_tops.csh {} batch_tops.config".format(i) for i in ain1
                     ]
+                    command_infiles = dict(zip(bash_commands1, ain1))
                     process_logger(process_num=f"{process_num}.2", log_file=paths.get("log_file_path"), message=f"Starting {remaining_count} remaining IFGs generation for subswath {key} (process {process_num}.2) - {completed_count}/{total_count} already completed...", mode="start")
                     
                     if detailed_log_path:
@@ -366,20 +487,32 @@ def gen_ifgs(paths, mst, filter_wavelength, rng, az, ncores, console_text=None,
                             log_message(detailed_log_path, f"  ... and {len(bash_commands1)-5} more commands")
                         log_message(detailed_log_path, "")
                     
-                    # Create wrapper function to pass logging info to execute_command
+                    # Create wrapper function to pass logging info to the memory governor
                     def execute_with_logging(command):
                         if detailed_log_path:
                             log_message(detailed_log_path, f"Executing: {command}")
-                        return execute_command(
-                            command, 
+                        start_time = datetime.now()
+                        infile = command_infiles[command]
+                        result = governor.execute(
+                            command,
+                            pair_features[infile][0],
                             log_func=ifg_logger, 
                             process_num=f"{process_num}.2"
                         )
+                        cost_model.record("ifg", (datetime.now() - start_time).total_seconds(), *pair_features[infile],
+                                          peak_rss=result["peak_rss"])
+                        with pending_lock:
+                            pending.pop(infile, None)
+                            remaining = list(pending.values())
+                        if progress_callback:
+                            eta = cost_model.estimate_remaining("ifg", remaining, ncores)
+                            progress_callback(key, total_count - len(remaining), total_count, eta)
+                        return result
                     
                     # Create a thread pool with a maximum of n threads
                     with ThreadPool(processes=ncores) as pool:
-                        # Execute bash commands in parallel with logging
-                        pool.map(execute_with_logging, bash_commands1)
+                        # Execute bash commands in parallel with logging; chunksize=1 keeps the longest-first order
+                        list(pool.imap_unordered(execute_with_logging, bash_commands1, chunksize=1))
 
                     process_logger(process_num=f"{process_num}.2", log_file=paths.get("log_file_path"), message=f"Remaining {remaining_count} IFGs generation for subswath {key} (process {process_num}.2) completed successfully.", mode="end")
                     
@@ -389,6 +522,9 @@ def gen_ifgs(paths, mst, filter_wavelength, rng, az, ncores, console_text=None,
                     # Restore existing interferograms from backup
                     if backup_paths:
                         restore_existing_interferograms(backup_paths)
+                    
+                    # Stamp the newly generated interferograms with the current parameters
+                    reconcile_ifg_cache(dir_path, ifg_params, ifg_params, detailed_log_path)
             
             # Log completion for this subswath
             process_logger(process_num=process_num, log_file=paths.get("log_file_path"), message=f"IFG generation for subswath {key} (process {process_num}) completed successfully.", mode="end")
\ No newline at end of file
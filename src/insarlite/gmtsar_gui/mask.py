@@ -7,14 +7,43 @@ import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.colors import LinearSegmentedColormap, ListedColormap, BoundaryNorm
 import rioxarray
-from matplotlib.patches import Patch, Polygon
+from matplotlib.patches import Patch, Polygon, Rectangle
+from matplotlib.widgets import RectangleSelector
 from matplotlib.path import Path
 import os
-import xarray as xr
 import h5netcdf  # Not used directly, but required indirectly
 import sys
 import re
-import subprocess
+import threading
+from ..utils.roi import read_roi, write_roi, clear_roi, mask_roi
+from ..utils.hover_readout import GridLookup, BlitReadout
+from ..utils.grid_io import write_gmt_grid
+
+# Longest side of the decimated grid used while exploring thresholds
+PREVIEW_SIZE = 2048
+SLIDE_DELAY_MS = 16
+
+def render_grid_preview(z, x, y, pdf_out, max_size=2048):
+    """Render a decimated preview of a grid to PDF with the Agg-based backend (thread safe, no pyplot)."""
+    try:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        step = (max(1, -(-z.shape[0] // max_size)), max(1, -(-z.shape[1] // max_size)))
+        fig = Figure(figsize=(6, 6))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot(111)
+        im = ax.imshow(z[::step[0], ::step[1]], origin='upper', aspect='auto', cmap='gray_r',
+                       extent=[x[0], x[-1], y[-1], y[0]])
+        fig.colorbar(im, ax=ax, fraction=0.046, pad=0.04)
+        ax.set_title(os.path.basename(pdf_out).replace(".pdf", ""))
+        ax.set_xlabel("Range")
+        ax.set_ylabel("Azimuth")
+        fig.savefig(pdf_out, bbox_inches='tight')
+        print(f"✓ Preview saved: {pdf_out}")
+    except Exception as e:
+        print(f"Warning: Could not render {pdf_out}: {e}")
+
 
 class GrdViewer(tk.Toplevel):
     def __init__(self, parent, grd_file=None):
@@ -32,12 +61,25 @@ class GrdViewer(tk.Toplevel):
         self.threshold_var = tk.DoubleVar(self, value=0.1)
         self.entry_thresh = None
         self._syncing = False
-        self.mask_poly = None
+        self.mask_polygons = []
         self.polygon_patch = None
         self.polygon_coords = []
         self.drawing_polygon = False
         self.filename = None
         self.grd_file = grd_file
+        self.roi = read_roi(os.path.dirname(grd_file)) if grd_file else None
+        self.roi_changed = False
+        self.roi_from_mask_var = tk.BooleanVar(self, value=False)
+        self.roi_patch = None
+        self.roi_selector = None
+        self.preview = None
+        self.preview_step = (1, 1)
+        self.mask_im = None
+        self.mask_thresh = None
+        self.mask_use_poly = True
+        self._slide_job = None
+        self.lookup = None
+        self.readout = None
         
         # Set protocol BEFORE creating widgets
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
@@ -55,6 +97,12 @@ class GrdViewer(tk.Toplevel):
                 self.canvas.mpl_disconnect(self.cid_click)
             if hasattr(self, 'cid_key'):
                 self.canvas.mpl_disconnect(self.cid_key)
+            if self.readout:
+                self.readout.disconnect()
+                self.readout = None
+            if self._slide_job is not None:
+                self.after_cancel(self._slide_job)
+                self._slide_job = None
             
             # Clean up matplotlib figures
             if self.fig:
@@ -75,7 +123,7 @@ class GrdViewer(tk.Toplevel):
             self.data = None
             self.extent = None
             self.ds = None
-            self.mask_poly = None
+            self.mask_polygons = []
             self.polygon_patch = None
             self.polygon_coords = []
             
@@ -109,12 +157,25 @@ class GrdViewer(tk.Toplevel):
             )
         self.entry_thresh.pack(side=tk.LEFT)
 
+        self.scale_thresh = ttk.Scale(frm, from_=0.0, to=1.0, orient=tk.HORIZONTAL, length=160,
+                                      variable=self.threshold_var, command=self._on_threshold_slide)
+        self.scale_thresh.pack(side=tk.LEFT, padx=5)
+
         self.btn_update = ttk.Button(frm, text="Update Mask", command=self.update_mask_with_prompt)
         self.btn_update.pack(side=tk.LEFT, padx=5)
 
         self.btn_draw_poly = ttk.Button(frm, text="Draw Polygon Mask", command=self.enable_polygon_draw)
         self.btn_draw_poly.pack(side=tk.LEFT, padx=5)
 
+        self.btn_draw_roi = ttk.Button(frm, text="Draw ROI", command=self.enable_roi_draw)
+        self.btn_draw_roi.pack(side=tk.LEFT, padx=5)
+
+        self.btn_clear_roi = ttk.Button(frm, text="Clear ROI", command=self.clear_roi_box)
+        self.btn_clear_roi.pack(side=tk.LEFT, padx=5)
+
+        self.chk_roi_mask = ttk.Checkbutton(frm, text="Crop to mask extent", variable=self.roi_from_mask_var)
+        self.chk_roi_mask.pack(side=tk.LEFT, padx=5)
+
         self.btn_export = ttk.Button(frm, text="Confirm Mask", command=self.export_and_close)
         self.btn_export.pack(side=tk.LEFT, padx=5)
 
@@ -185,15 +246,7 @@ class GrdViewer(tk.Toplevel):
         filename = filedialog.askopenfilename(title="Select .grd file", filetypes=filetypes)
         if not filename:
             return
-        self.lbl_file.config(text=filename)
-        data, extent, ds = self.read_grd_file(filename)
-        if data is not None:
-            self.data = data
-            self.extent = extent
-            self.ds = ds
-            self.filename = filename
-            self.mask_poly = None
-            self.plot_data()
+        self.load_grd_from_path(filename)
 
     def load_grd_from_path(self, filename):
         self.lbl_file.config(text=filename)
@@ -203,9 +256,49 @@ class GrdViewer(tk.Toplevel):
             self.extent = extent
             self.ds = ds
             self.filename = filename
-            self.mask_poly = None
+            self.mask_polygons = []
+            self._prepare_preview()
+            self._destroy_figure()
             self.plot_data()
 
+    def _prepare_preview(self):
+        """Decimate the grid to display resolution and allocate the preview mask buffers."""
+        ny, nx = self.data.shape
+        self.preview_step = (max(1, -(-ny // PREVIEW_SIZE)), max(1, -(-nx // PREVIEW_SIZE)))
+        self.preview = self.data[::self.preview_step[0], ::self.preview_step[1]]
+        self._preview_mask = np.zeros(self.preview.shape, dtype=bool)
+        self._preview_poly = np.zeros(self.preview.shape, dtype=bool)
+        self.lookup = GridLookup(self.data, self.extent, top_row_first=True)
+
+    def _preview_extent(self):
+        """Get the extent spanned by the preview pixels (the last full-resolution rows may be skipped)."""
+        x0, x1, y0, y1 = self.extent
+        ny, nx = self.data.shape
+        pny, pnx = self.preview.shape
+        fx = (pnx - 1) * self.preview_step[1] / (nx - 1) if nx > 1 else 1.0
+        fy = (pny - 1) * self.preview_step[0] / (ny - 1) if ny > 1 else 1.0
+        # The first row is shown at the top, so skipped rows are at the bottom
+        return [x0, x0 + (x1 - x0) * fx, y1 - (y1 - y0) * fy, y1]
+
+    def _grid_axes(self, step=(1, 1)):
+        """Get the x and y coordinates of the grid nodes (array order) at a decimation step."""
+        x0, x1, y0, y1 = self.extent
+        ny, nx = self.data.shape
+        return np.linspace(x0, x1, nx)[::step[1]], np.linspace(y0, y1, ny)[::step[0]]
+
+    def _rasterize_polygon(self, poly, step=(1, 1)):
+        """Rasterize a polygon (array coordinates) onto the grid, testing only nodes in its bounding box."""
+        xs, ys = self._grid_axes(step)
+        inside = np.zeros((len(ys), len(xs)), dtype=bool)
+        cols = np.nonzero((xs >= poly[:, 0].min()) & (xs <= poly[:, 0].max()))[0]
+        rows = np.nonzero((ys >= poly[:, 1].min()) & (ys <= poly[:, 1].max()))[0]
+        if cols.size and rows.size:
+            c0, c1, r0, r1 = cols[0], cols[-1] + 1, rows[0], rows[-1] + 1
+            xv, yv = np.meshgrid(xs[c0:c1], ys[r0:r1])
+            points = np.column_stack((xv.ravel(), yv.ravel()))
+            inside[r0:r1, c0:c1] = Path(poly).contains_points(points).reshape(xv.shape)
+        return inside
+
     # Creates threshold based mask
     def get_threshold_mask(self):
         thresh = self.get_current_threshold()
@@ -214,20 +307,26 @@ class GrdViewer(tk.Toplevel):
         return (self.data < thresh).astype(np.uint8)
 
     def get_polygon_mask(self):
-        if self.mask_poly is not None:
-            return self.mask_poly
-        else:
-            return np.zeros_like(self.data, dtype=np.uint8)
+        mask_poly = np.zeros_like(self.data, dtype=np.uint8)
+        for poly in self.mask_polygons:
+            mask_poly |= self._rasterize_polygon(poly)
+        return mask_poly
 
     def get_cumulative_mask(self, use_poly=True):
+        """Get the full-resolution mask (1 = masked) for export."""
         mask_thresh = self.get_threshold_mask()
         if mask_thresh is None:
             return None
-        if use_poly and self.mask_poly is not None:
-            mask_poly = self.get_polygon_mask()
-            return np.logical_or(mask_thresh, mask_poly).astype(np.uint8)
-        else:
-            return mask_thresh
+        if use_poly and self.mask_polygons:
+            mask_thresh |= self.get_polygon_mask()
+        return mask_thresh
+
+    def get_preview_mask(self, thresh, use_poly=True):
+        """Update the display-resolution mask in place and return it."""
+        np.less(self.preview, thresh, out=self._preview_mask)
+        if use_poly and self.mask_polygons:
+            np.logical_or(self._preview_mask, self._preview_poly, out=self._preview_mask)
+        return self._preview_mask
 
     def update_mask_with_prompt(self):
         if self.data is None or self.extent is None:
@@ -237,7 +336,7 @@ class GrdViewer(tk.Toplevel):
         if thresh is None:
             return
         use_poly = True
-        if self.mask_poly is not None and np.any(self.mask_poly):
+        if self.mask_polygons:
             resp = messagebox.askyesno(
                 "Polygon Mask",
                 "A polygon mask exists. Do you want to RETAIN it in the new mask?\n"
@@ -245,33 +344,59 @@ class GrdViewer(tk.Toplevel):
             )
             use_poly = resp
             if not use_poly:
-                self.mask_poly = None
+                self.mask_polygons = []
+                self._preview_poly[:] = False
         self.plot_data(use_poly=use_poly)
 
-    def plot_data(self, use_poly=True):
-        if self.data is None or self.extent is None:
-            return
-
+    def _on_threshold_slide(self, value):
+        """Preview the mask while the threshold slider moves (coalesced to one redraw per frame)."""
+        self.threshold_var.set(round(float(value), 2))
+        if self.data is not None and self._slide_job is None:
+            self._slide_job = self.after(SLIDE_DELAY_MS, self._apply_slide)
+
+    def _apply_slide(self):
+        self._slide_job = None
+        if self.data is not None:
+            self.plot_data(use_poly=True)
+
+    def _destroy_figure(self):
+        if self.readout:
+            self.readout.disconnect()
+            self.readout = None
         if self.canvas:
             self.canvas.get_tk_widget().pack_forget()
             self.canvas = None
         if self.toolbar:
             self.toolbar.pack_forget()
             self.toolbar = None
+        if self.fig:
+            plt.close(self.fig)
+            self.fig = None
 
-        mask = self.get_cumulative_mask(use_poly=use_poly)
-        if mask is None:
+    def plot_data(self, use_poly=True):
+        """Draw the correlation and mask panels, or update only the mask layer once they exist."""
+        if self.data is None or self.extent is None:
             return
 
-        # Flip data and mask vertically for consistent display and export
-        data_plot = self.data
-        mask_plot = mask
-        extent_plot = self.extent
+        thresh = self.get_current_threshold()
+        if thresh is None:
+            return
+        mask = self.get_preview_mask(thresh, use_poly=use_poly)
+        self.mask_thresh = thresh
+        self.mask_use_poly = use_poly
+
+        if self.fig is not None:
+            self.mask_im.set_data(mask.view(np.uint8))
+            self.ax2.set_title(f"Mask (thresh={thresh})")
+            self.canvas.draw_idle()
+            return
+
+        extent_plot = self._preview_extent()
 
         self.fig, (self.ax1, self.ax2) = plt.subplots(1, 2, figsize=(14, 5), sharex=True, sharey=True)
 
         custom_cmap = self.get_custom_cmap()
-        im1 = self.ax1.imshow(data_plot, cmap=custom_cmap, vmin=0, vmax=1, origin='upper',
+        im1 = self.ax1.imshow(self.preview, cmap=custom_cmap, vmin=0, vmax=1, origin='upper',
                               aspect='auto', extent=extent_plot)
         cbar1 = self.fig.colorbar(im1, ax=self.ax1, orientation='vertical', fraction=0.046, pad=0.04)
         cbar1.set_label('correlation')
@@ -280,8 +405,8 @@ class GrdViewer(tk.Toplevel):
         cmap = ListedColormap(['white', 'red'])
         bounds = [-0.5, 0.5, 1.5]
         norm = BoundaryNorm(bounds, cmap.N)
-        self.ax2.imshow(mask_plot, cmap=cmap, norm=norm, origin='upper',
-                        aspect='auto', extent=extent_plot)
+        self.mask_im = self.ax2.imshow(mask.view(np.uint8), cmap=cmap, norm=norm, origin='upper',
+                                       aspect='auto', extent=extent_plot)
         legend_elements = [Patch(facecolor='red', edgecolor='k', label='Masked values')]
         self.ax2.legend(
             handles=legend_elements,
@@ -290,22 +415,47 @@ class GrdViewer(tk.Toplevel):
             borderaxespad=0.,
             frameon=True
         )
-        thresh = self.get_current_threshold()
-        self.ax2.set_title(f"Mask (thresh={thresh if thresh is not None else '?'})")
+        self.ax2.set_title(f"Mask (thresh={thresh})")
         self.ax2.set_xlabel("Range")
         self.ax2.set_ylabel("Azimuth")
         self.ax2.axis('on')
+        self.ax1.set_xlim(self.extent[0], self.extent[1])
+        self.ax1.set_ylim(self.extent[2], self.extent[3])
 
         self.fig.tight_layout()
         self._connect_axes()
+        self._draw_roi_patch()
 
         self.canvas = FigureCanvasTkAgg(self.fig, master=self)
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=1)
         self.toolbar = NavigationToolbar2Tk(self.canvas, self)
         self.toolbar.update()
         self.toolbar.pack(fill=tk.X)
+        self.readout = BlitReadout(self.canvas, self.ax1)
+        self.canvas.mpl_connect('motion_notify_event', self._on_hover)
+        self.canvas.mpl_connect('axes_leave_event', lambda event: self.readout.clear())
         self.canvas.draw()
 
+    def _masked_at(self, row, col):
+        """Check whether a full-resolution pixel is masked by the current threshold and polygons."""
+        if self.data[row, col] < self.mask_thresh:
+            return True
+        if self.mask_use_poly and self.mask_polygons:
+            xs, ys = self._grid_axes()
+            return any(Path(poly).contains_point((xs[col], ys[row])) for poly in self.mask_polygons)
+        return False
+
+    def _on_hover(self, event):
+        """Show the correlation and mask state under the mouse."""
+        if event.inaxes not in (self.ax1, self.ax2) or event.xdata is None or self.lookup is None:
+            return
+        row, col = self.lookup.index(event.xdata, event.ydata)
+        corr = self.data[row, col]
+        corr_text = f"{corr:.3f}" if np.isfinite(corr) else "N/A"
+        masked = "masked" if self._masked_at(row, col) else "kept"
+        self.readout.show(f"Range: {event.xdata:.1f}, Azimuth: {self._display_y(event.ydata):.1f}, "
+                          f"Corr: {corr_text} ({masked})")
+
     def _connect_axes(self):
         def on_xlim_changed(event_ax):
             if self._syncing:
@@ -420,8 +570,80 @@ class GrdViewer(tk.Toplevel):
             
         self.canvas.draw_idle()
 
+    def _display_y(self, y):
+        """Map between grid and display azimuth (the display is flipped, as for polygons)."""
+        return self.extent[2] + self.extent[3] - y
+
+    def _draw_roi_patch(self):
+        if self.roi_patch is not None:
+            try:
+                self.roi_patch.remove()
+            except ValueError:
+                pass
+            self.roi_patch = None
+        if self.roi is None or self.ax1 is None:
+            return
+        y_top = self._display_y(self.roi['y1'])
+        self.roi_patch = Rectangle((self.roi['x0'], y_top), self.roi['x1'] - self.roi['x0'],
+                                   self.roi['y1'] - self.roi['y0'], fill=False, edgecolor='magenta',
+                                   linestyle='--', linewidth=2)
+        self.ax1.add_patch(self.roi_patch)
+
+    def enable_roi_draw(self):
+        """Drag a rectangle on the left plot to crop interferograms before unwrapping."""
+        if self.data is None or self.extent is None:
+            messagebox.showinfo("Info", "Load a .grd file first.")
+            return
+        if self.drawing_polygon:
+            return
+        self.roi_selector = RectangleSelector(self.ax1, self._on_roi_select, useblit=True, button=[1],
+                                              interactive=False)
+        messagebox.showinfo(
+            "Region of Interest",
+            "Drag a rectangle on the left plot to set the region of interest.\n"
+            "Only this region is unwrapped and used in SBAS."
+        )
+
+    def _on_roi_select(self, press, release):
+        xs = sorted([press.xdata, release.xdata])
+        ys = sorted([self._display_y(press.ydata), self._display_y(release.ydata)])
+        if xs[0] == xs[1] or ys[0] == ys[1]:
+            return
+        self.roi = {'x0': xs[0], 'x1': xs[1], 'y0': ys[0], 'y1': ys[1]}
+        self.roi_changed = True
+        self.roi_from_mask_var.set(False)
+        if self.roi_selector is not None:
+            self.roi_selector.set_active(False)
+            self.roi_selector = None
+        self._draw_roi_patch()
+        self.canvas.draw_idle()
+
+    def clear_roi_box(self):
+        self.roi = None
+        self.roi_changed = True
+        self.roi_from_mask_var.set(False)
+        self._draw_roi_patch()
+        if self.canvas:
+            self.canvas.draw_idle()
+
+    def _export_roi(self, export_dir, grd_out):
+        """Save the drawn ROI, the extent of the exported mask, or clear the ROI."""
+        try:
+            if self.roi_from_mask_var.get():
+                roi = mask_roi(grd_out)
+                if roi is None:
+                    messagebox.showwarning("Region of Interest", "The mask has no valid pixels; ROI not set.")
+                    return
+                write_roi(export_dir, roi, "mask")
+            elif self.roi_changed and self.roi is not None:
+                write_roi(export_dir, self.roi, "drawn")
+            elif self.roi_changed:
+                clear_roi(export_dir)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save the region of interest:\n{e}")
+
     def _apply_polygon_mask(self):
-        """Convert drawn polygon to mask array."""
+        """Add the drawn polygon to the mask, updating only the preview pixels it covers."""
         poly = np.array(self.polygon_coords)
         
         # Transform polygon coordinates to match the coordinate system
@@ -431,36 +653,23 @@ class GrdViewer(tk.Toplevel):
         # Flip y-coordinates: display_y -> array_y
         poly_transformed[:, 1] = y1 - (poly[:, 1] - y0)
         
-        path = Path(poly_transformed)
-        ny, nx = self.data.shape
-        xs = np.linspace(x0, x1, nx)
-        ys = np.linspace(y0, y1, ny)
-        xv, yv = np.meshgrid(xs, ys)
-        points = np.vstack((xv.flatten(), yv.flatten())).T
-        inside = path.contains_points(points).reshape((ny, nx))
-        
-        if self.mask_poly is None:
-            self.mask_poly = np.zeros_like(self.data, dtype=np.uint8)
-        self.mask_poly[inside] = 1
+        self.mask_polygons.append(poly_transformed)
+        self._preview_poly |= self._rasterize_polygon(poly_transformed, self.preview_step)
+        if self.polygon_patch:
+            self.polygon_patch.remove()
+            self.polygon_patch = None
         self.plot_data()
 
-    def save_mask_as_grd(self, ds_in, mask, grd_out):
-        """Save mask as .grd file with inverted logic and proper orientation."""
+    def save_mask_as_grd(self, ds_in, mask, grd_out, data=None):
+        """Save mask as .grd file with inverted logic and proper orientation; returns True if written."""
         
         print(f"Original dataset coordinates: X: {ds_in.x.values[0]} to {ds_in.x.values[-1]}, Y: {ds_in.y.values[0]} to {ds_in.y.values[-1]}")
         print(f"Input mask shape: {mask.shape}")
         
-        # Create mask array preserving original NaN values
-        # Where mask > 0: set to NaN (newly masked areas)
-        # Where mask == 0 AND original data is valid: set to 1 (good areas)  
-        # Where mask == 0 AND original data is NaN: keep NaN (preserve original NaN)
-        original_data = ds_in.values.squeeze()
-        mask_arr = np.where(mask > 0, 
-                           np.nan, 
-                           np.where(np.isnan(original_data), np.nan, 1)).astype(np.float32)
-        
-        # # Apply vertical flip for correct QGIS orientation
-        # mask_arr = np.flipud(mask_arr)
+        # Masked areas and NaN in the original data are set to NaN, good areas to 1
+        original_data = data if data is not None else ds_in.values.squeeze()
+        mask_arr = np.ones(mask.shape, dtype=np.float32)
+        mask_arr[(mask > 0) | np.isnan(original_data)] = np.nan
         
         # Use original coordinates exactly as they were in the input file
         x = ds_in.x.values
@@ -468,44 +677,20 @@ class GrdViewer(tk.Toplevel):
         
         print(f"Saving with original coordinates: X: {x[0]} to {x[-1]}, Y: {y[0]} to {y[-1]}")
         
-        # Create DataArray with original coordinates
-        mask_da = xr.DataArray(
-            mask_arr,
-            dims=("y", "x"),
-            coords={"x": x, "y": y},
-            attrs=ds_in.attrs,
-            name="z"
-        )
-
-        tmp_nc = grd_out.replace(".grd", "_tmp.nc")
-        mask_da.to_netcdf(tmp_nc, engine="h5netcdf", format="NETCDF4")
-
-        # Use GMT to convert to classic grd format
         try:
-            subprocess.run(["gmt", "grdconvert", tmp_nc, f"{grd_out}=nf"], check=True)
-            os.remove(tmp_nc)
+            write_gmt_grid(mask_arr, x, y, grd_out, ds_in.attrs, history="InSARLite mask editor")
             print(f"✓ GMT .grd file saved: {grd_out}")
-            
-            # Generate pdf and ps files using GMT
-            base_name = grd_out.replace(".grd", "")
-            pdf_out = f"{base_name}.pdf"
-            ps_out = f"{base_name}.ps"
-            
-            try:
-                # Create ps file using gmt grdimage
-                subprocess.run(["gmt", "grdimage", grd_out, "-JX6i", "-P", "-Baf", f"-C{base_name}.cpt"], 
-                             stdout=open(ps_out, 'w'), check=True)
-                # Convert ps to pdf
-                subprocess.run(["gmt", "psconvert", ps_out, "-Tf", "-A"], check=True)
-                print(f"✓ Additional files saved: {pdf_out}, {ps_out}")
-            except subprocess.CalledProcessError as e:
-                print(f"Warning: Could not generate pdf/ps files: {e}")
-            except FileNotFoundError:
-                print("Warning: GMT commands not available for pdf/ps generation")
-        except subprocess.CalledProcessError as e:
-            print(f"Warning: GMT conversion failed: {e}")
-            print(f"Falling back to NetCDF format...")
-            os.rename(tmp_nc, grd_out.replace(".grd", ".nc"))
+        except Exception as e:
+            print(f"Warning: Could not write {grd_out}: {e}")
+            messagebox.showerror("Error", f"Failed to save mask grid:\n{e}")
+            return False
+        
+        # Render the pdf preview from the in-memory mask without blocking the GUI
+        pdf_out = grd_out.replace(".grd", ".pdf")
+        threading.Thread(target=render_grid_preview, args=(mask_arr, x, y, pdf_out),
+                         name="mask-preview").start()
+        return True
+
     def export_and_close(self):
         if self.data is None or self.extent is None or self.ds is None:
             messagebox.showerror("Error", "No data loaded to export.")
@@ -648,24 +833,29 @@ class GrdViewer(tk.Toplevel):
                 icon='warning', type='yesnocancel'
             )
             if resp == 'yes':
-                self.save_mask_as_grd(self.ds, mask, grd_out)
+                saved = self.save_mask_as_grd(self.ds, mask, grd_out, data=self.data)
             elif resp == 'no':
                 old_file = grd_out + ".old"
                 try:
                     if os.path.exists(old_file):
                         os.remove(old_file)
                     os.rename(grd_out, old_file)
-                    self.save_mask_as_grd(self.ds, mask, grd_out)
                 except Exception as e:
                     messagebox.showerror("Error", f"Failed to rename old file:\n{e}")
                     return
+                saved = self.save_mask_as_grd(self.ds, mask, grd_out, data=self.data)
             else:  # Cancel
                 messagebox.showinfo("Export", "Export skipped. Window remains open.")
                 return
         else:
-            self.save_mask_as_grd(self.ds, mask, grd_out)
+            saved = self.save_mask_as_grd(self.ds, mask, grd_out, data=self.data)
+        if not saved:
+            # The error was shown by save_mask_as_grd; keep the window open to retry
+            return
+        self._export_roi(export_dir, grd_out)
 
-        messagebox.showinfo("Export", f"Exported:\n{png1} (+ .ps)\n{png2} (+ .ps)\n{grd_out}")
+        messagebox.showinfo("Export", f"Exported:\n{png1} (+ .pdf/.svg/.eps/.ps)\n"
+                                      f"{png2} (+ .pdf/.svg/.eps/.ps)\n{grd_out} (+ .pdf)")
         
         # Proper cleanup before closing
         try:
@@ -678,7 +868,7 @@ class GrdViewer(tk.Toplevel):
             self.data = None
             self.extent = None
             self.ds = None
-            self.mask_poly = None
+            self.mask_polygons = []
             self.polygon_patch = None
             self.polygon_coords = []
             
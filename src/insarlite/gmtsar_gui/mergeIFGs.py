@@ -2,6 +2,7 @@ import os
 import shutil
 import subprocess
 from ..utils.utils import process_logger
+from ..utils.product_catalog import get_catalog
 
 
 def update_prm(file, param, value):
@@ -73,21 +74,34 @@ def merge_thread(pmerge, log_file_path, mst=None):
 
         dir_path = '..'
 
-        if not next(os.walk('.'))[1]:
+        # Pairs merged in an earlier run (incremental stack update) are not merged again
+        merged = get_catalog(pmerge).pairs_with(pmerge, 'corr.grd')
+        if merged:
+            print(f"Found {len(merged)} merged interferograms, merging only new pairs")
+
+        if not next(os.walk('.'))[1] or merged:
             with open('merge_list', 'w') as out:
                 for line in create_merge(dir_path):
                     out.write(line + '\n')
             with open('merge_list', 'r') as f:
                 lines = f.readlines()
+            all_lines = lines
+            lines = [x for x in lines if os.path.basename(os.path.normpath(x.split(',')[0].split(':')[0])) not in merged]
+            if not lines:
+                print("All interferograms already merged ...")
+                return
             # Troubleshooting: Split the line into smaller parts
             # Find the line containing mst in the first file name
-            filtered_lines = list(filter(lambda x: mst in x.split(',')[0].split(':')[1], lines))
+            filtered_lines = list(filter(lambda x: mst in x.split(',')[0].split(':')[1], all_lines))
             if not filtered_lines:
-                filtered_lines = list(filter(lambda x: mst in x.split(',')[0].split(':')[2], lines))
+                filtered_lines = list(filter(lambda x: mst in x.split(',')[0].split(':')[2], all_lines))
             print(f"Filtered lines containing mst '{mst}': {filtered_lines}")
             # Get the index of that line
             if filtered_lines:
                 mst_line = filtered_lines[0]
+                # merge_batch.csh needs the master line first, even if that pair is already merged
+                if mst_line not in lines:
+                    lines.append(mst_line)
                 mst_index = lines.index(mst_line)
                 # Remove the line from its current position
                 popped_line = lines.pop(mst_index)
@@ -1,9 +1,9 @@
 #!/usr/bin/env python3
 import os
-import re
 import sys
 import time
-from datetime import datetime, timedelta
+import queue
+import threading
 import xarray as xr
 import matplotlib
 matplotlib.use('TkAgg')
@@ -14,6 +14,8 @@ import matplotlib.dates as mdates
 import tkinter as tk
 from tkinter import messagebox, filedialog
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+from ..utils.timeseries_export import (BaseMapCache, detect_lat_lon_names, extract_series, series_quality,
+                                        start_series_export, get_file_paths, load_all_data_lazy)
 
 # Configure matplotlib for TRUE VECTOR output (editable text, not rasterized)
 # This MUST be set before creating any figures
@@ -23,46 +25,6 @@ plt.rcParams['svg.fonttype'] = 'none'    # Preserve text as text (not paths)
 plt.rcParams['pdf.use14corefonts'] = True  # Use standard PDF fonts
 plt.rcParams['text.usetex'] = False      # Don't use LaTeX (prevents rasterization)
 
-# -----------------------------------------------------------------------------
-# Helper: collect files and their datetime from filenames
-# -----------------------------------------------------------------------------
-def get_file_paths(folder_path):
-    pattern = re.compile(r"disp_(\d{4})(\d{3})_ll\.grd$")
-    files_to_load = []
-    for filename in sorted(os.listdir(folder_path)):
-        match = pattern.match(filename)
-        if match:
-            year = int(match.group(1))
-            doy = int(match.group(2))
-            # Fix GMTSAR native 1-day offset: add 1 day to the calculated date
-            date = datetime(year, 1, 1) + timedelta(days=doy)  # Changed from doy-1 to doy
-            file_path = os.path.join(folder_path, filename)
-            files_to_load.append((file_path, date))
-    files_to_load.sort(key=lambda x: x[1])
-    return files_to_load
-
-# -----------------------------------------------------------------------------
-# Open all files lazily and concat along 'time' dimension
-# -----------------------------------------------------------------------------
-def load_all_data_lazy(files_to_load, chunk_dict=None):
-    if not files_to_load:
-        raise ValueError("No files to load")
-    dataarrays = []
-    for fp, dt in files_to_load:
-        try:
-            da = xr.open_dataarray(fp)
-        except Exception:
-            ds = xr.open_dataset(fp)
-            if len(ds.data_vars) == 0:
-                raise RuntimeError(f"No data variables found in {fp}")
-            da = ds[list(ds.data_vars)[0]]
-        da = da.expand_dims(time=[np.datetime64(dt)])
-        dataarrays.append(da)
-    stacked = xr.concat(dataarrays, dim="time")
-    if chunk_dict:
-        stacked = stacked.chunk(chunk_dict)
-    return stacked
-
 # -----------------------------------------------------------------------------
 # TopLevel window for time series plot
 # -----------------------------------------------------------------------------
@@ -481,6 +443,9 @@ class VisualizeApp(tk.Tk):
         
         # Pin marker
         self.pin_marker = None
+        
+        # Rendered velocity maps for context map exports
+        self.base_map_cache = None
 
         self.create_widgets()
         self.load_data()
@@ -513,6 +478,9 @@ class VisualizeApp(tk.Tk):
                                           command=self.clear_polygon, state=tk.DISABLED)
         self.clear_polygon_btn.pack(side=tk.LEFT, padx=5)
 
+        self.trend_btn = tk.Button(frame_top, text="Fit Trend/Seasonal Maps", command=self.fit_trend_maps)
+        self.trend_btn.pack(side=tk.LEFT, padx=5)
+
         # Add status label for click feedback (wider without data path)
         self.status_label = tk.Label(frame_top, text="Click on map to view time series", 
                                    fg="blue", font=("Arial", 9), width=60)
@@ -525,6 +493,39 @@ class VisualizeApp(tk.Tk):
         self.map_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
         self.map_canvas = None
 
+    def fit_trend_maps(self):
+        """Fit velocity, acceleration and seasonal terms to every pixel and save trend_*_ll.grd grids"""
+        from ..utils.trend_model import fit_trend_grids
+
+        self.trend_btn.config(state=tk.DISABLED)
+        self.status_label.config(text="Fitting trend and seasonal terms to all pixels...", fg="orange")
+        results = queue.Queue()
+
+        def work():
+            try:
+                results.put((fit_trend_grids(self.folder_path), None))
+            except Exception as e:
+                results.put((None, e))
+
+        def poll():
+            try:
+                outputs, error = results.get_nowait()
+            except queue.Empty:
+                self.after(200, poll)
+                return
+            self.trend_btn.config(state=tk.NORMAL)
+            if error:
+                self.status_label.config(text="Trend fit failed", fg="red")
+                messagebox.showerror("Error", f"Failed to fit trend maps:\n{error}")
+                return
+            self.status_label.config(text=f"Saved {len(outputs)} trend grids", fg="green")
+            messagebox.showinfo("Trend Maps",
+                                "Saved:\n" + "\n".join(os.path.basename(p) for p in outputs.values())
+                                + f"\n\nto {self.folder_path}")
+
+        threading.Thread(target=work, daemon=True).start()
+        self.after(200, poll)
+
     def load_data(self):
         folder_path = self.folder_path
         if not folder_path or not os.path.isdir(folder_path):
@@ -633,95 +634,55 @@ class VisualizeApp(tk.Tk):
             zoom_factor: How much to zoom out (3.0 = 3x zoom out)
         """
         try:
-            # Load velocity data
-            ds = xr.open_dataarray(self.vel_file_path)
-            
-            # Detect coordinate names
-            lat_name = lon_name = None
-            for n in ds.coords:
-                if n.lower().startswith("lat"): 
-                    lat_name = n; break
-            for n in ds.coords:
-                if n.lower().startswith("lon"): 
-                    lon_name = n; break
-            if lat_name is None or lon_name is None:
-                if 'y' in ds.coords and 'x' in ds.coords:
-                    lat_name, lon_name = 'y', 'x'
-                    
-            if not (lat_name and lon_name):
-                return
-                
-            lons = ds[lon_name].values
-            lats = ds[lat_name].values
-            lon2d, lat2d = np.meshgrid(lons, lats)
-            vel = ds.values
-            
-            # Get current map extent if available
-            if hasattr(self, 'map_canvas') and self.map_canvas:
-                try:
-                    ax_current = self.map_canvas.figure.axes[0]
-                    current_xlim = ax_current.get_xlim()
-                    current_ylim = ax_current.get_ylim()
-                    
-                    # Calculate center and size
-                    center_lon = (current_xlim[0] + current_xlim[1]) / 2
-                    center_lat = (current_ylim[0] + current_ylim[1]) / 2
-                    width = (current_xlim[1] - current_xlim[0]) * zoom_factor
-                    height = (current_ylim[1] - current_ylim[0]) * zoom_factor
-                    
-                    # Calculate new extent
-                    lon_min = max(lons.min(), center_lon - width / 2)
-                    lon_max = min(lons.max(), center_lon + width / 2)
-                    lat_min = max(lats.min(), center_lat - height / 2)
-                    lat_max = min(lats.max(), center_lat + height / 2)
-                    
-                except:
-                    # Fallback: center on pin with reasonable zoom
-                    lon_range = lons.max() - lons.min()
-                    lat_range = lats.max() - lats.min()
-                    margin = 0.1  # 10% margin around pin
-                    
-                    lon_min = max(lons.min(), lon - lon_range * margin)
-                    lon_max = min(lons.max(), lon + lon_range * margin)
-                    lat_min = max(lats.min(), lat - lat_range * margin)
-                    lat_max = min(lats.max(), lat + lat_range * margin)
-            else:
-                # No current view, use full extent
-                lon_min, lon_max = lons.min(), lons.max()
-                lat_min, lat_max = lats.min(), lats.max()
-            
-            # Create clean map figure with basic matplotlib
-            clean_fig = plt.Figure(figsize=(8, 6))
-            clean_ax = clean_fig.add_subplot(111)
-            clean_ax.set_xlim(lon_min, lon_max)
-            clean_ax.set_ylim(lat_min, lat_max)
-            
-            # Plot velocity map
-            c = clean_ax.pcolormesh(lon2d, lat2d, vel, cmap='jet')
-            clean_fig.colorbar(c, ax=clean_ax, orientation='vertical')
-            clean_ax.set_xlabel('Longitude')
-            clean_ax.set_ylabel('Latitude')
-            clean_ax.grid(True, alpha=0.3, linestyle='--')
-            clean_ax.set_aspect('equal', adjustable='box')
-            
-            # Add pin at specified location
-            clean_ax.plot(lon, lat, '+', markersize=15, 
-                        markeredgecolor='red', markeredgewidth=3, 
-                        label=f'Location: ({lat:.4f}, {lon:.4f})')
-            clean_ax.legend(loc='upper right')
-            
-            clean_ax.set_title("Surface Deformation Velocity - Context Map")
-            clean_fig.tight_layout()
-            
-            # Save the map
-            clean_fig.savefig(file_path, bbox_inches='tight', facecolor='white', dpi=300)
-            plt.close(clean_fig)
-            
-            ds.close()
+            extent = self._context_map_extent(lat, lon, zoom_factor)
+            # Composite the pin on the cached base map of this extent
+            self.base_map_cache.save(file_path, lat, lon, extent)
                 
         except Exception as e:
             print(f"Warning: Could not save context map: {e}")
 
+    def _context_map_extent(self, lat, lon, zoom_factor=3.0):
+        """Get the (lon_min, lon_max, lat_min, lat_max) of a context map: the current view zoomed out"""
+        # Velocity grid and its renders are cached until vel_ll.grd changes
+        if self.base_map_cache is None or self.base_map_cache.vel_file_path != self.vel_file_path:
+            self.base_map_cache = BaseMapCache(self.vel_file_path)
+        data_lon_min, data_lon_max, data_lat_min, data_lat_max = self.base_map_cache.bounds()
+        
+        # Get current map extent if available
+        if hasattr(self, 'map_canvas') and self.map_canvas:
+            try:
+                ax_current = self.map_canvas.figure.axes[0]
+                current_xlim = ax_current.get_xlim()
+                current_ylim = ax_current.get_ylim()
+                
+                # Calculate center and size
+                center_lon = (current_xlim[0] + current_xlim[1]) / 2
+                center_lat = (current_ylim[0] + current_ylim[1]) / 2
+                width = (current_xlim[1] - current_xlim[0]) * zoom_factor
+                height = (current_ylim[1] - current_ylim[0]) * zoom_factor
+                
+                # Calculate new extent
+                lon_min = max(data_lon_min, center_lon - width / 2)
+                lon_max = min(data_lon_max, center_lon + width / 2)
+                lat_min = max(data_lat_min, center_lat - height / 2)
+                lat_max = min(data_lat_max, center_lat + height / 2)
+                
+            except:
+                # Fallback: center on pin with reasonable zoom
+                lon_range = data_lon_max - data_lon_min
+                lat_range = data_lat_max - data_lat_min
+                margin = 0.1  # 10% margin around pin
+                
+                lon_min = max(data_lon_min, lon - lon_range * margin)
+                lon_max = min(data_lon_max, lon + lon_range * margin)
+                lat_min = max(data_lat_min, lat - lat_range * margin)
+                lat_max = min(data_lat_max, lat + lat_range * margin)
+        else:
+            # No current view, use full extent
+            lon_min, lon_max = data_lon_min, data_lon_max
+            lat_min, lat_max = data_lat_min, data_lat_max
+        return lon_min, lon_max, lat_min, lat_max
+
     def process_polygon_selection(self):
         """Process polygon selection and ask user for action"""
         if len(self.polygon_points) < 3:
@@ -743,8 +704,8 @@ class VisualizeApp(tk.Tk):
             return
             
         try:
-            # Find all pixels within polygon
-            pixels_in_polygon = self._find_pixels_in_polygon()
+            # Find all pixels within polygon (all of them when saving)
+            pixels_in_polygon = self._find_pixels_in_polygon(subsample=bool(response))
             
             if not pixels_in_polygon:
                 messagebox.showwarning("No Data", "No valid pixels found within the polygon.")
@@ -762,99 +723,60 @@ class VisualizeApp(tk.Tk):
         # Clear polygon after processing
         self.clear_polygon()
         
-    def _find_pixels_in_polygon(self):
-        """Find all valid pixels within the drawn polygon"""
-        from matplotlib.path import Path
-        import numpy as np
+    def _find_pixels_in_polygon(self, subsample=True):
+        """Find all valid pixels within the drawn polygon
         
-        # Debug: Print polygon points
-        print(f"🔍 Polygon points (lon, lat):")
-        for i, (lon, lat) in enumerate(self.polygon_points):
-            print(f"   Point {i+1}: ({lon:.4f}, {lat:.4f})")
+        Args:
+            subsample: Thin out large selections to about 50 pixels (for interactive plots)
+        """
+        from matplotlib.path import Path
         
         # Create polygon path
         polygon_path = Path(self.polygon_points)
         
         # Get data coordinates
         ds = xr.open_dataarray(self.vel_file_path)
-        
-        # Detect coordinate names
-        lat_name = lon_name = None
-        for n in ds.coords:
-            if n.lower().startswith("lat"): 
-                lat_name = n; break
-        for n in ds.coords:
-            if n.lower().startswith("lon"): 
-                lon_name = n; break
-        if lat_name is None or lon_name is None:
-            if 'y' in ds.coords and 'x' in ds.coords:
-                lat_name, lon_name = 'y', 'x'
-                
+        lat_name, lon_name = detect_lat_lon_names(ds.coords)
         lons = ds[lon_name].values
         lats = ds[lat_name].values
-        
-        print(f"   Data bounds: Lon [{lons.min():.4f}, {lons.max():.4f}], Lat [{lats.min():.4f}, {lats.max():.4f}]")
-        
         ds.close()
         
-        pixels_in_polygon = []
-        pixels_checked = 0
-        pixels_in_bounds = 0
+        print(f"🔍 Polygon with {len(self.polygon_points)} vertices over a {len(lats)}x{len(lons)} grid")
         
-        # DON'T subsample for debugging - check all pixels to find the issue
-        # After finding pixels, we can re-enable subsampling if needed
-        step_size = 1  # Check every pixel
+        # Test only the grid nodes inside the polygon's bounding box, all at once
+        poly = np.asarray(self.polygon_points)
+        cols = np.nonzero((lons >= poly[:, 0].min()) & (lons <= poly[:, 0].max()))[0]
+        rows = np.nonzero((lats >= poly[:, 1].min()) & (lats <= poly[:, 1].max()))[0]
+        if not cols.size or not rows.size:
+            return []
+        col_grid, row_grid = np.meshgrid(cols, rows)
+        inside = polygon_path.contains_points(np.column_stack((lons[col_grid.ravel()], lats[row_grid.ravel()])))
+        row_idx, col_idx = row_grid.ravel()[inside], col_grid.ravel()[inside]
+        pixels_in_bounds = len(row_idx)
         
-        print(f"   Grid size: {len(lats)}x{len(lons)}, step_size: {step_size}")
+        # If we found many pixels, subsample to avoid too many
+        if subsample and pixels_in_bounds > 100:
+            step_size = max(1, int(np.sqrt(pixels_in_bounds / 50)))  # Aim for ~50 pixels
+            print(f"⚠️ Too many pixels ({pixels_in_bounds}), subsampling every {step_size} rows/columns...")
+            keep = (row_idx % step_size == 0) & (col_idx % step_size == 0)
+            row_idx, col_idx = row_idx[keep], col_idx[keep]
+        if not len(row_idx):
+            return []
         
-        # Check each pixel
-        for i in range(0, len(lats), step_size):
-            for j in range(0, len(lons), step_size):
-                lat, lon = lats[i], lons[j]
-                pixels_checked += 1
-                
-                # Test containment
-                point = (lon, lat)
-                if polygon_path.contains_point(point):
-                    pixels_in_bounds += 1
-                    if pixels_in_bounds <= 5:  # Print first few matches for debugging
-                        print(f"   ✓ Pixel ({lat:.6f}, {lon:.6f}) is INSIDE polygon")
-                    
-                    # Use the same validation as single-click mode
-                    quality_info = self._validate_time_series_quality(lat, lon)
-                    if quality_info['is_valid']:
-                        pixels_in_polygon.append({
-                            'lat': lat,
-                            'lon': lon,
-                            'quality': quality_info
-                        })
+        # Use the same validation as single-click mode, for all pixels in one read
+        series = extract_series(self.stacked_data, lats[row_idx], lons[col_idx])
+        quality = series_quality(series['times'], series['values'])
+        # Keep the series read here, so saving them does not read the stack again
+        pixels_in_polygon = [
+            {'lat': lats[r], 'lon': lons[c], 'quality': {key: values[i] for key, values in quality.items()},
+             'times': series['times'], 'values': series['values'][i]}
+            for i, (r, c) in enumerate(zip(row_idx, col_idx)) if quality['is_valid'][i]
+        ]
         
         print(f"✅ Polygon scan complete:")
-        print(f"   Pixels checked: {pixels_checked}")
         print(f"   Pixels in polygon bounds: {pixels_in_bounds}")
         print(f"   Valid pixels found: {len(pixels_in_polygon)}")
         
-        # If we found pixels, re-run with subsampling to avoid too many
-        if pixels_in_bounds > 100:
-            print(f"⚠️ Too many pixels ({pixels_in_bounds}), re-running with subsampling...")
-            step_size = max(1, int(np.sqrt(pixels_in_bounds / 50)))  # Aim for ~50 pixels
-            pixels_in_polygon = []
-            
-            for i in range(0, len(lats), step_size):
-                for j in range(0, len(lons), step_size):
-                    lat, lon = lats[i], lons[j]
-                    point = (lon, lat)
-                    if polygon_path.contains_point(point):
-                        quality_info = self._validate_time_series_quality(lat, lon)
-                        if quality_info['is_valid']:
-                            pixels_in_polygon.append({
-                                'lat': lat,
-                                'lon': lon,
-                                'quality': quality_info
-                            })
-            
-            print(f"   Resampled to {len(pixels_in_polygon)} pixels")
-        
         return pixels_in_polygon
 
     def _show_interactive_polygon_plots(self, pixels_in_polygon):
@@ -889,10 +811,7 @@ class VisualizeApp(tk.Tk):
         self.status_label.config(text=f"Opened {len(self.open_windows)} time series windows", fg="green")
         
     def _save_polygon_files(self, pixels_in_polygon):
-        """Save time series files for all pixels without opening plots"""
-        from tkinter import filedialog
-        import os
-        
+        """Save time series of all pixels without opening plots (one table, optional plots in a process pool)"""
         save_dir = filedialog.askdirectory(title="Select Directory to Save Polygon Time Series")
         if not save_dir:
             return
@@ -901,6 +820,25 @@ class VisualizeApp(tk.Tk):
         polygon_dir = os.path.join(save_dir, f"polygon_{len(self.polygon_points)}vertices_{len(pixels_in_polygon)}pixels")
         os.makedirs(polygon_dir, exist_ok=True)
         
+        total_pixels = len(pixels_in_polygon)
+        plots = messagebox.askyesno(
+            "Polygon Time Series",
+            f"All {total_pixels} time series are saved to one table.\n\n"
+            "Also save a plot and context map for every pixel?"
+        )
+        
+        lats = [pixel['lat'] for pixel in pixels_in_polygon]
+        lons = [pixel['lon'] for pixel in pixels_in_polygon]
+        series = {'times': pixels_in_polygon[0]['times'], 'lat': np.asarray(lats, dtype=float),
+                  'lon': np.asarray(lons, dtype=float),
+                  'values': np.vstack([pixel['values'] for pixel in pixels_in_polygon])}
+        map_extent = None
+        if plots:
+            try:
+                map_extent = self._context_map_extent(lats[0], lons[0], zoom_factor=3.0)
+            except Exception as e:
+                print(f"Warning: Context maps disabled: {e}")
+        
         progress_window = tk.Toplevel(self)
         progress_window.title("Saving Polygon Time Series")
         progress_window.geometry("400x150")
@@ -908,7 +846,7 @@ class VisualizeApp(tk.Tk):
         
         tk.Label(progress_window, text="Processing polygon selection...", font=("Arial", 12)).pack(pady=10)
         
-        progress_var = tk.StringVar()
+        progress_var = tk.StringVar(value=f"Saving {total_pixels} time series...")
         progress_label = tk.Label(progress_window, textvariable=progress_var)
         progress_label.pack(pady=5)
         
@@ -919,107 +857,50 @@ class VisualizeApp(tk.Tk):
         progress_bar = tk.Label(progress_bar_frame, text="", bg="lightblue", height=1)
         progress_bar.pack(fill=tk.X)
         
-        saved_count = 0
-        total_pixels = len(pixels_in_polygon)
+        # Export runs in the background; the GUI polls its progress queue
+        _, progress = start_series_export(self.stacked_data, lats, lons, polygon_dir, plots=plots,
+                                          vel_file_path=self.vel_file_path, map_extent=map_extent,
+                                          series=series)
         
-        for i, pixel in enumerate(pixels_in_polygon):
-            try:
-                # Update progress
-                progress_var.set(f"Processing pixel {i+1} of {total_pixels}")
-                progress_width = int((i+1) / total_pixels * 40)  # 40 characters wide
-                progress_text = "█" * progress_width + "░" * (40 - progress_width)
-                progress_bar.config(text=progress_text)
-                progress_window.update()
-                
-                lat, lon = pixel['lat'], pixel['lon']
-                
-                # Extract time series data
-                lat_name = lon_name = None
-                for n in self.stacked_data.coords:
-                    if n.lower().startswith("lat"): lat_name = n; break
-                for n in self.stacked_data.coords:
-                    if n.lower().startswith("lon"): lon_name = n; break
-                if lat_name is None or lon_name is None:
-                    if 'y' in self.stacked_data.coords and 'x' in self.stacked_data.coords:
-                        lat_name, lon_name = 'y', 'x'
-                    else:
-                        continue
-                
-                point_series = self.stacked_data.sel({lat_name: lat, lon_name: lon}, method="nearest")
-                times = pd.to_datetime(point_series['time'].values)
-                deformation = point_series.values.astype(float)
-                
-                # Get actual coordinates
-                actual_lat = float(point_series[lat_name].values)
-                actual_lon = float(point_series[lon_name].values)
-                
-                # Create filename
-                lat_str = f"{'N' if actual_lat >= 0 else 'S'}{abs(actual_lat):.4f}".replace('.', 'p')
-                lon_str = f"{'E' if actual_lon >= 0 else 'W'}{abs(actual_lon):.4f}".replace('.', 'p')
-                base_filename = f"timeseries_{lat_str}_{lon_str}"
-                
-                # Save CSV
-                csv_path = os.path.join(polygon_dir, f"{base_filename}.csv")
-                time_series_data = pd.DataFrame({"Time": times, "Deformation": deformation})
-                time_series_data.to_csv(csv_path, index=False)
-                
-                # Create and save plot
-                fig = plt.Figure(figsize=(8, 5))
-                ax = fig.add_subplot(111)
-                ax.plot(times, deformation, marker='o', linestyle='-')
-                
-                # Format time axis
-                num_years = (times[-1] - times[0]).days / 365.0 if len(times) > 1 else 0
-                if num_years <= 1:
-                    ax.xaxis.set_major_locator(mdates.MonthLocator(interval=1))
-                    ax.xaxis.set_major_formatter(mdates.DateFormatter("%b '%y"))
-                elif num_years <= 4:
-                    ax.xaxis.set_major_locator(mdates.MonthLocator(interval=3))
-                    ax.xaxis.set_major_formatter(mdates.DateFormatter("%b '%y"))
-                else:
-                    ax.xaxis.set_major_locator(mdates.YearLocator())
-                    ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y"))
-                
-                ax.set_title(f"Time Series at ({actual_lat:.4f}, {actual_lon:.4f})")
-                ax.set_xlabel("Time")
-                ax.set_ylabel("Deformation (mm)")
-                ax.tick_params(axis='x', rotation=45)
-                ax.grid()
-                fig.tight_layout()
-                
-                # Save PNG (rcParams already configured globally for true vector output)
-                png_path = os.path.join(polygon_dir, f"{base_filename}.png")
-                fig.savefig(png_path, bbox_inches='tight', facecolor='white', dpi=300)
-                
-                # Save true vector formats
-                for fmt in ['pdf', 'svg', 'eps']:
-                    vector_path = os.path.join(polygon_dir, f"{base_filename}.{fmt}")
-                    fig.savefig(vector_path, format=fmt, bbox_inches='tight', facecolor='white')
-                
-                plt.close(fig)
-                
-                # Save context map with pin (3x zoom out)
-                try:
-                    map_path = os.path.join(polygon_dir, f"{base_filename}_map.png")
-                    self._save_context_map(map_path, actual_lat, actual_lon, zoom_factor=3.0)
-                except Exception as e:
-                    print(f"Warning: Could not save context map: {e}")
-                
-                saved_count += 1
-                
-            except Exception as e:
-                print(f"Warning: Failed to save files for pixel ({lat:.4f}, {lon:.4f}): {e}")
-        
-        progress_window.destroy()
+        def finish(result=None, error=None):
+            progress_window.destroy()
+            if error:
+                messagebox.showerror("Error", f"Failed to save polygon time series:\n{error}")
+                self.status_label.config(text="Polygon export failed", fg="red")
+                return
+            saved_count = result['pixels'] - len(result['errors'])
+            for message in result['errors'][:10]:
+                print(f"Warning: Failed to save plot for {message}")
+            messagebox.showinfo(
+                "Polygon Processing Complete",
+                f"Saved {result['pixels']} time series to {os.path.basename(result['table'])}"
+                + (f" and plots for {saved_count} of them" if plots else "") + ".\n\n"
+                f"Files saved to: {polygon_dir}"
+            )
+            self.status_label.config(text=f"Saved {result['pixels']} polygon time series", fg="green")
         
-        # Show completion message
-        messagebox.showinfo(
-            "Polygon Processing Complete",
-            f"Successfully saved {saved_count} out of {total_pixels} time series.\n\n"
-            f"Files saved to: {polygon_dir}"
-        )
+        def poll():
+            try:
+                while True:
+                    message = progress.get_nowait()
+                    if message[0] == "status":
+                        progress_var.set(message[1])
+                    elif message[0] == "plot":
+                        done, total = message[1], message[2]
+                        progress_var.set(f"Saved plots for pixel {done} of {total}")
+                        progress_width = int(done / total * 40)  # 40 characters wide
+                        progress_bar.config(text="█" * progress_width + "░" * (40 - progress_width))
+                    elif message[0] == "done":
+                        finish(result=message[1])
+                        return
+                    elif message[0] == "error":
+                        finish(error=message[1])
+                        return
+            except queue.Empty:
+                pass
+            self.after(100, poll)
         
-        self.status_label.config(text=f"Saved {saved_count} polygon time series files", fg="green")
+        poll()
         
     def _validate_time_series_quality(self, lat, lon, min_valid_ratio=0.05):
         """Validate time series data quality at given coordinates.
@@ -1,8 +1,9 @@
 import os
 import shutil
-import subprocess
 import sys
 import tkinter as tk
+from ..utils.run_policy import is_headless
+from ..utils.pair_network import read_baseline_table, select_pairs, write_intf_in
 
 def remove_unconnected_images(ind, dind):
     # Open the ind file and read it line by line
@@ -22,6 +23,8 @@ def remove_unconnected_images(ind, dind):
         nrows = sum(1 for _ in f)
     if len(unique_integers) == 0:
         print("No pairs found.")
+        if is_headless():
+            raise RuntimeError(f"No interferogram pairs found in {ind}")
         for widget in tk._default_root.children.values():
             try:
                 widget.destroy()
@@ -120,8 +123,10 @@ def remove_unconnected_images(ind, dind):
             )
             return set()
             
-def gen_pairs(paths, parallel_baseline, perpendicular_baseline, console_text, log_file_path):
-    # Generate intf.in for the first valid subswath, then copy to others
+def gen_pairs(paths, parallel_baseline, perpendicular_baseline, console_text, log_file_path,
+              max_neighbors=None, min_redundancy=None, ensure_connected=False):
+    # Select pairs from the baseline table of the first valid subswath and
+    # write intf.in for all subswaths at once
     primary_key = None
     primary_dir = None
     
@@ -137,39 +142,16 @@ def gen_pairs(paths, parallel_baseline, perpendicular_baseline, console_text, lo
         print("No valid subswath directories found for pair generation")
         return
     
-    # Generate intf.in for primary subswath (always regenerate, don't check if exists)
-    ind = os.path.join(primary_dir, "intf.in")
-    dind = os.path.join(primary_dir, "raw", "data.in")
-    
-    os.chdir(primary_dir)
     print(f"Generating IFGs pairs for {primary_key}...")
-    subprocess.call('select_pairs.csh baseline_table.dat {} {}'.format(parallel_baseline, perpendicular_baseline), shell=True)
-    print(f"✅ Generated intf.in for {primary_key}")
-    
-    # Copy the generated intf.in file to other subswaths
-    for other_key in ["pF1", "pF2", "pF3"]:
-        if other_key != primary_key:
-            other_dir_path = paths.get(other_key)
-            
-            if other_dir_path and os.path.exists(other_dir_path):
-                other_ind = os.path.join(other_dir_path, "intf.in")
-                # Copy the file
-                shutil.copy(ind, other_ind)
-                # Always modify subswath references after copying
-                with open(other_ind, 'r') as f:
-                    lines = f.readlines()
-                with open(other_ind, 'w') as f:
-                    for line in lines:
-                        # Replace _ALL_F1 with _ALL_F2, etc.
-                        modified_line = line.replace(f'_ALL_F{primary_key[-1]}', f'_ALL_F{other_key[-1]}')
-                        f.write(modified_line)
-                print(f"  Copied and modified intf.in: F{primary_key[-1]} -> F{other_key[-1]}")
+    file_ids, dates, perp_baselines = read_baseline_table(os.path.join(primary_dir, "baseline_table.dat"))
+    pairs = select_pairs(dates, perp_baselines, float(parallel_baseline), float(perpendicular_baseline),
+                         max_neighbors=max_neighbors, min_redundancy=min_redundancy,
+                         ensure_connected=ensure_connected)
+    written = write_intf_in(paths, [(file_ids[i], file_ids[j]) for i, j in pairs])
+    print(f"✅ Generated intf.in with {len(pairs)} pairs for {', '.join(written)}")
     
     # Remove unconnected images from data.in for all subswaths
-    for key in ["pF1", "pF2", "pF3"]:
-        dir_path = paths.get(key)
-        if dir_path and os.path.exists(dir_path):
-            ind = os.path.join(dir_path, "intf.in")
-            dind = os.path.join(dir_path, "raw", "data.in")
-            if os.path.exists(ind) and os.path.exists(dind):
-                remove_unconnected_images(ind, dind)
\ No newline at end of file
+    for key, ind in written.items():
+        dind = os.path.join(paths[key], "raw", "data.in")
+        if os.path.exists(dind):
+            remove_unconnected_images(ind, dind)
@@ -8,6 +8,8 @@ import numpy as np
 import os
 import subprocess
 from ..utils.utils import create_ref_point_ra
+from ..utils.radar_transform import get_transformer
+from ..utils.hover_readout import GridLookup, BlitReadout
 try:
     import rioxarray
     RIOXARRAY_AVAILABLE = True
@@ -32,6 +34,7 @@ class ReferencePointGUI(tk.Toplevel):
         self.corr_stack_path = os.path.join(self.save_dir, "corr_stack.grd")
         self.validity_path = os.path.join(self.save_dir, "validity_pin.grd")
         self.std_path = os.path.join(self.save_dir, "std.grd")
+        self._lookups = {}  # Pixel lookups of the loaded grids, by array id
         
         # Check if validity raster exists
         self.validity_available = os.path.exists(self.validity_path)
@@ -211,6 +214,8 @@ class ReferencePointGUI(tk.Toplevel):
         # Bind click events
         self.corr_canvas.mpl_connect('button_press_event', self.on_corr_plot_click)
         self.corr_canvas.mpl_connect('motion_notify_event', self.on_corr_plot_hover)
+        self.corr_canvas.mpl_connect('axes_leave_event', lambda event: self.corr_readout.clear())
+        self.corr_readout = BlitReadout(self.corr_canvas, self.corr_ax)
 
     def setup_validity_plot(self):
         """Setup matplotlib plot for validity visualization"""
@@ -227,6 +232,8 @@ class ReferencePointGUI(tk.Toplevel):
         # Bind click events
         self.validity_canvas.mpl_connect('button_press_event', self.on_validity_plot_click)
         self.validity_canvas.mpl_connect('motion_notify_event', self.on_validity_plot_hover)
+        self.validity_canvas.mpl_connect('axes_leave_event', lambda event: self.validity_readout.clear())
+        self.validity_readout = BlitReadout(self.validity_canvas, self.validity_ax)
 
     def _load_grid_data(self):
         """Load grid data using GMT"""
@@ -553,6 +560,13 @@ class ReferencePointGUI(tk.Toplevel):
             filepathr = os.path.join(topo_path, "ref_point.ra")
             prm = os.path.join(topo_path, "master.PRM")
             
+            x, y = self._transform_ll_to_ra(lat, lon)
+            if x is not None:
+                with open(filepathr, "w") as f:
+                    f.write(f"{x} {y} 0 {lon} {lat}\n")
+                messagebox.showinfo("Success", "Reference point saved successfully!")
+                return
+            
             result = subprocess.run(
                 f"SAT_llt2rat {prm} 0 < {filepath} > {filepathr}",
                 shell=True, capture_output=True, text=True
@@ -633,15 +647,13 @@ class ReferencePointGUI(tk.Toplevel):
                 if self.validity_available:
                     validity_val = self.get_value_at_location(self.validity_data, self.validity_extent, x, y)
                 
-                # Update hover info in status bar or tooltip
                 corr_text = f"{corr_val:.3f}" if corr_val is not None else 'N/A'
                 hover_text = f"Range: {x:.2f}, Azimuth: {y:.2f}, Corr: {corr_text}"
                 if validity_val is not None:
                     hover_text += f", Valid count: {int(validity_val) if validity_val else 0}"
                 
-                # Update plot title with hover info
-                self.corr_ax.set_title(f'Mean Correlation - {hover_text}')
-                self.corr_canvas.draw_idle()
+                # Blit the readout instead of redrawing the images
+                self.corr_readout.show(hover_text)
 
     def on_validity_plot_click(self, event):
         """Handle click on validity plot"""
@@ -664,8 +676,7 @@ class ReferencePointGUI(tk.Toplevel):
                 if corr_val is not None:
                     hover_text += f", Corr: {corr_val:.3f}"
                 
-                self.validity_ax.set_title(f'Validity Count - {hover_text}')
-                self.validity_canvas.draw_idle()
+                self.validity_readout.show(hover_text)
 
     def get_value_at_location(self, data, extent, x, y):
         """Get data value at specific coordinates"""
@@ -673,44 +684,11 @@ class ReferencePointGUI(tk.Toplevel):
             return None
         
         try:
-            # Convert coordinates to array indices
-            x_min, x_max, y_min, y_max = extent
-            rows, cols = data.shape
-            
-            # Calculate normalized coordinates (0 to 1)
-            x_norm = (x - x_min) / (x_max - x_min)
-            y_norm = (y - y_min) / (y_max - y_min)
-            
-            # Convert to array indices
-            col_idx = int(x_norm * (cols - 1))
-            row_idx = int(y_norm * (rows - 1))
-            
-            # Clamp indices to valid range
-            col_idx = max(0, min(cols - 1, col_idx))
-            row_idx = max(0, min(rows - 1, row_idx))
-            
-            # For GMT grids, typically Y is stored from top to bottom, so we need to flip row index
-            flipped_row_idx = rows - 1 - row_idx
-            
-            value = data[flipped_row_idx, col_idx]
-            
-            # Debug output for highest correlation case
-            if hasattr(self, '_debug_highest_corr') and self._debug_highest_corr:
-                print(f"Debug - Coords: ({x:.2f}, {y:.2f}) -> Normalized: ({x_norm:.4f}, {y_norm:.4f})")
-                print(f"Debug - Array indices: row={flipped_row_idx}, col={col_idx}, value={value:.6f}")
-                print(f"Debug - Data shape: {data.shape}, extent: {extent}")
-                
-                # Check surrounding values
-                for dr in [-1, 0, 1]:
-                    for dc in [-1, 0, 1]:
-                        r_check = max(0, min(rows-1, flipped_row_idx + dr))
-                        c_check = max(0, min(cols-1, col_idx + dc))
-                        val_check = data[r_check, c_check]
-                        print(f"Debug - Surrounding [{dr},{dc}]: {val_check:.6f}")
-                
-                self._debug_highest_corr = False  # Reset debug flag
-            
-            return float(value) if not np.isnan(value) else None
+            # GMT grids are stored from top to bottom, so the first row is at the top of the extent
+            lookup = self._lookups.get(id(data))
+            if lookup is None or lookup.data is not data:
+                lookup = self._lookups[id(data)] = GridLookup(data, extent, top_row_first=True)
+            return lookup.value(x, y)
             
         except Exception as e:
             print(f"Error in get_value_at_location: {e}")
@@ -752,8 +730,37 @@ class ReferencePointGUI(tk.Toplevel):
                 self.range_var.set(f"{x:.6f}")
                 self.azimuth_var.set(f"{y:.6f}")
 
+    def _transformer(self):
+        """Get the trans.dat based coordinate transformer (None if trans.dat is missing)"""
+        if not hasattr(self, "_coord_transformer"):
+            self._coord_transformer = get_transformer(self.topodir)
+        return self._coord_transformer
+
+    def _transform_ra_to_ll(self, x, y):
+        """Convert radar to geographic coordinates in memory; (None, None) if not possible"""
+        transformer = self._transformer()
+        if transformer is not None:
+            lon, lat = transformer.ra_to_ll(x, y)
+            if np.isfinite(lon[0]) and np.isfinite(lat[0]):
+                return float(lat[0]), float(lon[0])
+        return None, None
+
+    def _transform_ll_to_ra(self, lat, lon):
+        """Convert geographic to radar coordinates in memory; (None, None) if not possible"""
+        transformer = self._transformer()
+        if transformer is not None:
+            x, y = transformer.ll_to_ra(lon, lat)
+            if np.isfinite(x[0]) and np.isfinite(y[0]):
+                return float(x[0]), float(y[0])
+        return None, None
+
     def radar_to_geographic(self, x, y):
         """Convert radar coordinates to geographic"""
+        lat, lon = self._transform_ra_to_ll(x, y)
+        if lat is not None:
+            return lat, lon
+        
+        # Fall back to SAT_rat2ll (no trans.dat or point outside the DEM)
         try:
             # Create temporary file with radar coordinates
             temp_ra = os.path.join(self.topodir, "temp_point.ra")
@@ -794,6 +801,11 @@ class ReferencePointGUI(tk.Toplevel):
 
     def geographic_to_radar(self, lat, lon):
         """Convert geographic coordinates to radar"""
+        x, y = self._transform_ll_to_ra(lat, lon)
+        if x is not None:
+            return x, y
+        
+        # Fall back to SAT_llt2rat (no trans.dat or point outside the DEM)
         try:
             # Create temporary file with geographic coordinates
             temp_ll = os.path.join(self.topodir, "temp_point.ll")
@@ -946,9 +958,6 @@ class ReferencePointGUI(tk.Toplevel):
             messagebox.showerror("File Error", "Correlation stack file not found")
             return
         
-        # Enable debug output for correlation value checking
-        self._debug_highest_corr = True
-        
         try:
             # Use GMT to find maximum
             result = subprocess.run(
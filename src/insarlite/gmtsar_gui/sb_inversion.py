@@ -1,6 +1,7 @@
 import os
 import subprocess
 from ..utils.utils import run_command
+from ..utils.product_catalog import get_catalog
 
 def sb_prep(intf, btable, intfdir, uwp):    
     if not os.path.exists('intf.tab') and not os.path.exists('scene.tab'):
@@ -23,10 +24,8 @@ def sb_inversion(sdir, paths, inc_angle, atm="", rms=" -rms", dem=" -dem", sbas=
                 intfdir = os.path.join(dir_path, 'intf_all')
             break
     uwp = 'unwrap.grd'
-    for subfolder in os.listdir(intfdir):
-        if os.path.exists(os.path.join(intfdir, subfolder, 'unwrap_GACOS_corrected_detrended.grd')):
-            uwp = 'unwrap_GACOS_corrected_detrended.grd'
-            break    
+    if get_catalog(intfdir).count_pairs_with(intfdir, 'unwrap_GACOS_corrected_detrended.grd') > 0:
+        uwp = 'unwrap_GACOS_corrected_detrended.grd'
     print(f"Creating required files for sbas using uwp: {uwp}, intf.in: {intf}, btable: {btable}, intfdir: {intfdir}")
     sb_prep(intf, btable, intfdir, uwp)
 
@@ -1,10 +1,15 @@
 import os
-import re
 import subprocess
+import threading
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
 from ..utils.utils import add_tooltip, run_command, projgrd, velkml, process_logger
+from ..utils.product_catalog import get_catalog
+from ..utils.run_policy import confirm
+from ..utils.roi import CROPPED_CORR, read_roi, ensure_cropped_corr
+from ..utils.ifg_qc import QC_TABLE, excluded_pairs, filter_intf_tab, intf_tab_pairs, run_ifg_qc
+from ..gmtsar_gui.ifgs_generation import read_intf_pairs
 from ..gmtsar_gui.out_visualize import run_visualize_app
 
 class SBASApp(tk.Frame):
@@ -94,12 +99,29 @@ class SBASApp(tk.Frame):
         sbas_mode_dropdown = ttk.Combobox(
             self,
             textvariable=self.sbas_mode_var,
-            values=["SBAS", "SBAS Parallel"],
+            values=["SBAS", "SBAS Parallel", "SBAS Python (blocked)"],
             state="readonly",
             width=20
         )
         sbas_mode_dropdown.grid(row=3, column=1, padx=10, pady=5, sticky="w")
-        add_tooltip(sbas_mode_dropdown, "Choose SBAS processing mode:\n• SBAS: Standard sequential processing\n• SBAS Parallel: Multi-threaded processing (faster)")
+        add_tooltip(sbas_mode_dropdown, "Choose SBAS processing mode:\n• SBAS: Standard sequential processing\n• SBAS Parallel: Multi-threaded processing (faster)\n• SBAS Python (blocked): In-process inversion of pixel blocks on all cores,\n  resumes an interrupted run")
+
+        # Interferogram QC
+        self.closure_var = tk.BooleanVar(value=False)
+        qc_frame = tk.Frame(self)
+        qc_frame.grid(row=3, column=2, columnspan=3, padx=10, pady=5, sticky="w")
+        self.qc_button = tk.Button(qc_frame, text="Screen Interferograms", command=self.run_qc)
+        self.qc_button.pack(side=tk.LEFT)
+        add_tooltip(self.qc_button, "Compute coherence, valid fraction and unwrapping-error metrics of every\n"
+                                    "interferogram (ifg_qc.csv) and leave bad pairs out of the SBAS network\n"
+                                    "(pairs needed to keep the network connected are kept)")
+        closure_checkbox = tk.Checkbutton(qc_frame, text="Phase closure", variable=self.closure_var)
+        closure_checkbox.pack(side=tk.LEFT, padx=(10, 0))
+        add_tooltip(closure_checkbox, "Also check phase closure over interferogram triplets\n"
+                                        "Writes closure_ifgs.csv, closure_triplets.csv and closure_errors.grd\n"
+                                        "(failing triplets per pixel) next to validity_pin.grd")
+        self.qc_status = tk.Label(qc_frame, text="")
+        self.qc_status.pack(side=tk.LEFT, padx=10)
 
         # Run Button
         run_button = tk.Button(self, text="Run", command=self.run_sbas)
@@ -123,25 +145,21 @@ class SBASApp(tk.Frame):
         elif sbas == "SBAS Parallel":
             sbas = "sbas_parallel"
             os.environ["OMP_NUM_THREADS"] = cores if cores else "1"
+        elif sbas == "SBAS Python (blocked)":
+            sbas = "python"
         smooth = args.get("smooth")
         # print(self.paths)
         sdir = self.sdir
-        disp_files = []
         nsce = 0
         ndisp = 0
 
-        # Regex pattern: disp_<7digits>.grd
-        pattern = re.compile(r"^disp_\d{7}\.grd$")
-        for root, _, files in os.walk(sdir):
-            for f in files:
-                if f == "scene.tab":
-                    sce = os.path.join(root, f)
-                    with open(sce) as file:     
-                        nsce = sum(1 for line in file)
-                if pattern.match(f):
-                    disp_files.append(os.path.join(root, f))
-
-        # Total count of disp_*.grd files
+        catalog = get_catalog(sdir)
+        for sce in catalog.find(sdir, r"^scene\.tab$"):
+            with open(sce) as file:     
+                nsce = sum(1 for line in file)
+
+        # Total count of disp_<7digits>.grd files
+        disp_files = catalog.find(sdir, r"^disp_\d{7}\.grd$", reconcile=False)
         ndisp = len(disp_files)
         
         # Validate required parameters first
@@ -156,37 +174,66 @@ class SBASApp(tk.Frame):
         # Always run sb_inversion which will handle sb_prep and create necessary files
         # sb_prep creates scene.tab which is essential for SBAS processing
         print("Calling sb_inversion to prepare and execute SBAS processing...")
-        self.sb_inversion(sdir, self.paths, inc_angle, atm, rms, dem, sbas, smooth)
+        self.sb_inversion(sdir, self.paths, inc_angle, atm, rms, dem, sbas, smooth,
+                          ncores=int(cores) if cores and cores.isdigit() else None)
         sbas_executed = True
         
         # Check for visualization after SBAS execution
         if sbas_executed:
             self.check_and_enable_visualization()
 
+    def run_qc(self):
+        """Screen the interferograms SBAS will invert in the background and report the flagged pairs"""
+        uwp = sb_unwrap_name(self.ifgsroot)
+        closure = self.closure_var.get()
+        cores = self.cores_var.get()
+        ncores = int(cores) if cores.isdigit() else None
+        self.qc_button.config(state="disabled")
+        self.qc_status.config(text="Screening...", fg="orange")
+        result = {}
+
+        def work():
+            try:
+                result["rows"] = run_ifg_qc(self.ifgsroot, uwp, closure=closure, ncores=ncores,
+                                            topodir=self.topodir)
+            except Exception as e:
+                result["error"] = e
+
+        def poll():
+            if thread.is_alive():
+                self.after(200, poll)
+                return
+            self.qc_button.config(state="normal")
+            if "error" in result:
+                self.qc_status.config(text="Screening failed", fg="red")
+                messagebox.showerror("Interferogram QC", f"Screening failed:\n{result['error']}")
+                return
+            rows = result["rows"]
+            dropped = [row for row in rows if not row["keep"]]
+            self.qc_status.config(text=f"{len(dropped)} of {len(rows)} pairs left out", fg="green")
+            if dropped:
+                listing = "\n".join(f"{row['pair']}: {row['reason']}" for row in dropped[:15])
+                more = f"\n... and {len(dropped) - 15} more" if len(dropped) > 15 else ""
+                messagebox.showinfo("Interferogram QC", f"Left out of the SBAS network:\n{listing}{more}\n\n"
+                                    f"Details in {os.path.join(self.ifgsroot, QC_TABLE)}")
+
+        thread = threading.Thread(target=work, daemon=True)
+        thread.start()
+        self.after(200, poll)
+
     def check_and_enable_visualization(self):
         """Check if all required output files exist and enable visualization if so"""
-        disp_files = []
-        disp_files_ll = []
         nsce = 0
+        catalog = get_catalog(self.sdir)
         
         # Count scene files
-        for root, _, files in os.walk(self.sdir):
-            for f in files:
-                if f == "scene.tab":
-                    sce = os.path.join(root, f)
-                    with open(sce) as file:     
-                        nsce = sum(1 for line in file)
+        for sce in catalog.find(self.sdir, r"^scene\.tab$"):
+            with open(sce) as file:     
+                nsce = sum(1 for line in file)
                         
-        # Regex patterns for output files
-        pattern = re.compile(r"^disp_\d{7}\.grd$")
-        patternll = re.compile(r"^disp_\d{7}_ll\.grd$")
-        
-        for root, _, files in os.walk(self.sdir):
-            for f in files:
-                if pattern.match(f):
-                    disp_files.append(os.path.join(root, f))
-                if patternll.match(f):
-                    disp_files_ll.append(os.path.join(root, f))
+        # Output files from the product catalog
+        disp_files = catalog.find(self.sdir, r"^disp_\d{7}\.grd$", reconcile=False)
+        disp_files_ll = catalog.find(self.sdir, r"^disp_\d{7}_ll\.grd$", reconcile=False)
 
         if len(disp_files_ll) == len(disp_files) and len(disp_files_ll) == nsce and nsce > 0:
             self.create_visualize()
@@ -209,113 +256,14 @@ class SBASApp(tk.Frame):
     def visualize_action(self):
         run_visualize_app(self.sdir)
 
-    def sb_prep(self, intf, btable, intfdir, uwp):    
-        if not os.path.exists('intf.tab') and not os.path.exists('scene.tab'):
-            subprocess.call(
-                f'prep_sbas.csh {intf} {btable} {intfdir} {uwp} corr.grd',
-                shell=True)
-                
-    def sb_inversion(self, sdir, paths, inc_angle, atm="", rms=" -rms", dem=" -dem", sbas="sbas", smooth=" -smooth 5.0"):
-        os.chdir(sdir)
-        pmerge = paths.get("pmerge")
-    
-        for key in ["pF1", "pF2", "pF3"]:
-            dir_path = paths.get(key)
-            if dir_path and os.path.exists(dir_path):
-                intf = os.path.join(dir_path, 'intf.in')
-                btable = os.path.join(dir_path, 'baseline_table.dat')
-                if pmerge and os.path.exists(pmerge):
-                    intfdir = pmerge
-                else:
-                    intfdir = os.path.join(dir_path, 'intf_all')
-                break
-        
-        # Determine unwrap file type
-        uwp = 'unwrap.grd'
-        for subfolder in os.listdir(intfdir):
-            if os.path.exists(os.path.join(intfdir, subfolder, 'unwrap_GACOS_corrected_detrended.grd')):
-                uwp = 'unwrap_GACOS_corrected_detrended.grd'
-                break
-        else:
-            # If no GACOS corrected files, check for unwrap_pin vs unwrap
-            uwps = [os.path.join(root, f) for root, _, files in os.walk(intfdir) for f in files if f == 'unwrap.grd']
-            uwpn = [os.path.join(root, f) for root, _, files in os.walk(intfdir) for f in files if f == 'unwrap_pin.grd']
-            if len(uwps) == len(uwpn):
-                uwp = "unwrap_pin.grd"
-            else:
-                uwp = "unwrap.grd"
-        
-        print(f"Creating required files for sbas using uwp: {uwp}, intf.in: {intf}, btable: {btable}, intfdir: {intfdir}")
-        
-        # Check if output files already exist before running prep
-        existing_disp_files = []
-        pattern = re.compile(r"^disp_\d{7}\.grd$")
-        for root, _, files in os.walk(sdir):
-            for f in files:
-                if pattern.match(f):
-                    existing_disp_files.append(os.path.join(root, f))
-        
-        if len(existing_disp_files) > 0:
-            confirm = messagebox.askyesno("SBAS Confirmation", 
-                                        f"Found {len(existing_disp_files)} existing displacement files. "
-                                        "SBAS seems to have already been completed. Redo the process?")
-            if not confirm:
-                print("Rerunning SBAS skipped by user.")
-                return
-        
-        # Always run sb_prep to create/update intf.tab and scene.tab
-        self.sb_prep(intf, btable, intfdir, uwp)
-
-        if os.path.exists('intf.tab') and os.path.exists('scene.tab'):
-            with open('intf.tab') as file:     
-                intf_count = sum(1 for line in file)
-            with open('intf.tab') as file:
-                for line in file:
-                    grd = line.strip().split()[0]
-                    break
-            with open('scene.tab') as file:
-                scene_count = sum(1 for line in file)
-
-            grdinfo = subprocess.check_output(f"gmt grdinfo {grd}", shell=True).decode().strip().split()
-            x = grdinfo.index('x')
-            y = grdinfo.index('y')
-            xval = grdinfo[x + 2]
-            yval = grdinfo[y + 2]
-            xmin = float(grdinfo[grdinfo.index('x_min:') + 1])
-            xmax = float(grdinfo[grdinfo.index('x_max:') + 1])
-            c = 3 * 10 ** 8
-            grdir = os.path.dirname(grd)
-            prm = next((os.path.join(rootx, f) for rootx, _, files in os.walk(grdir) for f in files if f.endswith('.PRM')), os.path.join(grdir, 'supermaster.PRM'))
-            with open(prm) as file:
-                for line in file:
-                    if 'near_range' in line:
-                        nr = float(line.split('=')[1].strip())
-                    if 'rng_samp_rate' in line:
-                        rs = float(line.split('=')[1].strip())
-                    if 'radar_wavelength' in line:
-                        rw = float(line.split('=')[1].strip())
-            range = c / rs / 2 * (xmin + xmax) / 2 + nr
-            print('Starting SBAS process')
-
-            sb_command = f"{sbas.lower()} intf.tab scene.tab {intf_count} {scene_count} {xval} {yval} -range {range} -incidence {inc_angle} -wavelength {rw} {smooth} {atm} {rms} {dem}".rstrip()
-
-            if sbas == 'sbas_parallel':
-                sb_command = sb_command + ' -mmap'
-            
-            print(sb_command)
-            run_command(sb_command)
-            print('SBAS process completed')
+    def sb_tables_stale(self, intf, intfdir, uwp):
+        return sb_tables_stale(intf, intfdir, uwp)
 
-            print('Projecting SBAS results to geographic coordinates')
-            velkml(sdir)
-            print('Velocity KML generation completed')
-            projgrd(sdir)
-            print('Projection completed')
-            
-            # Log completion of SBAS processing
-            if self.log_file:
-                process_logger(process_num=6, log_file=self.log_file, message="SBAS time series analysis completed.", mode="end")
+    def sb_prep(self, intf, btable, intfdir, uwp):
+        sb_prep(intf, btable, intfdir, uwp)
 
+    def sb_inversion(self, sdir, paths, inc_angle, atm="", rms=" -rms", dem=" -dem", sbas="sbas", smooth=" -smooth 5.0", ncores=None):
+        sb_inversion(sdir, paths, inc_angle, atm, rms, dem, sbas, smooth, log_file=self.log_file, ncores=ncores)
 
     def get_args(self):
         rms = "-rms" if self.rms_var.get() else ""
@@ -330,4 +278,170 @@ class SBASApp(tk.Frame):
             "smooth": smooth,
             "atm": atm,
             "sbas_mode": self.sbas_mode_var.get()
-        }
\ No newline at end of file
+        }
+
+
+def sb_corr_name(intfdir):
+    """Get the correlation grid name matching the unwrapped grids (cropped when an ROI is set)."""
+    return CROPPED_CORR if read_roi(intfdir) else 'corr.grd'
+
+
+def sb_unwrap_name(intfdir):
+    """Get the unwrapped grid name SBAS inverts: GACOS corrected, normalized (pinned) or plain."""
+    catalog = get_catalog(intfdir)
+    if catalog.count_pairs_with(intfdir, 'unwrap_GACOS_corrected_detrended.grd') > 0:
+        return 'unwrap_GACOS_corrected_detrended.grd'
+    # If no GACOS corrected files, check for unwrap_pin vs unwrap
+    uwps = catalog.count_pairs_with(intfdir, 'unwrap.grd', reconcile=False)
+    uwpn = catalog.count_pairs_with(intfdir, 'unwrap_pin.grd', reconcile=False)
+    return "unwrap_pin.grd" if uwps == uwpn else "unwrap.grd"
+
+
+def sb_tables_stale(intf, intfdir, uwp):
+    """
+    Check whether intf.tab/scene.tab miss pairs of the current network (e.g. after adding new scenes).
+
+    prep_sbas.csh lists every intf.in pair, so pairs that failed to unwrap do
+    not make the tables stale. They are stale when a listed pair left intf.in,
+    or when the pairs with the unwrapped grid that intf.tab omits are not
+    exactly the ones ifg_qc.csv excludes.
+    """
+    if not os.path.exists('intf.tab') or not os.path.exists('scene.tab'):
+        return False
+    with open('intf.tab') as file:
+        lines = [line for line in file if line.strip()]
+    # Tables made before the ROI was set or cleared list the other correlation grids
+    first = lines[0].split() if lines else []
+    if len(first) > 1 and os.path.basename(first[1]) != sb_corr_name(intfdir):
+        return True
+    listed = intf_tab_pairs('intf.tab')
+    network = read_intf_pairs(intf)
+    usable = network & get_catalog(intfdir).pairs_with(intfdir, uwp)
+    return bool(listed - network) or (usable - listed) != (usable & excluded_pairs(intfdir))
+
+
+def sb_prep(intf, btable, intfdir, uwp):    
+    if sb_tables_stale(intf, intfdir, uwp):
+        # Rebuild the tables so the new interferograms enter the inversion;
+        # all existing interferograms are reused as they are
+        print("intf.tab/scene.tab are out of date, recreating them for the updated stack")
+        os.remove('intf.tab')
+        os.remove('scene.tab')
+    if not os.path.exists('intf.tab') and not os.path.exists('scene.tab'):
+        corr = sb_corr_name(intfdir)
+        if corr == CROPPED_CORR:
+            # Unwrapped grids cover the ROI only; crop correlation to match
+            for pair in get_catalog(intfdir).pairs_with(intfdir, uwp):
+                ensure_cropped_corr(os.path.join(intfdir, pair))
+        subprocess.call(
+            f'prep_sbas.csh {intf} {btable} {intfdir} {uwp} {corr}',
+            shell=True)
+        # Leave out the pairs flagged by interferogram QC
+        dropped = filter_intf_tab('intf.tab', excluded_pairs(intfdir))
+        if dropped:
+            print(f"Left {dropped} interferograms flagged in {QC_TABLE} out of intf.tab")
+
+
+def sb_option_value(option, default):
+    """Get the value of an sbas option string such as '-smooth 5.0' (default if not given)."""
+    parts = (option or "").split()
+    return float(parts[1]) if len(parts) > 1 else default
+
+
+def sb_inversion(sdir, paths, inc_angle, atm="", rms=" -rms", dem=" -dem", sbas="sbas", smooth=" -smooth 5.0", log_file=None, ncores=None):
+    """
+    Prepare intf.tab/scene.tab, run the SBAS inversion and project the results to geographic coordinates.
+
+    sbas is 'sbas' or 'sbas_parallel' for the GMTSAR binaries, or 'python' for the
+    in-process blocked inversion (utils.sbas_engine) on ncores workers.
+    """
+    os.chdir(sdir)
+    pmerge = paths.get("pmerge")
+
+    for key in ["pF1", "pF2", "pF3"]:
+        dir_path = paths.get(key)
+        if dir_path and os.path.exists(dir_path):
+            intf = os.path.join(dir_path, 'intf.in')
+            btable = os.path.join(dir_path, 'baseline_table.dat')
+            if pmerge and os.path.exists(pmerge):
+                intfdir = pmerge
+            else:
+                intfdir = os.path.join(dir_path, 'intf_all')
+            break
+
+    uwp = sb_unwrap_name(intfdir)
+
+    print(f"Creating required files for sbas using uwp: {uwp}, intf.in: {intf}, btable: {btable}, intfdir: {intfdir}")
+
+    # Check if output files already exist before running prep
+    existing_disp_files = get_catalog(sdir).find(sdir, r"^disp_\d{7}\.grd$")
+
+    if len(existing_disp_files) > 0 and sb_tables_stale(intf, intfdir, uwp):
+        print(f"Found {len(existing_disp_files)} existing displacement files from a smaller stack, updating SBAS with the new interferograms")
+    elif len(existing_disp_files) > 0:
+        redo = confirm("sbas_redo", "SBAS Confirmation", 
+                       f"Found {len(existing_disp_files)} existing displacement files. "
+                       "SBAS seems to have already been completed. Redo the process?")
+        if not redo:
+            print("Rerunning SBAS skipped by user.")
+            return
+
+    # Always run sb_prep to create/update intf.tab and scene.tab
+    sb_prep(intf, btable, intfdir, uwp)
+
+    if os.path.exists('intf.tab') and os.path.exists('scene.tab'):
+        with open('intf.tab') as file:     
+            intf_count = sum(1 for line in file)
+        with open('intf.tab') as file:
+            for line in file:
+                grd = line.strip().split()[0]
+                break
+        with open('scene.tab') as file:
+            scene_count = sum(1 for line in file)
+
+        grdinfo = subprocess.check_output(f"gmt grdinfo {grd}", shell=True).decode().strip().split()
+        x = grdinfo.index('x')
+        y = grdinfo.index('y')
+        xval = grdinfo[x + 2]
+        yval = grdinfo[y + 2]
+        xmin = float(grdinfo[grdinfo.index('x_min:') + 1])
+        xmax = float(grdinfo[grdinfo.index('x_max:') + 1])
+        c = 3 * 10 ** 8
+        grdir = os.path.dirname(grd)
+        prm = next((os.path.join(rootx, f) for rootx, _, files in os.walk(grdir) for f in files if f.endswith('.PRM')), os.path.join(grdir, 'supermaster.PRM'))
+        with open(prm) as file:
+            for line in file:
+                if 'near_range' in line:
+                    nr = float(line.split('=')[1].strip())
+                if 'rng_samp_rate' in line:
+                    rs = float(line.split('=')[1].strip())
+                if 'radar_wavelength' in line:
+                    rw = float(line.split('=')[1].strip())
+        range = c / rs / 2 * (xmin + xmax) / 2 + nr
+        print('Starting SBAS process')
+
+        if sbas == 'python':
+            from ..utils.sbas_engine import run_sbas_inversion
+
+            run_sbas_inversion(sdir, wavelength=rw, slant_range=range, incidence=float(inc_angle),
+                               smooth=sb_option_value(smooth, 0.0), atm=int(sb_option_value(atm, 0)),
+                               rms=bool(rms.strip()), dem=bool(dem.strip()), ncores=ncores)
+        else:
+            sb_command = f"{sbas.lower()} intf.tab scene.tab {intf_count} {scene_count} {xval} {yval} -range {range} -incidence {inc_angle} -wavelength {rw} {smooth} {atm} {rms} {dem}".rstrip()
+
+            if sbas == 'sbas_parallel':
+                sb_command = sb_command + ' -mmap'
+
+            print(sb_command)
+            run_command(sb_command)
+        print('SBAS process completed')
+
+        print('Projecting SBAS results to geographic coordinates')
+        velkml(sdir)
+        print('Velocity KML generation completed')
+        projgrd(sdir)
+        print('Projection completed')
+
+        # Log completion of SBAS processing
+        if log_file:
+            process_logger(process_num=6, log_file=log_file, message="SBAS time series analysis completed.", mode="end")
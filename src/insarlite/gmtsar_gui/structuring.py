@@ -1,7 +1,10 @@
 import os
+import glob
+import json
 import shutil
 import subprocess
 from ..utils.utils import subset_safe_dirs, create_symlink
+from ..utils.burst_selection import read_burst_footprints, select_bursts
 
 """
 This script is used to create a directory structure and copy files appropriately based on user inputs.
@@ -104,7 +107,86 @@ def generate_paths(output_dir, project_name, node, subswath_list):
             paths = {k: v for k, v in paths.items() if key not in k}
     return paths
 
-def orchestrate_structure_and_copy(output_dir, project_name, node, subswath_option, dem_file, pin_file, in_data_dir, btconfig, polarization, stdate=None, endate=None, console_text=None, log_file_path=None):
+def subset_raw_bursts(raw_dir, aoi, margin=0.05):
+    """
+    Crop the subswath inputs in a raw folder to the bursts covering an AOI.
+    
+    Each symlinked TIFF/XML pair is replaced by the output of GMTSAR's
+    assemble_tops holding only the bursts that intersect the AOI plus a
+    margin (file stems are kept, so data.in stays valid). Inputs that are
+    already cropped, fully inside the AOI, or that cannot be cropped are
+    left as they are.
+    
+    Parameters:
+        raw_dir (str): Subswath raw folder with symlinked *.tiff/*.xml files
+        aoi (dict): Area of interest {'w','e','s','n'} in degrees
+        margin (float): Margin around the AOI in degrees
+    
+    Returns:
+        dict: Selected (first, last) burst range and burst count per file stem
+    """
+    if not shutil.which("assemble_tops"):
+        print("assemble_tops not found; processing full subswaths")
+        return {}
+    
+    selection = {}
+    src_dir = os.path.join(raw_dir, "burst_src")
+    for tiff in sorted(glob.glob(os.path.join(raw_dir, "*.tiff"))):
+        stem = os.path.splitext(os.path.basename(tiff))[0]
+        xml = os.path.join(raw_dir, stem + ".xml")
+        if not (os.path.islink(tiff) and os.path.islink(xml)):
+            continue  # Already cropped (regular files) or incomplete
+        try:
+            footprints = read_burst_footprints(os.path.realpath(xml))
+        except Exception as e:
+            print(f"Could not read burst geolocation of {stem}: {e}")
+            continue
+        bursts = select_bursts(footprints, aoi, margin)
+        if bursts is None:
+            print(f"  {stem}: no burst intersects the AOI, keeping all {len(footprints)} bursts")
+            continue
+        first, last = bursts
+        if last - first + 1 == len(footprints):
+            continue
+        
+        # assemble_tops keeps the bursts covering the given azimuth lines (burst centers)
+        lines_per_burst = footprints[0]['last_line'] + 1
+        azi_1 = footprints[first]['first_line'] + lines_per_burst // 2
+        azi_2 = footprints[last]['first_line'] + lines_per_burst // 2
+        os.makedirs(src_dir, exist_ok=True)
+        src_stem = os.path.join(src_dir, stem)
+        for ext, link in ((".tiff", tiff), (".xml", xml)):
+            if os.path.lexists(src_stem + ext):
+                os.unlink(src_stem + ext)
+            os.symlink(os.path.realpath(link), src_stem + ext)
+            os.unlink(link)
+        result = subprocess.run(["assemble_tops", str(azi_1), str(azi_2), src_stem, stem],
+                                cwd=raw_dir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0 or not os.path.exists(tiff) or not os.path.exists(xml):
+            print(f"  {stem}: burst cropping failed, keeping full subswath ({result.stderr.strip()[:200]})")
+            for ext, link in ((".tiff", tiff), (".xml", xml)):
+                if os.path.lexists(link):
+                    os.remove(link)
+                os.symlink(os.path.realpath(src_stem + ext), link)
+            continue
+        selection[stem] = {"first": first, "last": last, "total": len(footprints)}
+        print(f"  {stem}: kept bursts {first + 1}-{last + 1} of {len(footprints)}")
+    
+    if selection:
+        record_path = os.path.join(raw_dir, "burst_selection.json")
+        try:
+            previous = {}
+            if os.path.exists(record_path):
+                with open(record_path, "r") as f:
+                    previous = json.load(f).get("files", {})
+            previous.update(selection)
+            with open(record_path, "w") as f:
+                json.dump({"aoi": aoi, "margin": margin, "files": previous}, f, indent=2)
+        except Exception as e:
+            print(f"Could not record burst selection: {e}")
+    return selection
+
+def orchestrate_structure_and_copy(output_dir, project_name, node, subswath_option, dem_file, pin_file, in_data_dir, btconfig, polarization, stdate=None, endate=None, console_text=None, log_file_path=None, aoi=None, burst_margin=0.05):
 
     # Generate and create the directory structure for the project and get the paths to be used later
     structure = generate_structure(project_name, node, subswath_option)
@@ -143,6 +225,9 @@ def orchestrate_structure_and_copy(output_dir, project_name, node, subswath_opti
             create_symlink(dem_file, os.path.join(dir_path, "raw", os.path.basename(dem_file)))
             subprocess.call(f'ln -s {os.path.join(os.path.dirname(dir_path), "data")}/*.SAFE/*/*iw{key[-1]}*{polarization}*xml {os.path.join(dir_path, "raw")}', shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)    
             subprocess.call(f'ln -s {os.path.join(os.path.dirname(dir_path), "data")}/*.SAFE/*/*iw{key[-1]}*{polarization}*tiff {os.path.join(dir_path, "raw")}', shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            if aoi:
+                print(f"Selecting F{key[-1]} bursts covering the AOI...")
+                subset_raw_bursts(os.path.join(dir_path, "raw"), aoi, burst_margin)
     print("Copied files and created symlinks as required")
     return paths, structure  
 
@@ -1,18 +1,15 @@
 import os
-import subprocess
 import threading
 import tkinter as tk
 from tkinter import messagebox
-from multiprocessing.pool import ThreadPool
-from datetime import datetime
 
-from ..gmtsar_gui.mask import GrdViewer
-from ..gmtsar_gui.ref_point import ReferencePointGUI
 from ..gmtsar_gui.gacos_atm_corr import gacos
-from ..utils.utils import execute_command, add_tooltip, process_logger, process_logger_consolidated
+from ..gmtsar_gui.unwrap_processing import UnwrapProcessing
+from ..utils.utils import add_tooltip, process_logger
+from ..utils.product_catalog import get_catalog
 
 
-class UnwrapApp(tk.Frame):
+class UnwrapApp(tk.Frame, UnwrapProcessing):
     def __init__(self, parent, ifgsroot, ifgs, gacosdir, log_file=None):
         super().__init__(parent)
         parent.title("UnwrapApp")
@@ -27,16 +24,13 @@ class UnwrapApp(tk.Frame):
         if not self.ifgs and self.ifgsroot and os.path.exists(self.ifgsroot):
             print("IFGs list is empty, scanning for all interferogram directories...")
             try:
-                all_dirs = next(os.walk(self.ifgsroot))[1]
                 # Filter for valid interferogram directories (contain phasefilt.grd or unwrap.grd)
-                self.ifgs = []
-                for d in all_dirs:
-                    ifg_dir = os.path.join(self.ifgsroot, d)
-                    if (os.path.exists(os.path.join(ifg_dir, "phasefilt.grd")) or 
-                        os.path.exists(os.path.join(ifg_dir, "unwrap.grd"))):
-                        self.ifgs.append(d)
+                catalog = get_catalog(self.ifgsroot)
+                valid_dirs = (catalog.pairs_with(self.ifgsroot, "phasefilt.grd") |
+                              catalog.pairs_with(self.ifgsroot, "unwrap.grd", reconcile=False))
+                self.ifgs = sorted(valid_dirs)
                 print(f"Found {len(self.ifgs)} interferogram directories by scanning")
-            except StopIteration:
+            except Exception:
                 print("Could not scan interferogram directory")
                 self.ifgs = []
         
@@ -53,14 +47,15 @@ class UnwrapApp(tk.Frame):
         print(f"Number of interferograms to check: {len(self.ifgs)}")
         
         # Check if interferograms are already unwrapped
+        unwrapped = get_catalog(self.ifgsroot).pairs_with(self.ifgsroot, "unwrap.grd") if self.ifgs else set()
         unwrapped_count = 0
         for i, ifg in enumerate(self.ifgs):
-            ifg_dir = os.path.join(self.ifgsroot, ifg)
-            unwrap_file = os.path.join(ifg_dir, "unwrap.grd")
-            if os.path.exists(unwrap_file):
+            unwrap_file = os.path.join(self.ifgsroot, ifg, "unwrap.grd")
+            exists = os.path.basename(os.path.normpath(ifg)) in unwrapped
+            if exists:
                 unwrapped_count += 1
             if i < 3:  # Show first few for debugging
-                print(f"Checking: {unwrap_file} - {'EXISTS' if os.path.exists(unwrap_file) else 'MISSING'}")
+                print(f"Checking: {unwrap_file} - {'EXISTS' if exists else 'MISSING'}")
         
         print(f"Found {unwrapped_count} unwrapped interferograms out of {len(self.ifgs)}")
         
@@ -89,7 +84,7 @@ class UnwrapApp(tk.Frame):
         
         self.btn_mask = tk.Button(mask_frame, text="Define Mask", command=self.define_mask)
         self.btn_mask.pack(side="left", padx=5)
-        add_tooltip(self.btn_mask, "Create or load a coherence mask\nMasks out low coherence areas before unwrapping\nButton color indicates status:\n• Red: No mask defined\n• Green: Mask defined")
+        add_tooltip(self.btn_mask, "Create or load a coherence mask\nMasks out low coherence areas before unwrapping\nOptionally set a region of interest to unwrap only that area\nButton color indicates status:\n• Red: No mask defined\n• Green: Mask defined")
         
         # Delete Mask button (initially disabled)
         self.btn_delete_mask = tk.Button(mask_frame, text="Delete Mask", command=self.delete_mask, state=tk.DISABLED)
@@ -205,7 +200,8 @@ class UnwrapApp(tk.Frame):
                 self._focus_window()
                 return
         
-        # Open viewer to create mask
+        # Open viewer to create mask (imported here: it pulls in matplotlib)
+        from ..gmtsar_gui.mask import GrdViewer
         viewer = GrdViewer(self.winfo_toplevel(), grd_file)
         self.wait_window(viewer)
         
@@ -213,6 +209,7 @@ class UnwrapApp(tk.Frame):
         self._set_button_state(os.path.exists(mask_path))
 
     def define_reference_point(self):
+        from ..gmtsar_gui.ref_point import ReferencePointGUI
         topodir = self.topodir
         dem = os.path.join(topodir, "dem.grd")
         ra_file = os.path.join(topodir, "ref_point.ra")
@@ -323,6 +320,13 @@ class UnwrapApp(tk.Frame):
         cores_entry.pack(side="left", padx=5)
         add_tooltip(cores_entry, f"Number of CPU cores for parallel processing\nAvailable cores: {os.cpu_count()}\nRecommended: Leave 1 core for system")
 
+        # SNAPHU tiling
+        if not hasattr(self, 'tiling_var'):
+            self.tiling_var = tk.BooleanVar(value=True)
+        tiling_check = tk.Checkbutton(row_frame, text="Tile large grids", variable=self.tiling_var)
+        tiling_check.pack(side="left", padx=(15, 0))
+        add_tooltip(tiling_check, "Unwrap large grids in SNAPHU tiles on several cores\nUsed when fewer interferograms than cores remain\nSmall grids are always unwrapped one core each")
+
         # Run Phase 1 button
         self.phase1_btn = tk.Button(self.controls_inner_frame, text="Run Phase 1: Unwrap + Create Validity", 
                                   command=self.run_phase1_unwrapping_ui, bg="orange")
@@ -472,6 +476,8 @@ class UnwrapApp(tk.Frame):
     def run_phase1_unwrapping(self, threshold, ncores):
         """Phase 1: Unwrapping and validity raster creation"""
         
+        tiling = self.tiling_var.get() if getattr(self, 'tiling_var', None) is not None else True
+
         # Log the start of unwrapping
         if self.log_file:
             process_logger(process_num=5, log_file=self.log_file, message="Starting phase unwrapping sequence (Phase 1: Unwrapping)...", mode="start")
@@ -482,7 +488,7 @@ class UnwrapApp(tk.Frame):
                 if self.log_file:
                     process_logger(process_num=5.1, log_file=self.log_file, message="Starting parallel phase unwrapping process...", mode="start")
                 print("Starting unwrapping in parallel...")
-                self.parall_unwrap(threshold, ncores)
+                self.parall_unwrap(threshold, ncores, tiling=tiling)
                 if self.log_file:
                     process_logger(process_num=5.1, log_file=self.log_file, message="Parallel phase unwrapping process completed.", mode="end")
                 
@@ -634,304 +640,6 @@ class UnwrapApp(tk.Frame):
             gacos(self.gacosdir, self.topodir, self.incidence, self.ifgsroot, self.ncores, log_file=self.log_file)
         
 
-    def post_unwrap(self, ifgsroot=None):
-        base_unwrap = []
-        ifgsroot = self.ifgsroot if self.ifgsroot else ifgsroot
-        topo_dir = self.topodir
-        ref_point_ra = os.path.join(topo_dir, "ref_point.ra")
-        line = None
-        print(f"Reading reference point from {ref_point_ra}...")
-        if os.path.exists(ref_point_ra):
-            with open(ref_point_ra, 'r') as f:
-                line = f.readline().strip()
-        if not line:
-            print("Reference point not found.")
-            return
-
-        for root, dirs, _ in os.walk(ifgsroot):
-            for dirname in dirs:
-                d = os.path.join(root, dirname)
-                if os.path.isdir(d):
-                    uwp = os.path.join(d, "unwrap.grd")
-                    base_unwrap.append(uwp)
-
-        parts = line.split()
-        if len(parts) >= 2:
-            x, y = parts[0], parts[1]
-        else:
-            x, y = None, None
-
-        def process_unwrap_with_logging(unwrap_tuple):
-            unwrap, ifg_index = unwrap_tuple
-            process_num = f"5.2.{ifg_index}"  # 5.2.1, 5.2.2, etc.
-            ifg_name = os.path.basename(os.path.dirname(unwrap))
-            
-            start_time = datetime.now()
-            
-            out = os.path.join(os.path.dirname(unwrap), "unwrap_pin.grd")
-            if not os.path.exists(out):
-                try:
-                    # Use grdtrack to extract value at reference point
-                    # -Z outputs only the value, no coordinates
-                    result = subprocess.run(
-                        ["gmt", "grdtrack", ref_point_ra, f"-G{unwrap}", "-Z"],
-                        text=True,
-                        capture_output=True,
-                        check=True
-                    )
-                    
-                    phase_value_str = result.stdout.strip()
-                    
-                    # Check if the result is NaN or invalid
-                    if not phase_value_str or phase_value_str.lower() == 'nan' or phase_value_str == '*':
-                        print(f"Reference point is not valid in {ifg_name} (NaN/masked area). Skipping normalization.")
-                        if self.log_file:
-                            process_logger_consolidated(
-                                process_num=process_num, 
-                                message=f"Normalization for {ifg_name} skipped - invalid reference point (NaN/masked)", 
-                                log_file=self.log_file,
-                                start_time=start_time
-                            )
-                        return
-                    
-                    a = float(phase_value_str)
-                    
-                    # Perform normalization by subtracting reference value
-                    subprocess.run([
-                        "gmt", "grdmath", str(unwrap), str(a), "SUB", "=", str(out)
-                    ], check=True)
-                    
-                    print(f"{ifg_name} normalized through Reference Point (ref value: {a:.4f})")
-                    if self.log_file:
-                        process_logger_consolidated(
-                            process_num=process_num, 
-                            message=f"Normalization for interferogram {ifg_name} completed successfully (ref value: {a:.4f})", 
-                            log_file=self.log_file,
-                            start_time=start_time
-                        )
-                except Exception as e:
-                    print(f"Error processing {unwrap}: {e}")
-                    if self.log_file:
-                        process_logger_consolidated(
-                            process_num=process_num, 
-                            message=f"Normalization for {ifg_name} failed: {str(e)}", 
-                            log_file=self.log_file,
-                            start_time=start_time
-                        )
-            else:
-                print(f"{ifg_name} already normalized.")
-                if self.log_file:
-                    process_logger_consolidated(
-                        process_num=process_num, 
-                        message=f"Normalization for {ifg_name} skipped - already normalized", 
-                        log_file=self.log_file,
-                        start_time=start_time
-                    )
-
-        # Create tuples with indices for logging
-        unwrap_tuples = [(unwrap, i+1) for i, unwrap in enumerate(base_unwrap)]
-        
-        with ThreadPool(processes=self.ncores) as pool:
-            pool.map(process_unwrap_with_logging, unwrap_tuples)
-
-    def parall_unwrap(self, threshold, ncores):
-        intfdir = self.ifgsroot
-        IFGs = self.ifgs if self.ifgs else [
-            os.path.join(intfdir, d)
-            for d in next(os.walk(intfdir))[1]
-            if os.path.exists(os.path.join(intfdir, d, 'phasefilt.grd'))
-        ]
-        
-        # Count total IFGs and existing unwrapped IFGs
-        total_ifgs = len(IFGs)
-        existing_unwrap = []
-        for ifg_dir in IFGs:
-            unwrap_file = os.path.join(ifg_dir, "unwrap.grd")
-            if os.path.exists(unwrap_file):
-                existing_unwrap.append(unwrap_file)
-        
-        existing_count = len(existing_unwrap)
-        validity_exists = os.path.exists(os.path.join(self.ifgsroot, "validity_pin.grd"))
-        
-        print(f"Total IFGs to process: {total_ifgs}")
-        print(f"Already unwrapped: {existing_count}")
-        print(f"Validity raster exists: {validity_exists}")
-        
-        # Determine what needs to be done
-        if existing_count == total_ifgs:
-            if validity_exists:
-                print("All interferograms already unwrapped and validity raster exists. Skipping process 5.1.")
-                return
-            else:
-                print("All interferograms unwrapped but validity raster missing. Creating validity raster only.")
-                self.create_validity_raster()
-                return
-        elif existing_count > 0:
-            print(f"Partial unwrapping detected: {existing_count}/{total_ifgs} interferograms unwrapped.")
-            print("Continuing with remaining interferograms...")
-        
-        # Filter IFGs to only process those not yet unwrapped
-        IFGs_to_unwrap = [
-            ifg_dir for ifg_dir in IFGs 
-            if not os.path.exists(os.path.join(ifg_dir, "unwrap.grd"))
-        ]
-        
-        os.chdir(intfdir)
-        mask_path = os.path.join(intfdir, "mask_def.grd")
-        if os.path.exists(mask_path):
-            for subdir in IFGs_to_unwrap:
-                link_path = os.path.join(subdir, "mask_def.grd")
-                if not os.path.exists(link_path):
-                    try:
-                        os.symlink(mask_path, link_path)
-                    except FileExistsError:
-                        pass
-        
-        print(f"Number of IFGs to be unwrapped: {len(IFGs_to_unwrap)}/{total_ifgs}")
-        
-        if not IFGs_to_unwrap:
-            print("No additional IFGs to unwrap.")
-            # Check if validity raster needs to be created
-            if not validity_exists:
-                print("Creating validity raster...")
-                self.create_validity_raster()
-            return
-
-        # Build unwrap commands
-        unwrap_commands = []
-        for i, ifg_dir in enumerate(IFGs_to_unwrap, 1):
-            cmd = f"cd {ifg_dir} && snaphu_interp.csh {threshold} 0"            
-            cmd += " && cd .."
-            unwrap_commands.append((cmd, i))  # Include index for logging
-
-        # Create wrapper function for logged execution
-        def execute_with_logging(cmd_tuple):
-            cmd, ifg_index = cmd_tuple
-            process_num = f"5.1.{ifg_index}"  # 5.1.1, 5.1.2, etc.
-            ifg_name = os.path.basename(IFGs_to_unwrap[ifg_index - 1])
-            
-            start_time = datetime.now()
-            
-            try:
-                execute_command(cmd)
-                if self.log_file:
-                    process_logger_consolidated(
-                        process_num=process_num, 
-                        message=f"Unwrapping for interferogram {ifg_name} completed successfully", 
-                        log_file=self.log_file,
-                        start_time=start_time
-                    )
-            except Exception as e:
-                if self.log_file:
-                    process_logger_consolidated(
-                        process_num=process_num, 
-                        message=f"Unwrapping for interferogram {ifg_name} failed: {str(e)}", 
-                        log_file=self.log_file,
-                        start_time=start_time
-                    )
-                raise
-
-        with ThreadPool(processes=ncores) as pool:
-            pool.map(execute_with_logging, unwrap_commands)
-        
-        # Create validity raster after all unwrapping is complete
-        self.create_validity_raster()
-
-    def create_validity_raster(self):
-        """Create validity_pin.grd showing count of valid pixels across all unwrapped interferograms"""
-        validity_path = os.path.join(self.ifgsroot, "validity_pin.grd")
-        
-        if os.path.exists(validity_path):
-            print(f"Validity raster already exists: {validity_path}")
-            return
-        
-        # Find all unwrap.grd files using the known interferogram list
-        unwrap_files = []
-        for ifg in self.ifgs:
-            unwrap_file = os.path.join(self.ifgsroot, ifg, "unwrap.grd")
-            if os.path.exists(unwrap_file):
-                unwrap_files.append(unwrap_file)
-        
-        print(f"Found {len(unwrap_files)} unwrapped interferogram files from known ifg list")
-        
-        if not unwrap_files:
-            print("No unwrapped interferograms found for validity raster creation")
-            return
-        
-        print(f"Creating validity raster from {len(unwrap_files)} unwrapped interferograms...")
-        
-        try:
-            # Create binary masks in parallel
-            mask_files = []
-            mask_commands = []
-            
-            for i, uwp_file in enumerate(unwrap_files):
-                mask_file = os.path.join(os.path.dirname(uwp_file), f"temp_valid_mask_{i}.grd")
-                mask_files.append(mask_file)
-                # Create binary mask: 1 where data exists, 0 where NaN
-                cmd = f"gmt grdmath {uwp_file} ISNAN 0 EQ = {mask_file}"
-                mask_commands.append(cmd)
-            
-            # Execute mask creation in parallel with progress tracking
-            print(f"Creating {len(mask_commands)} binary masks using {self.ncores} cores...")
-            try:
-                with ThreadPool(processes=min(self.ncores, 4)) as pool:  # Limit cores to prevent overload
-                    results = pool.map(execute_command, mask_commands)
-                print("Binary mask creation completed")
-            except Exception as e:
-                print(f"Error in parallel mask creation: {e}")
-                raise
-            
-            # Sum all masks to create validity count
-            print("Combining binary masks...")
-            if len(mask_files) == 1:
-                # Only one file, just copy it
-                import shutil
-                print("Single mask file - copying to validity raster")
-                shutil.copy2(mask_files[0], validity_path)
-            else:
-                # Start with first mask (copy it)
-                import shutil
-                print("Starting with first mask file")
-                shutil.copy2(mask_files[0], validity_path)
-                
-                # Add remaining masks
-                print(f"Adding {len(mask_files)-1} remaining masks...")
-                for i, mask_file in enumerate(mask_files[1:], 1):
-                    if i % 10 == 0:  # Progress every 10 files
-                        print(f"Processing mask {i}/{len(mask_files)-1}")
-                    temp_path = os.path.join(self.ifgsroot, "temp_validity.grd")
-                    try:
-                        subprocess.run([
-                            "gmt", "grdmath", validity_path, mask_file, "ADD", "=", temp_path
-                        ], check=True, capture_output=True)
-                        # Replace the original validity file with the sum
-                        shutil.move(temp_path, validity_path)
-                    except subprocess.CalledProcessError as e:
-                        print(f"Error adding mask {mask_file}: {e}")
-                        if os.path.exists(temp_path):
-                            os.remove(temp_path)
-                        raise
-            
-            # Cleanup temporary mask files
-            for mask_file in mask_files:
-                try:
-                    os.remove(mask_file)
-                except:
-                    pass
-            
-            print(f"Validity raster created successfully: {validity_path}")
-            print(f"Pixel values range from 0 to {len(unwrap_files)} representing number of valid observations")
-            
-        except Exception as e:
-            print(f"Error creating validity raster: {e}")
-            # Cleanup on error
-            for mask_file in mask_files:
-                try:
-                    os.remove(mask_file)
-                except:
-                    pass
-
     def _create_validity_raster_only(self):
         """Create validity raster for already unwrapped interferograms"""
         try:
@@ -0,0 +1,492 @@
+"""
+Unwrapping, normalization and validity raster processing for InSARLite.
+Kept free of Tk and matplotlib imports so the headless pipeline runner can
+use it; UnwrapApp adds the interface on top.
+"""
+
+import os
+import subprocess
+import shutil
+import threading
+from multiprocessing.pool import ThreadPool
+from datetime import datetime
+
+from ..utils.process_utils import execute_command, process_logger_consolidated, format_time
+from ..utils.cost_model import JobCostModel, get_grid_pixels, get_temporal_baseline
+from ..utils.product_catalog import get_catalog
+from ..utils.stage_cache import inputs_hash, read_stamp, write_stamp
+from ..utils.roi import CROPPED_CORR, read_roi, roi_region, roi_fraction, ensure_cropped_corr
+from ..utils.memory_planner import MemoryGovernor, plan_workers
+from ..utils.snaphu_tiling import CoreBudget, unwrap_grid_shape, max_tile_procs, tile_options, write_tiled_script
+
+# Products derived from unwrap.grd that take its extent (and so depend on the ROI)
+ROI_DEPENDENT_PRODUCTS = ["unwrap.grd", "unwrap_pin.grd", CROPPED_CORR,
+                          "unwrap_GACOS_corrected.grd", "unwrap_GACOS_corrected_detrended.grd"]
+
+
+class UnwrapProcessing:
+    """
+    Unwrapping, normalization and validity raster processing without UI.
+
+    Expects ifgsroot, ifgs, topodir, ncores and log_file attributes; shared by
+    UnwrapApp and the headless pipeline runner.
+    """
+
+    def post_unwrap(self, ifgsroot=None):
+        base_unwrap = []
+        ifgsroot = self.ifgsroot if self.ifgsroot else ifgsroot
+        topo_dir = self.topodir
+        ref_point_ra = os.path.join(topo_dir, "ref_point.ra")
+        line = None
+        print(f"Reading reference point from {ref_point_ra}...")
+        if os.path.exists(ref_point_ra):
+            with open(ref_point_ra, 'r') as f:
+                line = f.readline().strip()
+        if not line:
+            print("Reference point not found.")
+            return
+
+        catalog = get_catalog(ifgsroot)
+        for dirname in catalog.subdirs(ifgsroot):
+            uwp = os.path.join(ifgsroot, dirname, "unwrap.grd")
+            base_unwrap.append(uwp)
+
+        parts = line.split()
+        if len(parts) >= 2:
+            x, y = parts[0], parts[1]
+        else:
+            x, y = None, None
+
+        roi = read_roi(ifgsroot)
+        if roi and x is not None and not (roi['x0'] <= float(x) <= roi['x1'] and roi['y0'] <= float(y) <= roi['y1']):
+            print(f"Warning: Reference point ({x}, {y}) lies outside the ROI {roi_region(roi)}; "
+                  "normalization will be skipped for all interferograms. Select a reference point inside the ROI.")
+
+        def process_unwrap_with_logging(unwrap_tuple):
+            unwrap, ifg_index = unwrap_tuple
+            process_num = f"5.2.{ifg_index}"  # 5.2.1, 5.2.2, etc.
+            ifg_name = os.path.basename(os.path.dirname(unwrap))
+            
+            start_time = datetime.now()
+            
+            out = os.path.join(os.path.dirname(unwrap), "unwrap_pin.grd")
+            if not os.path.exists(out):
+                try:
+                    # Use grdtrack to extract value at reference point
+                    # -Z outputs only the value, no coordinates
+                    result = subprocess.run(
+                        ["gmt", "grdtrack", ref_point_ra, f"-G{unwrap}", "-Z"],
+                        text=True,
+                        capture_output=True,
+                        check=True
+                    )
+                    
+                    phase_value_str = result.stdout.strip()
+                    
+                    # Check if the result is NaN or invalid
+                    if not phase_value_str or phase_value_str.lower() == 'nan' or phase_value_str == '*':
+                        print(f"Reference point is not valid in {ifg_name} (NaN/masked area). Skipping normalization.")
+                        if self.log_file:
+                            process_logger_consolidated(
+                                process_num=process_num, 
+                                message=f"Normalization for {ifg_name} skipped - invalid reference point (NaN/masked)", 
+                                log_file=self.log_file,
+                                start_time=start_time
+                            )
+                        return
+                    
+                    a = float(phase_value_str)
+                    
+                    # Perform normalization by subtracting reference value
+                    subprocess.run([
+                        "gmt", "grdmath", str(unwrap), str(a), "SUB", "=", str(out)
+                    ], check=True)
+                    catalog.record(out)
+                    
+                    print(f"{ifg_name} normalized through Reference Point (ref value: {a:.4f})")
+                    if self.log_file:
+                        process_logger_consolidated(
+                            process_num=process_num, 
+                            message=f"Normalization for interferogram {ifg_name} completed successfully (ref value: {a:.4f})", 
+                            log_file=self.log_file,
+                            start_time=start_time
+                        )
+                except Exception as e:
+                    print(f"Error processing {unwrap}: {e}")
+                    if self.log_file:
+                        process_logger_consolidated(
+                            process_num=process_num, 
+                            message=f"Normalization for {ifg_name} failed: {str(e)}", 
+                            log_file=self.log_file,
+                            start_time=start_time
+                        )
+            else:
+                print(f"{ifg_name} already normalized.")
+                if self.log_file:
+                    process_logger_consolidated(
+                        process_num=process_num, 
+                        message=f"Normalization for {ifg_name} skipped - already normalized", 
+                        log_file=self.log_file,
+                        start_time=start_time
+                    )
+
+        # Create tuples with indices for logging
+        unwrap_tuples = [(unwrap, i+1) for i, unwrap in enumerate(base_unwrap)]
+        
+        workers = plan_workers("normalize", self.ncores, get_grid_pixels(base_unwrap[0]) if base_unwrap else None)
+        with ThreadPool(processes=workers) as pool:
+            pool.map(process_unwrap_with_logging, unwrap_tuples)
+
+    def parall_unwrap(self, threshold, ncores, tiling=True):
+        intfdir = self.ifgsroot
+        catalog = get_catalog(intfdir)
+        IFGs = self.ifgs if self.ifgs else [
+            os.path.join(intfdir, d)
+            for d in sorted(catalog.pairs_with(intfdir, 'phasefilt.grd'))
+        ]
+
+        # Unwrap only the region of interest when one is set; unwraps made
+        # with another ROI (or the full frame) have other extents and are redone
+        roi = read_roi(intfdir)
+        region = roi_region(roi)
+        if region:
+            print(f"Unwrapping within ROI (range/azimuth): {region}")
+        self._invalidate_roi_changes(IFGs, region, catalog)
+        
+        # Count total IFGs and existing unwrapped IFGs
+        total_ifgs = len(IFGs)
+        unwrapped = catalog.pairs_with(intfdir, "unwrap.grd")
+        existing_unwrap = [
+            os.path.join(ifg_dir, "unwrap.grd")
+            for ifg_dir in IFGs
+            if os.path.basename(os.path.normpath(ifg_dir)) in unwrapped
+        ]
+        
+        existing_count = len(existing_unwrap)
+        validity_exists = os.path.exists(os.path.join(self.ifgsroot, "validity_pin.grd"))
+        
+        print(f"Total IFGs to process: {total_ifgs}")
+        print(f"Already unwrapped: {existing_count}")
+        print(f"Validity raster exists: {validity_exists}")
+        
+        # Determine what needs to be done
+        if existing_count == total_ifgs:
+            if validity_exists:
+                print("All interferograms already unwrapped and validity raster exists. Skipping process 5.1.")
+                if self._read_validity_pairs() is not None:
+                    self.update_validity_raster()
+                return
+            else:
+                print("All interferograms unwrapped but validity raster missing. Creating validity raster only.")
+                self.create_validity_raster()
+                return
+        elif existing_count > 0:
+            print(f"Partial unwrapping detected: {existing_count}/{total_ifgs} interferograms unwrapped.")
+            print("Continuing with remaining interferograms...")
+        
+        # Filter IFGs to only process those not yet unwrapped
+        IFGs_to_unwrap = [
+            ifg_dir for ifg_dir in IFGs 
+            if os.path.basename(os.path.normpath(ifg_dir)) not in unwrapped
+        ]
+        
+        os.chdir(intfdir)
+        mask_path = os.path.join(intfdir, "mask_def.grd")
+        if os.path.exists(mask_path):
+            for subdir in IFGs_to_unwrap:
+                link_path = os.path.join(subdir, "mask_def.grd")
+                if not os.path.exists(link_path):
+                    try:
+                        os.symlink(mask_path, link_path)
+                    except FileExistsError:
+                        pass
+        
+        print(f"Number of IFGs to be unwrapped: {len(IFGs_to_unwrap)}/{total_ifgs}")
+        
+        if not IFGs_to_unwrap:
+            print("No additional IFGs to unwrap.")
+            # Check if validity raster needs to be created
+            if not validity_exists:
+                print("Creating validity raster...")
+                self.create_validity_raster()
+            return
+
+        # Start the most expensive unwraps first so large IFGs do not dominate the tail
+        cost_model = JobCostModel.for_path(intfdir)
+        fraction = roi_fraction(roi, os.path.join(intfdir, IFGs_to_unwrap[0], "phasefilt.grd"))
+        ifg_features = {}
+        for ifg_dir in IFGs_to_unwrap:
+            pixels = get_grid_pixels(os.path.join(intfdir, ifg_dir, "phasefilt.grd"))
+            ifg_features[ifg_dir] = (int(pixels * fraction) if pixels else pixels, get_temporal_baseline(ifg_dir))
+        IFGs_to_unwrap = cost_model.order_longest_first("unwrap", IFGs_to_unwrap, ifg_features.get)
+        pending = dict(ifg_features)
+        pending_lock = threading.Lock()
+
+        eta = cost_model.estimate_remaining("unwrap", pending.values(), ncores)
+        if eta is not None:
+            print(f"Estimated unwrapping time: {format_time(round(eta))}")
+
+        # Interferograms share one raster, so one shape decides how far a grid can be tiled.
+        # Cores are handed out as unwraps start: one per interferogram while many are
+        # waiting, SNAPHU tiles on several cores when fewer grids than cores are left
+        tiled_script = None
+        shape = None
+        max_procs = 1
+        if tiling and ncores > 1:
+            shape = unwrap_grid_shape(os.path.join(intfdir, IFGs_to_unwrap[0], "phasefilt.grd"), roi)
+            max_procs = max_tile_procs(shape, ncores)
+            if max_procs > 1:
+                tiled_script = write_tiled_script(os.path.abspath(intfdir))
+                if tiled_script is None:
+                    max_procs = 1
+                else:
+                    print(f"Large grids ({shape[0]}x{shape[1]}): unwrapping in tiles on up to {max_procs} cores "
+                          f"each when fewer interferograms than cores remain")
+        budget = CoreBudget(ncores, len(IFGs_to_unwrap))
+        # Unwraps start only while their estimated peak memory fits (SNAPHU on merged grids is OOM-prone)
+        governor = MemoryGovernor("unwrap", cost_model)
+
+        def unwrap_command(ifg_dir, nproc):
+            options = tile_options(shape, nproc) if tiled_script and nproc > 1 else ""
+            if options:
+                return f"cd {ifg_dir} && SNAPHU_TILE_OPTS='{options}' csh -f {tiled_script} {threshold} 0 {region}".rstrip()
+            return f"cd {ifg_dir} && snaphu_interp.csh {threshold} 0 {region}".rstrip()
+
+        unwrap_commands = [(ifg_dir, i) for i, ifg_dir in enumerate(IFGs_to_unwrap, 1)]  # Include index for logging
+
+        # Create wrapper function for logged execution
+        def execute_with_logging(job):
+            ifg_dir, ifg_index = job
+            process_num = f"5.1.{ifg_index}"  # 5.1.1, 5.1.2, etc.
+            ifg_name = os.path.basename(ifg_dir)
+            pixels, temporal_baseline = ifg_features[ifg_dir]
+            
+            # Wait for memory before taking cores, so unwraps waiting for memory do not hold cores
+            with governor.admit(pixels) as admission:
+                nproc = budget.acquire(max_procs)
+                start_time = datetime.now()
+                
+                try:
+                    result = governor.execute(unwrap_command(ifg_dir, nproc), pixels, job=admission)
+                    ifg_path = os.path.join(intfdir, ifg_dir)
+                    write_stamp(ifg_path, "unwrap", {"threshold": threshold, "roi": region},
+                                inputs_hash([os.path.join(ifg_path, "phasefilt.grd"), os.path.join(ifg_path, "corr.grd")]),
+                                "unwrap.grd")
+                    if region:
+                        ensure_cropped_corr(ifg_path)
+                    # Record core-seconds so tiled and untiled runs fit the same per-core model
+                    cost_model.record("unwrap", (datetime.now() - start_time).total_seconds() * nproc, pixels,
+                                      temporal_baseline, peak_rss=result["peak_rss"])
+                    with pending_lock:
+                        pending.pop(ifg_dir, None)
+                        remaining = list(pending.values())
+                    eta = cost_model.estimate_remaining("unwrap", remaining, ncores)
+                    eta_str = f", ETA {format_time(round(eta))}" if eta is not None else ""
+                    print(f"Unwrapped {len(IFGs_to_unwrap) - len(remaining)}/{len(IFGs_to_unwrap)} interferograms{eta_str}")
+                    if self.log_file:
+                        process_logger_consolidated(
+                            process_num=process_num, 
+                            message=f"Unwrapping for interferogram {ifg_name} completed successfully", 
+                            log_file=self.log_file,
+                            start_time=start_time
+                        )
+                except Exception as e:
+                    if self.log_file:
+                        process_logger_consolidated(
+                            process_num=process_num, 
+                            message=f"Unwrapping for interferogram {ifg_name} failed: {str(e)}", 
+                            log_file=self.log_file,
+                            start_time=start_time
+                        )
+                    raise
+                finally:
+                    budget.release(nproc)
+
+        # Record which interferograms an existing validity raster was made from
+        # before new ones are unwrapped, so only those are added to it afterwards
+        if validity_exists and self._read_validity_pairs() is None:
+            self._write_validity_pairs({os.path.basename(os.path.normpath(p)) for p in IFGs
+                                        if os.path.basename(os.path.normpath(p)) in unwrapped})
+
+        with ThreadPool(processes=max(1, min(ncores, len(unwrap_commands)))) as pool:
+            # chunksize=1 keeps the longest-first order when handing out jobs
+            list(pool.imap_unordered(execute_with_logging, unwrap_commands, chunksize=1))
+        
+        # Create validity raster after all unwrapping is complete, or add the new
+        # interferograms to the existing one (incremental stack update)
+        if validity_exists:
+            self.update_validity_raster()
+        else:
+            self.create_validity_raster()
+
+    def _invalidate_roi_changes(self, ifg_dirs, region, catalog):
+        """Remove unwrapping products made with a different ROI so they are made again."""
+        stale = []
+        for ifg_dir in ifg_dirs:
+            ifg_path = os.path.join(self.ifgsroot, ifg_dir)
+            if not os.path.exists(os.path.join(ifg_path, "unwrap.grd")):
+                continue
+            stamp = read_stamp(ifg_path, "unwrap")
+            made_with = stamp.get("params", {}).get("roi", "") if stamp else ""
+            if made_with != region:
+                stale.append(ifg_path)
+        if not stale:
+            return
+
+        print(f"{len(stale)} interferograms were unwrapped with a different ROI and will be unwrapped again")
+        for ifg_path in stale:
+            for name in ROI_DEPENDENT_PRODUCTS:
+                path = os.path.join(ifg_path, name)
+                if os.path.exists(path):
+                    os.remove(path)
+                    catalog.remove(path)
+        # The validity raster counts pixels on the old extent
+        for path in (os.path.join(self.ifgsroot, "validity_pin.grd"), self._validity_pairs_path()):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def create_validity_raster(self):
+        """Create validity_pin.grd showing count of valid pixels across all unwrapped interferograms"""
+        validity_path = os.path.join(self.ifgsroot, "validity_pin.grd")
+        
+        if os.path.exists(validity_path):
+            print(f"Validity raster already exists: {validity_path}")
+            return
+        
+        # Find all unwrap.grd files using the known interferogram list
+        unwrapped = get_catalog(self.ifgsroot).pairs_with(self.ifgsroot, "unwrap.grd")
+        unwrap_files = [
+            os.path.join(self.ifgsroot, ifg, "unwrap.grd")
+            for ifg in self.ifgs
+            if os.path.basename(os.path.normpath(ifg)) in unwrapped
+        ]
+        
+        print(f"Found {len(unwrap_files)} unwrapped interferogram files from known ifg list")
+        
+        if not unwrap_files:
+            print("No unwrapped interferograms found for validity raster creation")
+            return
+        
+        print(f"Creating validity raster from {len(unwrap_files)} unwrapped interferograms...")
+        
+        try:
+            # Create binary masks in parallel
+            mask_files = []
+            mask_commands = []
+            
+            for i, uwp_file in enumerate(unwrap_files):
+                mask_file = os.path.join(os.path.dirname(uwp_file), f"temp_valid_mask_{i}.grd")
+                mask_files.append(mask_file)
+                # Create binary mask: 1 where data exists, 0 where NaN
+                cmd = f"gmt grdmath {uwp_file} ISNAN 0 EQ = {mask_file}"
+                mask_commands.append(cmd)
+            
+            # Execute mask creation in parallel with progress tracking
+            workers = plan_workers("validity", self.ncores, get_grid_pixels(unwrap_files[0]))
+            print(f"Creating {len(mask_commands)} binary masks using {workers} cores...")
+            try:
+                with ThreadPool(processes=workers) as pool:
+                    results = pool.map(execute_command, mask_commands)
+                print("Binary mask creation completed")
+            except Exception as e:
+                print(f"Error in parallel mask creation: {e}")
+                raise
+            
+            # Sum all masks to create validity count
+            print("Combining binary masks...")
+            if len(mask_files) == 1:
+                # Only one file, just copy it
+                import shutil
+                print("Single mask file - copying to validity raster")
+                shutil.copy2(mask_files[0], validity_path)
+            else:
+                # Start with first mask (copy it)
+                import shutil
+                print("Starting with first mask file")
+                shutil.copy2(mask_files[0], validity_path)
+                
+                # Add remaining masks
+                print(f"Adding {len(mask_files)-1} remaining masks...")
+                for i, mask_file in enumerate(mask_files[1:], 1):
+                    if i % 10 == 0:  # Progress every 10 files
+                        print(f"Processing mask {i}/{len(mask_files)-1}")
+                    temp_path = os.path.join(self.ifgsroot, "temp_validity.grd")
+                    try:
+                        subprocess.run([
+                            "gmt", "grdmath", validity_path, mask_file, "ADD", "=", temp_path
+                        ], check=True, capture_output=True)
+                        # Replace the original validity file with the sum
+                        shutil.move(temp_path, validity_path)
+                    except subprocess.CalledProcessError as e:
+                        print(f"Error adding mask {mask_file}: {e}")
+                        if os.path.exists(temp_path):
+                            os.remove(temp_path)
+                        raise
+            
+            # Cleanup temporary mask files
+            for mask_file in mask_files:
+                try:
+                    os.remove(mask_file)
+                except:
+                    pass
+            
+            self._write_validity_pairs({os.path.basename(os.path.dirname(f)) for f in unwrap_files})
+            print(f"Validity raster created successfully: {validity_path}")
+            print(f"Pixel values range from 0 to {len(unwrap_files)} representing number of valid observations")
+            
+        except Exception as e:
+            print(f"Error creating validity raster: {e}")
+            # Cleanup on error
+            for mask_file in mask_files:
+                try:
+                    os.remove(mask_file)
+                except:
+                    pass
+
+    def _validity_pairs_path(self):
+        return os.path.join(self.ifgsroot, "validity_pin.pairs")
+
+    def _read_validity_pairs(self):
+        """Get the interferograms counted in validity_pin.grd, or None if unknown."""
+        path = self._validity_pairs_path()
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return {line.strip() for line in f if line.strip()}
+
+    def _write_validity_pairs(self, pairs):
+        with open(self._validity_pairs_path(), 'w') as f:
+            for pair in sorted(pairs):
+                f.write(pair + "\n")
+
+    def update_validity_raster(self):
+        """Add unwrapped interferograms not yet counted to an existing validity_pin.grd"""
+        validity_path = os.path.join(self.ifgsroot, "validity_pin.grd")
+        counted = self._read_validity_pairs()
+        if not os.path.exists(validity_path) or counted is None:
+            self.create_validity_raster()
+            return
+
+        unwrapped = get_catalog(self.ifgsroot).pairs_with(self.ifgsroot, "unwrap.grd")
+        new_pairs = sorted(unwrapped - counted)
+        if not new_pairs:
+            print("Validity raster is up to date")
+            return
+
+        print(f"Adding {len(new_pairs)} new unwrapped interferograms to the validity raster...")
+        temp_path = os.path.join(self.ifgsroot, "temp_validity.grd")
+        try:
+            for pair in new_pairs:
+                uwp_file = os.path.join(self.ifgsroot, pair, "unwrap.grd")
+                subprocess.run([
+                    "gmt", "grdmath", validity_path, uwp_file, "ISNAN", "0", "EQ", "ADD", "=", temp_path
+                ], check=True, capture_output=True)
+                shutil.move(temp_path, validity_path)
+                counted.add(pair)
+        except subprocess.CalledProcessError as e:
+            print(f"Error updating validity raster: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        finally:
+            self._write_validity_pairs(counted)
+        print(f"Validity raster updated: {len(counted)} interferograms counted")
@@ -1,4 +1,5 @@
 import os
+import sys
 import math
 import threading
 import datetime
@@ -44,9 +45,9 @@ from .utils.utils import (
     check_alignment_completion_status, check_ifgs_completion, check_merge_completion, process_logger, add_tooltip
 )
 from .utils.file_operations import (
-    clamp, get_safe_and_zip_files, are_files_identical,
+    clamp, are_files_identical,
     extract_extent_from_zip_manifests, extract_zip_files_with_progress,
-    summarize_polarizations_from_files
+    summarize_polarizations_from_files, get_dates_from_zip_files
 )
 from .utils.gui_helpers import (
     validate_float, validate_dates_gentle, enforce_extent_limits,
@@ -365,11 +366,9 @@ class InSARLiteApp:
         if data_folder:
             self.data_folder_entry.delete(0, 'end')
             self.data_folder_entry.insert(0, data_folder)
-            # Trigger data folder change to create DEM controls
-            self._on_data_folder_change()
-            
-            # Use root.after to continue the config loading after GUI updates
-            self.root.after(100, self._load_config_step2)
+            # Trigger data folder change to create DEM controls, then continue
+            # the config loading after the scan has updated the GUI
+            self._on_data_folder_change(on_done=lambda: self.root.after(100, self._load_config_step2))
         else:
             messagebox.showwarning("Load Config", "No data folder found in configuration.")
             self._loading_config = False
@@ -758,13 +757,14 @@ class InSARLiteApp:
         
         self.flight_dir_frame = flight_dir_frame
 
-    def _detect_and_set_flight_direction(self, safe_dirs, zip_files):
+    def _detect_and_set_flight_direction(self, safe_dirs, zip_files, analysis=None):
         """
         Detect flight direction from manifest.safe files and update UI accordingly.
         
         Args:
             safe_dirs (list): List of SAFE directory paths
             zip_files (list): List of ZIP file paths
+            analysis (dict): Precomputed analyze_flight_directions result, if any
         """
         from .utils.utils import analyze_flight_directions
         
@@ -774,7 +774,8 @@ class InSARLiteApp:
             return
             
         try:
-            analysis = analyze_flight_directions(safe_dirs, zip_files)
+            if analysis is None:
+                analysis = analyze_flight_directions(safe_dirs, zip_files)
             
             if analysis['uniform'] and analysis['direction']:
                 # All files have the same flight direction
@@ -1496,7 +1497,13 @@ class InSARLiteApp:
 
     # --- Data Folder Change Handler ---
 
-    def _on_data_folder_change(self, _=None):
+    def _on_data_folder_change(self, _=None, on_done=None):
+        """
+        Scan the data folder in the background and update the data controls.
+        
+        Args:
+            on_done: Optional callable run on the Tk thread once the controls are updated
+        """
         if getattr(self, "download_in_progress", False):
             return
         
@@ -1512,6 +1519,7 @@ class InSARLiteApp:
 
         # 1. Default background: nothing selected
         if not folder:
+            DataHandlers.cancel_data_folder_scan(self)
             self._set_data_browse_bg(bg)
             self._set_controls_state("disabled")
             self.hide_query_btn()
@@ -1528,31 +1536,33 @@ class InSARLiteApp:
                 print(f"Warning: Could not create folder {folder}: {e}")
                 # Continue with the function - treat as empty folder
 
-        safe_dirs, zip_files = get_safe_and_zip_files(folder)
-        safe_dirs_tiff = []
-        for safe_dir in safe_dirs:
-            measurement_dir = os.path.join(safe_dir, "measurement")
-            if os.path.isdir(measurement_dir):
-                tiff_files = [
-                    os.path.join(measurement_dir, f)
-                    for f in os.listdir(measurement_dir)
-                    if f.lower().endswith(".tiff") and os.path.exists(os.path.join(measurement_dir, f))
-                ]
-                safe_dirs_tiff.extend(tiff_files)
-        safe_dirs_tiff = list(dict.fromkeys(safe_dirs_tiff))
-        dir_pol_summary = self._summarize_polarizations_from_files(safe_dirs_tiff)
-        zip_pol_summary = self._summarize_polarizations_from_files(zip_files)
+        # Directory walk and manifest parsing run in a worker thread; the
+        # controls are updated once the scan of this folder completes
+        def on_result(result):
+            self._apply_data_folder_scan(folder, result)
+            if on_done:
+                on_done()
+
+        DataHandlers.start_data_folder_scan(self, folder, on_result)
+
+    def _apply_data_folder_scan(self, folder, result):
+        """Update the data controls from a data folder scan result."""
+        safe_dirs, zip_files = result["safe_dirs"], result["zip_files"]
+        dir_pol_summary = result["dir_pol_summary"]
+        zip_pol_summary = result["zip_pol_summary"]
+        safe_metadata = result["safe_metadata"]
 
         # Detect and set flight direction from manifest files
-        self._detect_and_set_flight_direction(safe_dirs, zip_files)
+        self._detect_and_set_flight_direction(safe_dirs, zip_files, result["flight_analysis"])
 
         # Handle case where both ZIP files and SAFE directories are found
         if safe_dirs and zip_files:
-            DataHandlers.handle_mixed_safe_and_zip_files(self, folder, safe_dirs, zip_files, dir_pol_summary, zip_pol_summary)
+            DataHandlers.handle_mixed_safe_and_zip_files(self, folder, safe_dirs, zip_files, dir_pol_summary, zip_pol_summary,
+                                                         safe_metadata)
             return
 
         if safe_dirs:
-            DataHandlers.handle_safe_dirs_found(self, folder, safe_dirs, dir_pol_summary, zip_pol_summary)
+            DataHandlers.handle_safe_dirs_found(self, folder, safe_dirs, dir_pol_summary, zip_pol_summary, safe_metadata)
             return
 
         if zip_files and not safe_dirs:
@@ -2323,12 +2333,14 @@ class InSARLiteApp:
 
             # 11. Pin file
             pin_file = os.path.join(self.data_folder_entry.get().strip(), "pins.II")
+            aoi = None
             # Write pin_file based on extents and flight direction
             try:
                 E = float(self.e_entry.get())
                 N = float(self.n_entry.get())
                 W = float(self.w_entry.get())
                 S = float(self.s_entry.get())
+                aoi = {'w': W, 'e': E, 's': S, 'n': N}
                 fd = self.flight_dir_var.get().strip().lower()
                 with open(pin_file, "w") as f:
                     if fd == "descending":
@@ -2376,7 +2388,8 @@ class InSARLiteApp:
                 btconfig,
                 pol.lower(),
                 stdate,
-                endate
+                endate,
+                aoi=aoi
             )
             self._save_config()
             if isinstance(self.paths, dict):
@@ -2989,40 +3002,7 @@ class InSARLiteApp:
 
     def _get_dates_from_zip_files(self, zip_files):
         """Extract date range from zip files based on their filenames."""
-        try:
-            import re
-            from datetime import datetime
-            
-            dates = []
-            for zip_file in zip_files:
-                basename = os.path.basename(zip_file)
-                # Extract date from Sentinel-1 filename pattern
-                # S1A_IW_SLC__1SDV_20210101T050000_20210101T050030_036123_043C8A_1234.zip
-                if basename.startswith('S1') and '_IW_SLC_' in basename:
-                    match = re.search(r'_(\d{8})T\d{6}_(\d{8})T\d{6}_', basename)
-                    if match:
-                        start_date = match.group(1)  # YYYYMMDD
-                        end_date = match.group(2)    # YYYYMMDD
-                        try:
-                            # Convert to datetime for proper comparison
-                            start_dt = datetime.strptime(start_date, '%Y%m%d')
-                            end_dt = datetime.strptime(end_date, '%Y%m%d')
-                            dates.extend([start_dt, end_dt])
-                        except ValueError:
-                            continue
-            
-            if dates:
-                # Get the overall date range
-                min_date = min(dates)
-                max_date = max(dates)
-                return {
-                    'start': min_date.strftime('%Y-%m-%d'),
-                    'end': max_date.strftime('%Y-%m-%d')
-                }
-        except Exception as e:
-            print(f"Warning: Could not extract dates from zip files: {e}")
-        
-        return None
+        return get_dates_from_zip_files(zip_files)
 
     def _show_zip_extraction_controls(self):
         """Show controls for zip file extraction."""
@@ -3138,12 +3118,19 @@ class InSARLiteApp:
             self.custom_shape.delete()
             self.custom_shape = None
         browse_folder(self.data_folder_entry, "in_data_dir")
-        self._on_data_folder_change()
-        validate_dates_strict(self.start_var, self.end_var, self.start_date, self.root)  # Ensure dates are validated and UI updated
-        enforce_date_limits(self.start_var, self.end_var, self.date_limits)  # Ensure dates are clamped to limits
+
+        def validate_dates():
+            validate_dates_strict(self.start_var, self.end_var, self.start_date, self.root)  # Ensure dates are validated and UI updated
+            enforce_date_limits(self.start_var, self.end_var, self.date_limits)  # Ensure dates are clamped to limits
+
+        self._on_data_folder_change(on_done=validate_dates)
 
 def main():
     """Main entry point for InSARLite application."""
+    if len(sys.argv) > 1 and sys.argv[1] == "run":
+        # Headless batch processing: insarlite run <project> ...
+        from .cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
     root = tk.Tk()
     app = InSARLiteApp(root)
     root.mainloop()
@@ -0,0 +1,84 @@
+"""
+Burst selection utilities for InSARLite.
+Derives per-burst footprints of Sentinel-1 TOPS subswaths from the
+geolocation grid of their annotation XML and selects the bursts that cover
+an area of interest, so only those are cropped into the processing inputs.
+"""
+
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def read_burst_footprints(annotation_xml: str) -> List[Dict[str, float]]:
+    """
+    Get the bounding box of every burst of a subswath.
+
+    Each burst spans linesPerBurst azimuth lines; its corner coordinates are
+    interpolated along every range column of the geolocation grid.
+
+    Args:
+        annotation_xml: Path to the annotation XML of one subswath/polarization
+
+    Returns:
+        List of {'w','e','s','n','first_line','last_line'} dictionaries in burst order
+    """
+    root = ET.parse(annotation_xml).getroot()
+    lines_per_burst = int(root.findtext(".//swathTiming/linesPerBurst"))
+    burst_list = root.find(".//swathTiming/burstList")
+    n_bursts = int(burst_list.get("count")) if burst_list is not None else 0
+    if n_bursts == 0:
+        return []
+
+    points = []
+    for point in root.iter("geolocationGridPoint"):
+        points.append((float(point.findtext("line")), float(point.findtext("pixel")),
+                       float(point.findtext("latitude")), float(point.findtext("longitude"))))
+    grid = np.array(points)
+    columns = [grid[grid[:, 1] == pixel] for pixel in np.unique(grid[:, 1])]
+    columns = [col[np.argsort(col[:, 0])] for col in columns if len(col) > 1]
+
+    footprints = []
+    for k in range(n_bursts):
+        first_line = k * lines_per_burst
+        last_line = (k + 1) * lines_per_burst - 1
+        sample_lines = np.array([first_line, last_line], dtype=float)
+        lats, lons = [], []
+        for col in columns:
+            lats.extend(np.interp(sample_lines, col[:, 0], col[:, 2]))
+            lons.extend(np.interp(sample_lines, col[:, 0], col[:, 3]))
+        footprints.append({
+            'w': float(min(lons)), 'e': float(max(lons)),
+            's': float(min(lats)), 'n': float(max(lats)),
+            'first_line': first_line, 'last_line': last_line,
+        })
+    return footprints
+
+
+def select_bursts(footprints: List[Dict[str, float]], aoi: Dict[str, float], margin: float = 0.05,
+                  min_bursts: int = 2) -> Optional[Tuple[int, int]]:
+    """
+    Select the contiguous range of bursts intersecting an area of interest.
+
+    Args:
+        footprints: Burst footprints (see read_burst_footprints)
+        aoi: Area of interest {'w','e','s','n'} in degrees
+        margin: Margin added around the AOI in degrees
+        min_bursts: Minimum number of bursts to keep (ESD needs burst overlaps)
+
+    Returns:
+        (first, last) burst indices (inclusive), or None if no burst intersects
+    """
+    hits = [k for k, fp in enumerate(footprints)
+            if fp['w'] <= aoi['e'] + margin and fp['e'] >= aoi['w'] - margin
+            and fp['s'] <= aoi['n'] + margin and fp['n'] >= aoi['s'] - margin]
+    if not hits:
+        return None
+    first, last = min(hits), max(hits)
+    while last - first + 1 < min(min_bursts, len(footprints)):
+        if last + 1 < len(footprints):
+            last += 1
+        if last - first + 1 < min_bursts and first > 0:
+            first -= 1
+    return first, last
@@ -0,0 +1,304 @@
+"""
+Job cost model utilities for InSARLite.
+Records per-job durations (and peak memory) of the GMTSAR processing stages and
+predicts the cost of pending jobs, so that job pools can start the longest jobs
+first, the progress UI can report ETAs and the memory planner can size pools.
+"""
+
+import os
+import json
+import heapq
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple, Callable, Iterable
+
+import numpy as np
+
+
+METRICS_FILENAME = ".job_metrics.json"
+MAX_RECORDS_PER_STAGE = 500
+MIN_RECORDS_FOR_FIT = 5
+
+Features = Tuple[Optional[int], Optional[int]]
+
+
+def find_project_root(path: str) -> Optional[str]:
+    """
+    Find the project folder (the one holding .config.json) above a path.
+
+    Args:
+        path: Any file or directory inside a project
+
+    Returns:
+        Project folder path or None if not found
+    """
+    current = os.path.abspath(path)
+    if not os.path.isdir(current):
+        current = os.path.dirname(current)
+    while True:
+        if os.path.isfile(os.path.join(current, ".config.json")):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+def get_grid_pixels(grd_path: str) -> Optional[int]:
+    """
+    Get the number of nodes of a GMT grid from its netCDF header.
+
+    Args:
+        grd_path: Path to the grid file
+
+    Returns:
+        Number of grid nodes or None if the grid does not exist
+    """
+    if not grd_path or not os.path.exists(grd_path):
+        return None
+    try:
+        import netCDF4
+        with netCDF4.Dataset(grd_path) as ds:
+            z = ds.variables.get("z")
+            if z is not None:
+                return int(np.prod(z.shape))
+            return int(np.prod([len(d) for d in ds.dimensions.values()]))
+    except Exception:
+        # Fall back to the file size of a float32 grid
+        return os.path.getsize(grd_path) // 4
+
+
+def get_temporal_baseline(pair_name: str) -> Optional[int]:
+    """
+    Get the temporal baseline in days from an interferogram name.
+
+    Supports both GMTSAR directory names (YYYYDDD_YYYYDDD) and
+    date based names (YYYYMMDD_YYYYMMDD).
+
+    Args:
+        pair_name: Interferogram directory or pair name
+
+    Returns:
+        Temporal baseline in days or None if the name cannot be parsed
+    """
+    parts = os.path.basename(os.path.normpath(pair_name)).split("_")
+    if len(parts) < 2:
+        return None
+    try:
+        dates = []
+        for part in parts[:2]:
+            if len(part) == 7:
+                dates.append(datetime.strptime(part[:4], "%Y").toordinal() + int(part[4:]))
+            elif len(part) == 8:
+                dates.append(datetime.strptime(part, "%Y%m%d").toordinal())
+            else:
+                return None
+        return abs(dates[1] - dates[0])
+    except ValueError:
+        return None
+
+
+class JobCostModel:
+    """Predicts job durations per stage from recorded job history."""
+
+    def __init__(self, store_path: Optional[str] = None):
+        self.store_path = store_path
+        self._lock = threading.Lock()
+        self._records: Dict[str, List[Dict[str, Any]]] = self._load()
+        self._fits: Dict[str, Any] = {}
+
+    @classmethod
+    def for_path(cls, path: str) -> "JobCostModel":
+        """
+        Create a cost model backed by the metrics store of the project holding path.
+
+        Args:
+            path: Any file or directory inside a project
+
+        Returns:
+            JobCostModel instance
+        """
+        root = find_project_root(path) or (path if os.path.isdir(path) else os.path.dirname(path))
+        return cls(os.path.join(root, METRICS_FILENAME))
+
+    def _load(self) -> Dict[str, List[Dict[str, Any]]]:
+        if not self.store_path or not os.path.exists(self.store_path):
+            return {}
+        try:
+            with open(self.store_path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Warning: Could not read job metrics from {self.store_path}: {e}")
+            return {}
+
+    def _save(self) -> None:
+        if not self.store_path:
+            return
+        try:
+            tmp_path = self.store_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._records, f)
+            os.replace(tmp_path, self.store_path)
+        except Exception as e:
+            print(f"Warning: Could not save job metrics to {self.store_path}: {e}")
+
+    def record(self, stage: str, duration: float, pixels: Optional[int] = None,
+               temporal_baseline: Optional[int] = None, peak_rss: Optional[int] = None) -> None:
+        """
+        Record the duration of a finished job.
+
+        Args:
+            stage: Processing stage name (e.g. "ifg", "unwrap", "gacos")
+            duration: Job wall time in seconds
+            pixels: Number of grid nodes processed by the job
+            temporal_baseline: Temporal baseline of the pair in days
+            peak_rss: Peak resident memory of the job's processes in bytes
+        """
+        if duration is None or duration <= 0:
+            return
+        with self._lock:
+            records = self._records.setdefault(stage, [])
+            record = {
+                "duration": float(duration),
+                "pixels": pixels,
+                "temporal_baseline": temporal_baseline,
+            }
+            if peak_rss:
+                record["peak_rss"] = int(peak_rss)
+            records.append(record)
+            del records[:-MAX_RECORDS_PER_STAGE]
+            self._fits.pop(stage, None)
+            self._save()
+
+    def _fit(self, stage: str):
+        """Fit duration = a + b*pixels + c*temporal_baseline by least squares."""
+        if stage in self._fits:
+            return self._fits[stage]
+        records = self._records.get(stage, [])
+        fit = None
+        if records:
+            use_pixels = all(r.get("pixels") for r in records)
+            use_tb = all(r.get("temporal_baseline") is not None for r in records)
+            durations = np.array([r["duration"] for r in records], dtype=float)
+            columns = [np.ones(len(records))]
+            if use_pixels:
+                columns.append(np.array([r["pixels"] for r in records], dtype=float))
+            if use_tb:
+                columns.append(np.array([r["temporal_baseline"] for r in records], dtype=float))
+            design = np.column_stack(columns)
+            if len(records) >= max(MIN_RECORDS_FOR_FIT, design.shape[1] + 1):
+                coeffs = np.linalg.lstsq(design, durations, rcond=None)[0]
+            elif use_pixels:
+                # Too few records for a regression, scale the mean rate per pixel
+                coeffs = np.array([0.0, np.mean(durations / design[:, 1])] + ([0.0] if use_tb else []))
+            else:
+                coeffs = np.array([np.mean(durations)] + [0.0] * (design.shape[1] - 1))
+            means = design.mean(axis=0)
+            fit = (coeffs, use_pixels, use_tb, means, float(durations.min()))
+        self._fits[stage] = fit
+        return fit
+
+    def predict(self, stage: str, pixels: Optional[int] = None,
+                temporal_baseline: Optional[int] = None) -> Optional[float]:
+        """
+        Predict the duration of a job in seconds.
+
+        Args:
+            stage: Processing stage name
+            pixels: Number of grid nodes processed by the job
+            temporal_baseline: Temporal baseline of the pair in days
+
+        Returns:
+            Predicted duration in seconds or None if there is no history
+        """
+        with self._lock:
+            fit = self._fit(stage)
+        if fit is None:
+            return None
+        coeffs, use_pixels, use_tb, means, min_duration = fit
+        # Unknown features are replaced by their mean over the history
+        features = [1.0]
+        if use_pixels:
+            features.append(float(pixels) if pixels else means[len(features)])
+        if use_tb:
+            features.append(float(temporal_baseline) if temporal_baseline is not None else means[len(features)])
+        prediction = float(np.dot(coeffs, features))
+        # A linear fit can extrapolate below zero for small jobs
+        return max(prediction, 0.5 * min_duration)
+
+    def memory_per_pixel(self, stage: str) -> Optional[float]:
+        """
+        Get the peak memory per grid node observed for a stage.
+
+        The 90th percentile over the recorded jobs is used, so estimates err
+        on the safe side of the job-to-job variation.
+
+        Returns:
+            Bytes per grid node or None if no job of the stage has memory records
+        """
+        with self._lock:
+            ratios = [r["peak_rss"] / r["pixels"] for r in self._records.get(stage, [])
+                      if r.get("peak_rss") and r.get("pixels")]
+        if not ratios:
+            return None
+        return float(np.percentile(ratios, 90))
+
+    def relative_cost(self, stage: str, pixels: Optional[int] = None,
+                      temporal_baseline: Optional[int] = None) -> float:
+        """
+        Get a cost usable for ordering jobs, with or without history.
+
+        Without history the grid size is used as the cost, with the
+        temporal baseline as a tie breaker.
+        """
+        predicted = self.predict(stage, pixels, temporal_baseline)
+        if predicted is not None:
+            return predicted
+        return float(pixels or 0) + float(temporal_baseline or 0) * 1e-6
+
+    def order_longest_first(self, stage: str, jobs: Iterable[Any],
+                            features_func: Callable[[Any], Features]) -> List[Any]:
+        """
+        Sort jobs so that the most expensive ones are started first.
+
+        Args:
+            stage: Processing stage name
+            jobs: Jobs to order
+            features_func: Function returning (pixels, temporal_baseline) for a job
+
+        Returns:
+            List of jobs ordered by decreasing predicted cost
+        """
+        jobs = list(jobs)
+        costs = [self.relative_cost(stage, *features_func(job)) for job in jobs]
+        order = sorted(range(len(jobs)), key=lambda i: costs[i], reverse=True)
+        return [jobs[i] for i in order]
+
+    def estimate_remaining(self, stage: str, pending: Iterable[Features],
+                           ncores: int) -> Optional[float]:
+        """
+        Estimate the wall time needed to finish pending jobs on ncores workers.
+
+        The pending jobs are scheduled longest-first onto the workers, so the
+        estimate accounts for a few large jobs dominating the tail.
+
+        Args:
+            stage: Processing stage name
+            pending: (pixels, temporal_baseline) of each pending job
+            ncores: Number of parallel workers
+
+        Returns:
+            Estimated seconds until completion or None if there is no history
+        """
+        durations = []
+        for pixels, temporal_baseline in pending:
+            predicted = self.predict(stage, pixels, temporal_baseline)
+            if predicted is None:
+                return None
+            durations.append(predicted)
+        if not durations:
+            return 0.0
+        workers = [0.0] * max(1, min(int(ncores or 1), len(durations)))
+        for duration in sorted(durations, reverse=True):
+            heapq.heapreplace(workers, workers[0] + duration)
+        return max(workers)
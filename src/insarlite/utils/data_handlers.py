@@ -4,6 +4,8 @@ Handles data processing, file management, and data-related operations.
 """
 
 import os
+import time
+import threading
 import tkinter as tk
 from tkinter import messagebox
 from typing import List, Dict, Tuple, Optional, Any
@@ -11,6 +13,7 @@ from .file_operations import (
     get_safe_and_zip_files, summarize_polarizations_from_files,
     extract_zip_files_with_progress, extract_extent_from_zip_manifests
 )
+from .scene_index import get_scene_metadata, measurement_files, combined_extent, corner_strings, date_range
 from .gui_helpers import disable_extent_editing, set_extent_entry_values
 
 
@@ -19,9 +22,10 @@ class DataHandlers:
     
     @staticmethod
     def handle_safe_dirs_found(app_instance, folder: str, safe_dirs: List[str], 
-                              dir_pol_summary: Dict, zip_pol_summary: Dict) -> None:
-        """Handle when SAFE directories are found."""
-        from ..utils.utils import extr_ext_TL, add_tooltip
+                              dir_pol_summary: Dict, zip_pol_summary: Dict,
+                              safe_metadata: Optional[Tuple] = None) -> None:
+        """Handle when SAFE directories are found (safe_metadata: (bounds, start, end, direction) from the scan)."""
+        from ..utils.utils import add_tooltip
         
         app_instance._set_data_browse_bg("green")
         app_instance._set_controls_state("normal")
@@ -40,7 +44,7 @@ class DataHandlers:
             app_instance.hide_extract_btn()
 
         # Extract metadata
-        max_bounds, sdate, edate, fdirection = extr_ext_TL(folder)
+        max_bounds, sdate, edate, fdirection = safe_metadata or (None, None, None, None)
         
         if max_bounds:
             app_instance._draw_custom_shape_and_labels(max_bounds)
@@ -151,7 +155,7 @@ class DataHandlers:
     @staticmethod  
     def handle_mixed_safe_and_zip_files(app_instance, folder: str, safe_dirs: List[str], 
                                        zip_files: List[str], dir_pol_summary: Dict, 
-                                       zip_pol_summary: Dict) -> None:
+                                       zip_pol_summary: Dict, safe_metadata: Optional[Tuple] = None) -> None:
         """Handle the case where both ZIP files and SAFE directories are found."""
         num_zip_files = len(zip_files)
         num_safe_dirs = len(safe_dirs)
@@ -169,50 +173,203 @@ class DataHandlers:
             )
             
             if result:  # User chose to proceed with SAFE directories
-                DataHandlers.handle_safe_dirs_found(app_instance, folder, safe_dirs, dir_pol_summary, zip_pol_summary)
+                DataHandlers.handle_safe_dirs_found(app_instance, folder, safe_dirs, dir_pol_summary, zip_pol_summary,
+                                                    safe_metadata)
             else:  # User chose to extract ZIP files
                 DataHandlers.handle_zip_files_found(app_instance, folder, zip_files, zip_pol_summary)
         else:
             # If SAFE directories >= ZIP files, default to using SAFE directories
-            DataHandlers.handle_safe_dirs_found(app_instance, folder, safe_dirs, dir_pol_summary, zip_pol_summary)
+            DataHandlers.handle_safe_dirs_found(app_instance, folder, safe_dirs, dir_pol_summary, zip_pol_summary,
+                                                safe_metadata)
+
+    @staticmethod
+    def scan_data_folder(folder: str, progress_callback=None,
+                         cancel_event: Optional[threading.Event] = None) -> Optional[Dict[str, Any]]:
+        """
+        Scan a data folder for scenes and their metadata.
+        
+        Does not touch Tk widgets, so it can run in a worker thread.
+        
+        Args:
+            folder: Data folder path
+            progress_callback: Optional callable(record, done, total) called as scenes resolve
+            cancel_event: Optional event that aborts the scan when set
+            
+        Returns:
+            Dictionary with safe_dirs, zip_files, dir_pol_summary, zip_pol_summary,
+            flight_analysis and safe_metadata, or None if cancelled
+        """
+        from ..utils.utils import analyze_flight_directions
+
+        safe_dirs, zip_files = get_safe_and_zip_files(folder, cancel_event)
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        records = get_scene_metadata(safe_dirs + zip_files, progress_callback, cancel_event)
+        if records is None:
+            return None
+
+        safe_dirs_tiff = list(dict.fromkeys(measurement_files(records[:len(safe_dirs)])))
+        result = {
+            "safe_dirs": safe_dirs,
+            "zip_files": zip_files,
+            "dir_pol_summary": summarize_polarizations_from_files(safe_dirs_tiff),
+            "zip_pol_summary": summarize_polarizations_from_files(zip_files),
+            "flight_analysis": None,
+            "safe_metadata": None,
+        }
+        if safe_dirs or zip_files:
+            try:
+                result["flight_analysis"] = analyze_flight_directions(safe_dirs, zip_files)
+            except Exception as e:
+                print(f"Error detecting flight direction: {e}")
+        if safe_dirs:
+            try:
+                result["safe_metadata"] = DataHandlers.safe_metadata(records[:len(safe_dirs)])
+            except Exception as e:
+                print(f"Could not extract extent and dates from SAFE directories: {e}")
+        return result
+
+    @staticmethod
+    def safe_metadata(records: List[Dict[str, Any]]) -> Tuple:
+        """
+        Get the combined footprint, date range and flight direction of SAFE directory records.
+        
+        Returns:
+            (footprint corners string, start date, end date, flight direction)
+        """
+        from datetime import datetime
+        from ..utils.utils import get_max_extent_from_kml_coords
+
+        corners = corner_strings(records)
+        max_bounds, fdirection = get_max_extent_from_kml_coords(corners) if corners else (None, None)
+        dates = date_range(records)
+        if not dates:
+            return max_bounds, None, None, fdirection
+        sdate, edate = (datetime.strptime(dates[k], "%Y-%m-%d").date() for k in ("start", "end"))
+        return max_bounds, sdate, edate, fdirection
+
+    @staticmethod
+    def cancel_data_folder_scan(app_instance) -> None:
+        """Cancel a running data folder scan, if any."""
+        cancel_event = getattr(app_instance, "_scan_cancel_event", None)
+        if cancel_event is not None:
+            cancel_event.set()
+        label = getattr(app_instance, "scan_progress_label", None)
+        if label is not None and label.winfo_exists():
+            label.destroy()
+        app_instance.scan_progress_label = None
+        shape = getattr(app_instance, "_scan_extent_shape", None)
+        if shape is not None:
+            try:
+                shape.delete()
+            except Exception:
+                pass
+        app_instance._scan_extent_shape = None
+
+    @staticmethod
+    def start_data_folder_scan(app_instance, folder: str, on_result) -> None:
+        """
+        Scan a data folder in a worker thread, streaming progress to the UI.
+        
+        A scan still running for a previous folder is cancelled. Progress
+        (scenes resolved so far and their combined extent) is posted to the
+        Tk thread with root.after at most every 0.2 s; on_result(result) is
+        called on the Tk thread unless the scan was cancelled.
+        
+        Args:
+            app_instance: Main application instance
+            folder: Data folder path
+            on_result: Callable receiving the scan_data_folder result
+        """
+        DataHandlers.cancel_data_folder_scan(app_instance)
+        cancel_event = threading.Event()
+        app_instance._scan_cancel_event = cancel_event
+        extents = []
+        last_post = [0.0]
+
+        def on_progress(record, done, total):
+            if record.get("footprint"):
+                extents.append(record)
+            now = time.time()
+            if now - last_post[0] < 0.2 and done < total:
+                return
+            last_post[0] = now
+            extent = combined_extent(list(extents))
+            app_instance.root.after(0, lambda: DataHandlers.show_scan_progress(
+                app_instance, cancel_event, done, total, extent))
+
+        def worker():
+            try:
+                result = DataHandlers.scan_data_folder(folder, on_progress, cancel_event)
+            except Exception as e:
+                print(f"Error scanning data folder {folder}: {e}")
+                result = DataHandlers.scan_data_folder_empty()
+            if result is None or cancel_event.is_set():
+                return
+
+            def deliver():
+                if cancel_event.is_set():
+                    return
+                # Clears the progress label and outline; the event is no longer used
+                DataHandlers.cancel_data_folder_scan(app_instance)
+                on_result(result)
+            app_instance.root.after(0, deliver)
+
+        DataHandlers.show_scan_progress(app_instance, cancel_event, 0, None, None)
+        threading.Thread(target=worker, daemon=True).start()
+
+    @staticmethod
+    def scan_data_folder_empty() -> Dict[str, Any]:
+        """Get a scan result for a folder without usable scenes."""
+        return {"safe_dirs": [], "zip_files": [], "dir_pol_summary": {}, "zip_pol_summary": {},
+                "flight_analysis": None, "safe_metadata": None}
+
+    @staticmethod
+    def show_scan_progress(app_instance, cancel_event: threading.Event, done: int,
+                           total: Optional[int], extent: Optional[Dict[str, float]]) -> None:
+        """Show the progress of a data folder scan (Tk thread only)."""
+        if cancel_event.is_set():
+            return
+        text = "Scanning..." if not total else f"Scanning: {done}/{total} scenes"
+        label = getattr(app_instance, "scan_progress_label", None)
+        if label is None or not label.winfo_exists():
+            label = tk.Label(app_instance.root, text=text, fg="gray")
+            label.grid(row=app_instance._get_row("data_folder"), column=3, sticky="w", padx=(0, 2))
+            app_instance.scan_progress_label = label
+        else:
+            label.config(text=text)
+        if extent:
+            # Outline of the footprints resolved so far (the map view is left as is)
+            shape = getattr(app_instance, "_scan_extent_shape", None)
+            if shape is not None:
+                shape.delete()
+            n, s, e, w = extent['n'], extent['s'], extent['e'], extent['w']
+            app_instance._scan_extent_shape = app_instance.map_widget.set_path(
+                [(n, w), (n, e), (s, e), (s, w), (n, w)], color="gray", width=1
+            )
 
     @staticmethod
     def process_data_folder_change(app_instance, folder: str) -> None:
-        """Process changes to the data folder."""
+        """Process changes to the data folder (the scan runs in a worker thread)."""
         if not folder or not os.path.exists(folder):
-            app_instance._set_data_browse_bg("red")
-            app_instance.show_query_btn()
-            app_instance._update_data_query_btn_state_wrapper()
-            app_instance._set_controls_state("normal")
-            app_instance._clear_extent_and_date_labels()
-            app_instance.hide_download_btn()
-            app_instance._clear_dynamic_widgets_and_shapes()
-            app_instance._setup_subswath_controls(None, None)
-            app_instance._setup_polarization_controls(None, None)
-            app_instance._show_output_folder_and_project_controls()
+            DataHandlers.cancel_data_folder_scan(app_instance)
+            DataHandlers.show_no_data_found(app_instance)
             return
 
-        # Get SAFE directories and ZIP files
-        safe_dirs, zip_files = get_safe_and_zip_files(folder)
-        
-        # Analyze existing SAFE directories
-        safe_dirs_tiff = []
-        for safe_dir in safe_dirs:
-            measurement_dir = os.path.join(safe_dir, "measurement")
-            if os.path.isdir(measurement_dir):
-                tiff_files = [
-                    os.path.join(measurement_dir, f)
-                    for f in os.listdir(measurement_dir)
-                    if f.lower().endswith(".tiff") and os.path.exists(os.path.join(measurement_dir, f))
-                ]
-                safe_dirs_tiff.extend(tiff_files)
-        
-        safe_dirs_tiff = list(dict.fromkeys(safe_dirs_tiff))
-        dir_pol_summary = summarize_polarizations_from_files(safe_dirs_tiff)
-        zip_pol_summary = summarize_polarizations_from_files(zip_files)
+        DataHandlers.start_data_folder_scan(
+            app_instance, folder,
+            lambda result: DataHandlers.apply_data_folder_scan(app_instance, folder, result)
+        )
+
+    @staticmethod
+    def apply_data_folder_scan(app_instance, folder: str, result: Dict[str, Any]) -> None:
+        """Update the UI from a data folder scan result (Tk thread only)."""
+        safe_dirs, zip_files = result["safe_dirs"], result["zip_files"]
+        dir_pol_summary, zip_pol_summary = result["dir_pol_summary"], result["zip_pol_summary"]
 
         if safe_dirs:
-            DataHandlers.handle_safe_dirs_found(app_instance, folder, safe_dirs, dir_pol_summary, zip_pol_summary)
+            DataHandlers.handle_safe_dirs_found(app_instance, folder, safe_dirs, dir_pol_summary, zip_pol_summary,
+                                                result["safe_metadata"])
             return
 
         if zip_files and not safe_dirs and not getattr(app_instance, "zip_prompted", False):
@@ -222,16 +379,21 @@ class DataHandlers:
         app_instance.zip_prompted = False
 
         if not safe_dirs and not zip_files:
-            app_instance._set_data_browse_bg("red")
-            app_instance.show_query_btn()
-            app_instance._update_data_query_btn_state_wrapper()
-            app_instance._set_controls_state("normal")
-            app_instance._clear_extent_and_date_labels()
-            app_instance.hide_download_btn()
-            app_instance._clear_dynamic_widgets_and_shapes()
-            app_instance._setup_subswath_controls(None, None)
-            app_instance._setup_polarization_controls(None, None)
-            app_instance._show_output_folder_and_project_controls()
+            DataHandlers.show_no_data_found(app_instance)
+
+    @staticmethod
+    def show_no_data_found(app_instance) -> None:
+        """Reset the data controls when the folder has no usable scenes."""
+        app_instance._set_data_browse_bg("red")
+        app_instance.show_query_btn()
+        app_instance._update_data_query_btn_state_wrapper()
+        app_instance._set_controls_state("normal")
+        app_instance._clear_extent_and_date_labels()
+        app_instance.hide_download_btn()
+        app_instance._clear_dynamic_widgets_and_shapes()
+        app_instance._setup_subswath_controls(None, None)
+        app_instance._setup_polarization_controls(None, None)
+        app_instance._show_output_folder_and_project_controls()
 
     @staticmethod
     def perform_zip_extraction_optimized(app_instance, folder: str, selected_subswaths: List[int], 
@@ -267,7 +429,7 @@ class DataHandlers:
                 start_date=app_instance.start_var.get() if hasattr(app_instance, 'start_var') else None,
                 end_date=app_instance.end_var.get() if hasattr(app_instance, 'end_var') else None,
                 progress_callback=update_progress,
-                quick_comparison=True  # Use fast size+timestamp comparison
+                verify_mode="crc"  # Check existing files against the ZIP CRCs (cached per file)
             )
             
             print(f"Extraction complete: {extracted_count} extracted, {skipped_count} skipped, {len(failed_files)} failed")
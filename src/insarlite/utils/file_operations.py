@@ -6,13 +6,20 @@ Handles file/folder operations, ZIP file processing, and SAFE directory manageme
 import os
 import zipfile
 import hashlib
-import fnmatch
 import re
 import shutil
 import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Tuple, Dict, Optional
 
+from .scene_index import find_scenes, get_scene_metadata, combined_extent, date_range, get_scene_index
+
+# Ways of checking whether an extracted file matches its ZIP member
+VERIFY_MODES = ("quick", "crc", "full")
+CRC_CHUNK_SIZE = 4 * 1024 * 1024
+
 
 def clamp(val: float, minval: Optional[float], maxval: Optional[float]) -> float:
     """
@@ -47,36 +54,18 @@ def clamp(val: float, minval: Optional[float], maxval: Optional[float]) -> float
         return val
 
 
-def get_safe_and_zip_files(folder: str) -> Tuple[List[str], List[str]]:
+def get_safe_and_zip_files(folder: str, cancel_event=None) -> Tuple[List[str], List[str]]:
     """
     Get SAFE directories and ZIP files from a folder.
     
     Args:
         folder: Folder path to search
+        cancel_event: Optional threading.Event that stops the search when set
         
     Returns:
         Tuple of (safe_dirs, zip_files) lists
     """
-    pattern = "S1*_IW_SLC__1S*_*"
-    safe_dirs = [
-        os.path.join(root, d)
-        for root, dirs, _ in os.walk(folder)
-        for d in dirs
-        if d.endswith('.SAFE') and fnmatch.fnmatch(d, pattern)
-    ]
-    zip_files = [
-        os.path.join(root, f)
-        for root, _, files in os.walk(folder)
-        for f in files
-        if f.lower().endswith('.zip') and fnmatch.fnmatch(f, pattern)
-    ]
-    
-    # Filter out files with certain polarization patterns in the filename
-    exclude_pol = {"HH", "VV", "VH", "HV"}
-    safe_dirs = [x for x in safe_dirs if len(os.path.basename(x)) < 16 or os.path.basename(x)[14:16] not in exclude_pol]
-    zip_files = [x for x in zip_files if len(os.path.basename(x)) < 16 or os.path.basename(x)[14:16] not in exclude_pol]
-    
-    return safe_dirs, zip_files
+    return find_scenes(folder, cancel_event)
 
 
 def summarize_polarizations_from_files(file_list: List[str]) -> Dict[str, int]:
@@ -157,7 +146,114 @@ def summarize_polarizations_from_files(file_list: List[str]) -> Dict[str, int]:
     return summary
 
 
-def are_files_identical(zip_file_obj: zipfile.ZipFile, zip_member: str, local_file_path: str, quick_mode: bool = True) -> bool:
+def file_crc32(path: str) -> int:
+    """
+    Compute the CRC32 of a file in a streaming fashion.
+    
+    Args:
+        path: File path
+        
+    Returns:
+        CRC32 as an unsigned integer (as stored in ZIP central directories)
+    """
+    crc = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CRC_CHUNK_SIZE)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+    return crc & 0xFFFFFFFF
+
+
+def verify_members_crc(zip_file_obj: zipfile.ZipFile, targets: Dict[str, str],
+                       max_workers: Optional[int] = None) -> Dict[str, bool]:
+    """
+    Check extracted files against the CRC32 stored in the ZIP central directory.
+    
+    Nothing is decompressed: local files whose size matches are hashed in a
+    thread pool, and verified CRCs are remembered by (path, size, mtime), so
+    unchanged files are not hashed again on later runs.
+    
+    Args:
+        zip_file_obj: ZipFile object
+        targets: Dictionary mapping ZIP member to its local file path
+        max_workers: Hashing threads (default: min(8, CPU count))
+        
+    Returns:
+        Dictionary mapping member to True if the local file matches
+    """
+    results = {}
+    pending = {}
+    for member, local_path in targets.items():
+        local_path = os.path.abspath(local_path)
+        try:
+            info = zip_file_obj.getinfo(member)
+            st = os.stat(local_path)
+        except (KeyError, OSError):
+            results[member] = False
+            continue
+        if st.st_size != info.file_size:
+            results[member] = False
+            continue
+        pending[member] = (local_path, st.st_size, st.st_mtime_ns, info.CRC)
+    if not pending:
+        return results
+
+    index = get_scene_index()
+    known = index.get_file_crcs({p: (size, mtime) for p, size, mtime, _ in pending.values()})
+    to_hash = []
+    for member, (local_path, size, mtime, zip_crc) in pending.items():
+        if local_path in known:
+            results[member] = known[local_path] == zip_crc
+        else:
+            to_hash.append(member)
+
+    if to_hash:
+        workers = max_workers or min(8, os.cpu_count() or 1)
+        verified = []
+
+        def check(member):
+            local_path, size, mtime, zip_crc = pending[member]
+            try:
+                return member, file_crc32(local_path)
+            except OSError as e:
+                print(f"Error hashing {local_path}: {e}")
+                return member, None
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(to_hash)))) as pool:
+            for member, crc in pool.map(check, to_hash):
+                local_path, size, mtime, zip_crc = pending[member]
+                results[member] = crc == zip_crc
+                if crc is not None:
+                    verified.append((local_path, size, mtime, crc))
+        index.record_file_crcs(verified)
+    return results
+
+
+def record_extracted_crcs(extracted: List[Tuple[zipfile.ZipInfo, str]]) -> None:
+    """
+    Remember the CRCs of files just extracted from a ZIP.
+    
+    zipfile checks the CRC of a member read to the end, so the central
+    directory CRC is known to match the written file.
+    
+    Args:
+        extracted: (ZipInfo, local file path) pairs
+    """
+    rows = []
+    for zip_info, local_file_path in extracted:
+        try:
+            st = os.stat(local_file_path)
+        except OSError:
+            continue
+        if st.st_size == zip_info.file_size:
+            rows.append((os.path.abspath(local_file_path), st.st_size, st.st_mtime_ns, zip_info.CRC))
+    get_scene_index().record_file_crcs(rows)
+
+
+def are_files_identical(zip_file_obj: zipfile.ZipFile, zip_member: str, local_file_path: str, quick_mode: bool = True,
+                        verify_mode: Optional[str] = None) -> bool:
     """
     Check if a file in ZIP archive is identical to an existing local file.
     
@@ -166,10 +262,16 @@ def are_files_identical(zip_file_obj: zipfile.ZipFile, zip_member: str, local_fi
         zip_member: Path to member in ZIP
         local_file_path: Local file path to compare
         quick_mode: If True, use fast size+timestamp comparison (default: True for speed)
+        verify_mode: "quick", "crc" or "full"; overrides quick_mode when given
         
     Returns:
         True if files are identical, False otherwise
     """
+    if verify_mode is None:
+        verify_mode = "quick" if quick_mode else "full"
+    if verify_mode == "crc":
+        return verify_members_crc(zip_file_obj, {zip_member: local_file_path}, max_workers=1)[zip_member]
+    quick_mode = verify_mode == "quick"
     try:
         # First check if local file exists
         if not os.path.exists(local_file_path):
@@ -275,6 +377,9 @@ def extract_extent_from_zip_manifests(zip_files: List[str]) -> Optional[Dict[str
     """
     Extract extent from manifest.safe files in zip archives.
     
+    Manifests are read through the scene index, so unchanged archives are
+    not reopened.
+    
     Args:
         zip_files: List of ZIP file paths
         
@@ -282,60 +387,11 @@ def extract_extent_from_zip_manifests(zip_files: List[str]) -> Optional[Dict[str
         Dictionary with combined extent or None if extraction fails
     """
     try:
-        import xml.etree.ElementTree as ET
-        
-        all_extents = []
-        for zip_file in zip_files:
-            try:
-                # First check if file is a valid zip file
-                if not zipfile.is_zipfile(zip_file):
-                    print(f"Warning: {zip_file} is not a valid zip file, skipping extent extraction")
-                    continue
-                    
-                with zipfile.ZipFile(zip_file, 'r') as zf:
-                    # Look for manifest.safe file
-                    manifest_files = [f for f in zf.namelist() if f.endswith('/manifest.safe')]
-                    if manifest_files:
-                        manifest_content = zf.read(manifest_files[0])
-                        root = ET.fromstring(manifest_content)
-                        
-                        # Parse coordinates from manifest
-                        coordinates = root.findall('.//gml:coordinates', 
-                                                 {'gml': 'http://www.opengis.net/gml'})
-                        if coordinates:
-                            coord_text = coordinates[0].text
-                            # Parse coordinate pairs
-                            coord_pairs = coord_text.strip().split()
-                            lons, lats = [], []
-                            for pair in coord_pairs:
-                                if ',' in pair:
-                                    lat, lon = map(float, pair.split(','))
-                                    lons.append(lon)
-                                    lats.append(lat)
-                            
-                            if lons and lats:
-                                extent = {
-                                    'w': min(lons), 'e': max(lons),
-                                    's': min(lats), 'n': max(lats)
-                                }
-                                all_extents.append(extent)
-            except (zipfile.BadZipFile, zipfile.LargeZipFile, OSError) as e:
-                print(f"Warning: Could not read extent from {zip_file}: {e}")
-                continue
-            except Exception as e:
-                print(f"Warning: Error processing {zip_file}: {e}")
-                continue
-        
-        if all_extents:
-            # Combine all extents
-            combined_extent = {
-                'w': min(ext['w'] for ext in all_extents),
-                'e': max(ext['e'] for ext in all_extents),
-                's': min(ext['s'] for ext in all_extents),
-                'n': max(ext['n'] for ext in all_extents)
-            }
-            return combined_extent
-            
+        records = get_scene_metadata(zip_files)
+        for record in records:
+            if record.get("error"):
+                print(f"Warning: Could not read extent from {record['path']}: {record['error']}")
+        return combined_extent(records)
     except Exception as e:
         print(f"Warning: Could not extract extent from zip manifests: {e}")
     
@@ -353,32 +409,7 @@ def get_dates_from_zip_files(zip_files: List[str]) -> Optional[Dict[str, str]]:
         Dictionary with start and end dates or None if extraction fails
     """
     try:
-        dates = []
-        for zip_file in zip_files:
-            basename = os.path.basename(zip_file)
-            # Extract date from Sentinel-1 filename pattern
-            # S1A_IW_SLC__1SDV_20210101T050000_20210101T050030_036123_043C8A_1234.zip
-            if basename.startswith('S1') and '_IW_SLC_' in basename:
-                match = re.search(r'_(\d{8})T\d{6}_(\d{8})T\d{6}_', basename)
-                if match:
-                    start_date = match.group(1)  # YYYYMMDD
-                    end_date = match.group(2)    # YYYYMMDD
-                    try:
-                        # Convert to datetime for proper comparison
-                        start_dt = datetime.strptime(start_date, '%Y%m%d')
-                        end_dt = datetime.strptime(end_date, '%Y%m%d')
-                        dates.extend([start_dt, end_dt])
-                    except ValueError:
-                        continue
-        
-        if dates:
-            # Get the overall date range
-            min_date = min(dates)
-            max_date = max(dates)
-            return {
-                'start': min_date.strftime('%Y-%m-%d'),
-                'end': max_date.strftime('%Y-%m-%d')
-            }
+        return date_range(get_scene_metadata(zip_files))
     except Exception as e:
         print(f"Warning: Could not extract dates from zip files: {e}")
     
@@ -393,7 +424,8 @@ def extract_zip_files_with_progress(
     start_date: str = None,
     end_date: str = None,
     progress_callback=None,
-    quick_comparison: bool = True
+    quick_comparison: bool = True,
+    verify_mode: Optional[str] = None
 ) -> Tuple[int, int, List[str], Dict[str, int]]:
     """
     Extract ZIP files with progress tracking and detailed statistics.
@@ -407,6 +439,7 @@ def extract_zip_files_with_progress(
         end_date: End date filter (YYYY-MM-DD format, optional)
         progress_callback: Callback function for progress updates
         quick_comparison: If True, use fast size+timestamp comparison (default: True)
+        verify_mode: "quick", "crc" or "full" check of existing files; overrides quick_comparison
         
     Returns:
         Tuple of (extracted_count, skipped_count, failed_files, zip_stats)
@@ -416,6 +449,8 @@ def extract_zip_files_with_progress(
         r"s1[ab]-iw(?P<subswath>[123])-slc-(?P<polarization>vv|vh|hh|hv)-\d{8}t\d{6}-\d{8}t\d{6}-\d{6}-[0-9a-f]{6}-\d{3}\.tiff$",
         re.IGNORECASE
     )
+    if verify_mode is None:
+        verify_mode = "quick" if quick_comparison else "full"
     
     # Parse date range if provided
     start_dt = None
@@ -560,6 +595,7 @@ def extract_zip_files_with_progress(
                     filtered_tiff_count = 0
                     skipped_existing_count = 0
                     
+                    selected_members = []
                     for member in file_list:
                         if member.endswith('/'):
                             continue
@@ -581,21 +617,35 @@ def extract_zip_files_with_progress(
                                     print(f"  Skipping {filename} - polarization {polarization.upper()} not selected")
                                     filtered_tiff_count += 1
                                     continue
-                        
+                        selected_members.append(member)
+                    
+                    # Existing files are checked against the central directory CRCs in one parallel pass
+                    existing = {m: os.path.join(folder, m) for m in selected_members
+                                if os.path.exists(os.path.join(folder, m))}
+                    if verify_mode == "crc":
+                        identical = verify_members_crc(zf, existing)
+                    else:
+                        identical = {m: are_files_identical(zf, m, path, verify_mode=verify_mode)
+                                     for m, path in existing.items()}
+                    
+                    extracted_crcs = []
+                    for member in selected_members:
                         out_path = os.path.join(folder, member)
                         os.makedirs(os.path.dirname(out_path), exist_ok=True)
                         
-                        # Check if file already exists and is identical
-                        if os.path.exists(out_path):
-                            if are_files_identical(zf, member, out_path, quick_comparison):
-                                skipped_count += 1
-                                skipped_existing_count += 1
-                                continue
+                        # Skip files that already exist and are identical
+                        if identical.get(member):
+                            skipped_count += 1
+                            skipped_existing_count += 1
+                            continue
                         
-                        # Extract the file
+                        # Extract the file (zipfile checks the CRC once the member is read to the end)
                         with zf.open(member) as src, open(out_path, 'wb') as dst:
                             shutil.copyfileobj(src, dst)
                         extracted_file_count += 1
+                        extracted_crcs.append((zf.getinfo(member), out_path))
+                    
+                    record_extracted_crcs(extracted_crcs)
                     
                     extraction_successful = True
                     if filtered_tiff_count > 0:
@@ -620,7 +670,7 @@ def extract_zip_files_with_progress(
                                 
                                 # Check if file already exists and is identical
                                 if os.path.exists(out_path):
-                                    if are_files_identical(zf, member, out_path, quick_comparison):
+                                    if are_files_identical(zf, member, out_path, verify_mode=verify_mode):
                                         print(f"Skipping {member} - file already exists and is identical")
                                         skipped_count += 1
                                         # File skipped - don't update progress per file
@@ -0,0 +1,57 @@
+"""
+Grid I/O utilities for InSARLite.
+Writes grids directly as GMT-compatible netCDF from Python, without a
+temporary file and gmt grdconvert round-trip.
+"""
+
+import os
+
+import numpy as np
+import xarray as xr
+
+
+# Attributes copied from the input grid that would conflict with the output encoding
+DROPPED_GRID_ATTRS = ("scale_factor", "add_offset", "missing_value", "valid_range", "actual_range")
+
+
+def write_gmt_grid(z, x, y, grd_out, attrs=None, dims=("y", "x"), history="InSARLite"):
+    """
+    Write a float grid as GMT-compatible netCDF (COARDS/CF, as gmt grdconvert =nf).
+
+    The grid is written compressed to a temporary file and moved into place,
+    so readers never see a partial file.
+
+    Args:
+        z: 2-D array (rows along y)
+        x, y: Node coordinates
+        grd_out: Output path
+        attrs: Attributes of the input grid (node_offset keeps its registration)
+        dims: Names of the row and column dimensions (('lat', 'lon') for geographic grids)
+        history: Text of the history attribute
+    """
+    attrs = {k: v for k, v in (attrs or {}).items()
+             if not k.startswith("_") and k not in DROPPED_GRID_ATTRS}
+    node_offset = int(attrs.pop("node_offset", 0))
+    finite = z[np.isfinite(z)]
+    z_range = [float(finite.min()), float(finite.max())] if finite.size else [np.nan, np.nan]
+    ydim, xdim = dims
+    grid = xr.Dataset(
+        {"z": ((ydim, xdim), z, {**attrs, "long_name": "z", "actual_range": z_range,
+                                 "node_offset": np.int32(node_offset)})},
+        coords={
+            xdim: (xdim, x, {"long_name": xdim, "actual_range": [float(np.min(x)), float(np.max(x))]}),
+            ydim: (ydim, y, {"long_name": ydim, "actual_range": [float(np.min(y)), float(np.max(y))]}),
+        },
+        attrs={"Conventions": "CF-1.7", "title": "", "history": history,
+               "node_offset": np.int32(node_offset)},
+    )
+    encoding = {"z": {"dtype": "float32", "zlib": True, "complevel": 1, "_FillValue": np.float32(np.nan),
+                      "chunksizes": (min(len(y), 256), min(len(x), 256))},
+                xdim: {"_FillValue": None}, ydim: {"_FillValue": None}}
+    tmp_out = grd_out + ".tmp"
+    try:
+        grid.to_netcdf(tmp_out, engine="h5netcdf", format="NETCDF4", encoding=encoding)
+        os.replace(tmp_out, grd_out)
+    finally:
+        if os.path.exists(tmp_out):
+            os.remove(tmp_out)
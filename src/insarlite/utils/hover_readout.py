@@ -0,0 +1,123 @@
+"""
+Hover readout utilities for InSARLite plots.
+Looks up grid values under the mouse with a precomputed affine pixel
+mapping, and shows them in a text overlay redrawn by blitting, so hovering
+over large grids does not re-render the full-resolution images.
+"""
+
+import time
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+# Readout updates are coalesced to about the display refresh rate
+REFRESH_INTERVAL = 1.0 / 60
+
+
+class GridLookup:
+    """
+    Maps plot coordinates to grid values.
+
+    The display extent is (x0, x1, y0, y1); with top_row_first the first row
+    of the array is shown at y1 (imshow origin='upper' or a flipped GMT grid).
+    """
+
+    def __init__(self, data: np.ndarray, extent: Sequence[float], top_row_first: bool = True):
+        self.data = data
+        self.rows, self.cols = data.shape
+        x0, x1, y0, y1 = (float(v) for v in extent)
+        self.x0, self.y0 = x0, y0
+        self.sx = (self.cols - 1) / (x1 - x0) if x1 != x0 else 0.0
+        self.sy = (self.rows - 1) / (y1 - y0) if y1 != y0 else 0.0
+        self.top_row_first = top_row_first
+
+    def index(self, x, y):
+        """Get the (row, column) indices of plot coordinates, clamped to the grid."""
+        col = np.clip(np.floor((np.asarray(x, dtype=float) - self.x0) * self.sx), 0, self.cols - 1).astype(np.int64)
+        row = np.clip(np.floor((np.asarray(y, dtype=float) - self.y0) * self.sy), 0, self.rows - 1).astype(np.int64)
+        if self.top_row_first:
+            row = self.rows - 1 - row
+        return row, col
+
+    def value(self, x: float, y: float) -> Optional[float]:
+        """Get the grid value at plot coordinates, or None for NaN."""
+        row, col = self.index(x, y)
+        value = float(self.data[row, col])
+        return None if np.isnan(value) else value
+
+    def values(self, xs, ys) -> np.ndarray:
+        """Get the grid values at arrays of plot coordinates."""
+        row, col = self.index(xs, ys)
+        return self.data[row, col]
+
+
+class BlitReadout:
+    """
+    Text overlay on a Matplotlib axes updated by blitting.
+
+    The canvas background is cached after every full draw; an update restores
+    it and redraws only the text artist. Updates arriving faster than the
+    refresh interval are coalesced into one, scheduled on the Tk event loop.
+    """
+
+    def __init__(self, canvas, ax, loc: str = "upper left", interval: float = REFRESH_INTERVAL):
+        self.canvas = canvas
+        self.ax = ax
+        self.interval = interval
+        self._background = None
+        self._text = None
+        self._pending = None
+        self._scheduled = False
+        self._last = 0.0
+        self._xy, self._ha, self._va = {
+            "upper left": ((0.01, 0.99), "left", "top"),
+            "lower left": ((0.01, 0.01), "left", "bottom"),
+            "upper right": ((0.99, 0.99), "right", "top"),
+        }[loc]
+        self._cid = canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _artist(self):
+        # Axes.clear() drops the artist, so recreate it on the current axes
+        if self._text is None or self._text not in self.ax.texts:
+            self._text = self.ax.text(*self._xy, "", transform=self.ax.transAxes, ha=self._ha, va=self._va,
+                                      fontsize=9, animated=True, zorder=10,
+                                      bbox=dict(boxstyle="round", facecolor="white", alpha=0.8))
+        return self._text
+
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        text = self._artist()
+        if text.get_text():
+            self.ax.draw_artist(text)
+
+    def show(self, message: str) -> None:
+        """Show a message, at most once per refresh interval."""
+        self._pending = message
+        wait = self.interval - (time.monotonic() - self._last)
+        if wait <= 0:
+            self._flush()
+        elif not self._scheduled:
+            self._scheduled = True
+            self.canvas.get_tk_widget().after(max(1, int(wait * 1000)), self._flush)
+
+    def clear(self) -> None:
+        self.show("")
+
+    def _flush(self):
+        self._scheduled = False
+        if self._pending is None:
+            return
+        text = self._artist()
+        text.set_text(self._pending)
+        self._pending = None
+        self._last = time.monotonic()
+        if self._background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._background)
+        self.ax.draw_artist(text)
+        self.canvas.blit(self.canvas.figure.bbox)
+
+    def disconnect(self) -> None:
+        self.canvas.mpl_disconnect(self._cid)
@@ -0,0 +1,263 @@
+"""
+Interferogram quality screening for InSARLite.
+Reads each interferogram's correlation and unwrapped phase once, in row
+chunks, and derives mean/median coherence, the valid-pixel fraction and the
+share of phase jumps over pi between neighbouring pixels (unwrapping
+errors); optionally phase-closure errors over the triplets of the
+network (see phase_closure). The metrics are kept in ifg_qc.csv next to
+the interferograms, with a keep flag that SBAS preparation uses to leave
+bad pairs out of intf.tab without disconnecting the network.
+"""
+
+import os
+import csv
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import numpy as np
+
+from .pair_network import connected_components
+from .phase_closure import check_closure, split_pair
+from .product_catalog import get_catalog
+from .roi import CROPPED_CORR, read_roi
+from .stage_cache import inputs_hash
+
+
+QC_TABLE = "ifg_qc.csv"
+ROW_CHUNK = 512
+COHERENCE_BINS = 1000
+DEFAULT_THRESHOLDS = {
+    "min_coherence": 0.15,        # mean coherence
+    "min_valid_fraction": 0.3,    # unwrapped pixels / all pixels
+    "max_gradient_outliers": 0.02,  # neighbour phase jumps over pi / neighbour pairs
+    "max_closure_outliers": 0.1,  # pixels with |closure| > pi / valid pixels, mean over triplets
+}
+COLUMNS = ["pair", "ref", "rep", "mean_coherence", "median_coherence", "valid_fraction",
+           "gradient_outliers", "closure_triplets", "closure_outliers", "inputs", "keep", "reason"]
+
+
+def _row_chunks(path: str):
+    """Yield (rows, first row index) of a grid in chunks of ROW_CHUNK rows."""
+    import xarray as xr
+
+    with xr.open_dataarray(path) as da:
+        ydim = da.dims[0]
+        ny = da.sizes[ydim]
+        for r0 in range(0, ny, ROW_CHUNK):
+            yield np.asarray(da.isel({ydim: slice(r0, min(ny, r0 + ROW_CHUNK))}).values, dtype=np.float32), r0
+
+
+def ifg_metrics(unwrap_path: str, corr_path: str) -> Dict[str, float]:
+    """
+    Compute the quality metrics of one interferogram in one pass over its grids.
+
+    Args:
+        unwrap_path: Unwrapped phase grid
+        corr_path: Correlation grid
+
+    Returns:
+        {'mean_coherence', 'median_coherence', 'valid_fraction', 'gradient_outliers'}
+    """
+    hist = np.zeros(COHERENCE_BINS, dtype=np.int64)
+    corr_sum, corr_count = 0.0, 0
+    for chunk, _ in _row_chunks(corr_path):
+        values = chunk[np.isfinite(chunk)]
+        corr_sum += float(values.sum(dtype=np.float64))
+        corr_count += values.size
+        hist += np.bincount(np.clip((values * COHERENCE_BINS).astype(np.int64), 0, COHERENCE_BINS - 1),
+                            minlength=COHERENCE_BINS)
+
+    valid_count = total = jumps = neighbours = 0
+    previous_row = None
+    for chunk, _ in _row_chunks(unwrap_path):
+        valid = np.isfinite(chunk)
+        valid_count += int(valid.sum())
+        total += chunk.size
+        # Compare each row with its right and lower neighbour; the last row of
+        # the previous chunk supplies the upper neighbour of the first row
+        rows = chunk if previous_row is None else np.vstack([previous_row, chunk])
+        for diff in (np.diff(chunk, axis=1), np.diff(rows, axis=0)):
+            finite = np.isfinite(diff)
+            neighbours += int(finite.sum())
+            jumps += int((np.abs(diff[finite]) > np.pi).sum())
+        previous_row = chunk[-1:]
+
+    if corr_count:
+        cumulative = np.cumsum(hist)
+        median = (np.searchsorted(cumulative, corr_count / 2) + 0.5) / COHERENCE_BINS
+    metrics = {
+        "mean_coherence": corr_sum / corr_count if corr_count else np.nan,
+        "median_coherence": float(median) if corr_count else np.nan,
+        "valid_fraction": valid_count / total if total else 0.0,
+        "gradient_outliers": jumps / neighbours if neighbours else np.nan,
+    }
+    return metrics
+
+
+def prune_pairs(rows: List[Dict[str, Any]], thresholds: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """
+    Flag the pairs failing the thresholds, worst first, unless dropping them disconnects the network.
+
+    Sets the keep and reason fields of the rows in place.
+    """
+    limits = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    scenes = {s: n for n, s in enumerate(sorted({s for row in rows for s in (row["ref"], row["rep"])}))}
+    failing = []
+    for row in rows:
+        reasons = []
+        if not row["mean_coherence"] >= limits["min_coherence"]:
+            reasons.append("coherence")
+        if not row["valid_fraction"] >= limits["min_valid_fraction"]:
+            reasons.append("valid_fraction")
+        if row["gradient_outliers"] > limits["max_gradient_outliers"]:
+            reasons.append("gradient")
+        if row["closure_outliers"] > limits["max_closure_outliers"]:
+            reasons.append("closure")
+        row["keep"], row["reason"] = True, ";".join(reasons)
+        if reasons:
+            failing.append(row)
+    kept = {row["pair"]: (row["ref"], row["rep"]) for row in rows}
+    components = connected_components(len(scenes), [(scenes[a], scenes[b]) for a, b in kept.values()])
+    for row in sorted(failing, key=lambda r: (-len(r["reason"].split(";")), r["mean_coherence"])):
+        trial = [(scenes[a], scenes[b]) for pair, (a, b) in kept.items() if pair != row["pair"]]
+        if connected_components(len(scenes), trial) <= components:
+            del kept[row["pair"]]
+            row["keep"] = False
+        else:
+            row["reason"] += ";kept_for_connectivity"
+    return rows
+
+
+def read_qc_table(ifgsroot: str) -> List[Dict[str, Any]]:
+    """Read ifg_qc.csv of an interferogram folder (empty if missing)."""
+    path = os.path.join(ifgsroot, QC_TABLE)
+    if not os.path.exists(path):
+        return []
+    rows = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            for key in ("mean_coherence", "median_coherence", "valid_fraction", "gradient_outliers",
+                        "closure_outliers"):
+                row[key] = float(row[key]) if row.get(key) not in (None, "") else np.nan
+            row["closure_triplets"] = int(row.get("closure_triplets") or 0)
+            row["keep"] = row.get("keep", "1") in ("1", "True", "true")
+            rows.append(row)
+    return rows
+
+
+def write_qc_table(ifgsroot: str, rows: List[Dict[str, Any]]) -> str:
+    """Write ifg_qc.csv of an interferogram folder; returns its path."""
+    path = os.path.join(ifgsroot, QC_TABLE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for row in rows:
+            values = {**row, "keep": int(bool(row["keep"]))}
+            writer.writerow([f"{values[k]:.6g}" if isinstance(values[k], float) else values[k] for k in COLUMNS])
+    os.replace(tmp, path)
+    return path
+
+
+def excluded_pairs(ifgsroot: str) -> Set[str]:
+    """Get the pairs ifg_qc.csv flags for removal from the network."""
+    return {row["pair"] for row in read_qc_table(ifgsroot) if not row["keep"]}
+
+
+def run_ifg_qc(ifgsroot: str, unwrap_name: str = "unwrap.grd", closure: bool = False,
+               thresholds: Optional[Dict[str, float]] = None, ncores: Optional[int] = None,
+               topodir: Optional[str] = None,
+               progress_callback: Optional[Callable[[int, int], None]] = None) -> List[Dict[str, Any]]:
+    """
+    Screen the unwrapped interferograms of a folder and write ifg_qc.csv.
+
+    Metrics of pairs whose grids are unchanged since the last run are reused.
+
+    Args:
+        ifgsroot: Interferogram folder (intf_all or merge)
+        unwrap_name: Unwrapped grid screened (the one SBAS will use)
+        closure: Also check phase closure over triplets (phase_closure.check_closure)
+        thresholds: Overrides of DEFAULT_THRESHOLDS
+        ncores: Interferograms read at once
+        topodir: Folder with ref_point.ra, used to reference closures
+        progress_callback: Called with (finished, total)
+
+    Returns:
+        Table rows
+    """
+    corr_name = CROPPED_CORR if read_roi(ifgsroot) else "corr.grd"
+    pairs = sorted(get_catalog(ifgsroot).pairs_with(ifgsroot, unwrap_name))
+    if not pairs:
+        raise ValueError(f"No {unwrap_name} found under {ifgsroot}")
+    previous = {row["pair"]: row for row in read_qc_table(ifgsroot)}
+
+    def screen(pair):
+        unwrap_path = os.path.join(ifgsroot, pair, unwrap_name)
+        corr_path = os.path.join(ifgsroot, pair, corr_name)
+        if not os.path.exists(corr_path):
+            corr_path = os.path.join(ifgsroot, pair, "corr.grd")
+        ihash = inputs_hash([unwrap_path, corr_path])
+        old = previous.get(pair)
+        if old and old.get("inputs") == ihash:
+            return {**old, "closure_triplets": 0, "closure_outliers": np.nan}
+        ref, rep = split_pair(pair)
+        return {"pair": pair, "ref": ref, "rep": rep, **ifg_metrics(unwrap_path, corr_path),
+                "closure_triplets": 0, "closure_outliers": np.nan, "inputs": ihash}
+
+    rows = []
+    with ThreadPoolExecutor(max_workers=max(1, ncores or os.cpu_count() or 1)) as pool:
+        for row in pool.map(screen, pairs):
+            rows.append(row)
+            if progress_callback:
+                progress_callback(len(rows), len(pairs))
+    if closure:
+        try:
+            result = check_closure(ifgsroot, unwrap_name, topodir=topodir, ncores=ncores)
+        except ValueError as e:
+            # No triplets in the network (or no grids to close): screen without closure
+            print(f"Phase closure skipped: {e}")
+            result = {"ifgs": []}
+        by_pair = {row["pair"]: row for row in result["ifgs"]}
+        for row in rows:
+            checked = by_pair.get(row["pair"])
+            if checked:
+                row["closure_triplets"] = checked["triplets"]
+                row["closure_outliers"] = checked["mean_error_fraction"]
+    prune_pairs(rows, thresholds)
+    path = write_qc_table(ifgsroot, rows)
+    dropped = [row["pair"] for row in rows if not row["keep"]]
+    print(f"Interferogram QC: {len(dropped)} of {len(rows)} pairs flagged for removal ({path})")
+    return rows
+
+
+def _line_pair(line: str) -> str:
+    """Get the pair folder name of an intf.tab line."""
+    return os.path.basename(os.path.dirname(line.split()[0]))
+
+
+def intf_tab_pairs(intf_tab: str) -> Set[str]:
+    """Get the pair folder names listed in an intf.tab (empty if missing)."""
+    if not os.path.exists(intf_tab):
+        return set()
+    with open(intf_tab) as f:
+        return {_line_pair(line) for line in f if line.strip()}
+
+
+def filter_intf_tab(intf_tab: str, excluded: Set[str]) -> int:
+    """
+    Remove the lines of excluded pairs from an intf.tab.
+
+    Returns:
+        Number of lines removed
+    """
+    if not excluded or not os.path.exists(intf_tab):
+        return 0
+    with open(intf_tab) as f:
+        lines = [line for line in f if line.strip()]
+    kept = [line for line in lines if _line_pair(line) not in excluded]
+    if len(kept) != len(lines):
+        tmp = intf_tab + ".tmp"
+        with open(tmp, "w") as f:
+            f.writelines(kept)
+        os.replace(tmp, intf_tab)
+    return len(lines) - len(kept)
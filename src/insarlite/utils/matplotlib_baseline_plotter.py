@@ -10,12 +10,137 @@ matplotlib.use('TkAgg')  # Set backend before importing pyplot
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
 import matplotlib.dates as mdates
-from datetime import datetime, timedelta
 import tkinter as tk
 from tkinter import messagebox
 import json
 
+from .pair_network import read_baseline_table, select_pairs
+
+
+def point_to_segments_distance(point, starts, ends):
+    """Calculate distances from a point to many line segments (arrays of (x, y) ends)."""
+    line_vec = ends - starts
+    point_vec = point - starts
+    line_len_sq = np.einsum('ij,ij->i', line_vec, line_vec)
+    # Project point onto each line, constrained to the segment (degenerate segments are points)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(line_len_sq > 0, np.einsum('ij,ij->i', point_vec, line_vec) / line_len_sq, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    closest = starts + t[:, None] * line_vec
+    return np.hypot(point[0] - closest[:, 0], point[1] - closest[:, 1])
+
+
+class DisplayGridIndex:
+    """
+    Grid bucket index of points and line segments in display (pixel) coordinates.
+    
+    Segments are registered in every cell they pass through, so a query only
+    tests the items in the 3x3 cells around the cursor. The cell size must be
+    at least twice the largest query threshold.
+    """
+    
+    def __init__(self, cell_size=50.0):
+        self.cell_size = float(cell_size)
+        self.points = np.empty((0, 2))
+        self.starts = np.empty((0, 2))
+        self.ends = np.empty((0, 2))
+        self._point_cells = {}
+        self._segment_cells = {}
+        
+    def _cell_keys(self, xy):
+        cells = np.floor(xy / self.cell_size).astype(np.int64)
+        return [tuple(c) for c in cells]
+        
+    @staticmethod
+    def _group(keys, ids):
+        buckets = {}
+        for key, item in zip(keys, ids):
+            buckets.setdefault(key, []).append(item)
+        return {key: np.unique(items) for key, items in buckets.items()}
+        
+    @staticmethod
+    def clip_segments(starts, ends, bounds):
+        """
+        Clip segments to a rectangle (Liang-Barsky).
+        
+        Args:
+            starts, ends: Segment ends (E, 2)
+            bounds: (xmin, ymin, xmax, ymax)
+            
+        Returns:
+            (ids of the segments crossing the rectangle, clipped starts, clipped ends)
+        """
+        xmin, ymin, xmax, ymax = bounds
+        delta = ends - starts
+        t0, t1 = np.zeros(len(starts)), np.ones(len(starts))
+        inside = np.ones(len(starts), dtype=bool)
+        for p, q in ((-delta[:, 0], starts[:, 0] - xmin), (delta[:, 0], xmax - starts[:, 0]),
+                     (-delta[:, 1], starts[:, 1] - ymin), (delta[:, 1], ymax - starts[:, 1])):
+            parallel = p == 0
+            inside &= ~(parallel & (q < 0))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                r = np.where(parallel, 0.0, q / p)
+            t0 = np.where(~parallel & (p < 0), np.maximum(t0, r), t0)
+            t1 = np.where(~parallel & (p > 0), np.minimum(t1, r), t1)
+        ids = np.flatnonzero(inside & (t0 <= t1))
+        return ids, starts[ids] + t0[ids, None] * delta[ids], starts[ids] + t1[ids, None] * delta[ids]
+        
+    def build(self, points, segments, bounds=None):
+        """
+        Index points (N, 2) and segments (E, 2, 2) given in display coordinates.
+        
+        With bounds (xmin, ymin, xmax, ymax), segments are only registered
+        where they cross that rectangle, so zooming in does not make long
+        off-screen segments expensive to index. Bounds should cover the
+        visible area plus the largest query threshold.
+        """
+        self.points = np.asarray(points, dtype=float).reshape(-1, 2)
+        segments = np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+        self.starts, self.ends = segments[:, 0], segments[:, 1]
+        
+        self._point_cells = self._group(self._cell_keys(self.points), range(len(self.points)))
+        
+        if bounds is None:
+            ids, starts, ends = np.arange(len(segments)), self.starts, self.ends
+        else:
+            ids, starts, ends = self.clip_segments(self.starts, self.ends, bounds)
+        
+        # Sample each segment at a quarter cell so every cell it crosses is registered
+        step = self.cell_size / 4.0
+        lengths = np.hypot(*(ends - starts).T)
+        counts = np.ceil(lengths / step).astype(int) + 1
+        sample_ids = np.repeat(np.arange(len(ids)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        t = offsets / np.maximum(np.repeat(counts, counts) - 1, 1)
+        samples = starts[sample_ids] + t[:, None] * (ends[sample_ids] - starts[sample_ids])
+        self._segment_cells = self._group(self._cell_keys(samples), ids[sample_ids])
+        
+    def _candidates(self, buckets, x, y):
+        cx, cy = int(np.floor(x / self.cell_size)), int(np.floor(y / self.cell_size))
+        found = [buckets[key] for key in ((cx + dx, cy + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+                 if key in buckets]
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=int)
+        
+    def nearest_point(self, x, y, threshold):
+        """Get the index of the closest point within threshold pixels, or None."""
+        ids = self._candidates(self._point_cells, x, y)
+        if not len(ids):
+            return None
+        distances = np.hypot(self.points[ids, 0] - x, self.points[ids, 1] - y)
+        best = int(np.argmin(distances))
+        return int(ids[best]) if distances[best] <= threshold else None
+        
+    def nearest_segment(self, x, y, threshold):
+        """Get the index of the closest segment within threshold pixels, or None."""
+        ids = self._candidates(self._segment_cells, x, y)
+        if not len(ids):
+            return None
+        distances = point_to_segments_distance(np.array([x, y]), self.starts[ids], self.ends[ids])
+        best = int(np.argmin(distances))
+        return int(ids[best]) if distances[best] <= threshold else None
+
 
 class InteractiveBaselinePlotter:
     """
@@ -37,7 +162,9 @@ class InteractiveBaselinePlotter:
         self.perp_baselines = []
         self.file_ids = []
         self.points = []
+        self.point_xy = np.empty((0, 2))  # (date number, baseline) per point
         self.edges = []
+        self._edge_index = {}  # (min idx, max idx) -> edge
         self.original_edges = []
         
         # Interactive state
@@ -51,6 +178,12 @@ class InteractiveBaselinePlotter:
         self.canvas = None
         self.toolbar = None
         self.ax = None
+        self.edge_collection = None
+        
+        # Display-space hit-testing index, rebuilt lazily when the view or edges change
+        self._hit_index = DisplayGridIndex(cell_size=50.0)
+        self._hit_index_key = None
+        self._edges_version = 0
         
         # Callbacks
         self.on_edge_changed = None
@@ -62,23 +195,7 @@ class InteractiveBaselinePlotter:
     def _load_and_parse_data(self):
         """Load and parse baseline table data."""
         try:
-            with open(self.baseline_table_path, "r") as f:
-                for line in f:
-                    parts = line.strip().split()
-                    if len(parts) < 5:
-                        continue
-                    
-                    file_id = parts[0]
-                    date_str = file_id.split('_')[1]  # Extract yyyymmdd
-                    try:
-                        date = datetime.strptime(date_str, "%Y%m%d")
-                    except ValueError:
-                        continue
-                    
-                    perp_baseline = float(parts[4])
-                    self.dates.append(date)
-                    self.perp_baselines.append(perp_baseline)
-                    self.file_ids.append(file_id)
+            self.file_ids, self.dates, self.perp_baselines = read_baseline_table(self.baseline_table_path)
                     
             # Create point data structure
             for i, (date, baseline, file_id) in enumerate(zip(self.dates, self.perp_baselines, self.file_ids)):
@@ -89,6 +206,8 @@ class InteractiveBaselinePlotter:
                     'file_id': file_id,
                     'selected': False
                 })
+            if self.points:
+                self.point_xy = np.column_stack([mdates.date2num(self.dates), self.perp_baselines])
                 
         except Exception as e:
             print(f"Error loading baseline data: {e}")
@@ -227,6 +346,13 @@ class InteractiveBaselinePlotter:
         legend = self.ax.legend(loc='upper right', framealpha=0.9)
         legend.set_rasterized(False)  # Ensure vector legend
         
+        # All edges are drawn by a single collection, one segment per edge
+        self.edge_collection = LineCollection([], colors='black', linewidths=1.0,
+                                              zorder=1,  # Lower zorder than points
+                                              capstyle='round', joinstyle='round',
+                                              rasterized=False)  # Ensure vector rendering
+        self.ax.add_collection(self.edge_collection, autolim=False)
+        
     def _setup_event_handlers(self):
         """Set up matplotlib event handlers for interactivity."""
         # Use only button_press_event for unified selection handling
@@ -273,32 +399,27 @@ class InteractiveBaselinePlotter:
                 # Clear all selections when clicking empty space
                 self._clear_all_selections()
                 
+    def _get_hit_index(self):
+        """Get the display-space index of points and edges, rebuilding it if the view changed."""
+        key = (self.ax.transData.get_affine().get_matrix().tobytes(), self._edges_version, len(self.points))
+        if key != self._hit_index_key:
+            points = self.ax.transData.transform(self.point_xy) if len(self.points) else np.empty((0, 2))
+            segments = self._edge_segments()
+            ends = self.ax.transData.transform(segments.reshape(-1, 2)).reshape(-1, 2, 2)
+            # Only the visible part of the edges can be clicked; one cell of margin covers the thresholds
+            margin = self._hit_index.cell_size
+            x0, y0, x1, y1 = self.ax.bbox.extents
+            self._hit_index.build(points, ends, bounds=(x0 - margin, y0 - margin, x1 + margin, y1 + margin))
+            self._hit_index_key = key
+        return self._hit_index
+        
     def _check_node_click(self, event):
-        """Check if a node was clicked using improved detection."""
-        if not self.points or event.xdata is None or event.ydata is None:
+        """Check if a node was clicked using the display-space index."""
+        if not self.points or event.x is None or event.y is None:
             return None
             
-        try:
-            click_x = mdates.num2date(event.xdata).replace(tzinfo=None)
-            click_y = event.ydata
-        except:
-            return None
-        
-        # Check each point for proximity
         node_threshold = 25  # pixels for node selection
-        
-        for i, point in enumerate(self.points):
-            # Calculate distance in display coordinates
-            point_display = self.ax.transData.transform([(mdates.date2num(point['date']), point['baseline'])])[0]
-            click_display = self.ax.transData.transform([(mdates.date2num(click_x), click_y)])[0]
-            
-            distance = np.sqrt((point_display[0] - click_display[0])**2 + 
-                             (point_display[1] - click_display[1])**2)
-            
-            if distance <= node_threshold:
-                return i
-                
-        return None
+        return self._get_hit_index().nearest_point(event.x, event.y, node_threshold)
         
     def _handle_node_selection(self, node_idx):
         """Handle node selection with universal rules."""
@@ -316,15 +437,8 @@ class InteractiveBaselinePlotter:
                 # Universal Rule 2: Second node selection creates edge and deselects both
                 other_idx = selected_indices[0]
                 
-                # Check if edge already exists
-                edge_exists = any(
-                    (e['idx1'] == node_idx and e['idx2'] == other_idx) or 
-                    (e['idx1'] == other_idx and e['idx2'] == node_idx)
-                    for e in self.edges
-                )
-                
-                if not edge_exists:
-                    self._create_edge(other_idx, node_idx)
+                # Create the edge unless it already exists
+                self._create_edge(other_idx, node_idx)
                 
                 # Always deselect both points after attempting edge creation
                 self._deselect_point(other_idx)
@@ -461,40 +575,67 @@ class InteractiveBaselinePlotter:
         self._draw_with_rotation()
         
     def _create_edge(self, idx1, idx2):
-        """Create an edge between two points optimized for vector graphics."""
-        # Check if edge already exists
-        for edge in self.edges:
-            if (edge['idx1'] == idx1 and edge['idx2'] == idx2) or \
-               (edge['idx1'] == idx2 and edge['idx2'] == idx1):
-                return  # Edge already exists
-                
-        point1 = self.points[idx1]
-        point2 = self.points[idx2]
-        
-        # Create line object optimized for vector graphics
-        line, = self.ax.plot([point1['date'], point2['date']], 
-                           [point1['baseline'], point2['baseline']], 
-                           'k-', linewidth=1.0, alpha=1.0,  # Full opacity for vectors
-                           zorder=1,  # Lower zorder than points
-                           solid_capstyle='round',  # Vector-friendly line caps
-                           solid_joinstyle='round',  # Vector-friendly line joins
-                           rasterized=False)  # Ensure vector rendering
-        
-        # Store edge data
-        edge = {
-            'idx1': idx1,
-            'idx2': idx2,
-            'line': line,
-            'selected': False
-        }
-        self.edges.append(edge)
+        """Create an edge between two points."""
+        self.add_edges([(idx1, idx2)])
         
-        self.canvas.draw_idle()
+    def add_edges(self, pairs, notify=True):
+        """
+        Add edges between point pairs, skipping existing ones.
+        
+        The plot is redrawn and on_edge_changed is called once for all pairs.
+        
+        Args:
+            pairs: Iterable of (idx1, idx2) point index pairs
+            notify: Whether to trigger the on_edge_changed callback
+        """
+        added = False
+        for idx1, idx2 in pairs:
+            idx1, idx2 = int(idx1), int(idx2)
+            key = (min(idx1, idx2), max(idx1, idx2))
+            if idx1 == idx2 or key in self._edge_index:
+                continue
+            edge = {
+                'idx1': idx1,
+                'idx2': idx2,
+                'selected': False
+            }
+            self.edges.append(edge)
+            self._edge_index[key] = edge
+            added = True
+            
+        if not added:
+            return
+        self._refresh_edges()
         
         # Trigger callback if set
-        if self.on_edge_changed:
+        if notify and self.on_edge_changed:
             self.on_edge_changed(self.edges)
             
+    def _edge_segments(self):
+        """Get the edge segments as an (E, 2, 2) array in data coordinates."""
+        if not self.edges:
+            return np.empty((0, 2, 2))
+        idx = np.array([(e['idx1'], e['idx2']) for e in self.edges])
+        return self.point_xy[idx]
+        
+    def _refresh_edges(self):
+        """Update the edge collection from the edge list and request one redraw."""
+        self._edges_version += 1
+        if self.edge_collection is None:
+            return
+        self.edge_collection.set_segments(self._edge_segments())
+        self._update_edge_styles()
+        
+    def _update_edge_styles(self):
+        """Update per-segment colors and widths from the edge selection state."""
+        selected = np.array([e['selected'] for e in self.edges], dtype=bool)
+        colors = np.zeros((len(self.edges), 4))
+        colors[:, 3] = 1.0  # Black
+        colors[selected] = (1.0, 0.0, 0.0, 1.0)  # Red
+        self.edge_collection.set_color(colors)
+        self.edge_collection.set_linewidths(np.where(selected, 2.0, 1.0))  # Moderate highlight thickness
+        self.canvas.draw_idle()
+            
     def _clear_all_node_selections(self):
         """Clear all node selections while preserving edge selections."""
         for point in self.points:
@@ -502,78 +643,13 @@ class InteractiveBaselinePlotter:
         self._update_point_colors()
             
     def _check_edge_click(self, event):
-        """Check if mouse click is near an edge with consistent, reliable detection."""
-        if not self.edges:
-            return None
-            
-        # Ensure we have valid coordinates
-        if event.xdata is None or event.ydata is None:
+        """Check if mouse click is near an edge using the display-space index."""
+        if not self.edges or event.x is None or event.y is None:
             return None
             
-        # Convert event coordinates to data coordinates
-        try:
-            click_x = mdates.num2date(event.xdata).replace(tzinfo=None)
-            click_y = event.ydata
-        except:
-            return None
-        
-        min_distance = float('inf')
-        closest_edge = None
         edge_threshold = 20  # pixels - consistent threshold
-        
-        for edge in self.edges:
-            point1 = self.points[edge['idx1']]
-            point2 = self.points[edge['idx2']]
-            
-            # Calculate distance in display coordinates for consistency
-            try:
-                # Convert line endpoints to display coordinates
-                p1_display = self.ax.transData.transform([(mdates.date2num(point1['date']), point1['baseline'])])[0]
-                p2_display = self.ax.transData.transform([(mdates.date2num(point2['date']), point2['baseline'])])[0]
-                click_display = self.ax.transData.transform([(mdates.date2num(click_x), click_y)])[0]
-                
-                # Calculate distance from click to line segment in display coordinates
-                distance = self._point_to_line_distance_display(
-                    click_display[0], click_display[1],
-                    p1_display[0], p1_display[1],
-                    p2_display[0], p2_display[1]
-                )
-                
-                if distance < min_distance:
-                    min_distance = distance
-                    closest_edge = edge
-                    
-            except Exception:
-                continue
-                
-        if min_distance <= edge_threshold:
-            return closest_edge
-                
-        return None
-        
-    def _point_to_line_distance_display(self, px, py, x1, y1, x2, y2):
-        """Calculate distance from point to line segment in display coordinates."""
-        # Vector from line start to end
-        line_vec = np.array([x2 - x1, y2 - y1])
-        # Vector from line start to point
-        point_vec = np.array([px - x1, py - y1])
-        
-        # Calculate the length of the line segment
-        line_len_sq = np.dot(line_vec, line_vec)
-        
-        if line_len_sq == 0:
-            # Line segment is actually a point
-            return np.sqrt(np.dot(point_vec, point_vec))
-        
-        # Project point onto the line, constrained to the segment
-        t = max(0, min(1, np.dot(point_vec, line_vec) / line_len_sq))
-        
-        # Find the closest point on the line segment
-        closest_point = np.array([x1, y1]) + t * line_vec
-        
-        # Calculate distance from point to closest point on line
-        distance_vec = np.array([px, py]) - closest_point
-        return np.sqrt(np.dot(distance_vec, distance_vec))
+        closest = self._get_hit_index().nearest_segment(event.x, event.y, edge_threshold)
+        return self.edges[closest] if closest is not None else None
         
     def _select_edge(self, edge):
         """Select an edge for editing with refined styling."""
@@ -583,32 +659,27 @@ class InteractiveBaselinePlotter:
             
         self.selected_edge = edge
         edge['selected'] = True
-        edge['line'].set_color('red')
-        edge['line'].set_linewidth(2.0)  # More moderate highlight thickness
-        self.canvas.draw_idle()
+        self._update_edge_styles()
         
     def _deselect_edge(self):
         """Deselect the currently selected edge."""
         if self.selected_edge:
             self.selected_edge['selected'] = False
-            self.selected_edge['line'].set_color('black')
-            self.selected_edge['line'].set_linewidth(1.0)  # Return to optimized thickness
             self.selected_edge = None
-            self.canvas.draw_idle()
+            self._update_edge_styles()
             
     def _delete_selected_edge(self):
         """Delete the currently selected edge."""
         if not self.selected_edge:
             return
             
-        # Remove line from plot
-        self.selected_edge['line'].remove()
-        
-        # Remove from edges list
-        self.edges.remove(self.selected_edge)
+        # Remove from edges list and redraw the remaining edges
+        edge = self.selected_edge
+        self.edges.remove(edge)
+        self._edge_index.pop((min(edge['idx1'], edge['idx2']), max(edge['idx1'], edge['idx2'])), None)
         self.selected_edge = None
         
-        self.canvas.draw_idle()
+        self._refresh_edges()
         
         # Trigger callback if set
         if self.on_edge_changed:
@@ -625,43 +696,35 @@ class InteractiveBaselinePlotter:
         if self.selected_edge:
             self._deselect_edge()
             
-    def connect_baseline_nodes(self, perp_constraint, temp_constraint):
+    def connect_baseline_nodes(self, perp_constraint, temp_constraint, max_neighbors=None,
+                               min_redundancy=None, ensure_connected=False):
         """
         Connect nodes within specified constraints.
         
         Args:
             perp_constraint: Maximum perpendicular baseline difference (meters)
             temp_constraint: Maximum temporal baseline (days)
+            max_neighbors: Maximum number of pairs each image selects (None for no limit)
+            min_redundancy: Minimum number of pairs per image (None for no minimum)
+            ensure_connected: Whether to add the cheapest pairs joining disconnected parts
         """
         # Clear existing edges
         self.clear_edges()
         
-        n = len(self.points)
-        for i in range(n):
-            for j in range(i + 1, n):
-                point1 = self.points[i]
-                point2 = self.points[j]
-                
-                # Calculate temporal difference
-                temp_diff = abs((point2['date'] - point1['date']).days)
-                
-                # Calculate perpendicular baseline difference
-                perp_diff = abs(point2['baseline'] - point1['baseline'])
-                
-                # Check constraints
-                if temp_diff <= temp_constraint and perp_diff <= perp_constraint:
-                    self._create_edge(i, j)
+        pairs = select_pairs(self.dates, self.perp_baselines, temp_constraint, perp_constraint,
+                             max_neighbors=max_neighbors, min_redundancy=min_redundancy,
+                             ensure_connected=ensure_connected)
+        self.add_edges(pairs)
                     
         # Store original edges for comparison
         self.original_edges = [(e['idx1'], e['idx2']) for e in self.edges]
         
     def clear_edges(self):
         """Clear all edges from the plot."""
-        for edge in self.edges:
-            edge['line'].remove()
         self.edges.clear()
+        self._edge_index.clear()
         self.selected_edge = None
-        self.canvas.draw_idle()
+        self._refresh_edges()
         
     def set_edit_mode(self, enabled):
         """Enable or disable edit mode."""
@@ -0,0 +1,273 @@
+"""
+Memory-aware concurrency planning for InSARLite.
+Estimates the peak memory of GMTSAR jobs from their grid size and the peak
+RSS recorded for earlier jobs, and limits how many run at once so the host
+neither swaps (or OOM-kills SNAPHU) nor leaves cores idle. Running jobs are
+sampled, so estimates are raised mid-stage when jobs use more than expected.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Any
+
+from .cost_model import JobCostModel
+
+
+# Peak bytes per grid node before any job of the stage has been measured
+DEFAULT_BYTES_PER_PIXEL = {
+    "ifg": 48.0,
+    "unwrap": 64.0,
+    "normalize": 16.0,
+    "validity": 16.0,
+    "gacos": 48.0,
+    "sbas": 40.0,  # per cube element (pixels x interferograms) of an inversion block
+}
+FALLBACK_BYTES_PER_PIXEL = 32.0
+# Share of the available memory jobs may reserve; the rest is headroom
+MEMORY_FRACTION = 0.85
+# Admissions pause while less than this share of physical memory is available
+LOW_MEMORY_FRACTION = 0.05
+SAMPLE_INTERVAL = 1.0
+
+_budget_override: Optional[int] = None
+
+
+def set_memory_budget(gb: Optional[float]) -> None:
+    """Limit the memory all job pools may use (e.g. from --memory-gb); None for automatic."""
+    global _budget_override
+    _budget_override = int(gb * 1024 ** 3) if gb else None
+
+
+def _meminfo() -> Dict[str, int]:
+    values = {}
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                parts = rest.split()
+                if parts:
+                    values[key] = int(parts[0]) * 1024
+    except (OSError, ValueError):
+        pass
+    return values
+
+
+def available_memory() -> Optional[int]:
+    """Get the memory available for new processes in bytes, or None if unknown."""
+    info = _meminfo()
+    if "MemAvailable" in info:
+        return info["MemAvailable"]
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def total_memory() -> Optional[int]:
+    """Get the physical memory of the host in bytes, or None if unknown."""
+    info = _meminfo()
+    if "MemTotal" in info:
+        return info["MemTotal"]
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def memory_budget() -> Optional[int]:
+    """Get the memory job pools may reserve in bytes, or None if unknown."""
+    available = available_memory()
+    if _budget_override:
+        return min(_budget_override, available) if available else _budget_override
+    return int(available * MEMORY_FRACTION) if available else None
+
+
+def bytes_per_pixel(stage: str, cost_model: Optional[JobCostModel] = None) -> float:
+    """Get the peak memory per grid node of a stage, learned from history when available."""
+    learned = cost_model.memory_per_pixel(stage) if cost_model else None
+    return learned or DEFAULT_BYTES_PER_PIXEL.get(stage, FALLBACK_BYTES_PER_PIXEL)
+
+
+def plan_workers(stage: str, ncores: int, pixels: Optional[int],
+                 cost_model: Optional[JobCostModel] = None) -> int:
+    """
+    Get the number of jobs of a stage that fit in memory at once.
+
+    Args:
+        stage: Processing stage name
+        ncores: Core budget (upper bound)
+        pixels: Grid nodes per job (largest job)
+        cost_model: Job history used to learn the memory per grid node
+
+    Returns:
+        Number of workers (at least 1)
+    """
+    ncores = max(1, int(ncores or 1))
+    budget = memory_budget()
+    if not pixels or not budget:
+        return ncores
+    per_job = pixels * bytes_per_pixel(stage, cost_model)
+    workers = max(1, min(ncores, int(budget // max(per_job, 1))))
+    if workers < ncores:
+        print(f"Memory planner: running {workers} {stage} jobs at once instead of {ncores} "
+              f"(~{per_job / 1024 ** 3:.1f} GB each, {budget / 1024 ** 3:.1f} GB available)")
+    return workers
+
+
+def _process_tree_rss(roots) -> Dict[int, int]:
+    """Get the summed RSS (bytes) of the process trees under each root pid."""
+    parents, rss = {}, {}
+    page = os.sysconf("SC_PAGE_SIZE")
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            pid = int(entry)
+            parents[pid] = int(fields[1])
+            rss[pid] = int(fields[21]) * page
+        except (OSError, IndexError, ValueError):
+            continue
+    children: Dict[int, list] = {}
+    for pid, ppid in parents.items():
+        children.setdefault(ppid, []).append(pid)
+    totals = {}
+    for root in roots:
+        total, stack = 0, [root]
+        while stack:
+            pid = stack.pop()
+            total += rss.get(pid, 0)
+            stack.extend(children.get(pid, []))
+        totals[root] = total
+    return totals
+
+
+class MemoryGovernor:
+    """
+    Admits shell jobs of a stage while their estimated peak memory fits the budget.
+
+    Each job reserves its estimate (grid nodes times bytes per node) before it
+    starts. A sampler thread sums the RSS of every running job's process tree;
+    a job using more than its reservation grows it and raises the bytes per
+    node used for the jobs still waiting, so concurrency drops mid-stage
+    instead of the host swapping. At least one job always runs.
+    """
+
+    def __init__(self, stage: str, cost_model: Optional[JobCostModel] = None,
+                 budget: Optional[int] = None, interval: float = SAMPLE_INTERVAL):
+        self.stage = stage
+        self.budget = budget if budget is not None else memory_budget()
+        self.bytes_per_pixel = bytes_per_pixel(stage, cost_model)
+        self.interval = interval
+        self.reserved = 0
+        self._running = 0
+        self._jobs: Dict[int, Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._sampler = None
+        self._can_sample = os.path.isdir("/proc/self")
+        self._total = total_memory()
+
+    def estimate(self, pixels: Optional[int]) -> int:
+        """Get the memory to reserve for a job over a grid of pixels nodes."""
+        return int((pixels or 0) * self.bytes_per_pixel)
+
+    def _low_memory(self) -> bool:
+        if not self._total:
+            return False
+        available = available_memory()
+        return available is not None and available < self._total * LOW_MEMORY_FRACTION
+
+    def _admit(self, estimate: int) -> None:
+        with self._cond:
+            while self._running and self.budget and (self.reserved + estimate > self.budget or self._low_memory()):
+                self._cond.wait(self.interval)
+            self.reserved += estimate
+            self._running += 1
+
+    def _start_sampler(self) -> None:
+        with self._cond:
+            if self._sampler is None and self._can_sample:
+                self._sampler = threading.Thread(target=self._sample_loop, daemon=True)
+                self._sampler.start()
+
+    def _sample_loop(self) -> None:
+        while True:
+            with self._cond:
+                jobs = dict(self._jobs)
+                if not jobs:
+                    self._sampler = None
+                    return
+            try:
+                totals = _process_tree_rss(jobs.keys())
+            except OSError:
+                totals = {}
+            with self._cond:
+                for pid, current in totals.items():
+                    job = self._jobs.get(pid)
+                    if job is None:
+                        continue
+                    job["peak"] = max(job["peak"], current)
+                    if current > job["reserved"]:
+                        # The job outgrew its estimate: hold back the jobs waiting
+                        # for memory and expect more from the ones not yet started
+                        self.reserved += current - job["reserved"]
+                        job["reserved"] = current
+                        if job["pixels"]:
+                            self.bytes_per_pixel = max(self.bytes_per_pixel, current / job["pixels"])
+            time.sleep(self.interval)
+
+    @contextmanager
+    def admit(self, pixels: Optional[int] = None):
+        """
+        Reserve the memory of a job over a grid of pixels nodes, waiting until it fits.
+
+        The reservation is released when the block exits. Other resources a
+        job needs (e.g. cores) should be taken inside the block, so they are
+        not held while waiting for memory.
+
+        Yields:
+            Job record to pass to execute
+        """
+        estimate = self.estimate(pixels)
+        self._admit(estimate)
+        job = {"reserved": estimate, "peak": 0, "pixels": pixels}
+        try:
+            yield job
+        finally:
+            with self._cond:
+                for pid, running in list(self._jobs.items()):
+                    if running is job:
+                        del self._jobs[pid]
+                self.reserved -= job["reserved"]
+                self._running -= 1
+                self._cond.notify_all()
+
+    def execute(self, command: str, pixels: Optional[int] = None, log_func=None,
+                process_num=None, job: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Run a shell command once its memory estimate fits (see utils.execute_command).
+
+        Args:
+            job: Job record of an admission already held (see admit); if None,
+                the command is admitted with the estimate for pixels
+
+        Returns:
+            {'command', 'output', 'error', 'peak_rss'} with the peak RSS in bytes (None if not sampled)
+        """
+        from .process_utils import execute_command
+
+        if job is None:
+            with self.admit(pixels) as job:
+                return self.execute(command, pixels, log_func, process_num, job)
+
+        def track(process):
+            with self._cond:
+                self._jobs[process.pid] = job
+            self._start_sampler()
+
+        result = execute_command(command, log_func, process_num, on_start=track)
+        result["peak_rss"] = job["peak"] if self._can_sample and job["peak"] else None
+        return result
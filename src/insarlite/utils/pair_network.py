@@ -0,0 +1,193 @@
+"""
+Interferogram pair network utilities for InSARLite.
+Selects interferometric pairs from a parsed baseline table in-process
+(temporal/perpendicular thresholds, neighbour limits, redundancy and
+connectivity guarantees) and writes intf.in for all subswaths at once.
+"""
+
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+Pair = Tuple[int, int]
+
+SUBSWATH_PATTERN = re.compile(r"_ALL_F\d")
+
+
+def read_baseline_table(baseline_table_path: str) -> Tuple[List[str], List[datetime], List[float]]:
+    """
+    Parse a GMTSAR baseline_table.dat.
+
+    Args:
+        baseline_table_path: Path to baseline_table.dat
+
+    Returns:
+        (file_ids, dates, perpendicular baselines) in table order
+    """
+    file_ids, dates, perp_baselines = [], [], []
+    with open(baseline_table_path, "r") as f:
+        for line in f:
+            parts = line.strip().split()
+            if len(parts) < 5:
+                continue
+            try:
+                date = datetime.strptime(parts[0].split('_')[1], "%Y%m%d")
+            except (IndexError, ValueError):
+                continue
+            file_ids.append(parts[0])
+            dates.append(date)
+            perp_baselines.append(float(parts[4]))
+    return file_ids, dates, perp_baselines
+
+
+def _pair_costs(days: np.ndarray, baselines: np.ndarray, temp_constraint: float,
+                perp_constraint: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Temporal/perpendicular differences and a normalized cost for all pairs."""
+    temp_diff = np.abs(days[:, None] - days[None, :])
+    perp_diff = np.abs(baselines[:, None] - baselines[None, :])
+    cost = temp_diff / max(float(temp_constraint), 1.0) + perp_diff / max(float(perp_constraint), 1.0)
+    return temp_diff, perp_diff, cost
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i: int, j: int) -> bool:
+        ri, rj = self.find(i), self.find(j)
+        if ri == rj:
+            return False
+        self.parent[ri] = rj
+        return True
+
+
+def select_pairs(dates: Sequence[datetime], perp_baselines: Sequence[float], temp_constraint: float,
+                 perp_constraint: float, max_neighbors: Optional[int] = None,
+                 min_redundancy: Optional[int] = None, ensure_connected: bool = False) -> List[Pair]:
+    """
+    Select interferometric pairs.
+
+    Candidates are all pairs within both thresholds (as select_pairs.csh).
+    Optionally each scene keeps only its max_neighbors temporally nearest
+    candidates (a pair is kept if either scene chose it), scenes with fewer
+    than min_redundancy pairs get their cheapest extra pairs, and the
+    cheapest pairs joining separate network components are added so the
+    network is connected (minimum spanning tree over the components).
+    Pair cost is the temporal and perpendicular baseline normalized by
+    their thresholds.
+
+    Args:
+        dates: Acquisition date of each scene
+        perp_baselines: Perpendicular baseline of each scene (m)
+        temp_constraint: Maximum temporal baseline (days)
+        perp_constraint: Maximum perpendicular baseline difference (m)
+        max_neighbors: Maximum number of pairs each scene selects
+        min_redundancy: Minimum number of pairs per scene
+        ensure_connected: Whether to connect all scenes into one network
+
+    Returns:
+        Sorted list of (earlier index, later index) pairs
+    """
+    n = len(dates)
+    if n < 2:
+        return []
+    days = np.array([d.toordinal() for d in dates], dtype=float)
+    baselines = np.asarray(perp_baselines, dtype=float)
+    temp_diff, perp_diff, cost = _pair_costs(days, baselines, temp_constraint, perp_constraint)
+
+    candidates = (temp_diff <= temp_constraint) & (perp_diff <= perp_constraint)
+    np.fill_diagonal(candidates, False)
+
+    if max_neighbors is not None and max_neighbors > 0:
+        # Rank each scene's candidates by temporal baseline (cost breaks ties)
+        rank_key = np.where(candidates, temp_diff + cost * 1e-6, np.inf)
+        order = np.argsort(rank_key, axis=1)[:, :max_neighbors]
+        chosen = np.zeros_like(candidates)
+        rows = np.repeat(np.arange(n), order.shape[1])
+        chosen[rows, order.ravel()] = True
+        chosen &= candidates
+        candidates = chosen | chosen.T
+
+    selected = np.triu(candidates | candidates.T, k=1)
+
+    if min_redundancy is not None and min_redundancy > 0:
+        degree = (selected | selected.T).sum(axis=1)
+        for i in np.argsort(degree):
+            missing = min_redundancy - int((selected[i, :].sum() + selected[:, i].sum()))
+            if missing <= 0:
+                continue
+            linked = selected[i, :] | selected[:, i]
+            options = [j for j in np.argsort(cost[i]) if j != i and not linked[j]]
+            for j in options[:missing]:
+                selected[min(i, j), max(i, j)] = True
+
+    if ensure_connected:
+        uf = _UnionFind(n)
+        for i, j in zip(*np.nonzero(selected)):
+            uf.union(int(i), int(j))
+        iu, ju = np.triu_indices(n, k=1)
+        for k in np.argsort(cost[iu, ju], kind="stable"):
+            i, j = int(iu[k]), int(ju[k])
+            if uf.union(i, j):
+                selected[i, j] = True
+
+    pairs = []
+    for i, j in zip(*np.nonzero(selected)):
+        i, j = int(i), int(j)
+        pairs.append((i, j) if days[i] <= days[j] else (j, i))
+    return sorted(pairs, key=lambda p: (days[p[0]], days[p[1]]))
+
+
+def connected_components(n: int, pairs: Sequence[Pair]) -> int:
+    """Count the network components (isolated scenes count as one each)."""
+    uf = _UnionFind(n)
+    components = n
+    for i, j in pairs:
+        if uf.union(i, j):
+            components -= 1
+    return components
+
+
+def component_labels(n: int, pairs: Sequence[Pair]) -> List[int]:
+    """Label every scene with its network component (scenes share a label when linked through pairs)."""
+    uf = _UnionFind(n)
+    for i, j in pairs:
+        uf.union(i, j)
+    return [uf.find(i) for i in range(n)]
+
+
+def write_intf_in(paths: Dict[str, str], pairs: Sequence[Tuple[str, str]]) -> Dict[str, str]:
+    """
+    Write intf.in for all subswaths from one pair list.
+
+    Args:
+        paths: Project paths with pF1/pF2/pF3 subswath folders
+        pairs: (file_id1, file_id2) pairs, e.g. ("S1_20230101_ALL_F1", "S1_20230113_ALL_F1")
+
+    Returns:
+        Dictionary mapping subswath key to the written intf.in path
+    """
+    written = {}
+    for key in ["pF1", "pF2", "pF3"]:
+        dir_path = paths.get(key)
+        if not dir_path or not os.path.exists(dir_path):
+            continue
+        suffix = f"_ALL_F{key[-1]}"
+        intf_path = os.path.join(dir_path, "intf.in")
+        tmp_path = intf_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for id1, id2 in pairs:
+                f.write(f"{SUBSWATH_PATTERN.sub(suffix, id1)}:{SUBSWATH_PATTERN.sub(suffix, id2)}\n")
+        os.replace(tmp_path, intf_path)
+        written[key] = intf_path
+    return written
@@ -0,0 +1,263 @@
+"""
+Phase-closure checking for InSARLite.
+Finds every closed triplet (i-j, j-k, i-k) of the interferogram network
+from its adjacency matrix and computes the closure phase
+phi_ij + phi_jk - phi_ik, which is zero for consistent unwrapping and a
+multiple of 2*pi where an interferogram has an unwrapping error. The
+unwrapped grids are streamed in row bands: each band of each interferogram
+is read once and used by all triplets it belongs to. Results are written
+next to validity_pin.grd: closure_triplets.csv, closure_ifgs.csv and
+closure_errors.grd (the number of failing triplets per pixel).
+"""
+
+import os
+import csv
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .memory_planner import memory_budget
+from .product_catalog import get_catalog
+
+
+TRIPLETS_TABLE = "closure_triplets.csv"
+IFGS_TABLE = "closure_ifgs.csv"
+ERRORS_GRID = "closure_errors.grd"
+# Closure magnitudes above this (radians) count as unwrapping errors
+ERROR_THRESHOLD = np.pi
+# Memory for one band of all interferograms plus the closures of a triplet batch
+BAND_MEMORY = 1024 ** 3
+TRIPLET_BATCH = 64
+
+
+def split_pair(pair: str) -> Tuple[str, str]:
+    """Get the (reference, repeat) scene ids of a pair folder name such as 2023001_2023013."""
+    parts = os.path.basename(os.path.normpath(pair)).split("_")
+    return (parts[0], parts[1]) if len(parts) >= 2 else (pair, "")
+
+
+def network_pairs(ifgsroot: str, unwrap_name: str = "unwrap.grd", intf_tab: Optional[str] = None) -> List[str]:
+    """
+    Get the pair folders of the network.
+
+    Args:
+        ifgsroot: Interferogram folder
+        unwrap_name: Unwrapped grid the pairs must have
+        intf_tab: SBAS intf.tab listing the network (default: every pair folder with unwrap_name)
+    """
+    available = get_catalog(ifgsroot).pairs_with(ifgsroot, unwrap_name)
+    if intf_tab and os.path.exists(intf_tab):
+        with open(intf_tab) as f:
+            listed = [os.path.basename(os.path.dirname(line.split()[0])) for line in f if line.strip()]
+        return [pair for pair in listed if pair in available]
+    return sorted(available)
+
+
+def enumerate_triplets(pairs: Sequence[str]) -> np.ndarray:
+    """
+    Find the closed triplets of a pair network from its adjacency matrix.
+
+    For every pair i-k the scenes j linked to both i (i-j) and k (j-k) close
+    a triplet; all pairs are tested at once as rows of a boolean matrix.
+
+    Args:
+        pairs: Pair folder names (reference_repeat)
+
+    Returns:
+        Array (triplets, 3) of pair indices (i-j, j-k, i-k) for scenes i < j < k
+    """
+    scenes = sorted({s for pair in pairs for s in split_pair(pair)})
+    index = {s: n for n, s in enumerate(scenes)}
+    n = len(scenes)
+    edge = np.full((n, n), -1, dtype=np.int64)
+    for k, pair in enumerate(pairs):
+        a, b = (index[s] for s in split_pair(pair))
+        if a != b:
+            edge[min(a, b), max(a, b)] = k
+    adj = edge >= 0
+    i, k = np.nonzero(adj)
+    # Row e marks the scenes j with i-j and j-k for pair e = i-k
+    rows, j = np.nonzero(adj[i, :] & adj[:, k].T)
+    i, k = i[rows], k[rows]
+    return np.column_stack([edge[i, j], edge[j, k], edge[i, k]]).reshape(-1, 3)
+
+
+def _reference_pixel(ifgsroot: str, topodir: Optional[str], x: np.ndarray, y: np.ndarray) -> Optional[Tuple[int, int]]:
+    """Get the (row, column) of the reference point, or of the pixel valid in most interferograms."""
+    import xarray as xr
+
+    ref_file = os.path.join(topodir, "ref_point.ra") if topodir else None
+    if ref_file and os.path.exists(ref_file):
+        with open(ref_file) as f:
+            parts = f.readline().split()
+        if len(parts) >= 2:
+            return int(np.abs(y - float(parts[1])).argmin()), int(np.abs(x - float(parts[0])).argmin())
+    validity = os.path.join(ifgsroot, "validity_pin.grd")
+    if os.path.exists(validity):
+        with xr.open_dataarray(validity) as da:
+            if da.shape == (len(y), len(x)):
+                counts = np.nan_to_num(np.asarray(da.values, dtype=np.float32), nan=-1)
+                return tuple(int(v) for v in np.unravel_index(counts.argmax(), counts.shape))
+    return None
+
+
+def _grid_info(path: str, ref: Optional[Tuple[int, int]]):
+    """Get the shape of a grid and its value at the reference pixel (0 if unknown)."""
+    import xarray as xr
+
+    with xr.open_dataarray(path) as da:
+        value = 0.0
+        if ref is not None and ref[0] < da.shape[0] and ref[1] < da.shape[1]:
+            value = float(da[ref[0], ref[1]].values)
+        return da.shape, (value if np.isfinite(value) else np.nan)
+
+
+def _read_band(path: str, r0: int, r1: int) -> np.ndarray:
+    import xarray as xr
+
+    with xr.open_dataarray(path) as da:
+        return np.asarray(da.isel({da.dims[0]: slice(r0, r1)}).values, dtype=np.float32)
+
+
+def check_closure(ifgsroot: str, unwrap_name: str = "unwrap.grd", intf_tab: Optional[str] = None,
+                  topodir: Optional[str] = None, threshold: float = ERROR_THRESHOLD,
+                  ncores: Optional[int] = None,
+                  progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    Check phase closure over all triplets of the network and write the closure tables and raster.
+
+    Every interferogram is referenced to one pixel (the reference point, or
+    the pixel valid in most interferograms) so that unwrapping constants
+    cancel and only local unwrapping errors remain.
+
+    Args:
+        ifgsroot: Interferogram folder (holding validity_pin.grd)
+        unwrap_name: Unwrapped grid checked
+        intf_tab: SBAS intf.tab listing the network (default: all unwrapped pairs)
+        topodir: Folder with ref_point.ra
+        threshold: Closure magnitude (radians) counted as an error
+        ncores: Grids read at once
+        progress_callback: Called with (finished bands, total bands)
+
+    Returns:
+        {'triplets': rows, 'ifgs': rows, 'errors_grid': path}
+    """
+    import xarray as xr
+    from .grid_io import write_gmt_grid
+
+    pairs = network_pairs(ifgsroot, unwrap_name, intf_tab)
+    paths = [os.path.join(ifgsroot, pair, unwrap_name) for pair in pairs]
+    if not paths:
+        raise ValueError(f"No {unwrap_name} found under {ifgsroot}")
+    with xr.open_dataarray(paths[0]) as da:
+        ydim, xdim = da.dims
+        x, y, attrs = da[xdim].values, da[ydim].values, dict(da.attrs)
+    ref = _reference_pixel(ifgsroot, topodir, x, y)
+    if ref is None:
+        print("Warning: No reference point or validity raster; closures include unwrapping constants")
+
+    workers = max(1, ncores or os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        infos = list(pool.map(lambda p: _grid_info(p, ref), paths))
+    shape = Counter(info[0] for info in infos).most_common(1)[0][0]
+    usable = [k for k, info in enumerate(infos) if info[0] == shape]
+    if len(usable) < len(pairs):
+        print(f"Warning: Skipping {len(pairs) - len(usable)} interferograms whose grid size differs from {shape}")
+    pairs = [pairs[k] for k in usable]
+    paths = [paths[k] for k in usable]
+    offsets = np.array([infos[k][1] for k in usable], dtype=np.float32)
+    triplets = enumerate_triplets(pairs)
+    if not len(triplets):
+        raise ValueError("The interferogram network has no closed triplets")
+    # Only interferograms in some triplet are read
+    members = np.unique(triplets)
+    slot = np.full(len(pairs), -1, dtype=np.int64)
+    slot[members] = np.arange(len(members))
+    local = slot[triplets]
+    # Interferograms without a referenced value cannot be checked
+    checkable = np.isfinite(offsets[triplets]).all(axis=1)
+
+    ny, nx = shape
+    budget = min(BAND_MEMORY, (memory_budget() or 4 * BAND_MEMORY) // 4)
+    band_rows = int(max(1, min(ny, budget // (4 * nx * (len(members) + 2 * TRIPLET_BATCH)))))
+    nbands = (ny + band_rows - 1) // band_rows
+    print(f"Checking {len(triplets)} triplets of {len(members)} interferograms in {nbands} bands of {band_rows} rows")
+
+    ntrip = len(triplets)
+    valid_count = np.zeros(ntrip, dtype=np.int64)
+    error_count = np.zeros(ntrip, dtype=np.int64)
+    abs_sum = np.zeros(ntrip)
+    sq_sum = np.zeros(ntrip)
+    errors = np.zeros(shape, dtype=np.float32)
+    checked = np.zeros(shape, dtype=np.float32)
+    member_offsets = np.nan_to_num(offsets[members])[:, None, None]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for band in range(nbands):
+            r0, r1 = band * band_rows, min(ny, (band + 1) * band_rows)
+            tile = np.stack(list(pool.map(lambda p: _read_band(p, r0, r1), [paths[m] for m in members])))
+            tile -= member_offsets
+            for start in range(0, ntrip, TRIPLET_BATCH):
+                batch = local[start:start + TRIPLET_BATCH]
+                closure = tile[batch[:, 0]] + tile[batch[:, 1]] - tile[batch[:, 2]]
+                closure[~checkable[start:start + TRIPLET_BATCH]] = np.nan
+                finite = np.isfinite(closure)
+                magnitude = np.abs(np.where(finite, closure, 0.0))
+                failing = magnitude > threshold
+                valid_count[start:start + TRIPLET_BATCH] += finite.sum(axis=(1, 2))
+                error_count[start:start + TRIPLET_BATCH] += failing.sum(axis=(1, 2))
+                abs_sum[start:start + TRIPLET_BATCH] += magnitude.sum(axis=(1, 2), dtype=np.float64)
+                sq_sum[start:start + TRIPLET_BATCH] += (magnitude.astype(np.float64) ** 2).sum(axis=(1, 2))
+                errors[r0:r1] += failing.sum(axis=0)
+                checked[r0:r1] += finite.sum(axis=0)
+            if progress_callback:
+                progress_callback(band + 1, nbands)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_abs = abs_sum / valid_count
+        rms = np.sqrt(sq_sum / valid_count)
+        error_fraction = error_count / valid_count
+    triplet_rows = [{"ifg_ij": pairs[t[0]], "ifg_jk": pairs[t[1]], "ifg_ik": pairs[t[2]],
+                     "valid_pixels": int(valid_count[n]), "error_pixels": int(error_count[n]),
+                     "error_fraction": float(error_fraction[n]), "mean_abs": float(mean_abs[n]),
+                     "rms": float(rms[n])} for n, t in enumerate(triplets)]
+
+    # Per interferogram: statistics over the triplets it belongs to
+    scored = valid_count > 0
+    ntriplets = np.zeros(len(pairs), dtype=np.int64)
+    fraction_sum = np.zeros(len(pairs))
+    fraction_max = np.zeros(len(pairs))
+    for column in range(3):
+        ids = triplets[scored, column]
+        np.add.at(ntriplets, ids, 1)
+        np.add.at(fraction_sum, ids, error_fraction[scored])
+        np.maximum.at(fraction_max, ids, error_fraction[scored])
+    ifg_rows = []
+    for k, pair in enumerate(pairs):
+        ifg_rows.append({"pair": pair, "triplets": int(ntriplets[k]),
+                         "mean_error_fraction": float(fraction_sum[k] / ntriplets[k]) if ntriplets[k] else np.nan,
+                         "max_error_fraction": float(fraction_max[k]) if ntriplets[k] else np.nan,
+                         "referenced": bool(np.isfinite(offsets[k]))})
+
+    _write_rows(os.path.join(ifgsroot, TRIPLETS_TABLE), triplet_rows)
+    _write_rows(os.path.join(ifgsroot, IFGS_TABLE), ifg_rows)
+    errors[checked == 0] = np.nan
+    errors_grid = os.path.join(ifgsroot, ERRORS_GRID)
+    write_gmt_grid(errors, x, y, errors_grid, {**attrs, "units": "triplets"}, dims=(ydim, xdim),
+                   history=f"InSARLite phase closure ({len(triplets)} triplets, |closure| > {threshold:.3g} rad)")
+    failing = sum(1 for row in triplet_rows if row["error_pixels"])
+    print(f"Phase closure: {failing} of {len(triplets)} triplets have pixels with |closure| > {threshold:.3g} rad")
+    return {"triplets": triplet_rows, "ifgs": ifg_rows, "errors_grid": errors_grid}
+
+
+def _write_rows(path: str, rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(list(rows[0]))
+        for row in rows:
+            writer.writerow([f"{v:.6g}" if isinstance(v, float) else v for v in row.values()])
+    os.replace(tmp, path)
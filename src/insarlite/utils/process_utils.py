@@ -0,0 +1,90 @@
+"""
+Command execution and process logging helpers for InSARLite.
+Free of Tk and pykml imports so the headless processing modules can use
+them; utils.utils re-exports them for the GUI.
+"""
+
+import subprocess
+from datetime import datetime
+
+
+# Function to run commands in parallel
+def execute_command(command, log_func=None, process_num=None, on_start=None):
+    # Execute bash command; on_start(process) is called once it is running
+    print(f"Executing command: {command}")
+    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if on_start:
+        on_start(process)
+    output, error = process.communicate()
+    if log_func:
+        log_func(message=output, process_num=process_num)
+        if error:
+            log_func(message=error, process_num=process_num)
+    return {'command': command, 'output': output, 'error': error}
+
+# Function to run a shell command and capture its output
+def run_command(command, log_func=None, process_num=None):
+    result = subprocess.run(command, shell=True, capture_output=True, text=True)
+    if log_func:
+        log_func(message=result.stdout, process_num=process_num)
+        if result.stderr:
+            log_func(message=result.stderr, process_num=process_num)
+    if result.returncode != 0:
+        print(result.stderr)
+    return result.stdout.strip()
+
+# Function to log messages to a log file
+def log_message(log_file_path, message):
+    with open(log_file_path, "a") as log_file:
+        log_file.write(message + "\n")
+
+
+# Consolidated process logger - single line per process
+def process_logger_consolidated(
+    process_num=None,
+    message=None,
+    log_file=None,
+    start_time=None
+):
+    """
+    Logs a consolidated process message with start time, end time, and duration.
+    
+    Args:
+        process_num (str|int): Process number (e.g., 1, 4.2.2, 5.1.1).
+        message (str): Process description message.
+        log_file (str): Full path to log file.
+        start_time (datetime): When the process started.
+    """
+    end_time = datetime.now()
+    start_timestamp = start_time.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    end_timestamp = end_time.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    
+    elapsed = (end_time - start_time).total_seconds()
+    elapsed_str = format_time(elapsed)
+    
+    msg = f"Process-{process_num}: {message or ''} | Started: {start_timestamp} | Ended: {end_timestamp} | Duration: {elapsed_str}"
+    print(msg)
+    if log_file:
+        log_message(log_file, msg)
+
+
+# Function to format time output
+def format_time(seconds):
+    days, remainder = divmod(seconds, 86400)
+    hours, remainder = divmod(remainder, 3600)
+    mins, secs = divmod(remainder, 60)
+
+    # Create a list to hold non-zero parts
+    parts = []
+    if days > 0:
+        parts.append(f"{int(days)}d")
+    if hours > 0:
+        parts.append(f"{int(hours)}h")
+    if mins > 0:
+        parts.append(f"{int(mins)}m")
+    if (
+        secs > 0 or not parts
+    ):  # Always include seconds, even if zero when it's the only value
+        parts.append(f"{secs:.2f}s")
+
+    return " ".join(parts)
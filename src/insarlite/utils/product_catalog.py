@@ -0,0 +1,339 @@
+"""
+Product catalog utilities for InSARLite.
+Keeps a per-project SQLite catalog of scenes, interferogram pairs and products
+so completion checks query the catalog instead of repeatedly walking
+(possibly network-mounted) project directories.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from .cost_model import find_project_root
+
+
+CATALOG_FILENAME = ".catalog.sqlite"
+
+# Stage that produces each known product file
+STAGE_BY_NAME = {
+    "corr.grd": "ifg",
+    "phasefilt.grd": "ifg",
+    "phase.grd": "ifg",
+    "unwrap.grd": "unwrap",
+    "unwrap_pin.grd": "normalize",
+    "unwrap_GACOS_corrected_detrended.grd": "gacos",
+    "validity_pin.grd": "unwrap",
+    "intf.tab": "sbas",
+    "scene.tab": "sbas",
+}
+STAGE_BY_PATTERN = [
+    (re.compile(r"^S1_\d{8}_ALL_F\d\.SLC$"), "align"),
+    (re.compile(r"^(disp_\d{7}(_ll)?|vel(_ll)?)\.grd$"), "sbas"),
+]
+SCENE_PATTERN = re.compile(r"^S1_(\d{8})_ALL_F(\d)\.SLC$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    root TEXT NOT NULL,
+    pair TEXT NOT NULL,
+    name TEXT NOT NULL,
+    stage TEXT,
+    size INTEGER,
+    mtime REAL,
+    params_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS products_root_name ON products (root, name);
+CREATE INDEX IF NOT EXISTS products_dir ON products (dir);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dirs_root ON dirs (root);
+"""
+
+
+def stage_for_name(name: str) -> Optional[str]:
+    """
+    Get the processing stage that produces a file name.
+
+    Args:
+        name: File name
+
+    Returns:
+        Stage name or None for untracked file types
+    """
+    if name in STAGE_BY_NAME:
+        return STAGE_BY_NAME[name]
+    for pattern, stage in STAGE_BY_PATTERN:
+        if pattern.match(name):
+            return stage
+    return None
+
+
+class ProductCatalog:
+    """SQLite catalog of the files below processing roots (one level of pair folders)."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _split(path: str) -> Tuple[str, str, str]:
+        """Split a product path into (dir, root, pair); pair is '' for root-level files."""
+        directory = os.path.dirname(path)
+        parent = os.path.dirname(directory)
+        return directory, parent, os.path.basename(directory)
+
+    def _upsert_rows(self, rows: List[Tuple]) -> None:
+        self._conn.executemany(
+            "INSERT INTO products (path, dir, root, pair, name, stage, size, mtime, params_hash) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET size=excluded.size, mtime=excluded.mtime, "
+            "stage=COALESCE(excluded.stage, products.stage), "
+            "params_hash=CASE WHEN excluded.mtime = products.mtime AND excluded.size = products.size "
+            "THEN products.params_hash ELSE excluded.params_hash END",
+            rows
+        )
+
+    def _scan_dir(self, directory: str, root: str, pair: str) -> Optional[List[str]]:
+        """List the files of one directory into the catalog; returns its subdirectory names."""
+        rows = []
+        subdirs = []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            subdirs.append(entry.name)
+                        elif entry.is_file():
+                            st = entry.stat()
+                            rows.append((entry.path, directory, root, pair, entry.name,
+                                         stage_for_name(entry.name), st.st_size, st.st_mtime, None))
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        present = {row[0] for row in rows}
+        stale = [(path,) for (path,) in self._conn.execute(
+            "SELECT path FROM products WHERE dir = ?", (directory,)
+        ) if path not in present]
+        self._conn.executemany("DELETE FROM products WHERE path = ?", stale)
+        self._upsert_rows(rows)
+        return subdirs
+
+    def reconcile(self, root: str) -> None:
+        """
+        Bring the catalog in line with the files in root and its direct subdirectories.
+
+        Only directories whose modification time changed since the last
+        reconcile are listed again, so an unchanged tree costs one scandir
+        of root plus one stat per subdirectory.
+
+        Args:
+            root: Processing root (e.g. intf_all, merge, SBAS or raw folder)
+        """
+        root = os.path.abspath(root)
+        with self._lock, self._conn:
+            known = dict(self._conn.execute(
+                "SELECT path, mtime_ns FROM dirs WHERE root = ? OR path = ?", (root, root)
+            ).fetchall())
+            try:
+                root_mtime = os.stat(root).st_mtime_ns
+            except OSError:
+                self._forget(root)
+                return
+
+            if known.get(root) == root_mtime:
+                subdirs = [os.path.basename(p) for p in known if p != root]
+            else:
+                subdirs = self._scan_dir(root, os.path.dirname(root), os.path.basename(root))
+                if subdirs is None:
+                    return
+                self._conn.execute("INSERT OR REPLACE INTO dirs (path, root, mtime_ns) VALUES (?, ?, ?)",
+                                   (root, os.path.dirname(root), root_mtime))
+                current = {os.path.join(root, d) for d in subdirs}
+                for stale in set(known) - current - {root}:
+                    self._forget(stale)
+
+            for name in subdirs:
+                directory = os.path.join(root, name)
+                try:
+                    mtime = os.stat(directory).st_mtime_ns
+                except OSError:
+                    self._forget(directory)
+                    continue
+                if known.get(directory) == mtime:
+                    continue
+                if self._scan_dir(directory, root, name) is not None:
+                    self._conn.execute("INSERT OR REPLACE INTO dirs (path, root, mtime_ns) VALUES (?, ?, ?)",
+                                       (directory, root, mtime))
+
+    def _forget(self, directory: str) -> None:
+        self._conn.execute("DELETE FROM products WHERE dir = ?", (directory,))
+        self._conn.execute("DELETE FROM dirs WHERE path = ?", (directory,))
+
+    def record(self, path: str, stage: Optional[str] = None, params_hash: Optional[str] = None) -> None:
+        """
+        Record a product that a stage has just written.
+
+        Args:
+            path: Product file path
+            stage: Producing stage (defaults to the stage known for the file name)
+            params_hash: Hash of the inputs/parameters the product was made with
+        """
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.remove(path)
+            return
+        directory, root, pair = self._split(path)
+        name = os.path.basename(path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO products (path, dir, root, pair, name, stage, size, mtime, params_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, directory, root, pair, name, stage or stage_for_name(name), st.st_size, st.st_mtime, params_hash)
+            )
+
+    def remove(self, path: str) -> None:
+        """Remove a product from the catalog."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM products WHERE path = ?", (os.path.abspath(path),))
+
+    def listdir(self, directory: str, reconcile: bool = True) -> List[str]:
+        """
+        List the file names of a directory from the catalog.
+
+        Args:
+            directory: Directory to list (a processing root or one of its pair folders)
+            reconcile: Whether to reconcile the directory first
+        """
+        directory = os.path.abspath(directory)
+        if reconcile:
+            self.reconcile(directory)
+        with self._lock:
+            rows = self._conn.execute("SELECT name FROM products WHERE dir = ?", (directory,)).fetchall()
+        return [name for (name,) in rows]
+
+    def subdirs(self, root: str, reconcile: bool = True) -> List[str]:
+        """List the names of the pair folders under a processing root."""
+        root = os.path.abspath(root)
+        if reconcile:
+            self.reconcile(root)
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM dirs WHERE root = ?", (root,)).fetchall()
+        return [os.path.basename(path) for (path,) in rows]
+
+    def pairs_with(self, root: str, filename: str, reconcile: bool = True) -> Set[str]:
+        """
+        Get the pair folders under root that contain a product file.
+
+        Args:
+            root: Processing root (e.g. intf_all or merge)
+            filename: Product file name (e.g. "corr.grd")
+            reconcile: Whether to reconcile root first
+
+        Returns:
+            Set of pair folder names
+        """
+        root = os.path.abspath(root)
+        if reconcile:
+            self.reconcile(root)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT pair FROM products WHERE root = ? AND name = ?", (root, filename)
+            ).fetchall()
+        return {pair for (pair,) in rows}
+
+    def count_pairs_with(self, root: str, filename: str, reconcile: bool = True) -> int:
+        """Count the pair folders under root that contain a product file."""
+        return len(self.pairs_with(root, filename, reconcile))
+
+    def find(self, root: str, pattern: str, reconcile: bool = True) -> List[str]:
+        """
+        Find files in root and its pair folders whose name matches a regex.
+
+        Args:
+            root: Processing root
+            pattern: Regular expression matched against file names
+            reconcile: Whether to reconcile root first
+
+        Returns:
+            Sorted list of matching file paths
+        """
+        root = os.path.abspath(root)
+        if reconcile:
+            self.reconcile(root)
+        regex = re.compile(pattern)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, name FROM products WHERE dir = ? OR root = ?", (root, root)
+            ).fetchall()
+        return sorted(path for path, name in rows if regex.match(name))
+
+    def aligned_scenes(self, raw_dir: str, reconcile: bool = True) -> Dict[str, str]:
+        """
+        Get the aligned scenes (S1_<date>_ALL_F<n>.SLC) of a raw folder.
+
+        Returns:
+            Dictionary mapping acquisition date (YYYYMMDD) to SLC path
+        """
+        scenes = {}
+        for path in self.find(raw_dir, SCENE_PATTERN.pattern, reconcile):
+            match = SCENE_PATTERN.match(os.path.basename(path))
+            if match and os.path.dirname(path) == os.path.abspath(raw_dir):
+                scenes[match.group(1)] = path
+        return scenes
+
+    def get_product(self, path: str) -> Optional[Dict[str, object]]:
+        """Get the catalog record of a product, or None if it is not catalogued."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, stage, size, mtime, params_hash FROM products WHERE path = ?",
+                (os.path.abspath(path),)
+            ).fetchone()
+        if not row:
+            return None
+        return dict(zip(("path", "stage", "size", "mtime", "params_hash"), row))
+
+
+_catalogs: Dict[Tuple[int, str], ProductCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(path: str) -> ProductCatalog:
+    """
+    Get the product catalog of the project containing path.
+
+    The catalog lives next to the project's .config.json; outside a project
+    it is kept in the given directory. Catalogs are cached per process.
+
+    Args:
+        path: Any file or directory inside a project
+
+    Returns:
+        ProductCatalog instance
+    """
+    path = os.path.abspath(path)
+    root = find_project_root(path) or (path if os.path.isdir(path) else os.path.dirname(path))
+    db_path = os.path.join(root, CATALOG_FILENAME)
+    # sqlite connections must not be shared with forked worker processes
+    key = (os.getpid(), db_path)
+    with _catalogs_lock:
+        if key not in _catalogs:
+            _catalogs[key] = ProductCatalog(db_path)
+        return _catalogs[key]
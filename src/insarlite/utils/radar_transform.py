@@ -0,0 +1,218 @@
+"""
+Radar/geographic coordinate transforms for InSARLite.
+Builds an in-memory transformer from topo/trans.dat (the SAT_llt2rat output
+for every DEM node: range, azimuth, height, lon, lat as binary doubles) so
+points can be converted in batches without forking SAT_llt2rat/SAT_rat2ll or
+writing temporary point files. Geographic to radar is a bilinear lookup on
+the DEM lattice; radar to geographic inverts it with Newton iterations
+started from a coarse inverse table.
+"""
+
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+TRANS_COLUMNS = 5  # range, azimuth, height, lon, lat
+MAX_GRID_NODES = 8_000_000
+INVERSE_BINS = 512
+READ_CHUNK_ROWS = 2_000_000
+NEWTON_ITERATIONS = 8
+# Radar points whose forward residual stays above this (pixels) are outside the DEM
+MAX_RESIDUAL = 0.5
+
+_transformers: Dict[Tuple[str, int, int], "RadarGeoTransformer"] = {}
+_transformers_lock = threading.Lock()
+
+
+def _axis_step(values: np.ndarray) -> float:
+    """Get the lattice spacing of one coordinate from its consecutive differences."""
+    diffs = np.abs(np.diff(values))
+    diffs = diffs[diffs > 0]
+    if diffs.size == 0:
+        raise ValueError("trans.dat does not contain a 2-D lattice")
+    return float(np.median(diffs))
+
+
+class RadarGeoTransformer:
+    """Converts between radar (range, azimuth) and geographic (lon, lat) coordinates."""
+
+    def __init__(self, rng: np.ndarray, azi: np.ndarray, lon0: float, lat0: float,
+                 dlon: float, dlat: float):
+        """
+        Args:
+            rng, azi: Radar coordinates on the DEM lattice, shape (nlat, nlon), NaN where unknown
+            lon0, lat0: Coordinates of lattice node [0, 0]
+            dlon, dlat: Lattice spacing in degrees
+        """
+        self.rng = rng
+        self.azi = azi
+        self.lon0, self.lat0 = lon0, lat0
+        self.dlon, self.dlat = dlon, dlat
+        self._build_inverse_table()
+
+    @classmethod
+    def from_trans_dat(cls, path: str, max_nodes: int = MAX_GRID_NODES) -> "RadarGeoTransformer":
+        """
+        Build a transformer from a GMTSAR trans.dat file.
+
+        Large DEMs are decimated to at most max_nodes lattice nodes; the
+        mapping is smooth, so bilinear interpolation keeps sub-pixel accuracy.
+        """
+        data = np.memmap(path, dtype="<f8", mode="r")
+        if data.size % TRANS_COLUMNS:
+            raise ValueError(f"{path} is not a {TRANS_COLUMNS}-column binary double file")
+        data = data.reshape(-1, TRANS_COLUMNS)
+
+        # DEM nodes are written row by row, so the lattice spacing shows in consecutive points
+        head = np.asarray(data[:min(len(data), READ_CHUNK_ROWS)])
+        dlon = _axis_step(head[:, 3])
+        dlat = _axis_step(head[:, 4]) if np.ptp(head[:, 4]) > 0 else _axis_step(data[:, 4])
+        lon0 = lat0 = np.inf
+        lon1 = lat1 = -np.inf
+        for start in range(0, len(data), READ_CHUNK_ROWS):
+            chunk = data[start:start + READ_CHUNK_ROWS]
+            lon0, lon1 = min(lon0, chunk[:, 3].min()), max(lon1, chunk[:, 3].max())
+            lat0, lat1 = min(lat0, chunk[:, 4].min()), max(lat1, chunk[:, 4].max())
+        nlon = int(round((lon1 - lon0) / dlon)) + 1
+        nlat = int(round((lat1 - lat0) / dlat)) + 1
+        step = max(1, int(np.ceil(np.sqrt(nlon * nlat / max_nodes))))
+        shape = ((nlat - 1) // step + 1, (nlon - 1) // step + 1)
+
+        rng = np.full(shape, np.nan)
+        azi = np.full(shape, np.nan)
+        for start in range(0, len(data), READ_CHUNK_ROWS):
+            chunk = np.asarray(data[start:start + READ_CHUNK_ROWS])
+            ix = np.rint((chunk[:, 3] - lon0) / dlon).astype(np.int64)
+            iy = np.rint((chunk[:, 4] - lat0) / dlat).astype(np.int64)
+            keep = (ix % step == 0) & (iy % step == 0)
+            rng[iy[keep] // step, ix[keep] // step] = chunk[keep, 0]
+            azi[iy[keep] // step, ix[keep] // step] = chunk[keep, 1]
+        return cls(rng, azi, float(lon0), float(lat0), dlon * step, dlat * step)
+
+    def _bilinear(self, lon: np.ndarray, lat: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        ny, nx = self.rng.shape
+        fx = (lon - self.lon0) / self.dlon
+        fy = (lat - self.lat0) / self.dlat
+        outside = (fx < 0) | (fy < 0) | (fx > nx - 1) | (fy > ny - 1) | ~np.isfinite(fx) | ~np.isfinite(fy)
+        i0 = np.clip(np.floor(np.nan_to_num(fx)).astype(np.int64), 0, max(nx - 2, 0))
+        j0 = np.clip(np.floor(np.nan_to_num(fy)).astype(np.int64), 0, max(ny - 2, 0))
+        i1, j1 = np.minimum(i0 + 1, nx - 1), np.minimum(j0 + 1, ny - 1)
+        tx, ty = np.nan_to_num(fx) - i0, np.nan_to_num(fy) - j0
+        results = []
+        for grid in (self.rng, self.azi):
+            value = (grid[j0, i0] * (1 - tx) * (1 - ty) + grid[j0, i1] * tx * (1 - ty)
+                     + grid[j1, i0] * (1 - tx) * ty + grid[j1, i1] * tx * ty)
+            value[outside] = np.nan
+            results.append(value)
+        return results[0], results[1]
+
+    def _build_inverse_table(self) -> None:
+        """Bin lattice nodes by radar position to start the inverse from a nearby guess."""
+        valid = np.isfinite(self.rng) & np.isfinite(self.azi)
+        jj, ii = np.nonzero(valid)
+        r, a = self.rng[valid], self.azi[valid]
+        self._r0, self._a0 = float(r.min()), float(a.min())
+        self._dr = max(float(r.max() - self._r0) / INVERSE_BINS, 1e-9)
+        self._da = max(float(a.max() - self._a0) / INVERSE_BINS, 1e-9)
+        bins = self._bin_index(r, a)
+        count = np.bincount(bins, minlength=INVERSE_BINS * INVERSE_BINS).astype(float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            table_i = np.bincount(bins, ii, INVERSE_BINS * INVERSE_BINS) / count
+            table_j = np.bincount(bins, jj, INVERSE_BINS * INVERSE_BINS) / count
+        table_i = table_i.reshape(INVERSE_BINS, INVERSE_BINS)
+        table_j = table_j.reshape(INVERSE_BINS, INVERSE_BINS)
+        # Spread known cells into empty ones so every bin has a starting guess
+        while np.isnan(table_i).any():
+            missing = np.isnan(table_i)
+            filled = False
+            for axis, shift in ((0, 1), (0, -1), (1, 1), (1, -1)):
+                src_i, src_j = np.roll(table_i, shift, axis), np.roll(table_j, shift, axis)
+                take = missing & np.isfinite(src_i)
+                table_i[take], table_j[take] = src_i[take], src_j[take]
+                missing &= ~take
+                filled |= take.any()
+            if not filled:
+                break
+        self._table_i, self._table_j = table_i, table_j
+
+    def _bin_index(self, r: np.ndarray, a: np.ndarray) -> np.ndarray:
+        br = np.clip(((r - self._r0) / self._dr).astype(np.int64), 0, INVERSE_BINS - 1)
+        ba = np.clip(((a - self._a0) / self._da).astype(np.int64), 0, INVERSE_BINS - 1)
+        return ba * INVERSE_BINS + br
+
+    def ll_to_ra(self, lon, lat) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Convert geographic to radar coordinates.
+
+        Args:
+            lon, lat: Scalars or arrays in degrees
+
+        Returns:
+            (range, azimuth) arrays, NaN outside the DEM
+        """
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        return self._bilinear(lon, lat)
+
+    def ra_to_ll(self, rng, azi) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Convert radar to geographic coordinates.
+
+        Args:
+            rng, azi: Scalars or arrays in radar pixels
+
+        Returns:
+            (lon, lat) arrays, NaN outside the DEM footprint
+        """
+        rng = np.atleast_1d(np.asarray(rng, dtype=float))
+        azi = np.atleast_1d(np.asarray(azi, dtype=float))
+        bins = self._bin_index(np.nan_to_num(rng), np.nan_to_num(azi))
+        lon = self.lon0 + self._table_i.ravel()[bins] * self.dlon
+        lat = self.lat0 + self._table_j.ravel()[bins] * self.dlat
+        hx, hy = 0.5 * self.dlon, 0.5 * self.dlat
+        for _ in range(NEWTON_ITERATIONS):
+            r, a = self._bilinear(lon, lat)
+            er, ea = r - rng, a - azi
+            r_x, a_x = self._bilinear(lon + hx, lat)
+            r_y, a_y = self._bilinear(lon, lat + hy)
+            j11, j21 = (r_x - r) / hx, (a_x - a) / hx
+            j12, j22 = (r_y - r) / hy, (a_y - a) / hy
+            det = j11 * j22 - j12 * j21
+            with np.errstate(invalid="ignore", divide="ignore"):
+                step_lon = (j22 * er - j12 * ea) / det
+                step_lat = (-j21 * er + j11 * ea) / det
+            ok = np.isfinite(step_lon) & np.isfinite(step_lat)
+            # Damp steps to a few lattice cells so iterations stay on the DEM
+            lon = np.where(ok, lon - np.clip(step_lon, -4 * self.dlon, 4 * self.dlon), lon)
+            lat = np.where(ok, lat - np.clip(step_lat, -4 * self.dlat, 4 * self.dlat), lat)
+        r, a = self._bilinear(lon, lat)
+        bad = ~(np.hypot(r - rng, a - azi) <= MAX_RESIDUAL)
+        lon[bad] = np.nan
+        lat[bad] = np.nan
+        return lon, lat
+
+
+def get_transformer(topodir: str) -> Optional[RadarGeoTransformer]:
+    """
+    Get the (cached) transformer of a topo or merge folder.
+
+    Returns:
+        Transformer, or None if the folder has no usable trans.dat
+    """
+    path = os.path.realpath(os.path.join(topodir, "trans.dat"))
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (path, st.st_size, st.st_mtime_ns)
+    with _transformers_lock:
+        if key not in _transformers:
+            try:
+                _transformers[key] = RadarGeoTransformer.from_trans_dat(path)
+            except (OSError, ValueError) as e:
+                print(f"Could not build coordinate transformer from {path}: {e}")
+                return None
+        return _transformers[key]
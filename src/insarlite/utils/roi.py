@@ -0,0 +1,266 @@
+"""
+Region of interest utilities for InSARLite.
+Keeps a radar-coordinate bounding box (range/azimuth) next to the
+interferograms so unwrapping, normalization and SBAS run on a crop of the
+frame instead of its full extent. The box can be drawn, taken from the
+valid area of mask_def.grd or converted from a geographic bounding box.
+"""
+
+import os
+import json
+import subprocess
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .radar_transform import get_transformer
+
+
+ROI_FILE = "roi.json"
+CROPPED_CORR = "corr_roi.grd"
+
+
+def roi_path(ifgsroot: str) -> str:
+    """Get the ROI file path of an interferogram folder."""
+    return os.path.join(ifgsroot, ROI_FILE)
+
+
+def read_roi(ifgsroot: str) -> Optional[Dict[str, float]]:
+    """
+    Read the ROI of an interferogram folder.
+
+    Returns:
+        {'x0','x1','y0','y1'} in radar coordinates, or None if no ROI is set
+    """
+    if not ifgsroot:
+        return None
+    path = roi_path(ifgsroot)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+        return {k: float(data[k]) for k in ("x0", "x1", "y0", "y1")}
+    except Exception as e:
+        print(f"Warning: Could not read ROI from {path}: {e}")
+        return None
+
+
+def write_roi(ifgsroot: str, roi: Dict[str, float], source: str = "drawn") -> Dict[str, float]:
+    """
+    Write the ROI of an interferogram folder, snapped to the interferogram grid.
+
+    Args:
+        ifgsroot: Interferogram folder
+        roi: {'x0','x1','y0','y1'} in radar coordinates
+        source: How the ROI was defined (drawn, mask, config, ...)
+
+    Returns:
+        The ROI as written
+    """
+    reference = _reference_grid(ifgsroot)
+    if reference:
+        try:
+            roi = snap_roi(roi, reference)
+        except (subprocess.CalledProcessError, FileNotFoundError) as e:
+            print(f"Warning: Could not snap the ROI to {reference}: {e}")
+    record = dict(roi)
+    record["source"] = source
+    record["created"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    tmp_path = roi_path(ifgsroot) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(record, f, indent=2)
+    os.replace(tmp_path, roi_path(ifgsroot))
+    print(f"ROI set ({source}): range {roi['x0']:g}-{roi['x1']:g}, azimuth {roi['y0']:g}-{roi['y1']:g}")
+    return roi
+
+
+def clear_roi(ifgsroot: str) -> None:
+    """Remove the ROI of an interferogram folder (full frame processing)."""
+    path = roi_path(ifgsroot)
+    if os.path.exists(path):
+        os.remove(path)
+        print("ROI cleared, interferograms are processed at their full extent")
+
+
+def roi_region(roi: Optional[Dict[str, float]]) -> str:
+    """Get the GMT region string (x0/x1/y0/y1) of an ROI, or '' for none."""
+    if not roi:
+        return ""
+    return f"{roi['x0']:g}/{roi['x1']:g}/{roi['y0']:g}/{roi['y1']:g}"
+
+
+def parse_region(region: str) -> Dict[str, float]:
+    """Parse an x0/x1/y0/y1 region string into an ROI."""
+    parts = [float(p) for p in region.split("/")]
+    if len(parts) != 4:
+        raise ValueError(f"Region must be x0/x1/y0/y1, got {region}")
+    x0, x1, y0, y1 = parts
+    return {"x0": min(x0, x1), "x1": max(x0, x1), "y0": min(y0, y1), "y1": max(y0, y1)}
+
+
+def grid_info(grd: str) -> Tuple[float, float, float, float, float, float]:
+    """Get (xmin, xmax, ymin, ymax, xinc, yinc) of a grid with gmt grdinfo -C."""
+    info = subprocess.run(["gmt", "grdinfo", "-C", grd], capture_output=True, text=True,
+                          check=True).stdout.split()
+    xmin, xmax, ymin, ymax = (float(v) for v in info[1:5])
+    xinc, yinc = float(info[7]), float(info[8])
+    return xmin, xmax, ymin, ymax, xinc, yinc
+
+
+def snap_roi(roi: Dict[str, float], grd: str) -> Dict[str, float]:
+    """
+    Clip an ROI to the extent of a grid and snap it outwards to its nodes.
+
+    Raises:
+        ValueError: If the ROI does not overlap the grid
+    """
+    xmin, xmax, ymin, ymax, xinc, yinc = grid_info(grd)
+    x0 = max(xmin, xmin + np.floor((roi["x0"] - xmin) / xinc) * xinc)
+    x1 = min(xmax, xmin + np.ceil((roi["x1"] - xmin) / xinc) * xinc)
+    y0 = max(ymin, ymin + np.floor((roi["y0"] - ymin) / yinc) * yinc)
+    y1 = min(ymax, ymin + np.ceil((roi["y1"] - ymin) / yinc) * yinc)
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError(f"ROI {roi_region(roi)} does not overlap the grid {grd}")
+    return {"x0": float(x0), "x1": float(x1), "y0": float(y0), "y1": float(y1)}
+
+
+def mask_roi(mask_grd: str) -> Optional[Dict[str, float]]:
+    """
+    Get the bounding box of the unmasked (non-NaN) pixels of a mask grid.
+
+    Returns:
+        ROI in radar coordinates, or None if the mask has no valid pixels
+    """
+    import rioxarray
+
+    ds = rioxarray.open_rasterio(mask_grd)
+    try:
+        data = ds.values.squeeze()
+        valid = np.isfinite(data) & (data != 0)
+        if not valid.any():
+            return None
+        rows = np.nonzero(valid.any(axis=1))[0]
+        cols = np.nonzero(valid.any(axis=0))[0]
+        xs = ds.x.values[[cols[0], cols[-1]]]
+        ys = ds.y.values[[rows[0], rows[-1]]]
+    finally:
+        ds.close()
+    return {"x0": float(xs.min()), "x1": float(xs.max()), "y0": float(ys.min()), "y1": float(ys.max())}
+
+
+def geographic_roi(bbox: Dict[str, float], topodir: str, samples: int = 10) -> Optional[Dict[str, float]]:
+    """
+    Convert a geographic bounding box into an ROI in radar coordinates.
+
+    Points along the box edges are converted with the trans.dat transformer
+    (SAT_llt2rat at zero elevation if it is unavailable) and their radar
+    bounding box is returned.
+
+    Args:
+        bbox: {'w','e','s','n'} in degrees
+        topodir: Folder holding trans.dat and master.PRM
+        samples: Points per box edge
+
+    Returns:
+        ROI, or None if the conversion failed
+    """
+    lons = np.linspace(bbox["w"], bbox["e"], samples)
+    lats = np.linspace(bbox["s"], bbox["n"], samples)
+    edge = [(lon, bbox["s"]) for lon in lons] + [(lon, bbox["n"]) for lon in lons]
+    edge += [(bbox["w"], lat) for lat in lats] + [(bbox["e"], lat) for lat in lats]
+    transformer = get_transformer(topodir)
+    if transformer is not None:
+        edge_lon, edge_lat = np.array(edge).T
+        x, y = transformer.ll_to_ra(edge_lon, edge_lat)
+        inside = np.isfinite(x) & np.isfinite(y)
+        if inside.any():
+            return {"x0": float(x[inside].min()), "x1": float(x[inside].max()),
+                    "y0": float(y[inside].min()), "y1": float(y[inside].max())}
+    points = "".join(f"{lon} {lat} 0\n" for lon, lat in edge)
+    prm = os.path.join(topodir, "master.PRM")
+    result = subprocess.run(["SAT_llt2rat", prm, "0"], input=points, capture_output=True, text=True,
+                            cwd=topodir)
+    coords = [line.split()[:2] for line in result.stdout.splitlines() if len(line.split()) >= 2]
+    if result.returncode != 0 or not coords:
+        print(f"Could not convert the geographic ROI to radar coordinates: {result.stderr.strip()}")
+        return None
+    xy = np.array(coords, dtype=float)
+    return {"x0": float(xy[:, 0].min()), "x1": float(xy[:, 0].max()),
+            "y0": float(xy[:, 1].min()), "y1": float(xy[:, 1].max())}
+
+
+def roi_fraction(roi: Optional[Dict[str, float]], grd: str) -> float:
+    """Get the fraction of a grid's area covered by an ROI (1.0 without ROI)."""
+    if not roi or not os.path.exists(grd):
+        return 1.0
+    try:
+        xmin, xmax, ymin, ymax, _, _ = grid_info(grd)
+    except (subprocess.CalledProcessError, FileNotFoundError, IndexError, ValueError):
+        return 1.0
+    width = max(0.0, min(roi["x1"], xmax) - max(roi["x0"], xmin))
+    height = max(0.0, min(roi["y1"], ymax) - max(roi["y0"], ymin))
+    area = (xmax - xmin) * (ymax - ymin)
+    return min(1.0, width * height / area) if area > 0 else 1.0
+
+
+def resolve_roi(spec, ifgsroot: str, topodir: str) -> Tuple[Optional[Dict[str, float]], str]:
+    """
+    Resolve an ROI specification from the command line or project configuration.
+
+    Args:
+        spec: "mask" (bounding box of mask_def.grd), an x0/x1/y0/y1 radar
+            region string, or a {'w','e','s','n'} geographic bounding box
+        ifgsroot: Interferogram folder
+        topodir: Folder holding master.PRM (for geographic boxes)
+
+    Returns:
+        (ROI or None, source name)
+    """
+    if isinstance(spec, dict):
+        return geographic_roi({k: float(spec[k]) for k in ("w", "e", "s", "n")}, topodir), "config"
+    if spec == "mask":
+        mask_grd = os.path.join(ifgsroot, "mask_def.grd")
+        if not os.path.exists(mask_grd):
+            raise FileNotFoundError(f"ROI from mask requested but {mask_grd} does not exist")
+        return mask_roi(mask_grd), "mask"
+    return parse_region(spec), "region"
+
+
+def crop_like(src: str, like: str, dst: str) -> None:
+    """Crop a grid to the region of another grid (gmt grdcut -R<like>)."""
+    tmp = dst + ".tmp.grd"
+    subprocess.run(["gmt", "grdcut", src, f"-R{like}", f"-G{tmp}"], check=True, capture_output=True)
+    os.replace(tmp, dst)
+
+
+def ensure_cropped_corr(ifg_dir: str, unwrap_name: str = "unwrap.grd") -> bool:
+    """
+    Make the correlation grid of an interferogram match its cropped unwrap grid.
+
+    Returns:
+        True if corr_roi.grd exists and is up to date
+    """
+    corr = os.path.join(ifg_dir, "corr.grd")
+    unwrap = os.path.join(ifg_dir, unwrap_name)
+    cropped = os.path.join(ifg_dir, CROPPED_CORR)
+    if not os.path.exists(corr) or not os.path.exists(unwrap):
+        return False
+    if os.path.exists(cropped) and os.path.getmtime(cropped) >= os.path.getmtime(unwrap):
+        return True
+    try:
+        crop_like(corr, unwrap, cropped)
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"Could not crop {corr} to the ROI: {e.stderr.decode(errors='ignore').strip() if e.stderr else e}")
+        return False
+
+
+def _reference_grid(ifgsroot: str) -> Optional[str]:
+    """Get a grid on the interferogram raster of a folder, for snapping the ROI."""
+    for name in ("corr_stack.grd", "mask_def.grd"):
+        path = os.path.join(ifgsroot, name)
+        if os.path.exists(path):
+            return path
+    return None
@@ -0,0 +1,71 @@
+"""
+Run policy utilities for InSARLite.
+Lets processing functions ask yes/no questions through a messagebox in the
+GUI, or answer them from policy flags when running headless.
+"""
+
+from typing import Dict, Optional
+
+# Decisions processing functions may need to make; None means "ask the user"
+POLICY_NAMES = (
+    "alignment_backup",   # Back up aligned SLC files before re-alignment
+    "sbas_redo",          # Redo SBAS when displacement grids already exist
+)
+
+_policies: Dict[str, Optional[bool]] = {name: None for name in POLICY_NAMES}
+_headless = False
+
+
+def set_headless(headless: bool = True) -> None:
+    """Mark the process as headless (no Tk windows may be created)."""
+    global _headless
+    _headless = headless
+
+
+def is_headless() -> bool:
+    """Check whether the process runs without a GUI."""
+    return _headless
+
+
+def set_policy(name: str, value: Optional[bool]) -> None:
+    """
+    Set the answer to a policy question.
+
+    Args:
+        name: Policy name (one of POLICY_NAMES)
+        value: True/False, or None to ask the user
+    """
+    if name not in _policies:
+        raise ValueError(f"Unknown policy: {name}")
+    _policies[name] = value
+
+
+def get_policy(name: str) -> Optional[bool]:
+    """Get the answer to a policy question, or None if the user should be asked."""
+    return _policies.get(name)
+
+
+def confirm(name: str, title: str, message: str, parent=None, default: bool = False) -> bool:
+    """
+    Answer a yes/no question from its policy, or ask the user in the GUI.
+
+    Headless runs without a policy for the question use the default answer.
+
+    Args:
+        name: Policy name
+        title: Dialog title
+        message: Dialog message
+        parent: Parent window of the dialog
+        default: Answer used when headless and no policy is set
+
+    Returns:
+        True for yes, False for no
+    """
+    answer = get_policy(name)
+    if answer is None and _headless:
+        answer = default
+    if answer is not None:
+        print(f"{title}: {'yes' if answer else 'no'} (policy '{name}')")
+        return answer
+    from tkinter import messagebox
+    return messagebox.askyesno(title, message, parent=parent)
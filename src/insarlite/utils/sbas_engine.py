@@ -0,0 +1,359 @@
+"""
+In-process SBAS inversion for InSARLite.
+An alternative to the GMTSAR sbas/sbas_parallel binaries that reads the
+same intf.tab/scene.tab and writes the same disp_<scene>.grd, vel.grd,
+rms.grd and dem.grd. The unwrapped interferograms are packed once into a
+memory-mapped cube, the design matrix is built once from the tables, and
+pixel blocks are solved in a process pool: pixels sharing a valid
+interferogram pattern share one pseudo-inverse, the rest are solved with
+batched normal equations. Finished blocks are checkpointed, so an
+interrupted inversion resumes where it stopped; the cube and checkpoint are
+deleted once the inversion completes.
+"""
+
+import os
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .memory_planner import plan_workers
+from .stage_cache import inputs_hash, params_hash
+
+
+# Pixels per block; a block reads (interferograms x pixels) float32 from the cube
+BLOCK_PIXELS = 65536
+# Patterns shared by fewer pixels are solved with per-pixel normal equations
+MIN_PATTERN_PIXELS = 8
+# Pseudo-inverses kept per worker across blocks
+PATTERN_CACHE_SIZE = 4096
+NORMAL_BATCH = 1024
+# Pixels with fewer valid interferograms than this share of the network are left NaN
+MIN_VALID_FRACTION = 0.5
+# Phase (radians) to LOS displacement (mm) per meter of wavelength, as GMTSAR sbas
+PHASE_TO_MM = -1000.0 / (4 * np.pi)
+
+CUBE_FILE = "sbas_cube.dat"
+CUBE_INFO = "sbas_cube.json"
+RESULT_FILE = "sbas_result.dat"
+CHECKPOINT_FILE = "sbas_checkpoint.json"
+
+_worker: Dict[str, Any] = {}
+
+
+def read_tables(intf_tab: str, scene_tab: str):
+    """
+    Read the GMTSAR SBAS tables.
+
+    Returns:
+        (interferograms [{'unwrap', 'corr', 'ref', 'rep', 'baseline'}],
+         scene ids sorted by time, scene days)
+    """
+    base = os.path.dirname(os.path.abspath(intf_tab))
+    scenes = []
+    with open(scene_tab) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2:
+                scenes.append((parts[0], float(parts[1])))
+    scenes.sort(key=lambda s: s[1])
+    ifgs = []
+    with open(intf_tab) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 5:
+                ifgs.append({"unwrap": os.path.join(base, parts[0]), "corr": os.path.join(base, parts[1]),
+                             "ref": parts[2], "rep": parts[3], "baseline": float(parts[4])})
+    if not ifgs or len(scenes) < 2:
+        raise ValueError(f"{intf_tab} and {scene_tab} do not describe an interferogram network")
+    return ifgs, [s[0] for s in scenes], np.array([s[1] for s in scenes])
+
+
+def build_system(ifgs: List[Dict[str, Any]], scene_ids: List[str], days: np.ndarray, wavelength: float,
+                 slant_range: float, incidence: float, smooth: float, dem: bool) -> Dict[str, np.ndarray]:
+    """
+    Build the SBAS design matrices.
+
+    Unknowns are the phase increments between consecutive scenes (plus the
+    DEM error in meters with dem); each interferogram sums the increments
+    between its scenes. Smoothing rows penalize changes of the phase rate
+    between consecutive intervals.
+
+    Returns:
+        {'A': (ifgs, unknowns), 'L': smoothing rows, 'S': scene incidence (ifgs, scenes),
+         'years': scene times in years}
+    """
+    index = {sid: i for i, sid in enumerate(scene_ids)}
+    nscene, nifg = len(scene_ids), len(ifgs)
+    nunk = nscene - 1 + (1 if dem else 0)
+    A = np.zeros((nifg, nunk))
+    S = np.zeros((nifg, nscene))
+    for j, ifg in enumerate(ifgs):
+        if ifg["ref"] not in index or ifg["rep"] not in index:
+            raise ValueError(f"Scene of {ifg['unwrap']} is missing from scene.tab")
+        a, b = index[ifg["ref"]], index[ifg["rep"]]
+        sign = 1.0 if b > a else -1.0
+        A[j, min(a, b):max(a, b)] = sign
+        S[j, a], S[j, b] = -1.0, 1.0
+        if dem:
+            A[j, -1] = 4 * np.pi * ifg["baseline"] / (wavelength * slant_range * np.sin(np.radians(incidence)))
+    years = (days - days[0]) / 365.25
+    dt = np.maximum(np.diff(years), 1e-6)
+    L = np.zeros((max(nscene - 2, 0), nunk))
+    for k in range(nscene - 2):
+        L[k, k] = -smooth / dt[k]
+        L[k, k + 1] = smooth / dt[k + 1]
+    return {"A": A, "L": L, "S": S, "years": years}
+
+
+def _pattern_pinv(valid_row: np.ndarray) -> np.ndarray:
+    """Get the (cached) pseudo-inverse columns of the valid interferograms of a pattern."""
+    key = np.packbits(valid_row).tobytes()
+    cache = _worker["pinv_cache"]
+    pinv = cache.get(key)
+    if pinv is None:
+        A, L = _worker["A"], _worker["L"]
+        rows = A[valid_row]
+        pinv = np.linalg.pinv(np.vstack([rows, L]))[:, :len(rows)]
+        if len(cache) >= PATTERN_CACHE_SIZE:
+            cache.pop(next(iter(cache)))
+        cache[key] = pinv
+    return pinv
+
+
+def _solve_normal(y: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Solve pixels with individual valid patterns by batched normal equations."""
+    A, outer, LtL = _worker["A"], _worker["outer"], _worker["LtL"]
+    nunk = A.shape[1]
+    x = np.full((len(y), nunk), np.nan)
+    for start in range(0, len(y), NORMAL_BATCH):
+        w = valid[start:start + NORMAL_BATCH].astype(float)
+        normal = (w @ outer).reshape(-1, nunk, nunk) + LtL
+        rhs = (np.where(w > 0, y[start:start + NORMAL_BATCH], 0.0)) @ A
+        try:
+            x[start:start + NORMAL_BATCH] = np.linalg.solve(normal, rhs[..., None])[..., 0]
+        except np.linalg.LinAlgError:
+            # Singular networks (no smoothing, disconnected scenes): minimum-norm solutions
+            for i in range(len(w)):
+                rows = np.vstack([A[w[i] > 0], _worker["L"]])
+                rhs_i = np.concatenate([y[start + i][w[i] > 0], np.zeros(len(_worker["L"]))])
+                x[start + i] = np.linalg.lstsq(rows, rhs_i, rcond=None)[0]
+    return x
+
+
+def _solve(y: np.ndarray, valid: np.ndarray, inverse: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Solve the unknowns of pixels (pixels, ifgs) grouped by valid pattern."""
+    x = np.full((len(y), _worker["A"].shape[1]), np.nan)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.concatenate([[0], np.cumsum(counts)])
+    rare = []
+    for g in range(len(counts)):
+        members = order[bounds[g]:bounds[g + 1]]
+        if counts[g] < MIN_PATTERN_PIXELS:
+            rare.append(members)
+            continue
+        pattern = valid[members[0]]
+        x[members] = y[members][:, pattern] @ _pattern_pinv(pattern).T
+    if rare:
+        rare = np.concatenate(rare)
+        x[rare] = _solve_normal(y[rare], valid[rare])
+    return x
+
+
+def _init_worker(config: Dict[str, Any]) -> None:
+    """Set up an inversion worker with the shared design matrices."""
+    _worker.clear()
+    _worker.update(config)
+    A = np.asarray(config["A"])
+    _worker["outer"] = np.einsum("ji,jk->jik", A, A).reshape(len(A), -1)
+    _worker["LtL"] = config["L"].T @ config["L"]
+    _worker["pinv_cache"] = {}
+
+
+def _pack_ifg(job) -> int:
+    """Copy one unwrapped interferogram into its layer of the cube."""
+    import xarray as xr
+
+    layer, path = job
+    cube = np.memmap(_worker["cube_path"], dtype=np.float32, mode="r+", shape=_worker["cube_shape"])
+    with xr.open_dataarray(path) as da:
+        data = np.asarray(da.values, dtype=np.float32)
+    if data.shape != cube.shape[1:]:
+        raise ValueError(f"{path} is {data.shape[0]}x{data.shape[1]}, expected {cube.shape[1]}x{cube.shape[2]}")
+    cube[layer] = data
+    cube.flush()
+    return layer
+
+
+def _solve_block(block: int) -> int:
+    """Invert one block of rows and write its layers to the result memory map."""
+    # The cube is opened on first use, after it has been packed
+    if "cube" not in _worker:
+        _worker["cube"] = np.memmap(_worker["cube_path"], dtype=np.float32, mode="r", shape=_worker["cube_shape"])
+    nifg, ny, nx = _worker["cube_shape"]
+    r0 = block * _worker["block_rows"]
+    r1 = min(ny, r0 + _worker["block_rows"])
+    y = np.asarray(_worker["cube"][:, r0:r1, :], dtype=float).reshape(nifg, -1).T
+    valid = np.isfinite(y)
+    nvalid = valid.sum(axis=1)
+    solvable = nvalid >= max(1, int(np.ceil(MIN_VALID_FRACTION * nifg)))
+    A, S = _worker["A"], _worker["S"]
+    nscene = S.shape[1]
+    nunk = A.shape[1]
+    result = np.full((len(y), nscene + 3), np.nan, dtype=np.float32)
+
+    if solvable.any():
+        ys, vs = np.where(valid[solvable], y[solvable], 0.0), valid[solvable]
+        _, inverse, counts = np.unique(np.packbits(vs, axis=1), axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+        x = _solve(ys, vs, inverse, counts)
+        # Common-scene stacking: the residuals of a scene's interferograms estimate its atmosphere
+        aps = np.zeros((len(ys), nscene))
+        nuse = np.maximum(vs.astype(float) @ np.abs(S), 1.0)
+        for _ in range(_worker["atm"]):
+            residual = np.where(vs, ys - aps @ S.T - x @ A.T, 0.0)
+            aps += (residual @ S) / nuse
+            aps -= aps.mean(axis=1, keepdims=True)
+            x = _solve(np.where(vs, ys - aps @ S.T, 0.0), vs, inverse, counts)
+        residual = np.where(vs, ys - aps @ S.T - x @ A.T, 0.0)
+        phase = np.zeros((len(ys), nscene))
+        phase[:, 1:] = np.cumsum(x[:, :nscene - 1], axis=1)
+        disp = phase * _worker["scale"]
+        t = _worker["years"] - _worker["years"].mean()
+        vel = disp @ t / max(float(t @ t), 1e-12)
+        rms = np.sqrt((residual ** 2).sum(axis=1) / np.maximum(vs.sum(axis=1), 1)) * abs(_worker["scale"])
+        out = result[solvable]
+        out[:, :nscene] = disp
+        out[:, nscene] = vel
+        out[:, nscene + 1] = rms
+        if nunk == nscene:
+            out[:, nscene + 2] = x[:, -1]
+        result[solvable] = out
+
+    target = np.memmap(_worker["result_path"], dtype=np.float32, mode="r+",
+                       shape=(nscene + 3, ny, nx))
+    target[:, r0:r1, :] = result.T.reshape(nscene + 3, r1 - r0, nx)
+    target.flush()
+    return block
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def run_sbas_inversion(sdir: str, wavelength: float, slant_range: float, incidence: float,
+                       smooth: float = 5.0, atm: int = 0, rms: bool = True, dem: bool = True,
+                       ncores: Optional[int] = None, intf_tab: str = "intf.tab", scene_tab: str = "scene.tab",
+                       keep_cube: bool = False,
+                       progress_callback: Optional[Callable[[int, int], None]] = None) -> List[str]:
+    """
+    Run the SBAS inversion of an SBAS folder in-process.
+
+    Args:
+        sdir: SBAS folder holding intf.tab and scene.tab
+        wavelength: Radar wavelength in meters
+        slant_range: Slant range to the scene center in meters (for the DEM error)
+        incidence: Incidence angle in degrees
+        smooth: Temporal smoothing factor (as sbas -smooth)
+        atm: Common-scene atmospheric correction iterations (as sbas -atm)
+        rms: Write rms.grd (as sbas -rms)
+        dem: Estimate the DEM error and write dem.grd (as sbas -dem)
+        ncores: Worker processes (default: all cores)
+        intf_tab, scene_tab: Table names, relative to sdir
+        keep_cube: Keep the packed interferogram cube after a successful run,
+            so reruns with other parameters skip packing (it is as large as all
+            unwrapped grids together)
+        progress_callback: Called with (finished blocks, total blocks)
+
+    Returns:
+        Paths of the written grids
+    """
+    import xarray as xr
+    from .grid_io import write_gmt_grid
+
+    intf_tab, scene_tab = os.path.join(sdir, intf_tab), os.path.join(sdir, scene_tab)
+    ifgs, scene_ids, days = read_tables(intf_tab, scene_tab)
+    system = build_system(ifgs, scene_ids, days, wavelength, slant_range, incidence, smooth, dem)
+    unwraps = [ifg["unwrap"] for ifg in ifgs]
+    with xr.open_dataarray(unwraps[0]) as first:
+        ydim, xdim = first.dims
+        xs, ys = first[xdim].values, first[ydim].values
+        attrs = dict(first.attrs)
+    nifg, ny, nx = len(ifgs), len(ys), len(xs)
+    nscene = len(scene_ids)
+    block_rows = max(1, BLOCK_PIXELS // nx)
+    nblocks = (ny + block_rows - 1) // block_rows
+
+    cube_path = os.path.join(sdir, CUBE_FILE)
+    result_path = os.path.join(sdir, RESULT_FILE)
+    checkpoint_path = os.path.join(sdir, CHECKPOINT_FILE)
+    ihash = inputs_hash(unwraps + [intf_tab, scene_tab])
+    params = {"wavelength": wavelength, "range": slant_range, "incidence": incidence, "smooth": smooth,
+              "atm": atm, "dem": dem, "block_rows": block_rows}
+    run_key = f"{params_hash(params)}:{ihash}"
+
+    workers = plan_workers("sbas", ncores or os.cpu_count() or 1, block_rows * nx * nifg)
+    config = {"cube_path": cube_path, "cube_shape": (nifg, ny, nx), "result_path": result_path,
+              "block_rows": block_rows, "A": system["A"], "L": system["L"], "S": system["S"],
+              "years": system["years"], "scale": PHASE_TO_MM * wavelength, "atm": int(atm)}
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(config,)) as pool:
+        cube_info = _read_json(os.path.join(sdir, CUBE_INFO))
+        if not (cube_info and cube_info.get("inputs") == ihash and os.path.exists(cube_path)
+                and os.path.getsize(cube_path) == nifg * ny * nx * 4):
+            print(f"Packing {nifg} interferograms into {CUBE_FILE}...")
+            np.memmap(cube_path, dtype=np.float32, mode="w+", shape=(nifg, ny, nx)).flush()
+            for future in as_completed([pool.submit(_pack_ifg, job) for job in enumerate(unwraps)]):
+                future.result()
+            _write_json(os.path.join(sdir, CUBE_INFO), {"inputs": ihash, "shape": [nifg, ny, nx]})
+
+        checkpoint = _read_json(checkpoint_path)
+        if checkpoint and checkpoint.get("key") == run_key and os.path.exists(result_path):
+            done = set(checkpoint.get("done", []))
+            print(f"Resuming SBAS inversion: {len(done)} of {nblocks} blocks already inverted")
+        else:
+            done = set()
+            np.memmap(result_path, dtype=np.float32, mode="w+", shape=(nscene + 3, ny, nx)).flush()
+        print(f"Inverting {nblocks} blocks of {block_rows} rows with {workers} workers")
+        futures = [pool.submit(_solve_block, b) for b in range(nblocks) if b not in done]
+        for future in as_completed(futures):
+            done.add(future.result())
+            _write_json(checkpoint_path, {"key": run_key, "done": sorted(done)})
+            if progress_callback:
+                progress_callback(len(done), nblocks)
+
+    result = np.memmap(result_path, dtype=np.float32, mode="r", shape=(nscene + 3, ny, nx))
+    outputs = [(f"disp_{sid}.grd", i) for i, sid in enumerate(scene_ids)] + [("vel.grd", nscene)]
+    if rms:
+        outputs.append(("rms.grd", nscene + 1))
+    if dem:
+        outputs.append(("dem.grd", nscene + 2))
+    written = []
+    for name, layer in outputs:
+        path = os.path.join(sdir, name)
+        write_gmt_grid(np.asarray(result[layer]), xs, ys, path, attrs, dims=(ydim, xdim),
+                       history="InSARLite SBAS inversion")
+        written.append(path)
+    del result
+    leftovers = [result_path, checkpoint_path]
+    if not keep_cube:
+        leftovers += [cube_path, os.path.join(sdir, CUBE_INFO)]
+    for path in leftovers:
+        if os.path.exists(path):
+            os.remove(path)
+    print(f"SBAS inversion wrote {len(written)} grids")
+    return written
@@ -0,0 +1,403 @@
+"""
+Scene metadata index for InSARLite.
+Scans Sentinel-1 SAFE directories and ZIP archives once, in parallel, and
+keeps the per-scene metadata (dates, footprint, polarizations, subswaths,
+flight direction, file sizes) in a persistent cache keyed by path, size and
+modification time, so unchanged scenes are never reopened. The same store
+remembers the CRC32 of verified extracted files.
+"""
+
+import os
+import re
+import json
+import fnmatch
+import sqlite3
+import zipfile
+import threading
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Any
+
+
+INDEX_PATH = os.path.join(os.path.expanduser('~'), ".scene_index.sqlite")
+SCENE_PATTERN = "S1*_IW_SLC__1S*_*"
+EXCLUDED_POLARIZATIONS = {"HH", "VV", "VH", "HV"}
+MEASUREMENT_PATTERN = re.compile(r"s1[abcd]-iw([123])-slc-(vv|vh|hh|hv)-", re.IGNORECASE)
+NAME_DATES_PATTERN = re.compile(r"_(\d{8})T(\d{6})_(\d{8})T(\d{6})_")
+# Bumped when records gain fields, so older cached records are read again
+RECORD_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS file_crcs (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    crc INTEGER NOT NULL
+);
+"""
+
+
+def find_scenes(folder: str, cancel_event: Optional[threading.Event] = None) -> Tuple[List[str], List[str]]:
+    """
+    Find Sentinel-1 SLC SAFE directories and ZIP archives in one walk of a folder.
+
+    SAFE directories are not descended into. Per-polarization products
+    (e.g. ..._1SVV_...) are skipped as before.
+
+    Args:
+        folder: Folder to search
+        cancel_event: Optional event that stops the walk when set
+
+    Returns:
+        Tuple of (safe_dirs, zip_files) lists (partial if cancelled)
+    """
+    safe_dirs, zip_files = [], []
+    for root, dirs, files in os.walk(folder):
+        if cancel_event is not None and cancel_event.is_set():
+            break
+        for d in dirs:
+            if d.endswith('.SAFE') and fnmatch.fnmatch(d, SCENE_PATTERN):
+                safe_dirs.append(os.path.join(root, d))
+        dirs[:] = [d for d in dirs if not d.endswith('.SAFE')]
+        for f in files:
+            if f.lower().endswith('.zip') and fnmatch.fnmatch(f, SCENE_PATTERN):
+                zip_files.append(os.path.join(root, f))
+
+    def keep(path):
+        name = os.path.basename(path)
+        return len(name) < 16 or name[14:16] not in EXCLUDED_POLARIZATIONS
+
+    return [x for x in safe_dirs if keep(x)], [x for x in zip_files if keep(x)]
+
+
+def _local_tag(elem) -> str:
+    return elem.tag.rsplit('}', 1)[-1]
+
+
+def parse_manifest(content: bytes) -> Dict[str, Any]:
+    """
+    Extract footprint, acquisition time, flight direction and polarizations from manifest.safe.
+
+    Args:
+        content: Raw manifest.safe content
+
+    Returns:
+        Dictionary with 'footprint' ({'w','e','s','n'} or None), 'corners'
+        (footprint corners as "lon,lat" strings), 'start', 'end',
+        'flight_direction' and 'polarizations' (missing values are None/empty)
+    """
+    info = {"footprint": None, "corners": [], "start": None, "end": None, "flight_direction": None,
+            "polarizations": []}
+    root = ET.fromstring(content)
+    for elem in root.iter():
+        tag = _local_tag(elem)
+        text = (elem.text or "").strip()
+        if not text:
+            continue
+        if tag == "coordinates" and info["footprint"] is None:
+            lats, lons = [], []
+            for pair in text.split():
+                if ',' in pair:
+                    lat, lon = map(float, pair.split(',')[:2])
+                    lats.append(lat)
+                    lons.append(lon)
+            if lats:
+                info["footprint"] = {'w': min(lons), 'e': max(lons), 's': min(lats), 'n': max(lats)}
+                info["corners"] = [f"{lon},{lat}" for lat, lon in zip(lats, lons)]
+        elif tag == "startTime" and info["start"] is None:
+            info["start"] = text
+        elif tag == "stopTime" and info["end"] is None:
+            info["end"] = text
+        elif tag == "pass" and info["flight_direction"] is None:
+            info["flight_direction"] = text.upper()
+        elif tag == "transmitterReceiverPolarisation" and text.upper() not in info["polarizations"]:
+            info["polarizations"].append(text.upper())
+    return info
+
+
+def _dates_from_name(name: str) -> Tuple[Optional[str], Optional[str]]:
+    """Get the start and end acquisition dates (YYYY-MM-DD) from a scene name."""
+    match = NAME_DATES_PATTERN.search(name)
+    if not match:
+        return None, None
+    try:
+        start = datetime.strptime(match.group(1), "%Y%m%d").strftime("%Y-%m-%d")
+        end = datetime.strptime(match.group(3), "%Y%m%d").strftime("%Y-%m-%d")
+    except ValueError:
+        return None, None
+    return start, end
+
+
+def read_scene(path: str) -> Dict[str, Any]:
+    """
+    Read the metadata of one SAFE directory or ZIP archive.
+
+    The ZIP central directory provides the measurement files and their sizes;
+    manifest.safe is the only member that is read.
+
+    Args:
+        path: SAFE directory or ZIP file path
+
+    Returns:
+        Scene metadata dictionary
+    """
+    name = os.path.basename(path)
+    start_date, end_date = _dates_from_name(name)
+    record = {
+        "path": path,
+        "name": name,
+        "kind": "zip" if name.lower().endswith('.zip') else "safe",
+        "start_date": start_date,
+        "end_date": end_date,
+        "version": RECORD_VERSION,
+        "footprint": None,
+        "corners": [],
+        "start": None,
+        "end": None,
+        "flight_direction": None,
+        "polarizations": [],
+        "subswaths": [],
+        "measurements": {},
+        "error": None,
+    }
+    manifest = None
+    try:
+        if record["kind"] == "zip":
+            with zipfile.ZipFile(path, 'r') as zf:
+                for info in zf.infolist():
+                    if info.filename.endswith('/manifest.safe') and manifest is None:
+                        manifest = zf.read(info)
+                    elif '/measurement/' in info.filename and info.filename.lower().endswith('.tiff'):
+                        record["measurements"][os.path.basename(info.filename)] = info.file_size
+        else:
+            manifest_path = os.path.join(path, 'manifest.safe')
+            if os.path.exists(manifest_path):
+                with open(manifest_path, 'rb') as f:
+                    manifest = f.read()
+            measurement_dir = os.path.join(path, 'measurement')
+            if os.path.isdir(measurement_dir):
+                with os.scandir(measurement_dir) as it:
+                    for entry in it:
+                        if entry.name.lower().endswith('.tiff'):
+                            try:
+                                record["measurements"][entry.name] = entry.stat().st_size
+                            except OSError:
+                                continue
+        if manifest:
+            record.update(parse_manifest(manifest))
+    except Exception as e:
+        record["error"] = str(e)
+
+    subswaths, polarizations = set(), set(record["polarizations"])
+    for fname in record["measurements"]:
+        match = MEASUREMENT_PATTERN.search(fname)
+        if match:
+            subswaths.add(int(match.group(1)))
+            polarizations.add(match.group(2).upper())
+    record["subswaths"] = sorted(subswaths)
+    record["polarizations"] = sorted(polarizations)
+    return record
+
+
+def _scene_key(path: str) -> Optional[Tuple[int, int]]:
+    """
+    Get the (size, mtime_ns) cache key of a scene.
+
+    SAFE directories are keyed by their manifest and measurement folder, so
+    extracting more measurement files invalidates the entry.
+    """
+    try:
+        if os.path.isdir(path):
+            st = os.stat(os.path.join(path, 'manifest.safe'))
+            measurement_dir = os.path.join(path, 'measurement')
+            mtime = st.st_mtime_ns
+            if os.path.isdir(measurement_dir):
+                mtime = max(mtime, os.stat(measurement_dir).st_mtime_ns)
+            return st.st_size, mtime
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+    except OSError:
+        return None
+
+
+class SceneIndex:
+    """Persistent cache of scene metadata keyed by (path, size, mtime)."""
+
+    def __init__(self, db_path: str = INDEX_PATH):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def get(self, paths: List[str], max_workers: Optional[int] = None, progress_callback=None,
+            cancel_event: Optional[threading.Event] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Get the metadata of scenes, reading only new or changed ones.
+
+        Args:
+            paths: SAFE directory and/or ZIP file paths
+            max_workers: Threads reading changed scenes (default: min(16, CPU count))
+            progress_callback: Optional callable(record, done, total) called as scenes resolve
+            cancel_event: Optional event; when set, scenes not yet read are skipped
+
+        Returns:
+            Metadata records in the order of paths, or None if cancelled
+            (scenes read before cancellation are still cached)
+        """
+        paths = [os.path.abspath(p) for p in paths]
+        keys = {p: _scene_key(p) for p in paths}
+        with self._lock:
+            cached = {}
+            for i in range(0, len(paths), 500):
+                chunk = paths[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT path, size, mtime_ns, metadata FROM scenes WHERE path IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for path, size, mtime_ns, metadata in rows:
+                    if keys.get(path) == (size, mtime_ns):
+                        record = json.loads(metadata)
+                        if record.get("version") == RECORD_VERSION:
+                            cached[path] = record
+
+        total = len(paths)
+        done = 0
+        results = dict(cached)
+        if progress_callback:
+            for path in paths:
+                if path in cached:
+                    done += 1
+                    progress_callback(cached[path], done, total)
+
+        missing = [p for p in paths if p not in cached]
+        if missing:
+            workers = max_workers or min(16, os.cpu_count() or 1)
+            rows = []
+            with ThreadPoolExecutor(max_workers=max(1, min(workers, len(missing)))) as pool:
+                futures = [pool.submit(read_scene, p) for p in missing]
+                for future in futures:
+                    if cancel_event is not None and cancel_event.is_set():
+                        for f in futures:
+                            f.cancel()
+                        break
+                    record = future.result()
+                    results[record["path"]] = record
+                    key = keys.get(record["path"])
+                    if key is not None and not record["error"]:
+                        rows.append((record["path"], key[0], key[1], json.dumps(record)))
+                    done += 1
+                    if progress_callback:
+                        progress_callback(record, done, total)
+            if rows:
+                with self._lock, self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO scenes (path, size, mtime_ns, metadata) VALUES (?, ?, ?, ?)", rows
+                    )
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        return [results[p] for p in paths]
+
+
+    def get_file_crcs(self, stats: Dict[str, Tuple[int, int]]) -> Dict[str, int]:
+        """
+        Get the verified CRC32 of files that did not change since they were recorded.
+
+        Args:
+            stats: Dictionary mapping file path to its current (size, mtime_ns)
+
+        Returns:
+            Dictionary mapping file path to CRC32 for unchanged files
+        """
+        paths = list(stats)
+        crcs = {}
+        with self._lock:
+            for i in range(0, len(paths), 500):
+                chunk = paths[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT path, size, mtime_ns, crc FROM file_crcs WHERE path IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for path, size, mtime_ns, crc in rows:
+                    if stats.get(path) == (size, mtime_ns):
+                        crcs[path] = crc
+        return crcs
+
+    def record_file_crcs(self, rows: List[Tuple[str, int, int, int]]) -> None:
+        """Record verified CRC32 values as (path, size, mtime_ns, crc) rows."""
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO file_crcs (path, size, mtime_ns, crc) VALUES (?, ?, ?, ?)", rows
+            )
+
+
+_index: Optional[SceneIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_scene_index() -> SceneIndex:
+    """Get the per-process scene index (stored in the user's home directory)."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            try:
+                _index = SceneIndex()
+            except sqlite3.Error as e:
+                print(f"Warning: Could not open scene index {INDEX_PATH}: {e}")
+                _index = SceneIndex(":memory:")
+        return _index
+
+
+def get_scene_metadata(paths: List[str], progress_callback=None,
+                       cancel_event: Optional[threading.Event] = None) -> Optional[List[Dict[str, Any]]]:
+    """Get the metadata of scenes through the persistent scene index (None if cancelled)."""
+    return get_scene_index().get(paths, progress_callback=progress_callback, cancel_event=cancel_event)
+
+
+def combined_extent(records: List[Dict[str, Any]]) -> Optional[Dict[str, float]]:
+    """Get the bounding box of the scene footprints, or None if none is known."""
+    footprints = [r["footprint"] for r in records if r.get("footprint")]
+    if not footprints:
+        return None
+    return {
+        'w': min(f['w'] for f in footprints),
+        'e': max(f['e'] for f in footprints),
+        's': min(f['s'] for f in footprints),
+        'n': max(f['n'] for f in footprints),
+    }
+
+
+def date_range(records: List[Dict[str, Any]]) -> Optional[Dict[str, str]]:
+    """Get the acquisition date range ({'start', 'end'} as YYYY-MM-DD) of scenes."""
+    dates = [d for r in records for d in (r.get("start_date"), r.get("end_date")) if d]
+    if not dates:
+        return None
+    return {'start': min(dates), 'end': max(dates)}
+
+
+def corner_strings(records: List[Dict[str, Any]]) -> List[str]:
+    """Get the footprint corners of scenes as "lon,lat lon,lat lon,lat lon,lat" strings (as in map-overlay.kml)."""
+    return [" ".join(r["corners"]) for r in records if len(r.get("corners") or []) == 4]
+
+
+def measurement_files(records: List[Dict[str, Any]]) -> List[str]:
+    """Get the measurement TIFF paths of SAFE directory records."""
+    files = []
+    for r in records:
+        if r.get("kind") == "safe":
+            files.extend(os.path.join(r["path"], "measurement", name) for name in sorted(r.get("measurements", {})))
+    return files
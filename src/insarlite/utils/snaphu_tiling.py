@@ -0,0 +1,149 @@
+"""
+SNAPHU tiling utilities for InSARLite.
+Chooses between unwrapping many interferograms side by side (one core each)
+and unwrapping large grids in tiles on several cores (SNAPHU --tile/--nproc),
+so the unwrap stage keeps all cores busy when there are fewer interferograms
+than cores or a few huge merged grids dominate the run.
+"""
+
+import os
+import re
+import math
+import shutil
+import subprocess
+import threading
+from typing import Dict, Optional, Tuple
+
+from .roi import grid_info
+
+
+TILED_SCRIPT = "snaphu_interp_tiled.csh"
+
+# Tiles smaller than this cost more in reassembly than they save
+MIN_TILE_PIXELS = 2_000_000
+MAX_TILE_PROCS = 32
+MIN_TILE_OVERLAP = 200
+MAX_TILE_OVERLAP = 500
+
+SNAPHU_CALL = re.compile(r"^(\s*)(snaphu(?:_interp)?)(\s+phase\.in\b)", re.MULTILINE)
+
+
+def unwrap_grid_shape(grd: str, roi: Optional[Dict[str, float]] = None) -> Optional[Tuple[int, int]]:
+    """
+    Get the (rows, columns) SNAPHU unwraps for a grid, cropped to an ROI.
+
+    Returns:
+        Grid shape or None if the grid cannot be read
+    """
+    try:
+        xmin, xmax, ymin, ymax, xinc, yinc = grid_info(grd)
+    except (subprocess.CalledProcessError, FileNotFoundError, IndexError, ValueError):
+        return None
+    if roi:
+        xmin, xmax = max(xmin, roi["x0"]), min(xmax, roi["x1"])
+        ymin, ymax = max(ymin, roi["y0"]), min(ymax, roi["y1"])
+    return int(round((ymax - ymin) / yinc)) + 1, int(round((xmax - xmin) / xinc)) + 1
+
+
+def max_tile_procs(shape: Optional[Tuple[int, int]], ncores: int) -> int:
+    """Get the most cores worth giving to one unwrap of a grid (1 for small grids)."""
+    if not shape:
+        return 1
+    pixels = shape[0] * shape[1]
+    if pixels < 2 * MIN_TILE_PIXELS:
+        return 1
+    return max(1, min(ncores, MAX_TILE_PROCS, pixels // MIN_TILE_PIXELS))
+
+
+def tile_layout(shape: Tuple[int, int], nproc: int) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Split a grid into about nproc tiles of similar aspect ratio.
+
+    Args:
+        shape: (rows, columns) of the grid
+        nproc: Number of tiles unwrapped in parallel
+
+    Returns:
+        (tile rows, tile columns, row overlap, column overlap), or None for a single tile
+    """
+    if nproc < 2:
+        return None
+    ny, nx = shape
+    rows = max(1, min(nproc, int(round(math.sqrt(nproc * ny / max(nx, 1))))))
+    cols = max(1, math.ceil(nproc / rows))
+    if rows * cols < 2:
+        return None
+    row_overlap = min(MAX_TILE_OVERLAP, max(MIN_TILE_OVERLAP, ny // rows // 10)) if rows > 1 else 0
+    col_overlap = min(MAX_TILE_OVERLAP, max(MIN_TILE_OVERLAP, nx // cols // 10)) if cols > 1 else 0
+    return rows, cols, row_overlap, col_overlap
+
+
+def tile_options(shape: Optional[Tuple[int, int]], nproc: int) -> str:
+    """Get the SNAPHU tiling options for unwrapping a grid on nproc cores ('' untiled)."""
+    layout = tile_layout(shape, nproc) if shape else None
+    if layout is None:
+        return ""
+    rows, cols, row_overlap, col_overlap = layout
+    return f"--tile {rows} {cols} {row_overlap} {col_overlap} --nproc {nproc}"
+
+
+def write_tiled_script(dest_dir: str) -> Optional[str]:
+    """
+    Write a copy of snaphu_interp.csh that passes $SNAPHU_TILE_OPTS to SNAPHU.
+
+    Args:
+        dest_dir: Folder to write the script to
+
+    Returns:
+        Script path, or None if snaphu_interp.csh was not found or not understood
+    """
+    source = shutil.which("snaphu_interp.csh")
+    if not source:
+        return None
+    with open(source, "r") as f:
+        script = f.read()
+    if not SNAPHU_CALL.search(script):
+        print(f"Could not find the SNAPHU call in {source}; unwrapping without tiles")
+        return None
+    script = SNAPHU_CALL.sub(r"\1\2 $SNAPHU_TILE_OPTS\3", script)
+    lines = script.split("\n")
+    insert_at = 1 if lines and lines[0].startswith("#!") else 0
+    lines.insert(insert_at, 'if (! $?SNAPHU_TILE_OPTS) setenv SNAPHU_TILE_OPTS ""')
+    path = os.path.join(dest_dir, TILED_SCRIPT)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write("\n".join(lines))
+    os.chmod(tmp_path, 0o755)
+    os.replace(tmp_path, path)
+    return path
+
+
+class CoreBudget:
+    """
+    Hands out cores to unwrap jobs as they start.
+
+    A job gets an even share of the free cores among the jobs that have not
+    started yet (capped by what its grid can use), so a long stack runs one
+    core per interferogram and a short stack or its last large grids run tiled.
+    """
+
+    def __init__(self, total: int, jobs: int):
+        self.free = max(1, int(total))
+        self.unstarted = max(1, int(jobs))
+        self._cond = threading.Condition()
+
+    def acquire(self, max_procs: int) -> int:
+        """Wait for a free core and take this job's share of the free cores."""
+        with self._cond:
+            while self.free < 1:
+                self._cond.wait()
+            share = self.free // max(1, self.unstarted)
+            nproc = max(1, min(max_procs, share))
+            self.free -= nproc
+            self.unstarted = max(0, self.unstarted - 1)
+            return nproc
+
+    def release(self, nproc: int) -> None:
+        with self._cond:
+            self.free += nproc
+            self._cond.notify_all()
@@ -0,0 +1,225 @@
+"""
+Stage result cache utilities for InSARLite.
+Stamps each product folder with a hash of the stage parameters and inputs it
+was made with, so stages can reuse valid outputs, recompute only stale ones
+and keep results of other parameter sets side by side as variants.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+from datetime import datetime
+from typing import Dict, Any, Optional, List
+
+from .product_catalog import get_catalog
+
+
+STAMP_TEMPLATE = ".stamp_{stage}.json"
+
+
+def params_hash(params: Dict[str, Any]) -> str:
+    """
+    Hash stage parameters independently of their order and value types.
+
+    Args:
+        params: Stage parameters
+
+    Returns:
+        Short hex digest identifying the parameter set
+    """
+    normalized = {str(k): str(v) for k, v in params.items()}
+    payload = json.dumps(normalized, sort_keys=True).encode()
+    return hashlib.sha1(payload).hexdigest()[:12]
+
+
+def input_signatures(input_paths: List[str]) -> Dict[str, Optional[str]]:
+    """
+    Get the size:mtime signature of each stage input by name (None if missing).
+
+    Args:
+        input_paths: Input files of the product
+
+    Returns:
+        Dictionary mapping input file name to its signature
+    """
+    signatures = {}
+    for path in sorted(input_paths):
+        try:
+            st = os.stat(path)
+            signatures[os.path.basename(path)] = f"{st.st_size}:{st.st_mtime_ns}"
+        except OSError:
+            signatures[os.path.basename(path)] = None
+    return signatures
+
+
+def inputs_hash(input_paths: List[str]) -> str:
+    """
+    Hash stage inputs by name, size and modification time (no content reads).
+
+    Missing inputs are hashed by name only; stamps written with the input
+    paths also keep per-input signatures, so is_stamp_valid can tell a
+    changed input from one that was cleaned up.
+
+    Args:
+        input_paths: Input files of the product
+
+    Returns:
+        Short hex digest identifying the inputs
+    """
+    sha = hashlib.sha1()
+    for name, signature in input_signatures(input_paths).items():
+        sha.update(name.encode())
+        if signature:
+            sha.update(signature.encode())
+    return sha.hexdigest()[:12]
+
+
+def _inputs_match(stamp: Dict[str, Any], input_hash: str, input_paths: Optional[List[str]]) -> bool:
+    """Compare the inputs of a stamp with the current ones; inputs deleted since stamping still match."""
+    if stamp.get("inputs_hash") == input_hash:
+        return True
+    if input_paths is None:
+        return False
+    current = input_signatures(input_paths)
+    recorded = stamp.get("inputs")
+    if recorded is None:
+        # Stamp without signatures: it can only be checked while the inputs exist
+        return all(signature is None for signature in current.values())
+    if set(recorded) != set(current):
+        return False
+    return all(signature is None or signature == recorded[name] for name, signature in current.items())
+
+
+def stamp_path(product_dir: str, stage: str) -> str:
+    """Get the stamp file path of a stage in a product folder."""
+    return os.path.join(product_dir, STAMP_TEMPLATE.format(stage=stage))
+
+
+def read_stamp(product_dir: str, stage: str) -> Optional[Dict[str, Any]]:
+    """
+    Read the stamp of a stage in a product folder.
+
+    Returns:
+        Stamp dictionary or None if the product has no (readable) stamp
+    """
+    path = stamp_path(product_dir, stage)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def write_stamp(product_dir: str, stage: str, params: Dict[str, Any], input_hash: str,
+                product_file: Optional[str] = None, input_paths: Optional[List[str]] = None) -> None:
+    """
+    Stamp a product folder with the parameters and inputs it was made with.
+
+    Args:
+        product_dir: Product (pair) folder
+        stage: Processing stage name
+        params: Stage parameters
+        input_hash: Hash of the product inputs (see inputs_hash)
+        product_file: Main product file name, also recorded in the product catalog
+        input_paths: Input files, whose signatures are kept so later checks survive input cleanup
+    """
+    stamp = {
+        "stage": stage,
+        "params": {str(k): str(v) for k, v in params.items()},
+        "params_hash": params_hash(params),
+        "inputs_hash": input_hash,
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    if input_paths is not None:
+        stamp["inputs"] = input_signatures(input_paths)
+    try:
+        with open(stamp_path(product_dir, stage), "w") as f:
+            json.dump(stamp, f, indent=2)
+        if product_file:
+            get_catalog(product_dir).record(os.path.join(product_dir, product_file), stage, stamp["params_hash"])
+    except Exception as e:
+        print(f"Warning: Could not stamp {product_dir}: {e}")
+
+
+def is_stamp_valid(product_dir: str, stage: str, phash: str, input_hash: str,
+                   input_paths: Optional[List[str]] = None) -> Optional[bool]:
+    """
+    Check whether a product was made with the given parameters and inputs.
+
+    With input_paths, inputs that no longer exist (e.g. cleaned-up SLCs) are
+    not held against the product; only inputs that exist and changed are.
+
+    Returns:
+        True/False, or None if the product has no stamp (made before stamping existed)
+    """
+    stamp = read_stamp(product_dir, stage)
+    if stamp is None:
+        return None
+    return stamp.get("params_hash") == phash and _inputs_match(stamp, input_hash, input_paths)
+
+
+def stash_variant(product_dir: str, stage: str, variants_root: str) -> Optional[str]:
+    """
+    Move a stamped product folder aside as a variant of its parameter set.
+
+    Args:
+        product_dir: Product folder to move
+        stage: Stage whose stamp identifies the variant
+        variants_root: Folder holding one subfolder per parameter hash
+
+    Returns:
+        New folder path, or None if the product has no stamp and was left in place
+    """
+    stamp = read_stamp(product_dir, stage)
+    if stamp is None:
+        return None
+    target = os.path.join(variants_root, stamp["params_hash"], os.path.basename(product_dir))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    shutil.move(product_dir, target)
+    write_variant_info(os.path.dirname(target), stamp)
+    return target
+
+
+def restore_variant(variants_root: str, phash: str, name: str, target_dir: str,
+                    stage: str, input_hash: str, input_paths: Optional[List[str]] = None) -> bool:
+    """
+    Move a cached variant back into place if it matches the current inputs.
+
+    Args:
+        variants_root: Folder holding one subfolder per parameter hash
+        phash: Parameter hash of the wanted variant
+        name: Product folder name
+        target_dir: Folder to move the variant into
+        stage: Stage whose stamp identifies the variant
+        input_hash: Hash of the current product inputs
+        input_paths: Current input files (see is_stamp_valid)
+
+    Returns:
+        True if the variant was restored
+    """
+    source = os.path.join(variants_root, phash, name)
+    if not os.path.isdir(source) or not is_stamp_valid(source, stage, phash, input_hash, input_paths):
+        return False
+    os.makedirs(target_dir, exist_ok=True)
+    target = os.path.join(target_dir, name)
+    if os.path.exists(target):
+        return False
+    shutil.move(source, target)
+    return True
+
+
+def write_variant_info(variant_dir: str, stamp: Dict[str, Any]) -> None:
+    """Write a readable description of the parameter set held in a variant folder."""
+    info_path = os.path.join(variant_dir, "params.json")
+    if os.path.exists(info_path):
+        return
+    try:
+        with open(info_path, "w") as f:
+            json.dump({"stage": stamp.get("stage"), "params": stamp.get("params")}, f, indent=2)
+    except Exception:
+        pass
@@ -0,0 +1,489 @@
+"""
+Time-series export utilities for InSARLite.
+Extracts the displacement series of many pixels in one vectorized read,
+writes them as a single tidy table and renders optional per-pixel plots in
+a process pool with the Agg backend. Context maps reuse a velocity base map
+rasterized once per extent, so each export only composites its pin and
+legend on top instead of re-rendering the whole velocity grid.
+"""
+
+import os
+import re
+import queue
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def detect_lat_lon_names(coords) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Detect the latitude and longitude coordinate names of an xarray object.
+
+    Returns:
+        (lat_name, lon_name), falling back to ('y', 'x'); (None, None) if not found
+    """
+    lat_name = next((n for n in coords if n.lower().startswith("lat")), None)
+    lon_name = next((n for n in coords if n.lower().startswith("lon")), None)
+    if lat_name is None or lon_name is None:
+        if 'y' in coords and 'x' in coords:
+            return 'y', 'x'
+        return None, None
+    return lat_name, lon_name
+
+
+def get_file_paths(folder_path):
+    """Get the (path, date) of the disp_YYYYDDD_ll.grd files of an SBAS folder, sorted by date."""
+    pattern = re.compile(r"disp_(\d{4})(\d{3})_ll\.grd$")
+    files_to_load = []
+    for filename in sorted(os.listdir(folder_path)):
+        match = pattern.match(filename)
+        if match:
+            year = int(match.group(1))
+            doy = int(match.group(2))
+            # Fix GMTSAR native 1-day offset: add 1 day to the calculated date
+            date = datetime(year, 1, 1) + timedelta(days=doy)  # Changed from doy-1 to doy
+            file_path = os.path.join(folder_path, filename)
+            files_to_load.append((file_path, date))
+    files_to_load.sort(key=lambda x: x[1])
+    return files_to_load
+
+
+def load_all_data_lazy(files_to_load, chunk_dict=None):
+    """Open displacement grids lazily and stack them along a 'time' dimension."""
+    import xarray as xr
+
+    if not files_to_load:
+        raise ValueError("No files to load")
+    dataarrays = []
+    for fp, dt in files_to_load:
+        try:
+            da = xr.open_dataarray(fp)
+        except Exception:
+            ds = xr.open_dataset(fp)
+            if len(ds.data_vars) == 0:
+                raise RuntimeError(f"No data variables found in {fp}")
+            da = ds[list(ds.data_vars)[0]]
+        da = da.expand_dims(time=[np.datetime64(dt)])
+        dataarrays.append(da)
+    stacked = xr.concat(dataarrays, dim="time")
+    if chunk_dict:
+        stacked = stacked.chunk(chunk_dict)
+    return stacked
+
+
+def _cell_edges(values: np.ndarray, step: float) -> Tuple[float, float]:
+    """Get the outer edges of the first and last cells centered on monotonic node coordinates."""
+    direction = 1.0 if values[-1] >= values[0] else -1.0
+    return float(values[0] - direction * step / 2), float(values[-1] + direction * step / 2)
+
+
+class BaseMapCache:
+    """
+    Cache of rendered velocity base maps for context map exports.
+
+    The velocity grid is read once and each requested extent is rendered
+    once; renders are dropped when vel_ll.grd changes on disk.
+    """
+
+    def __init__(self, vel_file_path: str, max_entries: int = 4, figsize=(8, 6), dpi: int = 300):
+        self.vel_file_path = vel_file_path
+        self.max_entries = max_entries
+        self.figsize = figsize
+        self.dpi = dpi
+        self._key = None
+        self._renders = OrderedDict()
+        self.lons = self.lats = self.vel = None
+
+    def _file_key(self):
+        st = os.stat(self.vel_file_path)
+        return st.st_size, st.st_mtime_ns
+
+    def load(self) -> None:
+        """Read the velocity grid if it is not loaded or changed on disk."""
+        key = self._file_key()
+        if key == self._key:
+            return
+        import xarray as xr
+
+        with xr.open_dataarray(self.vel_file_path) as ds:
+            lat_name, lon_name = detect_lat_lon_names(ds.coords)
+            if lat_name is None:
+                raise ValueError(f"Could not detect lat/lon in {self.vel_file_path}")
+            self.lons = ds[lon_name].values
+            self.lats = ds[lat_name].values
+            self.vel = np.asarray(ds.values, dtype=float).squeeze()
+        finite = self.vel[np.isfinite(self.vel)]
+        # Color limits of the full grid, as when the whole map is drawn
+        self.vmin, self.vmax = (float(finite.min()), float(finite.max())) if finite.size else (0.0, 1.0)
+        self._renders.clear()
+        self._key = key
+
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """Get (lon_min, lon_max, lat_min, lat_max) of the velocity grid."""
+        self.load()
+        return float(self.lons.min()), float(self.lons.max()), float(self.lats.min()), float(self.lats.max())
+
+    def _crop(self, extent):
+        """Get the grid nodes covering an extent, with the image extent of their cells."""
+        lon_min, lon_max, lat_min, lat_max = extent
+        dlon = abs(self.lons[1] - self.lons[0]) if len(self.lons) > 1 else 0.0
+        dlat = abs(self.lats[1] - self.lats[0]) if len(self.lats) > 1 else 0.0
+        cols = np.nonzero((self.lons >= lon_min - dlon) & (self.lons <= lon_max + dlon))[0]
+        rows = np.nonzero((self.lats >= lat_min - dlat) & (self.lats <= lat_max + dlat))[0]
+        if not cols.size or not rows.size:
+            return None, None
+        lons = self.lons[cols[0]:cols[-1] + 1]
+        lats = self.lats[rows[0]:rows[-1] + 1]
+        vel = self.vel[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+        # Nodes are cell centers, as pcolormesh draws them
+        return vel, _cell_edges(lons, dlon) + _cell_edges(lats, dlat)
+
+    def _render(self, extent):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        fig = Figure(figsize=self.figsize, dpi=self.dpi, facecolor='white')
+        canvas = FigureCanvasAgg(fig)
+        ax = fig.add_subplot(111)
+        vel, image_extent = self._crop(extent)
+        if vel is not None:
+            left, right, first, last = image_extent
+            # Row 0 is drawn at 'first'; imshow extent is (left, right, bottom, top)
+            im = ax.imshow(vel, cmap='jet', vmin=self.vmin, vmax=self.vmax, interpolation='nearest',
+                           origin='lower', extent=(left, right, first, last))
+            fig.colorbar(im, ax=ax, orientation='vertical')
+        ax.set_xlim(extent[0], extent[1])
+        ax.set_ylim(extent[2], extent[3])
+        ax.set_xlabel('Longitude')
+        ax.set_ylabel('Latitude')
+        ax.grid(True, alpha=0.3, linestyle='--')
+        ax.set_aspect('equal', adjustable='box')
+        ax.set_title("Surface Deformation Velocity - Context Map")
+        fig.tight_layout()
+        canvas.draw()
+        return {"fig": fig, "canvas": canvas, "ax": ax, "background": canvas.copy_from_bbox(fig.bbox)}
+
+    def _get_render(self, extent):
+        self.load()
+        key = tuple(round(float(v), 9) for v in extent)
+        if key in self._renders:
+            self._renders.move_to_end(key)
+        else:
+            self._renders[key] = self._render(key)
+            while len(self._renders) > self.max_entries:
+                self._renders.popitem(last=False)
+        return self._renders[key]
+
+    def save(self, file_path: str, lat: float, lon: float, extent) -> None:
+        """
+        Save the base map of an extent with a pin at (lat, lon) as PNG.
+
+        Args:
+            file_path: Output PNG path
+            lat, lon: Pin location
+            extent: (lon_min, lon_max, lat_min, lat_max) of the map
+        """
+        import matplotlib.image as mimage
+
+        render = self._get_render(extent)
+        canvas, ax = render["canvas"], render["ax"]
+        canvas.restore_region(render["background"])
+        pin = ax.plot(lon, lat, '+', markersize=15, markeredgecolor='red', markeredgewidth=3,
+                      label=f'Location: ({lat:.4f}, {lon:.4f})', animated=True)[0]
+        legend = ax.legend(handles=[pin], loc='upper right')
+        legend.set_animated(True)
+        try:
+            ax.draw_artist(pin)
+            ax.draw_artist(legend)
+            mimage.imsave(file_path, np.asarray(canvas.buffer_rgba()), dpi=self.dpi)
+        finally:
+            pin.remove()
+            legend.remove()
+
+
+def series_basename(lat: float, lon: float) -> str:
+    """Get the file base name of the time series at a location (timeseries_N12p3456_E98p7654)."""
+    lat_str = f"{'N' if lat >= 0 else 'S'}{abs(lat):.4f}".replace('.', 'p')
+    lon_str = f"{'E' if lon >= 0 else 'W'}{abs(lon):.4f}".replace('.', 'p')
+    return f"timeseries_{lat_str}_{lon_str}"
+
+
+def extract_series(stacked_data, lats: Sequence[float], lons: Sequence[float]) -> Dict[str, Any]:
+    """
+    Extract the time series nearest to many locations in one vectorized read.
+
+    Args:
+        stacked_data: DataArray with time and lat/lon dimensions
+        lats, lons: Requested locations
+
+    Returns:
+        {'times': DatetimeIndex, 'lat', 'lon': grid node coordinates (n,),
+         'values': float array (n, time)}
+    """
+    import xarray as xr
+
+    lat_name, lon_name = detect_lat_lon_names(stacked_data.coords)
+    if lat_name is None:
+        raise ValueError("Could not detect lat/lon coordinate names in DataArray")
+    points = stacked_data.sel({lat_name: xr.DataArray(np.asarray(lats, dtype=float), dims="pixel"),
+                               lon_name: xr.DataArray(np.asarray(lons, dtype=float), dims="pixel")},
+                              method="nearest")
+    points = points.transpose("pixel", "time").compute()
+    return {
+        "times": pd.to_datetime(points["time"].values),
+        "lat": np.asarray(points[lat_name].values, dtype=float),
+        "lon": np.asarray(points[lon_name].values, dtype=float),
+        "values": np.asarray(points.values, dtype=float),
+    }
+
+
+def series_quality(times: pd.DatetimeIndex, values: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Score the completeness of many time series at once.
+
+    The score is the valid ratio, raised for series spanning over 6 months
+    or a year and for series with at least 5 or 10 valid points, capped at 1.
+
+    Args:
+        times: Acquisition times (time,)
+        values: Series (n, time)
+
+    Returns:
+        Arrays (n,) of valid_count, total_count, valid_ratio, first_valid_idx,
+        last_valid_idx (-1 without data), data_span_days, quality_score, is_valid
+    """
+    valid = np.isfinite(values)
+    total = values.shape[1]
+    if total == 0:
+        valid = np.zeros((len(values), 1), dtype=bool)
+        times = pd.DatetimeIndex([pd.Timestamp(0)])
+    valid_count = valid.sum(axis=1)
+    valid_ratio = valid_count / max(total, 1)
+    has_data = valid_count > 0
+    first = np.where(has_data, valid.argmax(axis=1), -1)
+    last = np.where(has_data, valid.shape[1] - 1 - valid[:, ::-1].argmax(axis=1), -1)
+    days = np.asarray((times - times[0]).days)
+    span = np.where(has_data, days[np.maximum(last, 0)] - days[np.maximum(first, 0)], 0)
+    score = valid_ratio * np.select([span > 365, span > 180], [1.2, 1.1], 1.0)
+    score = score * np.select([valid_count >= 10, valid_count >= 5], [1.1, 1.05], 1.0)
+    score = np.where(has_data, np.minimum(1.0, score), 0.0)
+    return {
+        "valid_count": valid_count,
+        "total_count": np.full(len(values), total),
+        "valid_ratio": valid_ratio,
+        "first_valid_idx": first,
+        "last_valid_idx": last,
+        "data_span_days": span,
+        "quality_score": score,
+        "is_valid": has_data,
+    }
+
+
+def series_table(series: Dict[str, Any]) -> pd.DataFrame:
+    """Get extracted series as a tidy table (pixel, Latitude, Longitude, Time, Deformation)."""
+    n, nt = series["values"].shape
+    return pd.DataFrame({
+        "pixel": np.repeat(np.arange(n), nt),
+        "Latitude": np.repeat(series["lat"], nt),
+        "Longitude": np.repeat(series["lon"], nt),
+        "Time": np.tile(series["times"].values, n),
+        "Deformation": series["values"].ravel(),
+    })
+
+
+def write_series_table(table: pd.DataFrame, base_path: str, fmt: str = "auto") -> str:
+    """
+    Write a tidy series table.
+
+    Args:
+        table: Table from series_table
+        base_path: Output path without extension
+        fmt: 'parquet', 'csv', 'netcdf' or 'auto' (Parquet when pyarrow or
+            fastparquet is installed, CSV otherwise)
+
+    Returns:
+        Path of the written file
+    """
+    if fmt == "auto":
+        fmt = "csv"
+        for engine in ("pyarrow", "fastparquet"):
+            try:
+                __import__(engine)
+                fmt = "parquet"
+                break
+            except ImportError:
+                continue
+    if fmt == "parquet":
+        path = base_path + ".parquet"
+        table.to_parquet(path, index=False)
+    elif fmt == "netcdf":
+        path = base_path + ".nc"
+        pixels = table.drop_duplicates("pixel").set_index("pixel")
+        ds = table.set_index(["pixel", "Time"])[["Deformation"]].to_xarray()
+        ds = ds.assign_coords(Latitude=("pixel", pixels["Latitude"].values),
+                              Longitude=("pixel", pixels["Longitude"].values))
+        ds.to_netcdf(path, engine="h5netcdf")
+    else:
+        path = base_path + ".csv"
+        table.to_csv(path, index=False)
+    return path
+
+
+def format_time_axis(ax, times) -> None:
+    """Set monthly, quarterly or yearly date ticks for the span of a time series."""
+    import matplotlib.dates as mdates
+
+    num_years = (times[-1] - times[0]).days / 365.0 if len(times) > 1 else 0
+    if num_years <= 1:
+        ax.xaxis.set_major_locator(mdates.MonthLocator(interval=1))
+        ax.xaxis.set_major_formatter(mdates.DateFormatter("%b '%y"))
+    elif num_years <= 4:
+        ax.xaxis.set_major_locator(mdates.MonthLocator(interval=3))
+        ax.xaxis.set_major_formatter(mdates.DateFormatter("%b '%y"))
+    else:
+        ax.xaxis.set_major_locator(mdates.YearLocator())
+        ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y"))
+
+
+_worker_map_cache: Optional[BaseMapCache] = None
+
+
+def _init_plot_worker(vel_file_path: Optional[str]) -> None:
+    """Set up a plot worker: Agg backend, vector text output and a base map cache."""
+    global _worker_map_cache
+    import matplotlib
+    matplotlib.use("Agg")
+    matplotlib.rcParams['pdf.fonttype'] = 42
+    matplotlib.rcParams['ps.fonttype'] = 42
+    matplotlib.rcParams['svg.fonttype'] = 'none'
+    matplotlib.rcParams['pdf.use14corefonts'] = True
+    matplotlib.rcParams['text.usetex'] = False
+    _worker_map_cache = BaseMapCache(vel_file_path) if vel_file_path else None
+
+
+def _render_pixel_plot(job: Tuple[str, float, float, np.ndarray, np.ndarray, Optional[tuple]]) -> Tuple[str, Optional[str]]:
+    """Render the plot files (and context map) of one pixel; returns (base path, error or None)."""
+    base_path, lat, lon, times, values, map_extent = job
+    try:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        times = pd.to_datetime(times)
+        fig = Figure(figsize=(8, 5))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot(111)
+        ax.plot(times, values, marker='o', linestyle='-')
+        format_time_axis(ax, times)
+        ax.set_title(f"Time Series at ({lat:.4f}, {lon:.4f})")
+        ax.set_xlabel("Time")
+        ax.set_ylabel("Deformation (mm)")
+        ax.tick_params(axis='x', rotation=45)
+        ax.grid()
+        fig.tight_layout()
+        fig.savefig(f"{base_path}.png", bbox_inches='tight', facecolor='white', dpi=300)
+        for fmt in ('pdf', 'svg', 'eps'):
+            fig.savefig(f"{base_path}.{fmt}", format=fmt, bbox_inches='tight', facecolor='white')
+        if _worker_map_cache is not None and map_extent is not None:
+            _worker_map_cache.save(f"{base_path}_map.png", lat, lon, map_extent)
+        return base_path, None
+    except Exception as e:
+        return base_path, str(e)
+
+
+def render_series_plots(series: Dict[str, Any], out_dir: str, vel_file_path: Optional[str] = None,
+                        map_extent: Optional[tuple] = None, progress: Optional[queue.Queue] = None,
+                        workers: Optional[int] = None) -> List[str]:
+    """
+    Render per-pixel time series plots (PNG, PDF, SVG, EPS and context map) in a process pool.
+
+    Args:
+        series: Series from extract_series
+        out_dir: Output folder
+        vel_file_path: Velocity grid for context maps (None to skip maps)
+        map_extent: (lon_min, lon_max, lat_min, lat_max) of the context maps
+        progress: Queue receiving ('plot', done, total) after each pixel
+        workers: Process count (default: all cores but one)
+
+    Returns:
+        Error messages of the pixels that failed
+    """
+    n = len(series["lat"])
+    if n == 0:
+        return []
+    workers = max(1, min(n, workers or (os.cpu_count() or 2) - 1))
+    jobs = [(os.path.join(out_dir, series_basename(series["lat"][i], series["lon"][i])),
+             float(series["lat"][i]), float(series["lon"][i]), series["times"].values,
+             series["values"][i], map_extent) for i in range(n)]
+    errors = []
+    # Spawned workers do not inherit the Tk state of the GUI process
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_plot_worker,
+                             initargs=(vel_file_path if map_extent is not None else None,)) as pool:
+        futures = [pool.submit(_render_pixel_plot, job) for job in jobs]
+        for done, future in enumerate(as_completed(futures), start=1):
+            base_path, error = future.result()
+            if error:
+                errors.append(f"{os.path.basename(base_path)}: {error}")
+            if progress is not None:
+                progress.put(("plot", done, n))
+    return errors
+
+
+def export_series_batch(stacked_data, lats: Sequence[float], lons: Sequence[float], out_dir: str,
+                        plots: bool = False, vel_file_path: Optional[str] = None,
+                        map_extent: Optional[tuple] = None, progress: Optional[queue.Queue] = None,
+                        table_format: str = "auto", series: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Export the time series of many pixels: one read, one table, optional plots.
+
+    Progress messages are put on the queue as ('status', text),
+    ('plot', done, total) and finally ('done', result) or ('error', message).
+
+    Args:
+        series: Series of the pixels already read with extract_series; the
+            stack is then not read again
+
+    Returns:
+        {'table': path, 'pixels': count, 'errors': [...]}
+    """
+    try:
+        if series is None:
+            if progress is not None:
+                progress.put(("status", f"Reading {len(lats)} time series..."))
+            series = extract_series(stacked_data, lats, lons)
+        table_path = write_series_table(series_table(series), os.path.join(out_dir, "timeseries"), table_format)
+        errors = []
+        if plots:
+            if progress is not None:
+                progress.put(("status", f"Rendering {len(lats)} plots..."))
+            errors = render_series_plots(series, out_dir, vel_file_path, map_extent, progress)
+        result = {"table": table_path, "pixels": len(series["lat"]), "errors": errors}
+        if progress is not None:
+            progress.put(("done", result))
+        return result
+    except Exception as e:
+        if progress is not None:
+            progress.put(("error", str(e)))
+        raise
+
+
+def start_series_export(*args, **kwargs) -> Tuple[threading.Thread, queue.Queue]:
+    """Run export_series_batch in a background thread; returns (thread, progress queue)."""
+    progress = queue.Queue()
+    kwargs["progress"] = progress
+
+    def run():
+        try:
+            export_series_batch(*args, **kwargs)
+        except Exception:
+            pass  # Reported through the queue
+
+    thread = threading.Thread(target=run, name="series-export", daemon=True)
+    thread.start()
+    return thread, progress
@@ -0,0 +1,245 @@
+"""
+Per-pixel trend and seasonal model fitting for InSARLite.
+Fits every pixel of the disp_*_ll.grd stack with
+
+    d(t) = c + v*dt + a*dt^2/2 + annual and semi-annual sine/cosine terms
+
+(dt in years from the middle of the time span) and writes velocity,
+acceleration, seasonal amplitude/phase and residual RMS grids alongside
+vel_ll.grd. Pixels are solved in blocks with one shared design matrix:
+complete series share one pseudo-inverse, gappy series use NaN-masked
+normal equations built with matrix products, and blocks run in parallel
+through dask.
+"""
+
+import os
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from .stage_cache import inputs_hash, is_stamp_valid, params_hash, write_stamp
+from .timeseries_export import detect_lat_lon_names, get_file_paths, load_all_data_lazy
+
+
+DAYS_PER_YEAR = 365.25
+# Pixels solved per normal-equation batch (bounds the (pixels, time) work arrays)
+BLOCK_PIXELS = 16384
+# Normal matrices worse conditioned than this are left unsolved
+MAX_CONDITION = 1e10
+CHUNK_SIZE = 256
+
+# Output grids, in the order of the fitted parameter vector
+OUTPUTS = ["velocity", "acceleration", "annual_amplitude", "annual_phase",
+           "semiannual_amplitude", "semiannual_phase", "rms", "nobs"]
+OUTPUT_TEMPLATE = "trend_{name}_ll.grd"
+UNITS = {
+    "velocity": "mm/yr", "acceleration": "mm/yr^2", "annual_amplitude": "mm",
+    "annual_phase": "day of year of the maximum", "semiannual_amplitude": "mm",
+    "semiannual_phase": "day of the maximum in each half year", "rms": "mm", "nobs": "count",
+}
+
+
+def model_terms(times) -> List[str]:
+    """
+    Get the model terms the time span supports.
+
+    Seasonal terms need a year of data and acceleration at least two;
+    shorter stacks are fitted with fewer terms instead of ill-conditioned ones.
+    Higher-order terms (semi-annual, annual, then acceleration) are also
+    dropped until there are more epochs than terms, so no fit is exact.
+    """
+    times = np.asarray(times, dtype="datetime64[D]")
+    span = (times.max() - times.min()).astype(float) / DAYS_PER_YEAR if len(times) else 0.0
+    terms = ["offset", "velocity"]
+    if span >= 2.0:
+        terms.append("acceleration")
+    if span >= 1.0:
+        terms += ["annual_cos", "annual_sin", "semiannual_cos", "semiannual_sin"]
+    for optional in (["semiannual_cos", "semiannual_sin"], ["annual_cos", "annual_sin"], ["acceleration"]):
+        if len(times) > len(terms):
+            break
+        terms = [term for term in terms if term not in optional]
+    return terms
+
+
+def design_matrix(times, terms: Sequence[str]) -> np.ndarray:
+    """
+    Build the design matrix of the model.
+
+    Args:
+        times: Acquisition dates
+        terms: Model terms (see model_terms)
+
+    Returns:
+        Matrix (time, terms)
+    """
+    days = np.asarray(times, dtype="datetime64[D]")
+    t = (days - days.min()).astype(float) / DAYS_PER_YEAR
+    dt = t - (t.max() + t.min()) / 2
+    # Seasonal phase is measured from January 1st
+    years = days.astype("datetime64[Y]")
+    frac = (days - years).astype(float) / DAYS_PER_YEAR
+    columns = {
+        "offset": np.ones_like(dt),
+        "velocity": dt,
+        "acceleration": dt ** 2 / 2,
+        "annual_cos": np.cos(2 * np.pi * frac),
+        "annual_sin": np.sin(2 * np.pi * frac),
+        "semiannual_cos": np.cos(4 * np.pi * frac),
+        "semiannual_sin": np.sin(4 * np.pi * frac),
+    }
+    return np.column_stack([columns[term] for term in terms])
+
+
+def _solve_block(y: np.ndarray, design: np.ndarray, pinv: np.ndarray, outer: np.ndarray) -> np.ndarray:
+    """
+    Fit the model to a block of series (pixels, time); returns coefficients (pixels, terms).
+
+    Series with no more observations than terms are left NaN.
+    """
+    npix, nterms = y.shape[0], design.shape[1]
+    valid = np.isfinite(y)
+    determined = valid.sum(axis=1) > nterms
+    complete = valid.all(axis=1)
+    coeffs = np.full((npix, nterms), np.nan)
+    # Complete series share the pseudo-inverse of the design matrix
+    if (complete & determined).any():
+        coeffs[complete & determined] = y[complete & determined] @ pinv.T
+    gappy = ~complete & determined
+    if gappy.any():
+        w = valid[gappy].astype(float)
+        yw = np.where(valid[gappy], y[gappy], 0.0)
+        normal = (w @ outer).reshape(-1, nterms, nterms)
+        rhs = yw @ design
+        solvable = np.linalg.cond(normal) < MAX_CONDITION
+        normal[~solvable] = np.eye(nterms)
+        solved = np.linalg.solve(normal, rhs[..., None])[..., 0]
+        solved[~solvable] = np.nan
+        coeffs[gappy] = solved
+    return coeffs
+
+
+def fit_series(values: np.ndarray, design: np.ndarray, terms: Sequence[str]) -> np.ndarray:
+    """
+    Fit the model to series along the last axis.
+
+    Args:
+        values: Displacements (..., time), NaN where missing
+        design: Design matrix (time, terms)
+        terms: Model terms of the design matrix columns
+
+    Returns:
+        Parameters (..., len(OUTPUTS)), NaN where not estimable
+    """
+    shape = values.shape[:-1]
+    y = values.reshape(-1, values.shape[-1]).astype(float)
+    nterms = design.shape[1]
+    pinv = np.linalg.pinv(design)
+    outer = np.einsum("ti,tj->tij", design, design).reshape(len(design), -1)
+    out = np.full((y.shape[0], len(OUTPUTS)), np.nan)
+    index = {term: i for i, term in enumerate(terms)}
+    for start in range(0, y.shape[0], BLOCK_PIXELS):
+        block = y[start:start + BLOCK_PIXELS]
+        coeffs = _solve_block(block, design, pinv, outer)
+        valid = np.isfinite(block)
+        nobs = valid.sum(axis=1)
+        residual = np.where(valid, block - coeffs @ design.T, 0.0)
+        dof = np.maximum(nobs - nterms, 1)
+        result = out[start:start + BLOCK_PIXELS]
+        result[:, OUTPUTS.index("velocity")] = coeffs[:, index["velocity"]]
+        if "acceleration" in index:
+            result[:, OUTPUTS.index("acceleration")] = coeffs[:, index["acceleration"]]
+        for name, period_days in (("annual", DAYS_PER_YEAR), ("semiannual", DAYS_PER_YEAR / 2)):
+            if f"{name}_cos" in index:
+                c, s = coeffs[:, index[f"{name}_cos"]], coeffs[:, index[f"{name}_sin"]]
+                # c*cos(wt) + s*sin(wt) = A*cos(w(t - t_max))
+                result[:, OUTPUTS.index(f"{name}_amplitude")] = np.hypot(c, s)
+                result[:, OUTPUTS.index(f"{name}_phase")] = np.mod(np.arctan2(s, c), 2 * np.pi) / (2 * np.pi) * period_days
+        result[:, OUTPUTS.index("rms")] = np.where(np.isfinite(coeffs[:, 0]),
+                                                   np.sqrt((residual ** 2).sum(axis=1) / dof), np.nan)
+        result[:, OUTPUTS.index("nobs")] = nobs
+    return out.reshape(shape + (len(OUTPUTS),))
+
+
+def fit_stack(stacked, chunk_size: int = CHUNK_SIZE):
+    """
+    Fit the model to every pixel of a displacement stack.
+
+    Args:
+        stacked: DataArray (time, lat, lon), e.g. from load_all_data_lazy
+        chunk_size: Pixels per chunk side; chunks are fitted in parallel by dask
+
+    Returns:
+        (Dataset with one variable per output, model terms)
+    """
+    import xarray as xr
+
+    lat_name, lon_name = detect_lat_lon_names(stacked.coords)
+    if lat_name is None:
+        raise ValueError("Could not detect lat/lon coordinate names in the stack")
+    times = stacked["time"].values
+    terms = model_terms(times)
+    design = design_matrix(times, terms)
+    stacked = stacked.chunk({"time": -1, lat_name: chunk_size, lon_name: chunk_size})
+    params = xr.apply_ufunc(
+        fit_series, stacked,
+        input_core_dims=[["time"]], output_core_dims=[["param"]],
+        kwargs={"design": design, "terms": terms},
+        dask="parallelized", output_dtypes=[float],
+        dask_gufunc_kwargs={"output_sizes": {"param": len(OUTPUTS)}},
+    )
+    params = params.assign_coords(param=OUTPUTS).transpose(lat_name, lon_name, "param").compute()
+    fitted = xr.Dataset({name: params.sel(param=name, drop=True) for name in OUTPUTS})
+    return fitted, terms
+
+
+def fit_trend_grids(sdir: str, force: bool = False, chunk_size: int = CHUNK_SIZE) -> Dict[str, str]:
+    """
+    Fit the displacement stack of an SBAS folder and write trend_*_ll.grd grids next to vel_ll.grd.
+
+    Grids are reused while the stamp of the folder matches the displacement files.
+
+    Args:
+        sdir: SBAS folder holding disp_*_ll.grd
+        force: Refit even if the grids are up to date
+        chunk_size: Pixels per chunk side
+
+    Returns:
+        {output name: grid path} of the written (or reused) grids
+    """
+    from .grid_io import write_gmt_grid
+
+    files = get_file_paths(sdir)
+    if len(files) < 3:
+        raise ValueError(f"Need at least 3 disp_*_ll.grd files in {sdir}, found {len(files)}")
+    ihash = inputs_hash([path for path, _ in files])
+    terms = model_terms([np.datetime64(date, "D") for _, date in files])
+    params = {"terms": ",".join(terms), "epochs": len(files)}
+    outputs = {name: os.path.join(sdir, OUTPUT_TEMPLATE.format(name=name)) for name in OUTPUTS
+               if _output_estimated(name, terms)}
+    if not force and is_stamp_valid(sdir, "trend", params_hash(params), ihash) \
+            and all(os.path.exists(path) for path in outputs.values()):
+        print(f"Trend grids in {sdir} are up to date")
+        return outputs
+
+    print(f"Fitting {', '.join(terms)} to {len(files)} displacement grids...")
+    stacked = load_all_data_lazy(files)
+    lat_name, lon_name = detect_lat_lon_names(stacked.coords)
+    fitted, _ = fit_stack(stacked, chunk_size=chunk_size)
+    attrs = dict(stacked.attrs)
+    for name, path in outputs.items():
+        grid_attrs = {**attrs, "units": UNITS[name]}
+        write_gmt_grid(fitted[name].values.astype(np.float32), fitted[lon_name].values, fitted[lat_name].values,
+                       path, grid_attrs, dims=(lat_name, lon_name), history=f"InSARLite trend fit ({', '.join(terms)})")
+        print(f"✓ {os.path.basename(path)}")
+    write_stamp(sdir, "trend", params, ihash)
+    return outputs
+
+
+def _output_estimated(name: str, terms: Sequence[str]) -> bool:
+    """Check whether an output grid is estimated by a model with the given terms."""
+    if name == "acceleration":
+        return "acceleration" in terms
+    if name.startswith("annual") or name.startswith("semiannual"):
+        return f"{name.split('_')[0]}_cos" in terms
+    return True
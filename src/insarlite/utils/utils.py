@@ -16,36 +16,11 @@ import requests
 import time
 import numpy as np
 import glob
+from .product_catalog import get_catalog
+from .radar_transform import get_transformer
+from .process_utils import execute_command, run_command, log_message, process_logger_consolidated, format_time
 
 
-# Function to run commands in parallel
-def execute_command(command, log_func=None, process_num=None):
-    # Execute bash command
-    print(f"Executing command: {command}")
-    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    output, error = process.communicate()
-    if log_func:
-        log_func(message=output, process_num=process_num)
-        if error:
-            log_func(message=error, process_num=process_num)
-    return {'command': command, 'output': output, 'error': error}
-
-# Function to run a shell command and capture its output
-def run_command(command, log_func=None, process_num=None):
-    result = subprocess.run(command, shell=True, capture_output=True, text=True)
-    if log_func:
-        log_func(message=result.stdout, process_num=process_num)
-        if result.stderr:
-            log_func(message=result.stderr, process_num=process_num)
-    if result.returncode != 0:
-        print(result.stderr)
-    return result.stdout.strip()
-
-# Function to log messages to a log file
-def log_message(log_file_path, message):
-    with open(log_file_path, "a") as log_file:
-        log_file.write(message + "\n")
-
 # Function to format UI parameters for logging
 def format_ui_parameters(ui_params):
     """
@@ -176,34 +151,6 @@ def process_logger(
     if log_file:
         log_message(log_file, msg)
 
-# Consolidated process logger - single line per process
-def process_logger_consolidated(
-    process_num=None,
-    message=None,
-    log_file=None,
-    start_time=None
-):
-    """
-    Logs a consolidated process message with start time, end time, and duration.
-    
-    Args:
-        process_num (str|int): Process number (e.g., 1, 4.2.2, 5.1.1).
-        message (str): Process description message.
-        log_file (str): Full path to log file.
-        start_time (datetime): When the process started.
-    """
-    end_time = datetime.now()
-    start_timestamp = start_time.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-    end_timestamp = end_time.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-    
-    elapsed = (end_time - start_time).total_seconds()
-    elapsed_str = format_time(elapsed)
-    
-    msg = f"Process-{process_num}: {message or ''} | Started: {start_timestamp} | Ended: {end_timestamp} | Duration: {elapsed_str}"
-    print(msg)
-    if log_file:
-        log_message(log_file, msg)
-
 def parse_kml(kml_file):
     # Parse the KML file
     with open(kml_file, 'r') as f:
@@ -359,28 +306,6 @@ def extr_ext_TL(folder):
     return max_bounds, sdate, edate, fdirection
 
 
-# Function to format time output
-def format_time(seconds):
-    days, remainder = divmod(seconds, 86400)
-    hours, remainder = divmod(remainder, 3600)
-    mins, secs = divmod(remainder, 60)
-
-    # Create a list to hold non-zero parts
-    parts = []
-    if days > 0:
-        parts.append(f"{int(days)}d")
-    if hours > 0:
-        parts.append(f"{int(hours)}h")
-    if mins > 0:
-        parts.append(f"{int(mins)}m")
-    if (
-        secs > 0 or not parts
-    ):  # Always include seconds, even if zero when it's the only value
-        parts.append(f"{secs:.2f}s")
-
-    return " ".join(parts)
-
-
 # # Function to exit the program on specified condition if false
 # def exitGUI(root, condition, message="Critical Error. Exiting..."):
 #     """
@@ -902,11 +827,13 @@ def create_ref_point_ra(topodir, outmean):
     with open(os.path.join(topodir, "ref_point.ra"), 'w') as f:
         f.write(f"{x} {y}\n")
 
-    # with open(os.path.join(topodir, "ref_point.ll"), 'w') as f:
-    #     f.write(f"{lon} {lat} 0\n")
-    # print("Creating ref_point_2.ra file...")
-    # os.chdir(topodir)
-    # subprocess.run(f"SAT_llt2rat {os.path.join(topodir, 'master.PRM')} 0 < {os.path.join(topodir, 'ref_point.ll')} > {os.path.join(topodir, 'ref_point_2.ra')}", shell=True)
+    # Keep the geographic position alongside, converted in memory from trans.dat
+    transformer = get_transformer(topodir)
+    if transformer is not None:
+        lon, lat = transformer.ra_to_ll(float(x), float(y))
+        if np.isfinite(lon[0]) and np.isfinite(lat[0]):
+            with open(os.path.join(topodir, "ref_point.ll"), 'w') as f:
+                f.write(f"{lon[0]} {lat[0]}\n")
 
 ###################################
 # Process completion status check #
@@ -931,14 +858,8 @@ def check_ifgs_completion(subswathdir, verbose=True):
         with open(intf, "r") as f:
             intf_count = sum(1 for _ in f)
         
-        # List all subdirectories in ifg_dir that have completed interferograms (corr.grd exists)
-        completed_ifgs = []
-        subdirs = [d for d in os.listdir(ifg_dir) if os.path.isdir(os.path.join(ifg_dir, d))]
-        
-        for subdir in subdirs:
-            corr_file = os.path.join(ifg_dir, subdir, "corr.grd")
-            if os.path.exists(corr_file):
-                completed_ifgs.append(subdir)
+        # Completed interferograms (corr.grd exists) from the project product catalog
+        completed_ifgs = get_catalog(ifg_dir).pairs_with(ifg_dir, "corr.grd")
         
         if intf_count and len(completed_ifgs) != intf_count:
             if verbose:
@@ -977,7 +898,7 @@ def check_merge_completion(indir):
         with open(intf, "r") as f:
             intf_count = sum(1 for _ in f)
     # List all subdirectories in pmerge
-    subdirs = [d for d in os.listdir(pmerge) if os.path.isdir(os.path.join(pmerge, d))]
+    subdirs = get_catalog(pmerge).subdirs(pmerge)
     if intf_count and len(subdirs) != intf_count:
         print(f"❌ Only {len(subdirs)} out of {intf_count} merged IFGs present for {indir}")
         return False
@@ -1424,30 +1345,10 @@ def extract_flight_direction_from_zip(zip_path):
     Returns:
         str: Flight direction ('ASCENDING' or 'DESCENDING') or None if not found
     """
+    from .scene_index import get_scene_metadata
+
     try:
-        import zipfile
-        import tempfile
-        
-        with zipfile.ZipFile(zip_path, 'r') as zf:
-            # Look for manifest.safe file in the ZIP
-            manifest_files = [name for name in zf.namelist() if name.endswith('manifest.safe')]
-            
-            if not manifest_files:
-                return None
-                
-            # Use the first manifest.safe found
-            manifest_file = manifest_files[0]
-            
-            # Extract to temporary file and parse
-            with tempfile.NamedTemporaryFile(mode='w+b', suffix='.xml', delete=False) as temp_file:
-                temp_file.write(zf.read(manifest_file))
-                temp_file.flush()
-                
-                try:
-                    return parse_manifest_safe_flight_direction(temp_file.name)
-                finally:
-                    os.unlink(temp_file.name)
-                    
+        return get_scene_metadata([zip_path])[0].get("flight_direction")
     except Exception as e:
         print(f"Error extracting flight direction from ZIP {zip_path}: {e}")
         return None
@@ -1468,30 +1369,22 @@ def analyze_flight_directions(safe_dirs, zip_files):
             - 'direction': the uniform direction if uniform, else None
             - 'details': list of (file_path, direction) tuples
     """
+    from .scene_index import get_scene_metadata
+
     directions_found = set()
     details = []
     
-    # Process SAFE directories
-    for safe_dir in safe_dirs or []:
-        manifest_path = os.path.join(safe_dir, 'manifest.safe')
-        if os.path.exists(manifest_path):
-            direction = parse_manifest_safe_flight_direction(manifest_path)
-            if direction:
-                directions_found.add(direction)
-                details.append((safe_dir, direction))
-            else:
-                details.append((safe_dir, 'UNKNOWN'))
-        else:
-            details.append((safe_dir, 'NO_MANIFEST'))
-    
-    # Process ZIP files
-    for zip_file in zip_files or []:
-        direction = extract_flight_direction_from_zip(zip_file)
+    # Manifests of SAFE directories and ZIP files are read once through the scene index
+    scenes = list(safe_dirs or []) + list(zip_files or [])
+    for path, record in zip(scenes, get_scene_metadata(scenes)):
+        direction = record.get("flight_direction")
         if direction:
             directions_found.add(direction)
-            details.append((zip_file, direction))
+            details.append((path, direction))
+        elif record.get("kind") == "safe" and not os.path.exists(os.path.join(path, 'manifest.safe')):
+            details.append((path, 'NO_MANIFEST'))
         else:
-            details.append((zip_file, 'UNKNOWN'))
+            details.append((path, 'UNKNOWN'))
     
     # Determine if all directions are uniform
     uniform = len(directions_found) == 1
@@ -1644,7 +1537,7 @@ def check_alignment_completion_status(praw_dir, data_in_path=None, apply_network
             return {'status': 'error', 'message': 'Empty data.in file'}
             
         # Get list of existing files in directory
-        existing_files = set(os.listdir(praw_dir))
+        existing_files = set(get_catalog(praw_dir).listdir(praw_dir))
         
         total_images = len(lines)
         aligned_images = 0